@@ -0,0 +1,175 @@
+"""add master_stats projection maintained by orders trigger
+
+Revision ID: 2025_10_17_0001
+Revises: 2025_10_16_0002
+Create Date: 2025-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_17_0001"
+down_revision = "2025_10_16_0002"
+branch_labels = None
+depends_on = None
+
+
+_BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION master_stats_bump(p_mid INTEGER, p_active INTEGER, p_closed INTEGER)
+RETURNS void AS $$
+BEGIN
+    -- orders.assigned_master_id is SET NULL while the master is being deleted
+    IF NOT EXISTS (SELECT 1 FROM masters WHERE id = p_mid) THEN
+        RETURN;
+    END IF;
+    INSERT INTO master_stats AS ms (master_id, active_cnt, closed_total, updated_at)
+    VALUES (p_mid, GREATEST(p_active, 0), GREATEST(p_closed, 0), NOW())
+    ON CONFLICT (master_id) DO UPDATE
+       SET active_cnt = GREATEST(ms.active_cnt + p_active, 0),
+           closed_total = GREATEST(ms.closed_total + p_closed, 0),
+           updated_at = NOW();
+
+    UPDATE master_stats ms
+       SET avg_week_check = w.avg_week_check,
+           week_closed_cnt = w.week_closed_cnt,
+           week_closed_sum = w.week_closed_sum
+      FROM (
+            SELECT COALESCE(AVG(o.total_sum) FILTER (
+                       WHERE o.status IN ('PAYMENT','CLOSED')
+                   ), 0)::numeric(10,2) AS avg_week_check,
+                   COUNT(*) FILTER (WHERE o.status = 'CLOSED') AS week_closed_cnt,
+                   COALESCE(SUM(o.total_sum) FILTER (WHERE o.status = 'CLOSED'), 0) AS week_closed_sum
+              FROM orders o
+             WHERE o.assigned_master_id = p_mid
+               AND o.created_at >= NOW() - INTERVAL '7 days'
+      ) w
+     WHERE ms.master_id = p_mid;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION orders_master_stats_trg()
+RETURNS trigger AS $$
+DECLARE
+    old_mid INTEGER := NULL;
+    new_mid INTEGER := NULL;
+    old_active INTEGER := 0;
+    new_active INTEGER := 0;
+    old_closed INTEGER := 0;
+    new_closed INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_mid := OLD.assigned_master_id;
+        old_active := CASE WHEN OLD.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT') THEN 1 ELSE 0 END;
+        old_closed := CASE WHEN OLD.status = 'CLOSED' THEN 1 ELSE 0 END;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_mid := NEW.assigned_master_id;
+        new_active := CASE WHEN NEW.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT') THEN 1 ELSE 0 END;
+        new_closed := CASE WHEN NEW.status = 'CLOSED' THEN 1 ELSE 0 END;
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+       AND old_mid IS NOT DISTINCT FROM new_mid
+       AND OLD.status IS NOT DISTINCT FROM NEW.status
+       AND OLD.total_sum IS NOT DISTINCT FROM NEW.total_sum THEN
+        RETURN NULL;
+    END IF;
+
+    IF old_mid IS NOT NULL AND old_mid = new_mid THEN
+        PERFORM master_stats_bump(new_mid, new_active - old_active, new_closed - old_closed);
+        RETURN NULL;
+    END IF;
+    IF old_mid IS NOT NULL THEN
+        PERFORM master_stats_bump(old_mid, -old_active, -old_closed);
+    END IF;
+    IF new_mid IS NOT NULL THEN
+        PERFORM master_stats_bump(new_mid, new_active, new_closed);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_BACKFILL = """
+INSERT INTO master_stats (
+    master_id, active_cnt, avg_week_check,
+    week_closed_cnt, week_closed_sum, closed_total, updated_at
+)
+SELECT mm.id,
+       COALESCE(a.active_cnt, 0),
+       COALESCE(a.avg_week_check, 0),
+       COALESCE(a.week_closed_cnt, 0),
+       COALESCE(a.week_closed_sum, 0),
+       COALESCE(a.closed_total, 0),
+       NOW()
+  FROM masters mm
+  LEFT JOIN (
+        SELECT o.assigned_master_id AS mid,
+               COUNT(*) FILTER (
+                   WHERE o.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT')
+               ) AS active_cnt,
+               COALESCE(AVG(o.total_sum) FILTER (
+                   WHERE o.status IN ('PAYMENT','CLOSED')
+                     AND o.created_at >= NOW() - INTERVAL '7 days'
+               ), 0)::numeric(10,2) AS avg_week_check,
+               COUNT(*) FILTER (
+                   WHERE o.status = 'CLOSED'
+                     AND o.created_at >= NOW() - INTERVAL '7 days'
+               ) AS week_closed_cnt,
+               COALESCE(SUM(o.total_sum) FILTER (
+                   WHERE o.status = 'CLOSED'
+                     AND o.created_at >= NOW() - INTERVAL '7 days'
+               ), 0) AS week_closed_sum,
+               COUNT(*) FILTER (WHERE o.status = 'CLOSED') AS closed_total
+          FROM orders o
+         WHERE o.assigned_master_id IS NOT NULL
+         GROUP BY o.assigned_master_id
+  ) a ON a.mid = mm.id
+ON CONFLICT (master_id) DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "master_stats",
+        sa.Column(
+            "master_id",
+            sa.Integer(),
+            sa.ForeignKey("masters.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("active_cnt", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("avg_week_check", sa.Numeric(10, 2), nullable=False, server_default="0"),
+        sa.Column("week_closed_cnt", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("week_closed_sum", sa.Numeric(12, 2), nullable=False, server_default="0"),
+        sa.Column("closed_total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+    )
+
+    op.execute(_BUMP_FUNCTION)
+    op.execute(_TRIGGER_FUNCTION)
+    op.execute(
+        """
+        CREATE TRIGGER trg_orders__master_stats
+        AFTER INSERT OR DELETE OR UPDATE OF status, assigned_master_id, total_sum
+        ON orders
+        FOR EACH ROW EXECUTE FUNCTION orders_master_stats_trg()
+        """
+    )
+    op.execute(_BACKFILL)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_orders__master_stats ON orders")
+    op.execute("DROP FUNCTION IF EXISTS orders_master_stats_trg()")
+    op.execute("DROP FUNCTION IF EXISTS master_stats_bump(INTEGER, INTEGER, INTEGER)")
+    op.drop_table("master_stats")
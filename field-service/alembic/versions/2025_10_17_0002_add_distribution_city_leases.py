@@ -0,0 +1,66 @@
+"""add distribution worker registry and per-city leases
+
+Revision ID: 2025_10_17_0002
+Revises: 2025_10_17_0001
+Create Date: 2025-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_17_0002"
+down_revision = "2025_10_17_0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "distribution_workers",
+        sa.Column("worker_id", sa.String(length=128), primary_key=True),
+        sa.Column(
+            "started_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+        sa.Column(
+            "heartbeat_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+    )
+    op.create_table(
+        "distribution_city_leases",
+        sa.Column(
+            "city_id",
+            sa.Integer(),
+            sa.ForeignKey("cities.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("worker_id", sa.String(length=128), nullable=False),
+        sa.Column(
+            "acquired_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_distribution_city_leases__worker_id",
+        "distribution_city_leases",
+        ["worker_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_distribution_city_leases__worker_id",
+        table_name="distribution_city_leases",
+    )
+    op.drop_table("distribution_city_leases")
+    op.drop_table("distribution_workers")
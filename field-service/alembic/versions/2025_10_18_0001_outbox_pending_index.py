@@ -0,0 +1,29 @@
+"""partial index for pending notifications_outbox rows
+
+Revision ID: 2025_10_18_0001
+Revises: 2025_10_17_0002
+Create Date: 2025-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_18_0001"
+down_revision = "2025_10_17_0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_notifications_outbox__pending",
+        "notifications_outbox",
+        ["id"],
+        postgresql_where=sa.text("processed_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notifications_outbox__pending", table_name="notifications_outbox")
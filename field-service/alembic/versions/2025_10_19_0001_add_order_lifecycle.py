@@ -0,0 +1,127 @@
+"""add order_lifecycle projection maintained by order_status_history trigger
+
+Revision ID: 2025_10_19_0001
+Revises: 2025_10_18_0001
+Create Date: 2025-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_19_0001"
+down_revision = "2025_10_18_0001"
+branch_labels = None
+depends_on = None
+
+
+_STATUSES = (
+    "CREATED",
+    "SEARCHING",
+    "ASSIGNED",
+    "EN_ROUTE",
+    "WORKING",
+    "PAYMENT",
+    "CLOSED",
+    "DEFERRED",
+    "GUARANTEE",
+    "CANCELED",
+)
+
+# first_<status>_at / last_<status>_at are addressed by name: the status
+# values map 1:1 to column suffixes
+_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION order_status_history_lifecycle_trg()
+RETURNS trigger AS $$
+DECLARE
+    ts TIMESTAMPTZ := COALESCE(NEW.created_at, NOW());
+    suffix TEXT := lower(NEW.to_status::text);
+BEGIN
+    INSERT INTO order_lifecycle (order_id, updated_at)
+    VALUES (NEW.order_id, NOW())
+    ON CONFLICT (order_id) DO NOTHING;
+
+    IF NEW.to_status = 'CANCELED' THEN
+        UPDATE order_lifecycle
+           SET cancel_reason = NEW.reason
+         WHERE order_id = NEW.order_id
+           AND (last_canceled_at IS NULL OR last_canceled_at <= ts);
+    END IF;
+
+    EXECUTE format(
+        'UPDATE order_lifecycle
+            SET first_%1$s_at = LEAST(COALESCE(first_%1$s_at, $2), $2),
+                last_%1$s_at = GREATEST(COALESCE(last_%1$s_at, $2), $2),
+                updated_at = NOW()
+          WHERE order_id = $1',
+        suffix
+    ) USING NEW.order_id, ts;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _backfill_sql() -> str:
+    aggregates = ",\n       ".join(
+        f"MIN(h.created_at) FILTER (WHERE h.to_status = '{status}'),\n"
+        f"       MAX(h.created_at) FILTER (WHERE h.to_status = '{status}')"
+        for status in _STATUSES
+    )
+    columns = ", ".join(
+        f"first_{status.lower()}_at, last_{status.lower()}_at" for status in _STATUSES
+    )
+    return f"""
+INSERT INTO order_lifecycle (order_id, {columns}, cancel_reason, updated_at)
+SELECT h.order_id,
+       {aggregates},
+       (ARRAY_AGG(h.reason ORDER BY h.created_at DESC, h.id DESC)
+            FILTER (WHERE h.to_status = 'CANCELED'))[1],
+       NOW()
+  FROM order_status_history h
+ GROUP BY h.order_id
+ON CONFLICT (order_id) DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    columns = [
+        sa.Column(
+            "order_id",
+            sa.Integer(),
+            sa.ForeignKey("orders.id", ondelete="CASCADE"),
+            primary_key=True,
+        )
+    ]
+    for status in _STATUSES:
+        columns.append(sa.Column(f"first_{status.lower()}_at", sa.DateTime(timezone=True)))
+        columns.append(sa.Column(f"last_{status.lower()}_at", sa.DateTime(timezone=True)))
+    columns.append(sa.Column("cancel_reason", sa.Text()))
+    columns.append(
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        )
+    )
+    op.create_table("order_lifecycle", *columns)
+
+    op.execute(_TRIGGER_FUNCTION)
+    op.execute(
+        """
+        CREATE TRIGGER trg_order_status_history__lifecycle
+        AFTER INSERT ON order_status_history
+        FOR EACH ROW EXECUTE FUNCTION order_status_history_lifecycle_trg()
+        """
+    )
+    op.execute(_backfill_sql())
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_order_status_history__lifecycle ON order_status_history"
+    )
+    op.execute("DROP FUNCTION IF EXISTS order_status_history_lifecycle_trg()")
+    op.drop_table("order_lifecycle")
@@ -0,0 +1,151 @@
+"""add hourly/daily rollups of distribution_metrics maintained by trigger
+
+Revision ID: 2025_10_19_0002
+Revises: 2025_10_19_0001
+Create Date: 2025-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_19_0002"
+down_revision = "2025_10_19_0001"
+branch_labels = None
+depends_on = None
+
+
+# counter -> expression over a distribution_metrics row ({p} = row prefix);
+# keep in sync with services.distribution_metrics_service.ROLLUP_COUNTERS
+_COUNTERS = (
+    ("assignments", "1", sa.Integer()),
+    ("tta_count", "CASE WHEN {p}time_to_assign_seconds IS NOT NULL THEN 1 ELSE 0 END", sa.Integer()),
+    ("tta_sum", "COALESCE({p}time_to_assign_seconds, 0)", sa.BigInteger()),
+    ("round_sum", "{p}round_number", sa.Integer()),
+    ("candidates_sum", "{p}candidates_count", sa.Integer()),
+    ("preferred_count", "CASE WHEN {p}preferred_master_used THEN 1 ELSE 0 END", sa.Integer()),
+    ("logist_escalations", "CASE WHEN {p}was_escalated_to_logist THEN 1 ELSE 0 END", sa.Integer()),
+    ("admin_escalations", "CASE WHEN {p}was_escalated_to_admin THEN 1 ELSE 0 END", sa.Integer()),
+    (
+        "escalations",
+        "CASE WHEN {p}was_escalated_to_logist OR {p}was_escalated_to_admin THEN 1 ELSE 0 END",
+        sa.Integer(),
+    ),
+    ("round_1", "CASE WHEN {p}round_number = 1 THEN 1 ELSE 0 END", sa.Integer()),
+    ("round_2", "CASE WHEN {p}round_number = 2 THEN 1 ELSE 0 END", sa.Integer()),
+    ("round_3_plus", "CASE WHEN {p}round_number >= 3 THEN 1 ELSE 0 END", sa.Integer()),
+    ("tta_fast", "CASE WHEN {p}time_to_assign_seconds < 120 THEN 1 ELSE 0 END", sa.Integer()),
+    (
+        "tta_medium",
+        "CASE WHEN {p}time_to_assign_seconds BETWEEN 120 AND 300 THEN 1 ELSE 0 END",
+        sa.Integer(),
+    ),
+    ("tta_slow", "CASE WHEN {p}time_to_assign_seconds > 300 THEN 1 ELSE 0 END", sa.Integer()),
+    (
+        "via_master_bot",
+        "CASE WHEN {p}metadata_json ->> 'assigned_via' = 'master_bot' THEN 1 ELSE 0 END",
+        sa.Integer(),
+    ),
+    (
+        "via_admin_manual",
+        "CASE WHEN {p}metadata_json ->> 'assigned_via' = 'admin_manual' THEN 1 ELSE 0 END",
+        sa.Integer(),
+    ),
+)
+
+_ROLLUPS = (
+    (
+        "distribution_metrics_hourly",
+        "bucket_start",
+        "date_trunc('hour', {p}assigned_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'",
+    ),
+    (
+        "distribution_metrics_daily",
+        "bucket_date",
+        "({p}assigned_at AT TIME ZONE 'UTC')::date",
+    ),
+)
+
+
+def _upsert_sql(table: str, bucket_column: str, bucket_expr: str) -> str:
+    names = ", ".join(name for name, _, _ in _COUNTERS)
+    values = ", ".join(expr.format(p="NEW.") for _, expr, _ in _COUNTERS)
+    updates = ",\n           ".join(
+        f"{name} = {table}.{name} + EXCLUDED.{name}" for name, _, _ in _COUNTERS
+    )
+    return f"""
+    INSERT INTO {table} ({bucket_column}, city_id, master_id, {names})
+    VALUES ({bucket_expr.format(p="NEW.")}, NEW.city_id, COALESCE(NEW.master_id, 0), {values})
+    ON CONFLICT ({bucket_column}, city_id, master_id) DO UPDATE
+       SET {updates};
+"""
+
+
+_TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION distribution_metrics_rollups_trg()
+RETURNS trigger AS $$
+BEGIN
+{"".join(_upsert_sql(*rollup) for rollup in _ROLLUPS)}
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def _backfill_sql(table: str, bucket_column: str, bucket_expr: str) -> str:
+    names = ", ".join(name for name, _, _ in _COUNTERS)
+    sums = ", ".join(f"SUM({expr.format(p='')})" for _, expr, _ in _COUNTERS)
+    return f"""
+INSERT INTO {table} ({bucket_column}, city_id, master_id, {names})
+SELECT {bucket_expr.format(p='')}, city_id, COALESCE(master_id, 0), {sums}
+  FROM distribution_metrics
+ GROUP BY 1, 2, 3
+"""
+
+
+def _create_rollup(table: str, bucket: sa.Column) -> None:
+    columns = [
+        bucket,
+        sa.Column(
+            "city_id",
+            sa.Integer(),
+            sa.ForeignKey("cities.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("master_id", sa.Integer(), primary_key=True),
+    ]
+    for name, _, type_ in _COUNTERS:
+        columns.append(sa.Column(name, type_, nullable=False, server_default="0"))
+    op.create_table(table, *columns)
+
+
+def upgrade() -> None:
+    _create_rollup(
+        "distribution_metrics_hourly",
+        sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+    )
+    _create_rollup(
+        "distribution_metrics_daily",
+        sa.Column("bucket_date", sa.Date(), primary_key=True),
+    )
+
+    op.execute(_TRIGGER_FUNCTION)
+    op.execute(
+        """
+        CREATE TRIGGER trg_distribution_metrics__rollups
+        AFTER INSERT ON distribution_metrics
+        FOR EACH ROW EXECUTE FUNCTION distribution_metrics_rollups_trg()
+        """
+    )
+    for rollup in _ROLLUPS:
+        op.execute(_backfill_sql(*rollup))
+
+
+def downgrade() -> None:
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_distribution_metrics__rollups ON distribution_metrics"
+    )
+    op.execute("DROP FUNCTION IF EXISTS distribution_metrics_rollups_trg()")
+    op.drop_table("distribution_metrics_daily")
+    op.drop_table("distribution_metrics_hourly")
@@ -0,0 +1,107 @@
+"""add monthly partitioned archives of order_status_history and offers
+
+Revision ID: 2025_10_20_0001
+Revises: 2025_10_19_0002
+Create Date: 2025-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_20_0001"
+down_revision = "2025_10_19_0002"
+branch_labels = None
+depends_on = None
+
+
+# Monthly partitions are created on demand by
+# services.autoclose_scheduler.archive_closed_orders
+def upgrade() -> None:
+    op.add_column(
+        "order_autoclose_queue",
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        """
+        CREATE INDEX ix_order_autoclose_queue__archive
+            ON order_autoclose_queue (closed_at)
+         WHERE processed_at IS NOT NULL AND archived_at IS NULL
+        """
+    )
+
+    op.execute(
+        """
+        CREATE TABLE order_status_history_archive (
+            id                   INTEGER      NOT NULL,
+            order_id             INTEGER      NOT NULL,
+            from_status          order_status NULL,
+            to_status            order_status NOT NULL,
+            reason               TEXT         NULL,
+            changed_by_staff_id  INTEGER      NULL,
+            changed_by_master_id INTEGER      NULL,
+            actor_type           actor_type   NOT NULL,
+            context              JSONB        NOT NULL DEFAULT '{}'::jsonb,
+            created_at           TIMESTAMPTZ  NOT NULL,
+            archived_at          TIMESTAMPTZ  NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute(
+        "CREATE INDEX ix_order_status_history_archive__order "
+        "ON order_status_history_archive (order_id, created_at)"
+    )
+
+    op.execute(
+        """
+        CREATE TABLE offers_archive (
+            id           INTEGER     NOT NULL,
+            order_id     INTEGER     NOT NULL,
+            master_id    INTEGER     NOT NULL,
+            round_number SMALLINT    NOT NULL,
+            state        offer_state NOT NULL,
+            sent_at      TIMESTAMPTZ NULL,
+            responded_at TIMESTAMPTZ NULL,
+            expires_at   TIMESTAMPTZ NULL,
+            created_at   TIMESTAMPTZ NOT NULL,
+            archived_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("CREATE INDEX ix_offers_archive__order ON offers_archive (order_id)")
+    op.execute(
+        "CREATE INDEX ix_offers_archive__master_state ON offers_archive (master_id, state)"
+    )
+
+
+def downgrade() -> None:
+    # Archived rows are moved back before the tables are dropped
+    op.execute(
+        """
+        INSERT INTO order_status_history (
+            id, order_id, from_status, to_status, reason, changed_by_staff_id,
+            changed_by_master_id, actor_type, context, created_at
+        )
+        SELECT id, order_id, from_status, to_status, reason, changed_by_staff_id,
+               changed_by_master_id, actor_type, context, created_at
+          FROM order_status_history_archive
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO offers (
+            id, order_id, master_id, round_number, state, sent_at,
+            responded_at, expires_at, created_at
+        )
+        SELECT id, order_id, master_id, round_number, state, sent_at,
+               responded_at, expires_at, created_at
+          FROM offers_archive
+        """
+    )
+    op.execute("DROP TABLE offers_archive")
+    op.execute("DROP TABLE order_status_history_archive")
+    op.execute("DROP INDEX IF EXISTS ix_order_autoclose_queue__archive")
+    op.drop_column("order_autoclose_queue", "archived_at")
@@ -0,0 +1,252 @@
+"""extend master_stats with the master bot statistics screen counters
+
+Revision ID: 2025_10_20_0002
+Revises: 2025_10_20_0001
+Create Date: 2025-10-20 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_20_0002"
+down_revision = "2025_10_20_0001"
+branch_labels = None
+depends_on = None
+
+
+# Same as 2025_10_17_0001 plus the current month window (UTC, by updated_at)
+_BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION master_stats_bump(p_mid INTEGER, p_active INTEGER, p_closed INTEGER)
+RETURNS void AS $$
+DECLARE
+    v_month_start TIMESTAMPTZ := date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+BEGIN
+    -- orders.assigned_master_id is SET NULL while the master is being deleted
+    IF NOT EXISTS (SELECT 1 FROM masters WHERE id = p_mid) THEN
+        RETURN;
+    END IF;
+    INSERT INTO master_stats AS ms (master_id, active_cnt, closed_total, updated_at)
+    VALUES (p_mid, GREATEST(p_active, 0), GREATEST(p_closed, 0), NOW())
+    ON CONFLICT (master_id) DO UPDATE
+       SET active_cnt = GREATEST(ms.active_cnt + p_active, 0),
+           closed_total = GREATEST(ms.closed_total + p_closed, 0),
+           updated_at = NOW();
+
+    UPDATE master_stats ms
+       SET avg_week_check = w.avg_week_check,
+           week_closed_cnt = w.week_closed_cnt,
+           week_closed_sum = w.week_closed_sum
+      FROM (
+            SELECT COALESCE(AVG(o.total_sum) FILTER (
+                       WHERE o.status IN ('PAYMENT','CLOSED')
+                   ), 0)::numeric(10,2) AS avg_week_check,
+                   COUNT(*) FILTER (WHERE o.status = 'CLOSED') AS week_closed_cnt,
+                   COALESCE(SUM(o.total_sum) FILTER (WHERE o.status = 'CLOSED'), 0) AS week_closed_sum
+              FROM orders o
+             WHERE o.assigned_master_id = p_mid
+               AND o.created_at >= NOW() - INTERVAL '7 days'
+      ) w
+     WHERE ms.master_id = p_mid;
+
+    UPDATE master_stats ms
+       SET month_start = v_month_start,
+           month_closed_cnt = (
+                SELECT COUNT(*)
+                  FROM orders o
+                 WHERE o.assigned_master_id = p_mid
+                   AND o.status = 'CLOSED'
+                   AND o.updated_at >= v_month_start
+           )
+     WHERE ms.master_id = p_mid;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_OLD_BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION master_stats_bump(p_mid INTEGER, p_active INTEGER, p_closed INTEGER)
+RETURNS void AS $$
+BEGIN
+    -- orders.assigned_master_id is SET NULL while the master is being deleted
+    IF NOT EXISTS (SELECT 1 FROM masters WHERE id = p_mid) THEN
+        RETURN;
+    END IF;
+    INSERT INTO master_stats AS ms (master_id, active_cnt, closed_total, updated_at)
+    VALUES (p_mid, GREATEST(p_active, 0), GREATEST(p_closed, 0), NOW())
+    ON CONFLICT (master_id) DO UPDATE
+       SET active_cnt = GREATEST(ms.active_cnt + p_active, 0),
+           closed_total = GREATEST(ms.closed_total + p_closed, 0),
+           updated_at = NOW();
+
+    UPDATE master_stats ms
+       SET avg_week_check = w.avg_week_check,
+           week_closed_cnt = w.week_closed_cnt,
+           week_closed_sum = w.week_closed_sum
+      FROM (
+            SELECT COALESCE(AVG(o.total_sum) FILTER (
+                       WHERE o.status IN ('PAYMENT','CLOSED')
+                   ), 0)::numeric(10,2) AS avg_week_check,
+                   COUNT(*) FILTER (WHERE o.status = 'CLOSED') AS week_closed_cnt,
+                   COALESCE(SUM(o.total_sum) FILTER (WHERE o.status = 'CLOSED'), 0) AS week_closed_sum
+              FROM orders o
+             WHERE o.assigned_master_id = p_mid
+               AND o.created_at >= NOW() - INTERVAL '7 days'
+      ) w
+     WHERE ms.master_id = p_mid;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_OFFER_BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION master_stats_offer_bump(p_mid INTEGER, p_cnt INTEGER, p_seconds NUMERIC)
+RETURNS void AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM masters WHERE id = p_mid) THEN
+        RETURN;
+    END IF;
+    INSERT INTO master_stats AS ms (master_id, accepted_offers_cnt, response_seconds_sum, updated_at)
+    VALUES (p_mid, GREATEST(p_cnt, 0), p_seconds, NOW())
+    ON CONFLICT (master_id) DO UPDATE
+       SET accepted_offers_cnt = GREATEST(ms.accepted_offers_cnt + p_cnt, 0),
+           response_seconds_sum = ms.response_seconds_sum + p_seconds,
+           updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Shared by offers and offers_archive: moving an offer to the archive is a
+# DELETE + INSERT and nets out to zero.
+_OFFER_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION offers_master_stats_trg()
+RETURNS trigger AS $$
+DECLARE
+    old_seconds NUMERIC := NULL;
+    new_seconds NUMERIC := NULL;
+BEGIN
+    IF TG_OP <> 'INSERT'
+       AND OLD.state = 'ACCEPTED'
+       AND OLD.sent_at IS NOT NULL
+       AND OLD.responded_at IS NOT NULL THEN
+        old_seconds := EXTRACT(EPOCH FROM OLD.responded_at - OLD.sent_at);
+    END IF;
+    IF TG_OP <> 'DELETE'
+       AND NEW.state = 'ACCEPTED'
+       AND NEW.sent_at IS NOT NULL
+       AND NEW.responded_at IS NOT NULL THEN
+        new_seconds := EXTRACT(EPOCH FROM NEW.responded_at - NEW.sent_at);
+    END IF;
+
+    IF TG_OP = 'UPDATE'
+       AND OLD.master_id IS NOT DISTINCT FROM NEW.master_id
+       AND old_seconds IS NOT DISTINCT FROM new_seconds THEN
+        RETURN NULL;
+    END IF;
+
+    IF old_seconds IS NOT NULL THEN
+        PERFORM master_stats_offer_bump(OLD.master_id, -1, -old_seconds);
+    END IF;
+    IF new_seconds IS NOT NULL THEN
+        PERFORM master_stats_offer_bump(NEW.master_id, 1, new_seconds);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_BACKFILL = """
+INSERT INTO master_stats AS ms (
+    master_id, month_start, month_closed_cnt,
+    accepted_offers_cnt, response_seconds_sum, updated_at
+)
+SELECT mm.id,
+       date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+       COALESCE(mo.month_closed_cnt, 0),
+       COALESCE(r.accepted_offers_cnt, 0),
+       COALESCE(r.response_seconds_sum, 0),
+       NOW()
+  FROM masters mm
+  LEFT JOIN (
+        SELECT o.assigned_master_id AS mid, COUNT(*) AS month_closed_cnt
+          FROM orders o
+         WHERE o.status = 'CLOSED'
+           AND o.updated_at >= date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+         GROUP BY o.assigned_master_id
+  ) mo ON mo.mid = mm.id
+  LEFT JOIN (
+        SELECT f.master_id AS mid,
+               COUNT(*) AS accepted_offers_cnt,
+               SUM(EXTRACT(EPOCH FROM f.responded_at - f.sent_at)) AS response_seconds_sum
+          FROM (
+                SELECT master_id, sent_at, responded_at, state FROM offers
+                UNION ALL
+                SELECT master_id, sent_at, responded_at, state FROM offers_archive
+          ) f
+         WHERE f.state = 'ACCEPTED'
+           AND f.sent_at IS NOT NULL
+           AND f.responded_at IS NOT NULL
+         GROUP BY f.master_id
+  ) r ON r.mid = mm.id
+ON CONFLICT (master_id) DO UPDATE
+   SET month_start = EXCLUDED.month_start,
+       month_closed_cnt = EXCLUDED.month_closed_cnt,
+       accepted_offers_cnt = EXCLUDED.accepted_offers_cnt,
+       response_seconds_sum = EXCLUDED.response_seconds_sum
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "master_stats",
+        sa.Column("month_start", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.add_column(
+        "master_stats",
+        sa.Column("month_closed_cnt", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "master_stats",
+        sa.Column("accepted_offers_cnt", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "master_stats",
+        sa.Column(
+            "response_seconds_sum",
+            sa.Numeric(18, 6),
+            nullable=False,
+            server_default="0",
+        ),
+    )
+
+    op.execute(_BUMP_FUNCTION)
+    op.execute(_OFFER_BUMP_FUNCTION)
+    op.execute(_OFFER_TRIGGER_FUNCTION)
+    op.execute(
+        """
+        CREATE TRIGGER trg_offers__master_stats
+        AFTER INSERT OR DELETE OR UPDATE OF state, sent_at, responded_at, master_id
+        ON offers
+        FOR EACH ROW EXECUTE FUNCTION offers_master_stats_trg()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_offers_archive__master_stats
+        AFTER INSERT OR DELETE
+        ON offers_archive
+        FOR EACH ROW EXECUTE FUNCTION offers_master_stats_trg()
+        """
+    )
+    op.execute(_BACKFILL)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_offers_archive__master_stats ON offers_archive")
+    op.execute("DROP TRIGGER IF EXISTS trg_offers__master_stats ON offers")
+    op.execute("DROP FUNCTION IF EXISTS offers_master_stats_trg()")
+    op.execute("DROP FUNCTION IF EXISTS master_stats_offer_bump(INTEGER, INTEGER, NUMERIC)")
+    op.execute(_OLD_BUMP_FUNCTION)
+    op.drop_column("master_stats", "response_seconds_sum")
+    op.drop_column("master_stats", "accepted_offers_cnt")
+    op.drop_column("master_stats", "month_closed_cnt")
+    op.drop_column("master_stats", "month_start")
@@ -0,0 +1,44 @@
+"""partial indexes for keyset pages of the admin order queue
+
+Revision ID: 2025_10_21_0001
+Revises: 2025_10_20_0002
+Create Date: 2025-10-21 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_21_0001"
+down_revision = "2025_10_20_0002"
+branch_labels = None
+depends_on = None
+
+
+_QUEUE_STATUSES = (
+    "status IN ('SEARCHING','ASSIGNED','EN_ROUTE','WORKING','PAYMENT',"
+    "'GUARANTEE','DEFERRED')"
+)
+
+
+# Date filter uses the existing ix_orders__status_city_timeslot_start,
+# attachments EXISTS probe uses ix_attachments__etype_eid.
+def upgrade() -> None:
+    op.create_index(
+        "ix_orders__queue_created",
+        "orders",
+        ["created_at", "id"],
+        postgresql_where=sa.text(_QUEUE_STATUSES),
+    )
+    op.create_index(
+        "ix_orders__queue_city_created",
+        "orders",
+        ["city_id", "created_at", "id"],
+        postgresql_where=sa.text(_QUEUE_STATUSES),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders__queue_city_created", table_name="orders")
+    op.drop_index("ix_orders__queue_created", table_name="orders")
@@ -0,0 +1,263 @@
+"""per-city counters of the admin orders menu sections
+
+Revision ID: 2025_10_21_0002
+Revises: 2025_10_21_0001
+Create Date: 2025-10-21 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_21_0002"
+down_revision = "2025_10_21_0001"
+branch_labels = None
+depends_on = None
+
+
+_BUMP_FUNCTION = """
+CREATE OR REPLACE FUNCTION order_section_bump(p_city INTEGER, p_section VARCHAR, p_delta INTEGER)
+RETURNS void AS $$
+BEGIN
+    IF p_delta = 0 OR NOT EXISTS (SELECT 1 FROM cities WHERE id = p_city) THEN
+        RETURN;
+    END IF;
+    INSERT INTO order_section_counters AS c (city_id, section, cnt, updated_at)
+    VALUES (p_city, p_section, GREATEST(p_delta, 0), NOW())
+    ON CONFLICT (city_id, section) DO UPDATE
+       SET cnt = GREATEST(c.cnt + p_delta, 0),
+           updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Membership of one order in the 14-day warranty window
+# (CLOSED, not GUARANTEE, commission approved less than 14 days ago).
+_WINDOW_SYNC_FUNCTION = """
+CREATE OR REPLACE FUNCTION order_warranty_window_sync(p_order_id INTEGER)
+RETURNS void AS $$
+DECLARE
+    v_city INTEGER;
+    v_expires TIMESTAMPTZ;
+BEGIN
+    SELECT o.city_id, c.paid_approved_at + INTERVAL '14 days'
+      INTO v_city, v_expires
+      FROM orders o
+      JOIN commissions c ON c.order_id = o.id
+     WHERE o.id = p_order_id
+       AND o.status = 'CLOSED'
+       AND o.type <> 'GUARANTEE'
+       AND c.paid_approved_at IS NOT NULL;
+
+    IF v_city IS NULL OR v_expires < NOW() THEN
+        DELETE FROM order_warranty_window WHERE order_id = p_order_id;
+        RETURN;
+    END IF;
+    INSERT INTO order_warranty_window AS w (order_id, city_id, expires_at)
+    VALUES (p_order_id, v_city, v_expires)
+    ON CONFLICT (order_id) DO UPDATE
+       SET city_id = EXCLUDED.city_id,
+           expires_at = EXCLUDED.expires_at
+     WHERE (w.city_id, w.expires_at) IS DISTINCT FROM (EXCLUDED.city_id, EXCLUDED.expires_at);
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_ORDERS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION orders_section_counters_trg()
+RETURNS trigger AS $$
+DECLARE
+    old_queue INTEGER := 0;
+    new_queue INTEGER := 0;
+    old_closed INTEGER := 0;
+    new_closed INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_queue := CASE WHEN OLD.status IN (
+            'SEARCHING','ASSIGNED','EN_ROUTE','WORKING','PAYMENT','GUARANTEE','DEFERRED'
+        ) THEN 1 ELSE 0 END;
+        old_closed := CASE WHEN OLD.status = 'CLOSED' THEN 1 ELSE 0 END;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_queue := CASE WHEN NEW.status IN (
+            'SEARCHING','ASSIGNED','EN_ROUTE','WORKING','PAYMENT','GUARANTEE','DEFERRED'
+        ) THEN 1 ELSE 0 END;
+        new_closed := CASE WHEN NEW.status = 'CLOSED' THEN 1 ELSE 0 END;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.city_id = NEW.city_id THEN
+        PERFORM order_section_bump(NEW.city_id, 'queue', new_queue - old_queue);
+        PERFORM order_section_bump(NEW.city_id, 'closed_total', new_closed - old_closed);
+    ELSE
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM order_section_bump(OLD.city_id, 'queue', -old_queue);
+            PERFORM order_section_bump(OLD.city_id, 'closed_total', -old_closed);
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM order_section_bump(NEW.city_id, 'queue', new_queue);
+            PERFORM order_section_bump(NEW.city_id, 'closed_total', new_closed);
+        END IF;
+    END IF;
+
+    -- DELETE: the window row goes away with the FK cascade
+    IF TG_OP = 'UPDATE'
+       AND (OLD.status IS DISTINCT FROM NEW.status
+            OR OLD.type IS DISTINCT FROM NEW.type
+            OR OLD.city_id IS DISTINCT FROM NEW.city_id) THEN
+        PERFORM order_warranty_window_sync(NEW.id);
+    ELSIF TG_OP = 'INSERT' AND new_closed = 1 THEN
+        PERFORM order_warranty_window_sync(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_COMMISSIONS_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION commissions_section_counters_trg()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM order_warranty_window_sync(OLD.order_id);
+    END IF;
+    IF TG_OP <> 'DELETE'
+       AND (TG_OP = 'INSERT' OR OLD.order_id IS DISTINCT FROM NEW.order_id) THEN
+        PERFORM order_warranty_window_sync(NEW.order_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_WINDOW_TRIGGER_FUNCTION = """
+CREATE OR REPLACE FUNCTION order_warranty_window_trg()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.city_id = NEW.city_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM order_section_bump(OLD.city_id, 'guarantee', -1);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM order_section_bump(NEW.city_id, 'guarantee', 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+_BACKFILL_WINDOW = """
+INSERT INTO order_warranty_window (order_id, city_id, expires_at)
+SELECT o.id, o.city_id, c.paid_approved_at + INTERVAL '14 days'
+  FROM orders o
+  JOIN commissions c ON c.order_id = o.id
+ WHERE o.status = 'CLOSED'
+   AND o.type <> 'GUARANTEE'
+   AND c.paid_approved_at >= NOW() - INTERVAL '14 days'
+"""
+
+_BACKFILL_COUNTERS = """
+INSERT INTO order_section_counters (city_id, section, cnt, updated_at)
+SELECT o.city_id, 'queue', COUNT(*), NOW()
+  FROM orders o
+ WHERE o.status IN ('SEARCHING','ASSIGNED','EN_ROUTE','WORKING','PAYMENT','GUARANTEE','DEFERRED')
+ GROUP BY o.city_id
+UNION ALL
+SELECT o.city_id, 'closed_total', COUNT(*), NOW()
+  FROM orders o
+ WHERE o.status = 'CLOSED'
+ GROUP BY o.city_id
+UNION ALL
+SELECT w.city_id, 'guarantee', COUNT(*), NOW()
+  FROM order_warranty_window w
+ GROUP BY w.city_id
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        "order_section_counters",
+        sa.Column(
+            "city_id",
+            sa.Integer(),
+            sa.ForeignKey("cities.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("section", sa.String(length=16), primary_key=True),
+        sa.Column("cnt", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+    )
+    op.create_table(
+        "order_warranty_window",
+        sa.Column(
+            "order_id",
+            sa.Integer(),
+            sa.ForeignKey("orders.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("city_id", sa.Integer(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index(
+        "ix_order_warranty_window__expires_at",
+        "order_warranty_window",
+        ["expires_at"],
+    )
+
+    op.execute(_BUMP_FUNCTION)
+    op.execute(_WINDOW_SYNC_FUNCTION)
+    op.execute(_ORDERS_TRIGGER_FUNCTION)
+    op.execute(_COMMISSIONS_TRIGGER_FUNCTION)
+    op.execute(_WINDOW_TRIGGER_FUNCTION)
+
+    # Backfill before the triggers so nothing is counted twice
+    op.execute(_BACKFILL_WINDOW)
+    op.execute(_BACKFILL_COUNTERS)
+
+    op.execute(
+        """
+        CREATE TRIGGER trg_order_warranty_window__counters
+        AFTER INSERT OR DELETE OR UPDATE OF city_id
+        ON order_warranty_window
+        FOR EACH ROW EXECUTE FUNCTION order_warranty_window_trg()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_orders__section_counters
+        AFTER INSERT OR DELETE OR UPDATE OF status, type, city_id
+        ON orders
+        FOR EACH ROW EXECUTE FUNCTION orders_section_counters_trg()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_commissions__section_counters
+        AFTER INSERT OR DELETE OR UPDATE OF paid_approved_at, order_id
+        ON commissions
+        FOR EACH ROW EXECUTE FUNCTION commissions_section_counters_trg()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_commissions__section_counters ON commissions")
+    op.execute("DROP TRIGGER IF EXISTS trg_orders__section_counters ON orders")
+    op.execute(
+        "DROP TRIGGER IF EXISTS trg_order_warranty_window__counters ON order_warranty_window"
+    )
+    op.execute("DROP FUNCTION IF EXISTS commissions_section_counters_trg()")
+    op.execute("DROP FUNCTION IF EXISTS orders_section_counters_trg()")
+    op.execute("DROP FUNCTION IF EXISTS order_warranty_window_trg()")
+    op.execute("DROP FUNCTION IF EXISTS order_warranty_window_sync(INTEGER)")
+    op.execute("DROP FUNCTION IF EXISTS order_section_bump(INTEGER, VARCHAR, INTEGER)")
+    op.drop_index("ix_order_warranty_window__expires_at", table_name="order_warranty_window")
+    op.drop_table("order_warranty_window")
+    op.drop_table("order_section_counters")
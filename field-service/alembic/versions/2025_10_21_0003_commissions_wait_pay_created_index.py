@@ -0,0 +1,29 @@
+"""partial index for set-based bulk approval of WAIT_PAY commissions
+
+Revision ID: 2025_10_21_0003
+Revises: 2025_10_21_0002
+Create Date: 2025-10-21 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2025_10_21_0003"
+down_revision = "2025_10_21_0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_commissions__wait_pay_created",
+        "commissions",
+        ["created_at", "id"],
+        postgresql_where=sa.text("status = 'WAIT_PAY'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_commissions__wait_pay_created", table_name="commissions")
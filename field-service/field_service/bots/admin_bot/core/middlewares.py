@@ -79,15 +79,10 @@ class StaffAccessMiddleware(BaseMiddleware):
         if tg_id is None:
             return await handler(event, data)
 
-        logger.info(f"[STAFF MIDDLEWARE] Processing event from user {tg_id}")
-
         # CR-2025-10-04: Универсальный поиск по tg_id ИЛИ username
+        # Кэш по tg_id с коротким TTL: без похода в БД на каждый апдейт
         username = _extract_username(event)
-        staff = await self._staff_service.get_by_tg_id_or_username(
-            tg_id=tg_id,
-            username=username,
-            update_tg_id=True  # Автоматически обновлять tg_id если нашли по username
-        )
+        staff = await self._staff_service.get_staff_for_access(tg_id, username)
         
         if not staff:
             logger.warning(f"[STAFF MIDDLEWARE] Staff not found for user {tg_id} (username: {username})")
@@ -107,7 +102,7 @@ class StaffAccessMiddleware(BaseMiddleware):
             await _notify_access_required(event, INACTIVE_PROMPT)
             return None
 
-        logger.info(f"[STAFF MIDDLEWARE] Staff found: {staff.full_name} (role: {staff.role})")
+        logger.debug("[STAFF MIDDLEWARE] Staff found: %s (role: %s)", staff.full_name, staff.role)
         # Всегда устанавливаем свежезагруженные данные staff
         data["staff"] = staff
         return await handler(event, data)
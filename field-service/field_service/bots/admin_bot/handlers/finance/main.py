@@ -3,6 +3,7 @@ from __future__ import annotations
 import html
 import logging
 import re
+from time import monotonic
 from typing import Any, Iterable, Optional
 
 from aiogram import F, Router
@@ -573,6 +574,9 @@ async def on_finance_bulk_approve_confirm(
     await _safe_answer(cq)
 
 
+BULK_PROGRESS_INTERVAL = 2.0  # секунды между обновлениями прогресса
+
+
 @router.callback_query(
     F.data.regexp(r"^adm:f:bulk:exec:(\d+)$"),
     StaffRoleFilter({StaffRole.GLOBAL_ADMIN}),
@@ -609,11 +613,30 @@ async def on_finance_bulk_approve_execute(
         end_date = date.today()
         start_date = end_date - timedelta(days=days - 1)
         
+        # Большие пачки: показываем прогресс не чаще раза в BULK_PROGRESS_INTERVAL
+        last_progress = monotonic()
+
+        async def _report_progress(done: int, total: int) -> None:
+            nonlocal last_progress
+            now = monotonic()
+            if done >= total or now - last_progress < BULK_PROGRESS_INTERVAL:
+                return
+            last_progress = now
+            try:
+                await cq.message.edit_text(
+                    f"<b>⏳ Массовое подтверждение</b>\n\n"
+                    f"Подтверждено: {done} из {total}",
+                    parse_mode="HTML",
+                )
+            except TelegramBadRequest:
+                pass
+
         approved_count, errors = await finance_service.bulk_approve_commissions(
             start_date=start_date,
             end_date=end_date,
             city_ids=city_ids,
             by_staff_id=staff.id,
+            progress=_report_progress,
         )
         
         approved = approved_count
@@ -614,10 +614,9 @@ async def _render_queue_list(message: Message, staff: StaffUser, state: FSMConte
     else:
         list_queue = orders_service.list_queue
         params = inspect.signature(list_queue).parameters
-        accepts_order_id = (
-            "order_id" in params
-            or any(p.kind == p.VAR_KEYWORD for p in params.values())
-        )
+        accepts_kwargs = any(p.kind == p.VAR_KEYWORD for p in params.values())
+        accepts_order_id = "order_id" in params or accepts_kwargs
+        accepts_cursor = "after_id" in params or accepts_kwargs
         kwargs = {
             "city_ids": city_filter,
             "page": page,
@@ -629,7 +628,13 @@ async def _render_queue_list(message: Message, staff: StaffUser, state: FSMConte
         }
         if accepts_order_id and filters.order_id is not None:
             kwargs["order_id"] = filters.order_id  # P1: legacy order id filter
+        after_id = filters.cursor_for(page)
+        if accepts_cursor and after_id is not None:
+            kwargs["after_id"] = after_id  # keyset cursor of the previous page
         items, has_next = await list_queue(**kwargs)
+        if accepts_cursor and items and has_next:
+            filters.remember_cursor(page, items[-1].id)
+            await save_queue_filters(state, filters)
 
 
     filters_text = await _format_filters_text(
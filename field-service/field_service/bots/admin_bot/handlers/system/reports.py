@@ -7,8 +7,6 @@
 from __future__ import annotations
 
 from datetime import date, datetime, timedelta
-from pathlib import Path
-from tempfile import TemporaryDirectory
 from typing import Any, Optional
 
 from aiogram import F, Router
@@ -33,9 +31,9 @@ router = Router(name="admin_reports")
 
 # Определения отчётов: (русское название, функция экспорта, префикс для caption)
 REPORT_DEFINITIONS: dict[str, tuple[str, Any, str]] = {
-    "orders": ("заказы", export_service.export_orders, "Заказы"),
-    "commissions": ("комиссии", export_service.export_commissions, "Комиссии"),
-    "ref_rewards": ("реферальные начисления", export_service.export_referral_rewards, "Реферальные начисления"),
+    "orders": ("заказы", export_service.stream_orders, "Заказы"),
+    "commissions": ("комиссии", export_service.stream_commissions, "Комиссии"),
+    "ref_rewards": ("реферальные начисления", export_service.stream_referral_rewards, "Реферальные начисления"),
 }
 
 # Поддерживаемые форматы дат: ISO (YYYY-MM-DD) и русский (DD.MM.YYYY)
@@ -131,34 +129,29 @@ def _format_period_label(start_dt: date, end_dt: date) -> str:
 
 async def _send_export_documents(
     bot,
-    bundle: export_service.ExportBundle,
+    files: export_service.ExportFiles,
     caption: str,
     *,
     chat_id: int,
 ) -> None:
-    """📤 Отправка файлов отчёта (CSV и XLSX).
+    """📤 Отправка файлов отчёта (CSV и XLSX) прямо с диска.
     
     Args:
         bot: Экземпляр бота
-        bundle: ExportBundle с данными CSV и XLSX
+        files: ExportFiles с путями к CSV и XLSX
         caption: Подпись к файлам
         chat_id: ID чата для отправки
     """
     documents = [
-        (bundle.csv_bytes, bundle.csv_filename, f"{caption} - CSV"),
-        (bundle.xlsx_bytes, bundle.xlsx_filename, f"{caption} - XLSX"),
+        (files.csv_path, files.csv_filename, f"{caption} - CSV"),
+        (files.xlsx_path, files.xlsx_filename, f"{caption} - XLSX"),
     ]
-    
-    with TemporaryDirectory() as tmpdir:
-        base_path = Path(tmpdir)
-        for payload, filename, note in documents:
-            file_path = base_path / filename
-            file_path.write_bytes(payload)
-            await bot.send_document(
-                chat_id=chat_id,
-                document=FSInputFile(file_path),
-                caption=note,
-            )
+    for file_path, filename, note in documents:
+        await bot.send_document(
+            chat_id=chat_id,
+            document=FSInputFile(file_path, filename=filename),
+            caption=note,
+        )
 
 
 # ============================================
@@ -290,7 +283,7 @@ async def reports_period_submit(
     await msg.answer("🔄 <b>Генерация отчёта</b>\n\nПодождите, обрабатываем данные...")
 
     try:
-        bundle = await exporter(date_from=start_dt, date_to=end_dt, city_ids=city_ids)
+        files = await exporter(date_from=start_dt, date_to=end_dt, city_ids=city_ids)
     except Exception as exc:
         await state.clear()
         await msg.answer(
@@ -299,72 +292,75 @@ async def reports_period_submit(
         )
         return
 
-    period_label = _format_period_label(start_dt, end_dt)
-    
-    operator_chat_id = None
-    if msg.chat:
-        operator_chat_id = msg.chat.id
-    elif msg.from_user:
-        operator_chat_id = msg.from_user.id
-    
-    configured_chat_id: Optional[int] = None
     try:
-        settings_service = _settings_service(msg.bot)
-        raw_channel_id = await settings_service.get_value("reports_channel_id")
-    except Exception:
-        raw_channel_id = None
-    
-    if raw_channel_id:
-        candidate = raw_channel_id.strip()
-        if candidate and candidate != "-":
-            try:
-                configured_chat_id = int(candidate)
-            except ValueError:
-                configured_chat_id = None
-    
-    target_chat_id = configured_chat_id or env_settings.reports_channel_id or operator_chat_id
-    if target_chat_id is None:
-        await state.clear()
-        await msg.answer(
-            "❌ <b>Ошибка конфигурации</b>\n\n"
-            "Не указан канал для отправки отчётов.\n"
-            "Обратитесь к глобальному администратору.",
-            reply_markup=reports_menu_keyboard(),
-        )
-        return
+        period_label = _format_period_label(start_dt, end_dt)
 
-    try:
-        await _send_export_documents(
-            msg.bot,
-            bundle,
-            f"{caption_prefix} {period_label}",
-            chat_id=target_chat_id,
-        )
-    except TelegramBadRequest:
-        #       -  
-        if operator_chat_id is not None and target_chat_id != operator_chat_id:
+        operator_chat_id = None
+        if msg.chat:
+            operator_chat_id = msg.chat.id
+        elif msg.from_user:
+            operator_chat_id = msg.from_user.id
+
+        configured_chat_id: Optional[int] = None
+        try:
+            settings_service = _settings_service(msg.bot)
+            raw_channel_id = await settings_service.get_value("reports_channel_id")
+        except Exception:
+            raw_channel_id = None
+
+        if raw_channel_id:
+            candidate = raw_channel_id.strip()
+            if candidate and candidate != "-":
+                try:
+                    configured_chat_id = int(candidate)
+                except ValueError:
+                    configured_chat_id = None
+
+        target_chat_id = configured_chat_id or env_settings.reports_channel_id or operator_chat_id
+        if target_chat_id is None:
+            await state.clear()
+            await msg.answer(
+                "❌ <b>Ошибка конфигурации</b>\n\n"
+                "Не указан канал для отправки отчётов.\n"
+                "Обратитесь к глобальному администратору.",
+                reply_markup=reports_menu_keyboard(),
+            )
+            return
+
+        try:
             await _send_export_documents(
                 msg.bot,
-                bundle,
+                files,
                 f"{caption_prefix} {period_label}",
-                chat_id=operator_chat_id,
-            )
-            await msg.answer(
-                "ℹ️ <b>Отчёт отправлен в личные сообщения</b>\n\n"
-                "Не удалось отправить в настроенный канал.\n"
-                "Отчёт отправлен вам напрямую."
+                chat_id=target_chat_id,
             )
+        except TelegramBadRequest:
+            #       -  
+            if operator_chat_id is not None and target_chat_id != operator_chat_id:
+                await _send_export_documents(
+                    msg.bot,
+                    files,
+                    f"{caption_prefix} {period_label}",
+                    chat_id=operator_chat_id,
+                )
+                await msg.answer(
+                    "ℹ️ <b>Отчёт отправлен в личные сообщения</b>\n\n"
+                    "Не удалось отправить в настроенный канал.\n"
+                    "Отчёт отправлен вам напрямую."
+                )
+            else:
+                await state.clear()
+                await msg.answer(
+                    "❌ <b>Ошибка отправки</b>\n\n"
+                    "Не удалось отправить отчёт. Попробуйте позже."
+                )
+                return
         else:
-            await state.clear()
-            await msg.answer(
-                "❌ <b>Ошибка отправки</b>\n\n"
-                "Не удалось отправить отчёт. Попробуйте позже."
-            )
-            return
-    else:
-        await msg.answer("✅ <b>Отчёт успешно сформирован</b>\n\nФайлы CSV и XLSX отправлены.")
-    
-    await state.clear()
+            await msg.answer("✅ <b>Отчёт успешно сформирован</b>\n\nФайлы CSV и XLSX отправлены.")
+
+        await state.clear()
+    finally:
+        files.cleanup()
 
 
 @router.callback_query(F.data.regexp(r"^adm:r:pd:(today|yesterday|last7|this_month|prev_month|custom)$"))
@@ -425,7 +421,7 @@ async def reports_quick_period_choice(
         await cq.message.answer("🔄 <b>Генерация отчёта</b>\n\nПодождите, обрабатываем данные...")
     
     try:
-        bundle = await exporter(date_from=start_dt, date_to=end_dt, city_ids=city_ids)
+        files = await exporter(date_from=start_dt, date_to=end_dt, city_ids=city_ids)
     except Exception as exc:
         if cq.message:
             await cq.message.answer(
@@ -435,58 +431,61 @@ async def reports_quick_period_choice(
         await cq.answer()
         return
     
-    period_label = _format_period_label(start_dt, end_dt)
-    
-    target_chat_id = env_settings.reports_channel_id or (cq.message.chat.id if cq.message else None)
-    if target_chat_id is None and cq.from_user:
-        target_chat_id = cq.from_user.id
-    if target_chat_id is None:
-        if cq.message:
-            await cq.message.answer(
-                "❌ <b>Ошибка конфигурации</b>\n\n"
-                "Не указан канал для отправки отчётов.",
-                reply_markup=reports_menu_keyboard()
-            )
-        await cq.answer()
-        return
-    
     try:
-        await _send_export_documents(
-            cq.bot,
-            bundle,
-            f"{caption_prefix} {period_label}",
-            chat_id=target_chat_id,
-        )
-    except TelegramBadRequest:
-        # Fallback   
-        if cq.from_user:
+        period_label = _format_period_label(start_dt, end_dt)
+
+        target_chat_id = env_settings.reports_channel_id or (cq.message.chat.id if cq.message else None)
+        if target_chat_id is None and cq.from_user:
+            target_chat_id = cq.from_user.id
+        if target_chat_id is None:
+            if cq.message:
+                await cq.message.answer(
+                    "❌ <b>Ошибка конфигурации</b>\n\n"
+                    "Не указан канал для отправки отчётов.",
+                    reply_markup=reports_menu_keyboard()
+                )
+            await cq.answer()
+            return
+
+        try:
             await _send_export_documents(
                 cq.bot,
-                bundle,
+                files,
                 f"{caption_prefix} {period_label}",
-                chat_id=cq.from_user.id,
+                chat_id=target_chat_id,
             )
-            if cq.message:
-                await cq.message.answer(
-                    "ℹ️ <b>Отчёт отправлен в личные сообщения</b>\n\n"
-                    "Не удалось отправить в настроенный канал."
+        except TelegramBadRequest:
+            # Fallback   
+            if cq.from_user:
+                await _send_export_documents(
+                    cq.bot,
+                    files,
+                    f"{caption_prefix} {period_label}",
+                    chat_id=cq.from_user.id,
                 )
+                if cq.message:
+                    await cq.message.answer(
+                        "ℹ️ <b>Отчёт отправлен в личные сообщения</b>\n\n"
+                        "Не удалось отправить в настроенный канал."
+                    )
+            else:
+                if cq.message:
+                    await cq.message.answer(
+                        "❌ <b>Ошибка отправки</b>\n\n"
+                        "Не удалось отправить отчёт."
+                    )
+                await cq.answer()
+                return
         else:
             if cq.message:
                 await cq.message.answer(
-                    "❌ <b>Ошибка отправки</b>\n\n"
-                    "Не удалось отправить отчёт."
+                    "✅ <b>Отчёт успешно сформирован</b>\n\n"
+                    "Файлы CSV и XLSX отправлены."
                 )
-            await cq.answer()
-            return
-    else:
-        if cq.message:
-            await cq.message.answer(
-                "✅ <b>Отчёт успешно сформирован</b>\n\n"
-                "Файлы CSV и XLSX отправлены."
-            )
-    
-    await state.clear()
+
+        await state.clear()
+    finally:
+        files.cleanup()
     # P0-8: cq.answer()        
 
 
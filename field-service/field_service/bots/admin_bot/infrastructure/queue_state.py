@@ -7,7 +7,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field, asdict
 from datetime import date
-from typing import Optional
+from typing import Any, Optional
 
 from aiogram.fsm.context import FSMContext
 
@@ -28,8 +28,41 @@ class QueueFilters:
     master_id: Optional[int] = None
     date: Optional[date] = None
     order_id: Optional[int] = None  # P1:   ID 
+    # Keyset-пагинация: страница -> id последнего заказа предыдущей страницы.
+    # Курсоры действительны только для фильтров, при которых получены.
+    cursors: dict[int, int] = field(default_factory=dict)
+    cursors_key: Optional[str] = None
     
-    def to_dict(self) -> dict[str, Optional[str | int]]:
+    def filter_key(self) -> str:
+        """Подпись фильтров, к которой привязаны курсоры."""
+        return "|".join(
+            str(value) if value is not None else ""
+            for value in (
+                self.city_id,
+                self.category.value if self.category else None,
+                self.status.value if self.status else None,
+                self.master_id,
+                self.date.isoformat() if self.date else None,
+                self.order_id,
+            )
+        )
+    
+    def cursor_for(self, page: int) -> Optional[int]:
+        """Курсор страницы (None для первой или ещё не открытой)."""
+        if page <= 1 or self.cursors_key != self.filter_key():
+            return None
+        return self.cursors.get(page)
+    
+    def remember_cursor(self, page: int, last_order_id: int) -> None:
+        """Запомнить курсор следующей страницы после показа ``page``."""
+        key = self.filter_key()
+        if self.cursors_key != key:
+            self.cursors = {}
+        self.cursors = {p: oid for p, oid in self.cursors.items() if p <= page}
+        self.cursors[page + 1] = int(last_order_id)
+        self.cursors_key = key
+    
+    def to_dict(self) -> dict[str, Any]:
         """    FSM state."""
         return {
             "city_id": self.city_id,
@@ -38,10 +71,12 @@ class QueueFilters:
             "master_id": self.master_id,
             "date": self.date.isoformat() if self.date else None,
             "order_id": self.order_id,  # P1:   ID
+            "cursors": {str(page): oid for page, oid in self.cursors.items()},
+            "cursors_key": self.cursors_key,
         }
     
     @classmethod
-    def from_dict(cls, data: dict[str, Optional[str | int]]) -> QueueFilters:
+    def from_dict(cls, data: dict[str, Any]) -> QueueFilters:
         """  FSM state."""
         city_id = data.get("city_id")
         category_value = data.get("category")
@@ -73,7 +108,7 @@ class QueueFilters:
             except (ValueError, TypeError):
                 pass
         
-        return cls(
+        filters = cls(
             city_id=int(city_id) if city_id else None,
             category=category,
             status=status,
@@ -81,6 +116,17 @@ class QueueFilters:
             date=parsed_date,
             order_id=int(order_id) if order_id else None,  # P1:   ID
         )
+        
+        # Cursors survive only while the filters are unchanged
+        raw_cursors = data.get("cursors")
+        if isinstance(raw_cursors, dict) and data.get("cursors_key") == filters.filter_key():
+            filters.cursors_key = filters.filter_key()
+            for page, oid in raw_cursors.items():
+                try:
+                    filters.cursors[int(page)] = int(oid)
+                except (TypeError, ValueError):
+                    continue
+        return filters
 
 
 @dataclass
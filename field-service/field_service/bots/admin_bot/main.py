@@ -13,13 +13,16 @@ from aiogram.types import Update
 
 from field_service.config import settings
 from field_service.bots.common.error_middleware import setup_error_middleware
-from field_service.bots.common.polling import poll_with_single_instance_guard
+from field_service.bots.common.webhook import run_updates
 from field_service.bots.common.retry_handler import retry_router
 from field_service.bots.common.retry_middleware import setup_retry_middleware
 from field_service.infra.notify import send_alert, send_log
 from field_service.infra.enhanced_logging import setup_enhanced_logging  # ENHANCED LOGGING
 from field_service.services.distribution_scheduler import run_scheduler
+from field_service.services import settings_service
 from field_service.services.heartbeat import run_heartbeat
+from field_service.services.master_stats_service import run_master_stats_reconcile
+from field_service.services.order_sections_service import run_order_sections_maintenance
 from field_service.services.watchdogs import (
     watchdog_commissions_overdue,
     watchdog_commission_deadline_reminders,  # P1-21
@@ -56,6 +59,75 @@ async def log_all_callbacks_middleware(handler, event, data):
     return await handler(event, data)
 
 
+def _start_background_jobs(
+    bot: Bot, *, alerts_chat_id: int | None, logs_chat_id: int | None
+) -> list[asyncio.Task]:
+    """Периодические задачи админ-бота.
+
+    Должны работать в одном процессе: при нескольких webhook-репликах
+    остальные запускаются с RUN_BACKGROUND_JOBS=0.
+    """
+    tasks = [
+        asyncio.create_task(
+            run_heartbeat(bot, name="admin", chat_id=logs_chat_id),
+            name="admin_heartbeat",
+        ),
+        asyncio.create_task(
+            run_scheduler(bot, alerts_chat_id=alerts_chat_id),
+            name="admin_scheduler",
+        ),
+        asyncio.create_task(
+            watchdog_commissions_overdue(
+                bot,
+                alerts_chat_id,
+                interval_seconds=max(60, settings.overdue_watchdog_min * 60),
+            ),
+            name="commissions_watchdog",
+        ),
+        # P1-01: Автозакрытие заказов через 24ч (проверка каждый час)
+        asyncio.create_task(
+            autoclose_scheduler(interval_seconds=3600),
+            name="autoclose_scheduler",
+        ),
+        # P1-21: Напоминания о дедлайне комиссии (24ч, 6ч, 1ч)
+        # Ставятся в notifications_outbox, доставляет master_bot
+        asyncio.create_task(
+            watchdog_commission_deadline_reminders(interval_seconds=1800),
+            name="commission_deadline_reminders",
+        ),
+        # Watchdog для истёкших офферов: страховочный проход, офферы истекают
+        # по дедлайнам в offer_expiry (run_scheduler)
+        asyncio.create_task(
+            watchdog_expired_offers(interval_seconds=600),
+            name="expired_offers_watchdog",
+        ),
+        # BUGFIX 2025-10-10: Watchdog для автоматического завершения просроченных перерывов
+        asyncio.create_task(
+            watchdog_expired_breaks(interval_seconds=60),
+            name="expired_breaks_watchdog",
+        ),
+        # Сверка проекции master_stats с orders (скользящее окно 7 дней)
+        asyncio.create_task(
+            run_master_stats_reconcile(interval_seconds=600),
+            name="master_stats_reconcile",
+        ),
+        # Счётчики разделов меню заказов: истечение 14-дневного окна гарантии
+        # и периодическая пересборка с нуля
+        asyncio.create_task(
+            run_order_sections_maintenance(),
+            name="order_sections_maintenance",
+        ),
+    ]
+    if alerts_chat_id:
+        tasks.append(
+            asyncio.create_task(
+                monitor_unassigned_orders(bot, alerts_chat_id, interval_seconds=600),
+                name="unassigned_monitor",
+            )
+        )
+    return tasks
+
+
 async def main() -> int:
     # Setup enhanced logging FIRST
     log_level = os.getenv("LOG_LEVEL", "DEBUG").upper()  # Default to DEBUG for troubleshooting
@@ -128,76 +200,27 @@ async def main() -> int:
     # P1-13: Подключаем retry middleware для автоматического предложения повтора при ошибках
     setup_retry_middleware(dp, enabled=True)
 
-    heartbeat_task = asyncio.create_task(
-        run_heartbeat(bot, name="admin", chat_id=logs_chat_id),
-        name="admin_heartbeat",
-    )
-
-    scheduler_task = asyncio.create_task(
-        run_scheduler(bot, alerts_chat_id=alerts_chat_id),
-        name="admin_scheduler",
-    )
-
-    watchdog_interval = max(60, settings.overdue_watchdog_min * 60)
-    watchdog_task = asyncio.create_task(
-        watchdog_commissions_overdue(
-            bot,
-            alerts_chat_id,
-            interval_seconds=watchdog_interval,
-        ),
-        name="commissions_watchdog",
-    )
-
-    unassigned_task: asyncio.Task | None = None
-    if alerts_chat_id:
-        unassigned_task = asyncio.create_task(
-            monitor_unassigned_orders(
-                bot,
-                alerts_chat_id,
-                interval_seconds=600,
-            ),
-            name="unassigned_monitor",
+    background_tasks: list[asyncio.Task] = []
+    if settings.run_background_jobs:
+        background_tasks = _start_background_jobs(
+            bot, alerts_chat_id=alerts_chat_id, logs_chat_id=logs_chat_id
         )
+    else:
+        logger.info("RUN_BACKGROUND_JOBS=0: background jobs run in another replica")
 
-    # P1-01: Автозакрытие заказов через 24ч
-    autoclose_task = asyncio.create_task(
-        autoclose_scheduler(
-            interval_seconds=3600,  # Проверка каждый час
-        ),
-        name="autoclose_scheduler",
-    )
-
-    # P1-21: Напоминания о дедлайне комиссии (24ч, 6ч, 1ч)
-    # Передаём master_bot_token чтобы уведомления шли мастерам в их бот!
-    deadline_reminders_task = asyncio.create_task(
-        watchdog_commission_deadline_reminders(
-            master_bot_token=settings.master_bot_token,  # ← master_bot для мастеров!
-            interval_seconds=1800,  # Проверка каждые 30 минут
-        ),
-        name="commission_deadline_reminders",
-    )
-
-    # Watchdog для истёкших офферов
-    expired_offers_task = asyncio.create_task(
-        watchdog_expired_offers(
-            interval_seconds=60,  # Проверка каждую минуту
-        ),
-        name="expired_offers_watchdog",
-    )
-
-    # BUGFIX 2025-10-10: Watchdog для автоматического завершения просроченных перерывов
-    expired_breaks_task = asyncio.create_task(
-        watchdog_expired_breaks(
-            interval_seconds=60,  # Проверка каждую минуту
-        ),
-        name="expired_breaks_watchdog",
+    # Снимок настроек сбрасывается по NOTIFY при изменениях из других процессов
+    settings_listener_task = asyncio.create_task(
+        settings_service.run_listener(),
+        name="settings_listener",
     )
 
     exit_code = 0
     try:
-        await poll_with_single_instance_guard(
+        await run_updates(
             dp,
             bot,
+            bot_label="admin_bot",
+            port=settings.admin_webhook_port,
             logs_chat_id=logs_chat_id,
         )
     except SystemExit as conflict_exit:
@@ -211,20 +234,10 @@ async def main() -> int:
         await send_log(bot, message, chat_id=logs_chat_id)
         exit_code = 1
     finally:
-        for task in (
-            heartbeat_task,
-            scheduler_task,
-            watchdog_task,
-            autoclose_task,
-            deadline_reminders_task,  # P1-21
-            expired_offers_task,  # Watchdog истёкших офферов
-            expired_breaks_task,  # BUGFIX 2025-10-10: Watchdog просроченных перерывов
-            unassigned_task,
-        ):
-            if task:
-                task.cancel()
-                with suppress(asyncio.CancelledError):
-                    await task
+        for task in (*background_tasks, settings_listener_task):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
         await bot.session.close()
 
     return exit_code
@@ -1,5 +1,11 @@
 """Admin bot services."""
-from .staff import DBStaffService, AccessCodeError, _StaffAccess, _load_staff_access
+from .staff import (
+    DBStaffService,
+    AccessCodeError,
+    _StaffAccess,
+    _load_staff_access,
+    invalidate_staff_cache,
+)
 from .orders import DBOrdersService
 from .distribution import DBDistributionService
 from .finance import DBFinanceService
@@ -16,4 +22,5 @@ __all__ = [
     'AccessCodeError',
     '_StaffAccess',
     '_load_staff_access',
+    'invalidate_staff_cache',
 ]
@@ -1,18 +1,21 @@
 """Finance service: commission management and payments."""
 from __future__ import annotations
 
-from datetime import datetime, timezone, date, timedelta
+from datetime import datetime, time, timezone, date, timedelta
 from decimal import Decimal
-from typing import Any, Iterable, Optional, Sequence
+from typing import Any, Awaitable, Callable, Iterable, Optional, Sequence
 
-from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy import and_, delete, func, insert, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
 from field_service.services import live_log
 from field_service.services._session_utils import maybe_managed_session
-from field_service.services.referral_service import apply_rewards_for_commission
+from field_service.services.referral_service import (
+    apply_rewards_for_commission,
+    apply_rewards_for_commissions,
+)
 
 from ..core.dto import CommissionAttachment, CommissionDetail, CommissionListItem, WaitPayRecipient
 
@@ -52,6 +55,69 @@ from ._common import (
 )
 
 
+BULK_APPROVE_BATCH_SIZE = 500
+
+_BULK_APPROVE_COUNT_SQL = """
+SELECT COUNT(*)
+  FROM commissions c
+  JOIN orders o ON o.id = c.order_id
+ WHERE c.status = 'WAIT_PAY'
+   AND c.created_at >= :start
+   AND c.created_at < :end
+   {city_filter}
+"""
+
+# Одна пачка: те же поля, что и в approve(), paid_amount = сумма комиссии
+_BULK_APPROVE_SQL = """
+WITH picked AS (
+    SELECT c.id
+      FROM commissions c
+      JOIN orders o ON o.id = c.order_id
+     WHERE c.status = 'WAIT_PAY'
+       AND c.created_at >= :start
+       AND c.created_at < :end
+       {city_filter}
+     ORDER BY c.id
+     LIMIT :batch
+     FOR UPDATE OF c SKIP LOCKED
+)
+UPDATE commissions c
+   SET status = 'APPROVED',
+       is_paid = TRUE,
+       paid_amount = c.amount,
+       paid_approved_at = :now,
+       payment_reference = NULL,
+       updated_at = NOW()
+  FROM picked
+ WHERE c.id = picked.id
+RETURNING c.id, c.order_id, c.master_id, c.amount
+"""
+
+_BULK_CLOSE_ORDERS_SQL = """
+WITH prev AS (
+    SELECT o.id, o.status
+      FROM orders o
+     WHERE o.id = ANY(CAST(:order_ids AS INTEGER[]))
+       AND o.status <> 'CLOSED'
+     FOR UPDATE
+), closed AS (
+    UPDATE orders o
+       SET status = 'CLOSED',
+           updated_at = NOW(),
+           version = o.version + 1
+      FROM prev
+     WHERE o.id = prev.id
+    RETURNING o.id, prev.status AS from_status
+)
+INSERT INTO order_status_history (
+    order_id, from_status, to_status, changed_by_staff_id, reason, actor_type
+)
+SELECT id, from_status, CAST('CLOSED' AS order_status), CAST(:staff_id AS INTEGER),
+       'commission_paid', CAST('ADMIN' AS actor_type)
+  FROM closed
+"""
+
+
 class DBFinanceService:
     """Сервис для работы с комиссиями и финансами."""
     
@@ -65,21 +131,32 @@ class DBFinanceService:
         by_staff_id: int,
         *,
         city_ids: Optional[Iterable[int]] = None,
+        progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        batch_size: int = BULK_APPROVE_BATCH_SIZE,
     ) -> tuple[int, list[str]]:
         """
         Массовое одобрение комиссий за период.
         
+        Комиссии одобряются пачками: один UPDATE ... RETURNING на пачку,
+        закрытие заказов и история одним запросом, реферальные начисления
+        (цепочки из кэша referral_graph) и уведомления - одной вставкой
+        на пачку. Каждая пачка коммитится
+        отдельно, чтобы не держать блокировки на весь период.
+        
         Args:
             start_date: Начало периода
             end_date: Конец периода (включительно)
             by_staff_id: ID админа
             city_ids: Фильтр по городам (RBAC)
+            progress: Колбэк (одобрено, всего) после каждой пачки
+            batch_size: Размер пачки
         
         Returns:
             (количество одобренных, список ошибок)
         """
         errors: list[str] = []
         approved_count = 0
+        batch_size = max(1, int(batch_size))
         
         async with self._session_factory() as session:
             # Загружаем админа для RBAC
@@ -98,64 +175,72 @@ class DBFinanceService:
                 allowed = frozenset(city_ids)
             else:
                 allowed = None
+            if allowed is not None and not allowed:
+                return 0, ["Нет комиссий для одобрения"]
             
-            # Находим комиссии WAIT_PAY за период
-            stmt = (
-                select(m.commissions.id)
-                .join(m.orders, m.commissions.order_id == m.orders.id)
-                .where(
-                    m.commissions.status == m.CommissionStatus.WAIT_PAY,
-                    func.date(m.commissions.created_at) >= start_date,
-                    func.date(m.commissions.created_at) <= end_date,
-                )
-            )
-            
+            # Полуинтервал [start, end + 1 день) по created_at - без func.date()
+            params: dict[str, Any] = {
+                "start": datetime.combine(start_date, time.min, tzinfo=UTC),
+                "end": datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=UTC),
+            }
+            city_filter = ""
             if allowed is not None:
-                stmt = stmt.where(m.orders.city_id.in_(allowed))
-            
-            rows = await session.execute(stmt)
-            commission_ids = [row[0] for row in rows]
+                city_filter = "AND o.city_id = ANY(:city_ids)"
+                params["city_ids"] = sorted(allowed)
             
-            if not commission_ids:
+            total = int(
+                (
+                    await session.execute(
+                        text(_BULK_APPROVE_COUNT_SQL.format(city_filter=city_filter)),
+                        params,
+                    )
+                ).scalar()
+                or 0
+            )
+            if not total:
                 return 0, ["Нет комиссий для одобрения"]
             
-            # Одобряем каждую комиссию (НЕ создаём вложенные транзакции)
-            for comm_id in commission_ids:
+            approve_stmt = text(_BULK_APPROVE_SQL.format(city_filter=city_filter))
+            while True:
                 try:
-                    # Загружаем комиссию с блокировкой
-                    comm_stmt = (
-                        select(m.commissions)
-                        .where(m.commissions.id == comm_id)
-                        .with_for_update()
+                    rows = (
+                        await session.execute(
+                            approve_stmt,
+                            {**params, "batch": batch_size, "now": datetime.now(UTC)},
+                        )
+                    ).all()
+                    if not rows:
+                        break
+                    await session.execute(
+                        text(_BULK_CLOSE_ORDERS_SQL),
+                        {
+                            "order_ids": [row.order_id for row in rows],
+                            "staff_id": staff.id,
+                        },
+                    )
+                    await apply_rewards_for_commissions(
+                        session,
+                        [(row.id, row.master_id, row.amount, row.order_id) for row in rows],
                     )
-                    comm_row = await session.execute(comm_stmt)
-                    commission = comm_row.scalar_one_or_none()
-                    
-                    if not commission:
-                        errors.append(f"Комиссия #{comm_id} не найдена")
-                        continue
-                    
-                    if commission.status != m.CommissionStatus.WAIT_PAY:
-                        errors.append(f"Комиссия #{comm_id} не в статусе WAIT_PAY")
-                        continue
-                    
-                    # Обновляем статус
-                    commission.status = m.CommissionStatus.PAID
-                    commission.approved_by_staff_id = by_staff_id
-                    commission.approved_at = datetime.now(UTC)
-                    commission.updated_at = datetime.now(UTC)
-                    
-                    # Применяем реферальные вознаграждения
-                    try:
-                        await apply_rewards_for_commission(session, commission)
-                    except Exception as exc:
-                        pass  # logger not imported, skip warning
-                    
-                    approved_count += 1
-                    
+                    await session.commit()
                 except Exception as exc:
-                    errors.append(f"Ошибка при одобрении #{comm_id}: {exc}")
+                    await session.rollback()
+                    errors.append(f"Ошибка при одобрении пачки: {exc}")
+                    live_log.push("finance", f"bulk_approve batch failed: {exc}", level="ERROR")
+                    break
+                
+                approved_count += len(rows)
+                if progress is not None:
+                    await progress(approved_count, max(total, approved_count))
+                # Строки, заблокированные другими транзакциями, пропущены (SKIP LOCKED)
+                if len(rows) < batch_size:
+                    break
         
+        if approved_count:
+            live_log.push(
+                "finance",
+                f"bulk_approve: approved={approved_count} by staff#{by_staff_id}",
+            )
         return approved_count, errors
 
     async def list_commissions(
@@ -504,6 +589,7 @@ class DBFinanceService:
                     commission_id=commission_id,
                     master_id=commission_row.master_id,
                     base_amount=paid_amount,
+                    order_id=order_row.id,
                 )
                 return True
             else:
@@ -562,6 +648,7 @@ class DBFinanceService:
                     commission_id=commission_id,
                     master_id=commission_row.master_id,
                     base_amount=paid_amount,
+                    order_id=order_row.id,
                 )
                 return True
 
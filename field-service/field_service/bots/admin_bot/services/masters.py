@@ -12,8 +12,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
-from field_service.services import live_log
+from field_service.services import live_log, settings_service as settings_store
 from field_service.services.candidates import select_candidates
+from field_service.services.distribution import eligibility_index
 from field_service.infra.enhanced_logging import (
     log_function_call,
     log_db_query,
@@ -87,16 +88,8 @@ class DBMastersService:
             return skills
 
     async def _get_default_master_limit(self, session: AsyncSession) -> int:
-        value = await session.scalar(
-            select(m.settings.value).where(m.settings.key == "max_active_orders")
-        )
-        try:
-            parsed = int(value)
-            if parsed > 0:
-                return parsed
-        except (TypeError, ValueError):
-            pass
-        return 5
+        parsed = await settings_store.get_int("max_active_orders", 5, session=session)
+        return parsed if parsed > 0 else 5
 
     async def _log_admin_action(
         self,
@@ -693,6 +686,7 @@ class DBMastersService:
                     payload={},
                 )
                 live_log.push("moderation", f"master#{master_id} approved by staff#{by_staff_id}")
+        eligibility_index.invalidate()
         return True
 
     async def reject_master(self, master_id: int, reason: str, by_staff_id: int) -> bool:
@@ -723,6 +717,7 @@ class DBMastersService:
                     "moderation",
                     f"master#{master_id} rejected by staff#{by_staff_id}: {reason}",
                 )
+        eligibility_index.invalidate()
         return True
 
     async def block_master(self, master_id: int, reason: str, by_staff_id: int) -> bool:
@@ -754,6 +749,7 @@ class DBMastersService:
                     "moderation",
                     f"master#{master_id} blocked by staff#{by_staff_id}: {reason}",
                 )
+        eligibility_index.invalidate()
         return True
 
     async def unblock_master(self, master_id: int, by_staff_id: int) -> bool:
@@ -785,6 +781,7 @@ class DBMastersService:
                     "moderation",
                     f"master#{master_id} unblocked by staff#{by_staff_id}",
                 )
+        eligibility_index.invalidate()
         return True
 
     async def set_master_limit(
@@ -896,6 +893,7 @@ class DBMastersService:
                         "moderation",
                         f"master#{master_id} soft deleted by staff#{by_staff_id}",
                     )
+                    eligibility_index.invalidate()
                     return True, True
                 else:
                     # Hard delete: physically remove from database
@@ -935,6 +933,7 @@ class DBMastersService:
                         "moderation",
                         f"master#{master_id} hard deleted by staff#{by_staff_id}",
                     )
+                    eligibility_index.invalidate()
                     return True, False
 
 
@@ -1,25 +1,29 @@
 """Orders service: order management, creation, status changes."""
 from __future__ import annotations
 
-from datetime import datetime, timezone, date, timedelta
+from datetime import datetime, time, timezone, date, timedelta
 from decimal import Decimal
 from typing import Iterable, Optional, Sequence, Tuple
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import and_, func, select, update
+from sqlalchemy import and_, exists, false, func, or_, select, tuple_, update
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncSession
-from rapidfuzz import fuzz, process
+from rapidfuzz import fuzz
 
 from field_service.config import settings
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
 from field_service.services import (
+    geocoding_service,
     guarantee_service,
     live_log,
     operation_logger as oplog,
+    order_sections_service,
+    street_index,
     time_service,
 )
+from field_service.services.distribution import wake_channel
 from field_service.services.guarantee_service import GuaranteeError
 from field_service.services._session_utils import maybe_managed_session
 
@@ -90,6 +94,34 @@ def _session_tx_id(session: AsyncSession) -> Optional[str]:
         return None
 
 
+def _status_history_source(order_id: int):
+    """История статусов заказа: рабочая таблица + архив (autoclose_scheduler)."""
+    columns = (
+        "id",
+        "order_id",
+        "from_status",
+        "to_status",
+        "reason",
+        "changed_by_staff_id",
+        "changed_by_master_id",
+        "actor_type",
+        "context",
+        "created_at",
+    )
+    hot = m.order_status_history
+    archive = m.order_status_history_archive
+    return (
+        select(*(getattr(hot, name) for name in columns))
+        .where(hot.order_id == order_id)
+        .union_all(
+            select(*(getattr(archive, name) for name in columns)).where(
+                archive.order_id == order_id
+            )
+        )
+        .subquery("h")
+    )
+
+
 class DBOrdersService:
     def __init__(self, session_factory=SessionLocal) -> None:
             self._session_factory = session_factory
@@ -187,39 +219,17 @@ class DBOrdersService:
             if not normalized:
                 return []
             async with self._session_factory() as session:
-                stmt = (
-                    select(
-                        m.streets.id,
-                        m.streets.name,
-                        m.streets.district_id,
-                        m.streets.centroid_lat,
-                        m.streets.centroid_lon,
-                    )
-                    .where(m.streets.city_id == city_id)
-                    .order_by(m.streets.name)
-                    .limit(200)
-                )
-                rows = await session.execute(stmt)
-                items = rows.all()
-            if not items:
-                return []
-            choices = {row.name: row for row in items}
-            matches = process.extract(
-                normalized,
-                list(choices.keys()),
-                scorer=fuzz.WRatio,
-                processor=lambda s: s.lower(),
-                limit=min(limit * 3, len(choices)),
-            )
-            matches = sorted(matches, key=lambda item: (-item[1], -len(item[0])))
+                index = await street_index.get_city_index(session, city_id)
+            matches = index.search(normalized, limit=limit * 3)
+            matches.sort(key=lambda item: (-item[1], -len(item[0].name)))
             result: list[StreetRef] = []
             used_ids: set[int] = set()
             used_norms: list[str] = []
-            for name, score, _ in matches:
-                if score is None or score < STREET_MIN_SCORE:
+            for row, score in matches:
+                if score < STREET_MIN_SCORE:
                     continue
-                row = choices[name]
-                street_id = int(row.id)
+                name = row.name
+                street_id = row.id
                 if street_id in used_ids:
                     continue
                 normalized_candidate = _normalize_street_name(name)
@@ -236,9 +246,9 @@ class DBOrdersService:
                     StreetRef(
                         id=street_id,
                         city_id=city_id,
-                        district_id=int(row.district_id) if row.district_id is not None else None,
+                        district_id=row.district_id,
                         name=row.name,
-                        score=float(score),
+                        score=score,
                     )
                 )
                 used_ids.add(street_id)
@@ -277,7 +287,14 @@ class DBOrdersService:
             master_id: Optional[int] = None,
             timeslot_date: Optional[date] = None,
             order_id: Optional[int] = None,  # P1: Поиск по ID заказа
+            after_id: Optional[int] = None,
         ) -> tuple[list[OrderListItem], bool]:
+            """Queue page ordered by (created_at, id) DESC.
+
+            ``after_id`` is the last order of the previous page (keyset cursor
+            kept in QueueFilters); without it, or when that order is gone, the
+            page is addressed by OFFSET.
+            """
             offset = max(page - 1, 0) * page_size
             city_filter: Optional[list[int]] = None
             if city_ids is not None:
@@ -305,7 +322,12 @@ class DBOrdersService:
                         m.orders.assigned_master_id,
                         m.masters.full_name.label("master_name"),
                         m.masters.phone.label("master_phone"),
-                        func.count(m.attachments.id).label("attachments_count"),
+                        exists()
+                        .where(
+                            m.attachments.entity_type == m.AttachmentEntity.ORDER,
+                            m.attachments.entity_id == m.orders.id,
+                        )
+                        .label("has_attachments"),
                     )
                     .select_from(m.orders)
                     .join(m.cities, m.orders.city_id == m.cities.id)
@@ -324,12 +346,6 @@ class DBOrdersService:
                         m.orders.assigned_master_id == m.masters.id,
                         isouter=True,
                     )
-                    .join(
-                        m.attachments,
-                        (m.attachments.entity_type == m.AttachmentEntity.ORDER)
-                        & (m.attachments.entity_id == m.orders.id),
-                        isouter=True,
-                    )
                 )
                 if status_filter:
                     stmt = stmt.where(m.orders.status == status_filter.value)
@@ -342,32 +358,26 @@ class DBOrdersService:
                 if master_id:
                     stmt = stmt.where(m.orders.assigned_master_id == master_id)
                 if timeslot_date:
-                    stmt = stmt.where(func.date(m.orders.timeslot_start_utc) == timeslot_date)
+                    stmt = stmt.where(
+                        await self._timeslot_date_clause(session, timeslot_date, city_filter)
+                    )
                 if order_id:  # P1: Фильтр по ID заказа
                     stmt = stmt.where(m.orders.id == order_id)
-                stmt = (
-                    stmt.group_by(
-                        m.orders.id,
-                        m.orders.city_id,
-                        m.cities.name,
-                        m.orders.district_id,
-                        m.districts.name,
-                        m.streets.name,
-                        m.orders.house,
-                        m.orders.status,
-                        m.orders.type,
-                        m.orders.category,
-                        m.orders.created_at,
-                        m.orders.timeslot_start_utc,
-                        m.orders.timeslot_end_utc,
-                        m.orders.assigned_master_id,
-                        m.masters.full_name,
-                        m.masters.phone,
+                anchor_created_at = None
+                if after_id:
+                    anchor_created_at = await session.scalar(
+                        select(m.orders.created_at).where(m.orders.id == int(after_id))
                     )
-                    .order_by(m.orders.created_at.desc())
-                    .offset(offset)
-                    .limit(page_size + 1)
-                )
+                if anchor_created_at is not None:
+                    stmt = stmt.where(
+                        tuple_(m.orders.created_at, m.orders.id)
+                        < tuple_(anchor_created_at, int(after_id))
+                    )
+                else:
+                    stmt = stmt.offset(offset)
+                stmt = stmt.order_by(
+                    m.orders.created_at.desc(), m.orders.id.desc()
+                ).limit(page_size + 1)
                 rows = await session.execute(stmt)
                 fetched = rows.all()
                 has_next = len(fetched) > page_size
@@ -401,10 +411,45 @@ class DBOrdersService:
                             master_id=row.assigned_master_id,
                             master_name=row.master_name,
                             master_phone=row.master_phone,
-                            has_attachments=bool(row.attachments_count),
+                            has_attachments=bool(row.has_attachments),
                         )
                     )
             return items, has_next
+
+    async def _timeslot_date_clause(
+            self,
+            session: AsyncSession,
+            day: date,
+            city_filter: Optional[list[int]],
+        ):
+            """Half-open UTC range of the local ``day`` per city timezone.
+
+            Keeps the timeslot filter sargable: cities are grouped by timezone and
+            each group gets ``timeslot_start_utc >= start AND < end``.
+            """
+            stmt = select(m.cities.id, m.cities.timezone)
+            if city_filter is not None:
+                stmt = stmt.where(m.cities.id.in_(city_filter))
+            groups: dict[str, list[int]] = {}
+            for city_id, tz_value in (await session.execute(stmt)).all():
+                tz = time_service.resolve_timezone(tz_value or settings.timezone)
+                groups.setdefault(_zone_storage_value(tz), []).append(int(city_id))
+            if not groups:
+                return false()
+            clauses = []
+            for tz_name, ids in groups.items():
+                tz = time_service.resolve_timezone(tz_name)
+                start = datetime.combine(day, time.min, tzinfo=tz).astimezone(UTC)
+                end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz).astimezone(UTC)
+                in_range = and_(
+                    m.orders.timeslot_start_utc >= start,
+                    m.orders.timeslot_start_utc < end,
+                )
+                if city_filter is None and len(groups) == 1:
+                    return in_range
+                clauses.append(and_(m.orders.city_id.in_(ids), in_range))
+            return or_(*clauses)
+
     async def list_wait_pay_recipients(self) -> list[WaitPayRecipient]:
             async with self._session_factory() as session:
                 rows = await session.execute(
@@ -532,26 +577,26 @@ class DBOrdersService:
         ) -> tuple[OrderStatusHistoryItem, ...]:
             async with self._session_factory() as session:
                 limited = max(1, limit)
+                history = _status_history_source(order_id)
                 stmt = (
                     select(
-                        m.order_status_history.id,
-                        m.order_status_history.from_status,
-                        m.order_status_history.to_status,
-                        m.order_status_history.reason,
-                        m.order_status_history.changed_by_staff_id,
-                        m.order_status_history.changed_by_master_id,
-                        m.order_status_history.actor_type,
-                        m.order_status_history.context,
-                        m.order_status_history.created_at,
+                        history.c.id,
+                        history.c.from_status,
+                        history.c.to_status,
+                        history.c.reason,
+                        history.c.changed_by_staff_id,
+                        history.c.changed_by_master_id,
+                        history.c.actor_type,
+                        history.c.context,
+                        history.c.created_at,
                         m.staff_users.full_name.label("staff_name"),
                         m.masters.full_name.label("master_name"),
                     )
-                    .select_from(m.order_status_history)
-                    .join(m.orders, m.orders.id == m.order_status_history.order_id)
-                    .outerjoin(m.staff_users, m.order_status_history.changed_by_staff_id == m.staff_users.id)
-                    .outerjoin(m.masters, m.order_status_history.changed_by_master_id == m.masters.id)
-                    .where(m.order_status_history.order_id == order_id)
-                    .order_by(m.order_status_history.created_at.desc())
+                    .select_from(history)
+                    .join(m.orders, m.orders.id == history.c.order_id)
+                    .outerjoin(m.staff_users, history.c.changed_by_staff_id == m.staff_users.id)
+                    .outerjoin(m.masters, history.c.changed_by_master_id == m.masters.id)
+                    .order_by(history.c.created_at.desc())
                     .limit(limited)
                 )
                 if city_ids is not None:
@@ -669,25 +714,25 @@ class DBOrdersService:
             self, session: AsyncSession, order_id: int, tz: ZoneInfo
         ) -> tuple[OrderStatusHistoryItem, ...]:
             """Load order status change history with detailed context."""
+            history = _status_history_source(order_id)
             rows = await session.execute(
                 select(
-                    m.order_status_history.id,
-                    m.order_status_history.from_status,
-                    m.order_status_history.to_status,
-                    m.order_status_history.reason,
-                    m.order_status_history.changed_by_staff_id,
-                    m.order_status_history.changed_by_master_id,
-                    m.order_status_history.actor_type,
-                    m.order_status_history.context,
-                    m.order_status_history.created_at,
+                    history.c.id,
+                    history.c.from_status,
+                    history.c.to_status,
+                    history.c.reason,
+                    history.c.changed_by_staff_id,
+                    history.c.changed_by_master_id,
+                    history.c.actor_type,
+                    history.c.context,
+                    history.c.created_at,
                     m.staff_users.full_name.label("staff_name"),
                     m.masters.full_name.label("master_name"),
                 )
-                .select_from(m.order_status_history)
-                .outerjoin(m.staff_users, m.order_status_history.changed_by_staff_id == m.staff_users.id)
-                .outerjoin(m.masters, m.order_status_history.changed_by_master_id == m.masters.id)
-                .where(m.order_status_history.order_id == order_id)
-                .order_by(m.order_status_history.created_at.asc())
+                .select_from(history)
+                .outerjoin(m.staff_users, history.c.changed_by_staff_id == m.staff_users.id)
+                .outerjoin(m.masters, history.c.changed_by_master_id == m.masters.id)
+                .order_by(history.c.created_at.asc())
             )
             items = []
             for row in rows:
@@ -754,38 +799,25 @@ class DBOrdersService:
     async def _get_status_timestamps(
             self, session: AsyncSession, order_id: int
         ) -> tuple[Optional[str], Optional[str], Optional[str]]:
-            """Get timestamps for EN_ROUTE, WORKING, and PAYMENT statuses."""
-            rows = await session.execute(
-                select(
-                    m.order_status_history.to_status,
-                    m.order_status_history.created_at,
-                )
-                .where(
-                    (m.order_status_history.order_id == order_id)
-                    & (
-                        m.order_status_history.to_status.in_([
-                            m.OrderStatus.EN_ROUTE,
-                            m.OrderStatus.WORKING,
-                            m.OrderStatus.PAYMENT,
-                        ])
-                    )
+            """Get timestamps for EN_ROUTE, WORKING, and PAYMENT statuses.
+
+            First entry into each status, from the order_lifecycle projection.
+            """
+            row = (
+                await session.execute(
+                    select(
+                        m.order_lifecycle.first_en_route_at,
+                        m.order_lifecycle.first_working_at,
+                        m.order_lifecycle.first_payment_at,
+                    ).where(m.order_lifecycle.order_id == order_id)
                 )
-                .order_by(m.order_status_history.created_at.asc())
+            ).first()
+            if row is None:
+                return None, None, None
+            en_route_at, working_at, payment_at = (
+                _format_created_at(value) if value is not None else None
+                for value in row
             )
-            
-            en_route_at = None
-            working_at = None
-            payment_at = None
-            
-            for row in rows:
-                timestamp = _format_created_at(row.created_at)
-                if row.to_status == m.OrderStatus.EN_ROUTE and en_route_at is None:
-                    en_route_at = timestamp
-                elif row.to_status == m.OrderStatus.WORKING and working_at is None:
-                    working_at = timestamp
-                elif row.to_status == m.OrderStatus.PAYMENT and payment_at is None:
-                    payment_at = timestamp
-            
             return en_route_at, working_at, payment_at
 
     @staticmethod
@@ -798,6 +830,39 @@ class DBOrdersService:
             return None
 
 
+    async def _geocode_address(
+        self,
+        *,
+        city_id: int,
+        street_id: Optional[int],
+        house: Optional[str],
+    ) -> Optional[geocoding_service.GeocodeResult]:
+        """Точный адрес через геокодер (geo_mode=yandex).
+
+        Вызывается до транзакции создания заказа: настройки и названия
+        читаются в отдельной короткой сессии, запрос к провайдеру идёт без
+        открытой транзакции.
+        """
+        if not street_id or not house or not house.strip():
+            return None
+        async with self._session_factory() as session:
+            service = await geocoding_service.get_service(session)
+            if service is None:
+                return None
+            row = (
+                await session.execute(
+                    select(m.cities.name, m.streets.name)
+                    .join(m.streets, m.streets.city_id == m.cities.id)
+                    .where(m.cities.id == city_id, m.streets.id == street_id)
+                )
+            ).first()
+        if row is None:
+            return None
+        query = geocoding_service.build_address_query(row[0], row[1], house)
+        if query is None:
+            return None
+        return await service.geocode(query)
+
     async def _resolve_order_coordinates(
         self,
         session: AsyncSession,
@@ -807,6 +872,7 @@ class DBOrdersService:
         street_id: Optional[int],
         raw_lat: Optional[float],
         raw_lon: Optional[float],
+        geocoded: Optional[geocoding_service.GeocodeResult] = None,
     ) -> tuple[Optional[float], Optional[float], Optional[str], Optional[int], Optional[int]]:
         lat = self._coerce_float(raw_lat)
         lon = self._coerce_float(raw_lon)
@@ -815,6 +881,7 @@ class DBOrdersService:
             return lat, lon, "user_location", 100, resolved_district
 
         street_has_centroids = False
+        street_centroid: Optional[tuple[float, float]] = None
         if street_id:
             street_has_centroids = await _ensure_centroid_flag(session, "street")
             street_columns = [m.streets.district_id]
@@ -843,13 +910,25 @@ class DBOrdersService:
                     lat_val = data.get("centroid_lat")
                     lon_val = data.get("centroid_lon")
                     if lat_val is not None and lon_val is not None:
-                        return (
-                            float(lat_val),
-                            float(lon_val),
-                            "street_centroid",
-                            80,
-                            resolved_district,
-                        )
+                        street_centroid = (float(lat_val), float(lon_val))
+
+            # Точный адрес от геокодера (получен до транзакции), иначе центроиды
+            if geocoded is not None:
+                return (
+                    geocoded.lat,
+                    geocoded.lon,
+                    geocoded.provider,
+                    geocoded.confidence,
+                    resolved_district,
+                )
+            if street_centroid is not None:
+                return (
+                    street_centroid[0],
+                    street_centroid[1],
+                    "street_centroid",
+                    80,
+                    resolved_district,
+                )
 
         district_has_centroids = False
         if resolved_district is not None:
@@ -930,6 +1009,12 @@ class DBOrdersService:
                 initial_status=initial_status_hint,
             )
             try:
+                geocoded = None
+                if self._coerce_float(data.lat) is None or self._coerce_float(data.lon) is None:
+                    # HTTP-запрос к геокодеру - до открытия транзакции заказа
+                    geocoded = await self._geocode_address(
+                        city_id=data.city_id, street_id=data.street_id, house=data.house
+                    )
                 async with maybe_managed_session(session) as s:
                         tz = await self._city_timezone(s, data.city_id)
                         _, workday_end = await _workday_window()
@@ -954,6 +1039,7 @@ class DBOrdersService:
                             street_id=data.street_id,
                             raw_lat=data.lat,
                             raw_lon=data.lon,
+                            geocoded=geocoded,
                         )
                         no_district_flag = bool(data.no_district or resolved_district is None)
                         created_staff_id = None
@@ -1029,6 +1115,13 @@ class DBOrdersService:
                                 },
                             )
                         )
+                        if initial_status in (m.OrderStatus.SEARCHING, m.OrderStatus.GUARANTEE):
+                            await wake_channel.notify(
+                                s,
+                                wake_channel.WakeReason.ORDER_CREATED,
+                                order_id=order.id,
+                                city_id=order.city_id,
+                            )
                         tx_id = _session_tx_id(s)
                         oplog.log_order_created(
                             request_id=request_id,
@@ -1446,79 +1539,9 @@ class DBOrdersService:
         self,
         city_ids: Optional[Iterable[int]],
     ) -> dict[str, int]:
-        """Count orders for queue menu counters."""
-        now = datetime.now(UTC)
-        warranty_deadline = now - timedelta(days=14)
-
-        city_filter: Optional[list[int]] = None
-        if city_ids is not None:
-            city_filter = [int(cid) for cid in city_ids]
-            if not city_filter:
-                return {'queue': 0, 'guarantee': 0, 'closed': 0}
-
+        """Count orders for queue menu counters (order_section_counters)."""
         async with self._session_factory() as session:
-            queue_stmt = select(func.count(m.orders.id)).where(
-                m.orders.status.in_(
-                    [
-                        m.OrderStatus.SEARCHING,
-                        m.OrderStatus.ASSIGNED,
-                        m.OrderStatus.EN_ROUTE,
-                        m.OrderStatus.WORKING,
-                        m.OrderStatus.PAYMENT,
-                        m.OrderStatus.GUARANTEE,
-                        m.OrderStatus.DEFERRED,
-                    ]
-                )
-            )
-            if city_filter is not None:
-                queue_stmt = queue_stmt.where(m.orders.city_id.in_(city_filter))
-            queue_count = await session.scalar(queue_stmt) or 0
-
-            warranty_stmt = (
-                select(func.count(m.orders.id))
-                .select_from(m.orders)
-                .join(m.commissions, m.commissions.order_id == m.orders.id)
-                .where(
-                    m.orders.status == m.OrderStatus.CLOSED,
-                    m.orders.type != m.OrderType.GUARANTEE,
-                    m.commissions.paid_approved_at.isnot(None),
-                    m.commissions.paid_approved_at >= warranty_deadline,
-                )
-            )
-            if city_filter is not None:
-                warranty_stmt = warranty_stmt.where(m.orders.city_id.in_(city_filter))
-            warranty_count = await session.scalar(warranty_stmt) or 0
-
-            closed_stmt = (
-                select(func.count(m.orders.id))
-                .select_from(m.orders)
-                .join(
-                    m.commissions,
-                    m.commissions.order_id == m.orders.id,
-                    isouter=True,
-                )
-                .where(
-                    m.orders.status == m.OrderStatus.CLOSED,
-                    (
-                        (
-                            (m.orders.type != m.OrderType.GUARANTEE)
-                            & (m.commissions.paid_approved_at.isnot(None))
-                            & (m.commissions.paid_approved_at < warranty_deadline)
-                        )
-                        | (m.orders.type == m.OrderType.GUARANTEE)
-                        | (m.commissions.paid_approved_at.is_(None))
-                    ),
-                )
-            )
-            if city_filter is not None:
-                closed_stmt = closed_stmt.where(m.orders.city_id.in_(city_filter))
-            closed_count = await session.scalar(closed_stmt) or 0
-
-        return {
-            'queue': int(queue_count),
-            'guarantee': int(warranty_count),
-            'closed': int(closed_count),
-        }
+            return await order_sections_service.count_sections(city_ids, session=session)
 
     async def list_closed_orders(
         self,
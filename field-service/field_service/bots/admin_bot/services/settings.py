@@ -160,8 +160,9 @@ class DBSettingsService:
                         continue
                     raise
                 else:
+                    await settings_store.notify_changed(s)
                     break
-        settings_store.invalidate_working_window_cache()
+        settings_store.invalidate_cache()
 
 
     async def get_owner_pay_requisites(self, *, staff_id: int | None = None) -> dict[str, Any]:
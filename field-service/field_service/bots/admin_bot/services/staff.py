@@ -7,13 +7,14 @@ from typing import Any, Iterable, Optional, Sequence
 import json
 import secrets
 import string
+from time import monotonic
 
 from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
-from field_service.services import live_log
+from field_service.services import live_log, order_sections_service
 from field_service.services._session_utils import maybe_managed_session
 from field_service.config import settings
 
@@ -244,6 +245,27 @@ def _attachment_type_from_string(value: Optional[str]) -> m.AttachmentFileType:
     return m.AttachmentFileType.OTHER
 
 
+# Кэш авторизации для StaffAccessMiddleware: tg_id -> (StaffUser | None, срок)
+# Сбрасывается явно при изменении роли/активности/городов/профиля и при
+# регистрации по коду; TTL страхует от правок в обход сервиса.
+_STAFF_CACHE_TTL_SECONDS = 30
+_STAFF_CACHE_MISS_TTL_SECONDS = 5
+_STAFF_CACHE: dict[int, tuple[Optional[StaffUser], float]] = {}
+
+
+def invalidate_staff_cache(*, staff_id: Optional[int] = None, tg_id: Optional[int] = None) -> None:
+    """Сбросить кэш сотрудника (без аргументов - весь кэш)."""
+    if staff_id is None and tg_id is None:
+        _STAFF_CACHE.clear()
+        return
+    if tg_id is not None:
+        _STAFF_CACHE.pop(int(tg_id), None)
+    if staff_id is not None:
+        for key, (cached, _) in list(_STAFF_CACHE.items()):
+            if cached is not None and cached.id == staff_id:
+                _STAFF_CACHE.pop(key, None)
+
+
 def _generate_staff_code() -> str:
     alphabet = string.ascii_uppercase + string.digits
     return "".join(secrets.choice(alphabet) for _ in range(8))
@@ -364,6 +386,28 @@ class DBStaffService:
                 full_name=staff.full_name or "",
                 phone=staff.phone or "",
             )
+
+    async def get_staff_for_access(
+        self,
+        tg_id: int,
+        username: Optional[str] = None,
+    ) -> Optional[StaffUser]:
+        """get_by_tg_id_or_username через кэш (StaffAccessMiddleware)."""
+        if tg_id is None:
+            return None
+        now = monotonic()
+        cached = _STAFF_CACHE.get(int(tg_id))
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        staff = await self.get_by_tg_id_or_username(
+            tg_id=tg_id,
+            username=username,
+            update_tg_id=True,  # Автоматически обновлять tg_id если нашли по username
+        )
+        ttl = _STAFF_CACHE_TTL_SECONDS if staff is not None else _STAFF_CACHE_MISS_TTL_SECONDS
+        _STAFF_CACHE[int(tg_id)] = (staff, now + ttl)
+        return staff
+
     async def link_username_to_tg_id(
         self,
         username: str,
@@ -406,8 +450,7 @@ class DBStaffService:
                 "staff",
                 f"username linked: staff_id={staff.id} username={normalized_username} tg_id={tg_user_id}"
             )
-            
-            return StaffUser(
+            linked = StaffUser(
                 id=staff.id,
                 tg_id=tg_user_id,
                 role=_map_staff_role(staff.role),
@@ -416,6 +459,9 @@ class DBStaffService:
                 full_name=staff.full_name or "",
                 phone=staff.phone or "",
             )
+        invalidate_staff_cache(tg_id=tg_user_id)
+        return linked
+
     async def list_staff(
         self,
         *,
@@ -488,6 +534,7 @@ class DBStaffService:
                 m.staff_cities(staff_user_id=staff_id, city_id=cid)
                 for cid in normalized
             )
+        invalidate_staff_cache(staff_id=staff_id)
 
     async def set_staff_role(self, staff_id: int, role: StaffRole, *, session: Optional[AsyncSession] = None) -> None:
         async with maybe_managed_session(session) as s:
@@ -496,6 +543,7 @@ class DBStaffService:
                 .where(m.staff_users.id == staff_id)
                 .values(role=_map_staff_role_to_db(role))
             )
+        invalidate_staff_cache(staff_id=staff_id)
 
     async def set_staff_active(self, staff_id: int, is_active: bool, *, session: Optional[AsyncSession] = None) -> None:
         async with maybe_managed_session(session) as s:
@@ -504,6 +552,7 @@ class DBStaffService:
                 .where(m.staff_users.id == staff_id)
                 .values(is_active=is_active)
             )
+        invalidate_staff_cache(staff_id=staff_id)
 
     async def update_staff_profile(
         self, staff_id: int, *, full_name: str, phone: str, username: Optional[str] | None = None, session: Optional[AsyncSession] = None
@@ -517,6 +566,7 @@ class DBStaffService:
                 .where(m.staff_users.id == staff_id)
                 .values(**values)
             )
+        invalidate_staff_cache(staff_id=staff_id)
 
 
     async def create_access_code(
@@ -749,8 +799,7 @@ class DBStaffService:
                 )
             )
             live_log.push('staff', f'access_code used code={code_row.code} staff={staff_row.id}')
-            
-            return StaffUser(
+            registered = StaffUser(
                 id=staff_row.id,
                 tg_id=tg_user_id,
                 role=role,
@@ -759,6 +808,8 @@ class DBStaffService:
                 full_name=staff_row.full_name or '',
                 phone=staff_row.phone or '',
             )
+        invalidate_staff_cache(tg_id=tg_user_id)
+        return registered
 
 
     async def list_access_codes(
@@ -1098,79 +1149,9 @@ class DBStaffService:
         self,
         city_ids: Optional[Iterable[int]],
     ) -> dict[str, int]:
-        """Count orders for queue menu counters."""
-        now = datetime.now(UTC)
-        warranty_deadline = now - timedelta(days=14)
-
-        city_filter: Optional[list[int]] = None
-        if city_ids is not None:
-            city_filter = [int(cid) for cid in city_ids]
-            if not city_filter:
-                return {'queue': 0, 'guarantee': 0, 'closed': 0}
-
+        """Count orders for queue menu counters (order_section_counters)."""
         async with self._session_factory() as session:
-            queue_stmt = select(func.count(m.orders.id)).where(
-                m.orders.status.in_(
-                    [
-                        m.OrderStatus.SEARCHING,
-                        m.OrderStatus.ASSIGNED,
-                        m.OrderStatus.EN_ROUTE,
-                        m.OrderStatus.WORKING,
-                        m.OrderStatus.PAYMENT,
-                        m.OrderStatus.GUARANTEE,
-                        m.OrderStatus.DEFERRED,
-                    ]
-                )
-            )
-            if city_filter is not None:
-                queue_stmt = queue_stmt.where(m.orders.city_id.in_(city_filter))
-            queue_count = await session.scalar(queue_stmt) or 0
-
-            warranty_stmt = (
-                select(func.count(m.orders.id))
-                .select_from(m.orders)
-                .join(m.commissions, m.commissions.order_id == m.orders.id)
-                .where(
-                    m.orders.status == m.OrderStatus.CLOSED,
-                    m.orders.type != m.OrderType.GUARANTEE,
-                    m.commissions.paid_approved_at.isnot(None),
-                    m.commissions.paid_approved_at >= warranty_deadline,
-                )
-            )
-            if city_filter is not None:
-                warranty_stmt = warranty_stmt.where(m.orders.city_id.in_(city_filter))
-            warranty_count = await session.scalar(warranty_stmt) or 0
-
-            closed_stmt = (
-                select(func.count(m.orders.id))
-                .select_from(m.orders)
-                .join(
-                    m.commissions,
-                    m.commissions.order_id == m.orders.id,
-                    isouter=True,
-                )
-                .where(
-                    m.orders.status == m.OrderStatus.CLOSED,
-                    (
-                        (
-                            (m.orders.type != m.OrderType.GUARANTEE)
-                            & (m.commissions.paid_approved_at.isnot(None))
-                            & (m.commissions.paid_approved_at < warranty_deadline)
-                        )
-                        | (m.orders.type == m.OrderType.GUARANTEE)
-                        | (m.commissions.paid_approved_at.is_(None))
-                    ),
-                )
-            )
-            if city_filter is not None:
-                closed_stmt = closed_stmt.where(m.orders.city_id.in_(city_filter))
-            closed_count = await session.scalar(closed_stmt) or 0
-
-        return {
-            'queue': int(queue_count),
-            'guarantee': int(warranty_count),
-            'closed': int(closed_count),
-        }
+            return await order_sections_service.count_sections(city_ids, session=session)
 
     async def list_wait_pay_recipients(self) -> list[WaitPayRecipient]:
         async with self._session_factory() as session:
@@ -12,10 +12,17 @@ async def poll_with_single_instance_guard(
     bot,
     *,
     logs_chat_id: int | None = None,
+    drop_webhook: bool = False,
 ) -> None:
-    """Run dispatcher polling handling 409 conflicts gracefully."""
+    """Run dispatcher polling handling 409 conflicts gracefully.
+
+    drop_webhook=True removes a webhook left from the webhook runtime
+    (getUpdates answers 409 while one is set); pending updates are kept.
+    """
 
     try:
+        if drop_webhook:
+            await bot.delete_webhook(drop_pending_updates=False)
         # Keep signature minimal to be compatible with test doubles
         # and different dispatcher implementations.
         await dispatcher.start_polling(bot)
@@ -9,37 +9,13 @@ from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramRetryAfter
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 
+from field_service.infra.rate_limiter import Priority, get_limiter
+
 
 _LOGGER = logging.getLogger(__name__)
 _T = TypeVar("_T")
 
 
-class _SendQueue:
-    def __init__(self) -> None:
-        self._lock = asyncio.Lock()
-
-    async def call(self, factory: Callable[[], Awaitable[_T]]) -> _T:
-        delay = 1.0
-        while True:
-            async with self._lock:
-                try:
-                    return await factory()
-                except TelegramRetryAfter as exc:  # pragma: no cover - network timing
-                    wait_time = max(float(exc.retry_after), delay)
-                except TelegramBadRequest as exc:  # pragma: no cover - network timing
-                    message = (exc.message or "").lower()
-                    if "too many requests" not in message:
-                        raise
-                    wait_time = delay
-                except TelegramNetworkError:  # pragma: no cover - flaky network
-                    wait_time = delay
-            await asyncio.sleep(wait_time)
-            delay = min(delay * 2, 30.0)
-
-
-_SEND_QUEUES: dict[int, _SendQueue] = {}
-
-
 def _normalize_markup(markup: InlineKeyboardMarkup | None) -> Any:
     if markup is None:
         return None
@@ -79,18 +55,43 @@ def _normalize_markup(markup: InlineKeyboardMarkup | None) -> Any:
     return normalized
 
 
-def _queue_for(bot: Bot) -> _SendQueue:
-    key = id(bot)
-    queue = _SEND_QUEUES.get(key)
-    if queue is None:
-        queue = _SendQueue()
-        _SEND_QUEUES[key] = queue
-    return queue
+def _chat_key(value: Any) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 
+async def _queue_call(
+    bot: Bot,
+    factory: Callable[[], Awaitable[_T]],
+    *,
+    chat_id: int | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> _T:
+    """Run a Telegram call under the shared rate limiter of the bot.
 
-async def _queue_call(bot: Bot, factory: Callable[[], Awaitable[_T]]) -> _T:
-    queue = _queue_for(bot)
-    return await queue.call(factory)
+    Flood control (RetryAfter) backs off only ``chat_id``; other chats keep
+    being served.
+    """
+    limiter = get_limiter(bot)
+    delay = 1.0
+    while True:
+        await limiter.acquire(chat_id, priority=priority)
+        try:
+            return await factory()
+        except TelegramRetryAfter as exc:  # pragma: no cover - network timing
+            limiter.retry_after(chat_id, float(exc.retry_after))
+            continue
+        except TelegramBadRequest as exc:  # pragma: no cover - network timing
+            message = (exc.message or "").lower()
+            if "too many requests" not in message:
+                raise
+            wait_time = delay
+        except TelegramNetworkError:  # pragma: no cover - flaky network
+            wait_time = delay
+        await asyncio.sleep(wait_time)
+        delay = min(delay * 2, 30.0)
 
 
 async def safe_edit_or_send(
@@ -109,6 +110,7 @@ async def safe_edit_or_send(
                 result = await _queue_call(
                     message.bot,
                     lambda: message.edit_text(text, reply_markup=reply_markup, **kwargs),
+                    chat_id=_chat_key(message.chat.id),
                 )
                 _LOGGER.info("safe_edit_or_send: message edited successfully")
                 return result
@@ -127,6 +129,7 @@ async def safe_edit_or_send(
                                     lambda: message.edit_reply_markup(
                                         reply_markup=reply_markup
                                     ),
+                                    chat_id=_chat_key(message.chat.id),
                                 )
                             except TelegramBadRequest as markup_exc:
                                 _LOGGER.warning(
@@ -152,6 +155,7 @@ async def safe_edit_or_send(
                         reply_markup=reply_markup,
                         **kwargs,
                     ),
+                    chat_id=_chat_key(target_chat),
                 )
                 _LOGGER.info("safe_edit_or_send: new message sent successfully")
                 return result
@@ -165,6 +169,7 @@ async def safe_edit_or_send(
                     reply_markup=reply_markup,
                     **kwargs,
                 ),
+                chat_id=_chat_key(event.from_user.id),
             )
         _LOGGER.warning("safe_edit_or_send: both message and from_user are None, cannot send message")
         return None
@@ -173,6 +178,7 @@ async def safe_edit_or_send(
         return await _queue_call(
             event.bot,
             lambda: event.answer(text, reply_markup=reply_markup, **kwargs),
+            chat_id=_chat_key(event.chat.id),
         )
 
     raise TypeError(f"Unsupported event type: {type(event)!r}")
@@ -198,6 +204,7 @@ async def safe_answer_callback(
                 await _queue_call(
                     callback.bot,
                     lambda: callback.bot.send_message(callback.from_user.id, fallback_message),
+                    chat_id=_chat_key(callback.from_user.id),
                 )
             return
         if "query id not found" in message:
@@ -205,8 +212,20 @@ async def safe_answer_callback(
         raise
 
 
-async def safe_send_message(bot: Bot, chat_id: int, text: str, **kwargs: Any) -> Message:
-    return await _queue_call(bot, lambda: bot.send_message(chat_id, text, **kwargs))
+async def safe_send_message(
+    bot: Bot,
+    chat_id: int,
+    text: str,
+    *,
+    priority: Priority = Priority.INTERACTIVE,
+    **kwargs: Any,
+) -> Message:
+    return await _queue_call(
+        bot,
+        lambda: bot.send_message(chat_id, text, **kwargs),
+        chat_id=_chat_key(chat_id),
+        priority=priority,
+    )
 
 
 async def safe_delete_and_send(
@@ -226,6 +245,7 @@ async def safe_delete_and_send(
                     reply_markup=reply_markup,
                     **kwargs,
                 ),
+                chat_id=_chat_key(callback.from_user.id),
             )
         return None
 
@@ -245,4 +265,5 @@ async def safe_delete_and_send(
             reply_markup=reply_markup,
             **kwargs,
         ),
+        chat_id=_chat_key(chat_id),
     )
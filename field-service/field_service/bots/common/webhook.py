@@ -0,0 +1,286 @@
+"""Webhook runtime for the bots (aiohttp server), polling as the fallback.
+
+Telegram POSTs every update to ``{WEBHOOK_BASE_URL}/webhook/{bot_label}``.
+The server:
+
+- checks ``X-Telegram-Bot-Api-Secret-Token`` against ``WEBHOOK_SECRET``
+  (401 on mismatch);
+- answers 200 right away and feeds the update to the dispatcher in a
+  background task; at most ``max_concurrency`` updates are handled at once,
+  when all slots stay busy for ``acquire_timeout`` the update is answered
+  with 503 and Telegram redelivers it later;
+- on shutdown stops accepting updates (503) and drains the in-flight ones
+  for up to ``drain_timeout`` seconds before cancelling the rest.
+
+Updates cancelled after the drain timeout are lost: Telegram already got 200
+for them and will not redeliver. Their ``update_id``s are logged as a warning.
+
+Several replicas can run behind a load balancer: each one registers the same
+webhook on startup and does not delete it on exit. ``/healthz`` reports 503
+while draining so the balancer stops routing to the replica. Only the update
+handling is replicated: periodic jobs (scheduler, watchdogs, autoclose,
+reconciles) must run in one process, so every extra replica is started with
+``RUN_BACKGROUND_JOBS=0``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import secrets
+import signal
+from contextlib import suppress
+from typing import Any, Optional
+
+from aiohttp import web
+from aiogram.types import Update
+
+from field_service.bots.common.polling import poll_with_single_instance_guard
+from field_service.config import settings
+from field_service.infra.notify import send_log
+
+logger = logging.getLogger("bots.webhook")
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DEFAULT_ACQUIRE_TIMEOUT = 5.0
+
+__all__ = [
+    "SECRET_HEADER",
+    "WebhookRuntime",
+    "run_updates",
+    "serve_webhook",
+    "webhook_path",
+]
+
+
+def webhook_path(bot_label: str) -> str:
+    return f"/webhook/{bot_label}"
+
+
+class WebhookRuntime:
+    """aiohttp handler feeding webhook updates to a dispatcher with bounded concurrency."""
+
+    def __init__(
+        self,
+        dispatcher,
+        bot,
+        *,
+        path: str,
+        secret_token: str,
+        max_concurrency: int = 64,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        **workflow_data: Any,
+    ) -> None:
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.path = path
+        self._secret_token = secret_token
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._slots = asyncio.Semaphore(self._max_concurrency)
+        self._acquire_timeout = acquire_timeout
+        self._workflow_data = workflow_data
+        # task -> update_id: нужен, чтобы залогировать потерянные при дренаже апдейты
+        self._tasks: dict[asyncio.Task, int] = {}
+        self._draining = False
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        app.router.add_get("/healthz", self.health)
+        return app
+
+    def _verify_secret(self, request: web.Request) -> bool:
+        received = request.headers.get(SECRET_HEADER, "")
+        return secrets.compare_digest(received.encode(), self._secret_token.encode())
+
+    async def health(self, request: web.Request) -> web.Response:
+        if self._draining:
+            return web.json_response({"status": "draining"}, status=503)
+        return web.json_response({"status": "ok", "in_flight": self.in_flight})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self._verify_secret(request):
+            logger.warning("webhook %s: bad secret token from %s", self.path, request.remote)
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+        try:
+            payload = await request.json()
+            update = Update.model_validate(payload, context={"bot": self.bot})
+        except Exception as exc:
+            # Повторная доставка не поможет: отвечаем 200, чтобы Telegram не ретраил
+            logger.warning("webhook %s: malformed update: %s", self.path, exc)
+            return web.json_response({})
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self._acquire_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "webhook %s: %s updates in flight, update %s deferred",
+                self.path,
+                self._max_concurrency,
+                update.update_id,
+            )
+            return web.Response(status=503)
+        if self._draining:
+            self._slots.release()
+            return web.Response(status=503)
+
+        task = asyncio.create_task(
+            self._process(update), name=f"webhook_update_{update.update_id}"
+        )
+        self._tasks[task] = update.update_id
+        task.add_done_callback(self._on_done)
+        return web.json_response({})
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.pop(task, None)
+        self._slots.release()
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dispatcher.feed_update(self.bot, update, **self._workflow_data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("webhook update %s failed: %s", update.update_id, exc)
+
+    async def drain(self, timeout: float) -> int:
+        """Stop accepting updates and wait for in-flight ones. Returns cancelled count.
+
+        Updates still running after ``timeout`` are cancelled and lost (they were
+        acknowledged with 200), their ids are logged.
+        """
+        self._draining = True
+        pending = set(self._tasks)
+        if pending:
+            logger.info("webhook %s: draining %s updates", self.path, len(pending))
+            _done, pending = await asyncio.wait(pending, timeout=max(0.0, timeout))
+        lost = sorted(self._tasks[task] for task in pending if task in self._tasks)
+        for task in pending:
+            task.cancel()
+        if pending:
+            with suppress(Exception):
+                await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(
+                "webhook %s: cancelled %s updates after drain, lost update_ids=%s",
+                self.path,
+                len(pending),
+                lost,
+            )
+        return len(pending)
+
+
+def _install_stop_signals(stop: asyncio.Event) -> list[int]:
+    loop = asyncio.get_running_loop()
+    installed: list[int] = []
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        # Windows / не главный поток: остаётся KeyboardInterrupt
+        with suppress(NotImplementedError, RuntimeError, ValueError):
+            loop.add_signal_handler(sig, stop.set)
+            installed.append(sig)
+    return installed
+
+
+async def serve_webhook(
+    dispatcher,
+    bot,
+    *,
+    bot_label: str,
+    base_url: str,
+    secret_token: str,
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    max_concurrency: int = 64,
+    drain_timeout: float = 25.0,
+    acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+    stop_event: Optional[asyncio.Event] = None,
+    handle_signals: bool = True,
+) -> None:
+    """Serve updates over a webhook until ``stop_event`` is set (or SIGTERM/SIGINT)."""
+    path = webhook_path(bot_label)
+    runtime = WebhookRuntime(
+        dispatcher,
+        bot,
+        path=path,
+        secret_token=secret_token,
+        max_concurrency=max_concurrency,
+        acquire_timeout=acquire_timeout,
+    )
+    stop = stop_event or asyncio.Event()
+    installed = _install_stop_signals(stop) if handle_signals else []
+
+    runner = web.AppRunner(runtime.make_app(), handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    started = False
+    try:
+        await site.start()
+        await dispatcher.emit_startup(bot=bot, dispatcher=dispatcher)
+        started = True
+        await bot.set_webhook(
+            url=f"{base_url}{path}",
+            secret_token=secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+            max_connections=max(1, min(100, int(max_concurrency))),
+        )
+        logger.info("%s webhook listening on %s:%s%s", bot_label, host, port, path)
+        await stop.wait()
+    finally:
+        await runtime.drain(drain_timeout)
+        await runner.cleanup()
+        if started:
+            with suppress(Exception):
+                await dispatcher.emit_shutdown(bot=bot, dispatcher=dispatcher)
+        loop = asyncio.get_running_loop()
+        for sig in installed:
+            loop.remove_signal_handler(sig)
+        logger.info("%s webhook stopped", bot_label)
+
+
+async def run_updates(
+    dispatcher,
+    bot,
+    *,
+    bot_label: str,
+    port: int,
+    logs_chat_id: int | None = None,
+) -> None:
+    """Receive updates in the configured runtime (``BOT_RUNTIME``)."""
+    if settings.bot_runtime == "webhook":
+        if settings.webhook_base_url and settings.webhook_secret:
+            await serve_webhook(
+                dispatcher,
+                bot,
+                bot_label=bot_label,
+                base_url=settings.webhook_base_url,
+                secret_token=settings.webhook_secret,
+                host=settings.webhook_host,
+                port=port,
+                max_concurrency=settings.webhook_max_concurrency,
+                drain_timeout=settings.webhook_drain_seconds,
+            )
+            return
+        logger.warning(
+            "%s: BOT_RUNTIME=webhook without WEBHOOK_BASE_URL/WEBHOOK_SECRET, using polling",
+            bot_label,
+        )
+        await send_log(
+            bot,
+            f"{bot_label}: webhook не настроен (WEBHOOK_BASE_URL/WEBHOOK_SECRET) → polling",
+            chat_id=logs_chat_id,
+        )
+    # Webhook другой реплики не трогаем: снимаем его только при явном polling
+    await poll_with_single_instance_guard(
+        dispatcher,
+        bot,
+        logs_chat_id=logs_chat_id,
+        drop_webhook=settings.bot_runtime != "webhook",
+    )
@@ -0,0 +1,162 @@
+"""Per-master context cache for the master bot.
+
+Every update used to run ``ensure_master`` (``SELECT masters WHERE
+tg_user_id = ...``) and ``offer_accept`` additionally read the limit setting
+and counted active orders. The cache keeps, per process:
+
+- a snapshot of the ``masters`` row by ``tg_user_id``: on a hit the
+  middleware attaches a detached instance to the session without SQL, so
+  read-only screens (menu, cancel) never check out a connection;
+- the active order count per master (the default ``max_active_orders`` comes
+  from the settings snapshot).
+
+The row snapshot is refreshed after every successful handler from the
+instance the handler committed (shift changes etc.), active counts are
+dropped on accept / close. Changes made by other processes (admin bot:
+block, moderation, limit override, manual assignment) become visible within
+``TTL_SECONDS``.
+"""
+from __future__ import annotations
+
+import copy
+from dataclasses import dataclass
+from time import monotonic
+from typing import Any, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from field_service.db import models as m
+from field_service.services import onboarding_service
+
+TTL_SECONDS = 20.0
+_MAX_ENTRIES = 50_000
+
+
+@dataclass(slots=True)
+class _MasterEntry:
+    master_id: int
+    snapshot: dict[str, Any]
+    loaded_at: float
+
+
+_MASTERS: dict[int, _MasterEntry] = {}
+# master_id -> (active orders count, expires_at)
+_ACTIVE_COUNTS: dict[int, tuple[int, float]] = {}
+
+
+def _column_keys() -> list[str]:
+    return [attr.key for attr in inspect(m.masters).column_attrs]
+
+
+def _snapshot(master: m.masters) -> Optional[dict[str, Any]]:
+    state = inspect(master)
+    if state.key is None:
+        return None
+    keys = _column_keys()
+    if any(key not in state.dict for key in keys):
+        return None  # expired (rollback) or server defaults not loaded yet
+    return {key: copy.copy(state.dict[key]) for key in keys}
+
+
+def _fresh(loaded_at: float) -> bool:
+    return monotonic() - loaded_at < TTL_SECONDS
+
+
+def _evict_stale() -> None:
+    for tg_user_id in [k for k, e in _MASTERS.items() if not _fresh(e.loaded_at)]:
+        del _MASTERS[tg_user_id]
+
+
+async def get_master(session: AsyncSession, tg_user_id: int) -> m.masters:
+    """Master of the Telegram user attached to ``session``.
+
+    Falls back to ``onboarding_service.ensure_master`` on a miss.
+    """
+    entry = _MASTERS.get(tg_user_id)
+    if entry is not None and _fresh(entry.loaded_at):
+        existing = session.identity_map.get(
+            inspect(m.masters).identity_key_from_primary_key((entry.master_id,))
+        )
+        if existing is not None:
+            return existing
+        master = m.masters(**copy.deepcopy(entry.snapshot))
+        make_transient_to_detached(master)
+        session.add(master)
+        return master
+
+    master = await onboarding_service.ensure_master(session, tg_user_id)
+    snapshot = _snapshot(master)
+    if snapshot is not None:
+        if len(_MASTERS) >= _MAX_ENTRIES:
+            _evict_stale()
+        _MASTERS[tg_user_id] = _MasterEntry(master.id, snapshot, monotonic())
+    return master
+
+
+def remember(tg_user_id: int, master: m.masters, session: AsyncSession) -> None:
+    """Refresh the snapshot after a handler from the committed instance.
+
+    Uncommitted changes or an expired instance (rollback) drop the entry.
+    The original ``loaded_at`` is kept so other processes' changes are
+    still picked up within the TTL.
+    """
+    entry = _MASTERS.get(tg_user_id)
+    if entry is None:
+        return
+    snapshot = None
+    if master not in session.dirty and master not in session.deleted:
+        snapshot = _snapshot(master)
+    if snapshot is None:
+        _MASTERS.pop(tg_user_id, None)
+        return
+    entry.snapshot = snapshot
+
+
+def get_active_count(master_id: int) -> Optional[int]:
+    cached = _ACTIVE_COUNTS.get(master_id)
+    if cached is None or cached[1] <= monotonic():
+        return None
+    return cached[0]
+
+
+def set_active_count(master_id: int, value: int) -> None:
+    _ACTIVE_COUNTS[master_id] = (int(value), monotonic() + TTL_SECONDS)
+
+
+def forget_active_count(master_id: int) -> None:
+    """Drop the cached count after the master's set of active orders changed."""
+    _ACTIVE_COUNTS.pop(master_id, None)
+
+
+def invalidate(*, tg_user_id: Optional[int] = None, master_id: Optional[int] = None) -> None:
+    """Drop cached context of one master (or everything without arguments)."""
+    if tg_user_id is None and master_id is None:
+        reset()
+        return
+    if tg_user_id is not None:
+        entry = _MASTERS.pop(tg_user_id, None)
+        if entry is not None:
+            _ACTIVE_COUNTS.pop(entry.master_id, None)
+    if master_id is not None:
+        _ACTIVE_COUNTS.pop(master_id, None)
+        for key in [k for k, e in _MASTERS.items() if e.master_id == master_id]:
+            del _MASTERS[key]
+
+
+def reset() -> None:
+    _MASTERS.clear()
+    _ACTIVE_COUNTS.clear()
+
+
+__all__ = [
+    "TTL_SECONDS",
+    "forget_active_count",
+    "get_active_count",
+    "get_master",
+    "invalidate",
+    "remember",
+    "reset",
+    "set_active_count",
+]
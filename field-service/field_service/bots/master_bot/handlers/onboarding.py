@@ -11,7 +11,7 @@ from sqlalchemy import delete, func, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
-from field_service.services import onboarding_service
+from field_service.services import onboarding_service, referral_graph
 
 from ..keyboards import (
     districts_keyboard,
@@ -743,6 +743,9 @@ async def onboarding_confirm(
                 staff_code.is_revoked = True
 
     await session.commit()
+    if referral_code and referrer_id:
+        # Новое ребро графа рефералов: сбрасываем кэш цепочек этого процесса
+        referral_graph.invalidate()
 
     await clear_step_messages(callback.message.bot, state, callback.message.chat.id)
     await state.clear()
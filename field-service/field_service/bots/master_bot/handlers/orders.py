@@ -19,9 +19,11 @@ from field_service.bots.common import MasterPaths, add_breadcrumbs_to_text
 from field_service.bots.common.copy_utils import copy_button, format_copy_message
 from field_service.db import models as m
 from field_service.config import settings
-from field_service.services import time_service
+from field_service.services import settings_service, time_service
 from field_service.services.commission_service import CommissionService
+from field_service.services.distribution import wake_channel
 
+from .. import context_cache
 from ..states import CloseOrderStates
 from ..texts import (
     ACTIVE_STATUS_ACTIONS,
@@ -200,6 +202,9 @@ async def offer_accept(
     # Шаг 3: Проверка лимита активных заказов
     limit = await _get_active_limit(session, master)
     active_orders = await _count_active_orders(session, master.id)
+    if limit and active_orders >= limit:
+        # Кэш мог устареть (заказ закрыт в админке) - перепроверяем перед отказом
+        active_orders = await _count_active_orders(session, master.id, fresh=True)
     _log.info("offer_accept: master=%s limit=%s active=%s", master.id, limit, active_orders)
     
     if limit and active_orders >= limit:
@@ -244,6 +249,7 @@ async def offer_accept(
         return
     
     # Шаг 6: Успешное принятие - показываем карточку принятого заказа
+    context_cache.forget_active_count(master.id)
     _log.info("offer_accept SUCCESS: order=%s assigned to master=%s", order_id, master.id)
     await safe_answer_callback(callback, ALERT_ACCEPT_SUCCESS, show_alert=False)
     await _render_active_order(callback, session, master, order_id=order_id)
@@ -311,6 +317,12 @@ async def offer_decline_execute(
         .where((m.offers.order_id == order_id) & (m.offers.master_id == master.id))
         .values(state=m.OfferState.DECLINED, responded_at=func.now())
     )
+    await wake_channel.notify(
+        session,
+        wake_channel.WakeReason.OFFER_DECLINED,
+        order_id=order_id,
+        master_id=master.id,
+    )
     await session.commit()
 
     # Показываем уведомление об успехе
@@ -665,6 +677,7 @@ async def active_close_act(
         await CommissionService(session).create_for_order(order_id)
 
     await session.commit()
+    context_cache.forget_active_count(master.id)
     await cleanup_close_prompts(state, bot_instance, chat_id)
     await state.clear()
 
@@ -1176,18 +1189,16 @@ async def _load_active_order(
 async def _get_active_limit(session: AsyncSession, master: m.masters) -> int:
     if master.max_active_orders_override is not None and master.max_active_orders_override > 0:
         return master.max_active_orders_override
-    value = (
-        await session.execute(
-            select(m.settings.value).where(m.settings.key == "max_active_orders")
-        )
-    ).scalar_one_or_none()
-    try:
-        return int(value) if value is not None else 5
-    except (TypeError, ValueError):
-        return 5
+    return await settings_service.get_int("max_active_orders", 5, session=session)
 
 
-async def _count_active_orders(session: AsyncSession, master_id: int) -> int:
+async def _count_active_orders(
+    session: AsyncSession, master_id: int, *, fresh: bool = False
+) -> int:
+    if not fresh:
+        cached = context_cache.get_active_count(master_id)
+        if cached is not None:
+            return cached
     stmt = (
         select(func.count())
         .select_from(m.orders)
@@ -1196,7 +1207,9 @@ async def _count_active_orders(session: AsyncSession, master_id: int) -> int:
             m.orders.status.in_(ACTIVE_STATUSES),
         )
     )
-    return int((await session.execute(stmt)).scalar_one())
+    count = int((await session.execute(stmt)).scalar_one())
+    context_cache.set_active_count(master_id, count)
+    return count
 
 
 # P1-19: Handler для быстрого копирования данных
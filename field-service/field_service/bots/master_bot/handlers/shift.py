@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.bots.common import safe_answer_callback
 from field_service.db import models as m
+from field_service.services.distribution import wake_channel
 
 from ..texts import SHIFT_MESSAGES
 from ..utils import now_utc
@@ -38,6 +39,12 @@ async def shift_on(callback: CallbackQuery, session: AsyncSession, master: m.mas
     master.shift_status = m.ShiftStatus.SHIFT_ON
     master.is_on_shift = True
     master.break_until = None
+    await wake_channel.notify(
+        session,
+        wake_channel.WakeReason.MASTER_ON_SHIFT,
+        master_id=master.id,
+        city_id=master.city_id,
+    )
     await session.commit()
     await _answer(callback, SHIFT_MESSAGES["started"])
     if callback.message:
@@ -111,6 +118,12 @@ async def shift_break_end(callback: CallbackQuery, session: AsyncSession, master
     master.shift_status = m.ShiftStatus.SHIFT_ON
     master.is_on_shift = True
     master.break_until = None
+    await wake_channel.notify(
+        session,
+        wake_channel.WakeReason.MASTER_ON_SHIFT,
+        master_id=master.id,
+        city_id=master.city_id,
+    )
     await session.commit()
     await _answer(callback, SHIFT_MESSAGES["break_finished"])
     if callback.message:
@@ -1,12 +1,9 @@
 """P1-17:   (, , , )."""
 from __future__ import annotations
 
-from datetime import datetime, timezone
-
 from aiogram import F, Router
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
-from sqlalchemy import func, select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.bots.common import (
@@ -16,6 +13,7 @@ from field_service.bots.common import (
     safe_edit_or_send,
 )
 from field_service.db import models as m
+from field_service.services import master_stats_service
 
 from ..utils import inline_keyboard
 
@@ -33,38 +31,18 @@ async def handle_statistics(
     """   ."""
     await state.clear()
 
+    # Counters come from the master_stats projection (one PK lookup)
+    stats = await master_stats_service.get_profile_stats(session, master.id)
+
     # 1) Completed (CLOSED) orders count
-    completed_query = select(func.count(m.orders.id)).where(
-        and_(
-            m.orders.assigned_master_id == master.id,
-            m.orders.status == m.OrderStatus.CLOSED,
-        )
-    )
-    completed_result = await session.execute(completed_query)
-    completed_count = int(completed_result.scalar() or 0)
+    completed_count = stats.closed_total
 
     # 2) Average rating (fallback 5.0)
     avg_rating = float(getattr(master, "rating", 0) or 5.0)
 
     # 3) Average response time in minutes for ACCEPTED offers
-    response_time_query = select(
-        func.avg(
-            func.extract(
-                "EPOCH",
-                m.offers.responded_at - m.offers.sent_at,
-            ) / 60.0
-        )
-    ).where(
-        and_(
-            m.offers.master_id == master.id,
-            m.offers.state == m.OfferState.ACCEPTED,
-            m.offers.responded_at.is_not(None),
-        )
-    )
-    response_time_result = await session.execute(response_time_query)
-    avg_response_minutes = response_time_result.scalar()
+    avg_response_minutes = stats.avg_response_minutes
     if avg_response_minutes is not None:
-        avg_response_minutes = float(avg_response_minutes)
         if avg_response_minutes < 60:
             response_time_str = f"{avg_response_minutes:.0f} "
         else:
@@ -74,17 +52,7 @@ async def handle_statistics(
         response_time_str = ""
 
     # 4) Count of closed orders in current month
-    now = datetime.now(timezone.utc)
-    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    month_query = select(func.count(m.orders.id)).where(
-        and_(
-            m.orders.assigned_master_id == master.id,
-            m.orders.status == m.OrderStatus.CLOSED,
-            m.orders.updated_at >= month_start,
-        )
-    )
-    month_result = await session.execute(month_query)
-    month_count = int(month_result.scalar() or 0)
+    month_count = stats.month_closed_cnt
 
     # Compose human-readable statistics lines
     lines = [
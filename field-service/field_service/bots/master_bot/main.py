@@ -11,10 +11,11 @@ from aiogram.enums import ParseMode
 
 from field_service.config import settings
 from field_service.bots.common.error_middleware import setup_error_middleware
-from field_service.bots.common.polling import poll_with_single_instance_guard
+from field_service.bots.common.webhook import run_updates
 from field_service.bots.common.retry_handler import retry_router  # P1-13
 from field_service.bots.common.retry_middleware import setup_retry_middleware  # P1-13
 from field_service.infra.notify import send_alert, send_log
+from field_service.services import settings_service
 from field_service.services.heartbeat import run_heartbeat
 from field_service.services.break_reminder_scheduler import run_break_reminder  # P1-16
 from field_service.services.notifications_watcher import run_master_notifications  # Отправка уведомлений мастерам
@@ -61,35 +62,51 @@ async def main() -> int:
     # P1-13: Подключаем retry middleware для автоматического предложения повтора при ошибках
     setup_retry_middleware(dp, enabled=True)
 
-    heartbeat_task = asyncio.create_task(
-        run_heartbeat(bot, name="master", chat_id=logs_chat_id),
-        name="master_heartbeat",
-    )
+    heartbeat_task: asyncio.Task | None = None
+    break_reminder_task: asyncio.Task | None = None
+    expired_breaks_task: asyncio.Task | None = None
+    # Периодические задачи - в одной реплике (остальные с RUN_BACKGROUND_JOBS=0)
+    if settings.run_background_jobs:
+        heartbeat_task = asyncio.create_task(
+            run_heartbeat(bot, name="master", chat_id=logs_chat_id),
+            name="master_heartbeat",
+        )
 
-    # P1-16: Запуск планировщика напоминаний о перерывах
-    break_reminder_task = asyncio.create_task(
-        run_break_reminder(interval_seconds=60),
-        name="break_reminder",
-    )
-    
-    # Автоматическое снятие со смены после истечения перерыва
-    expired_breaks_task = asyncio.create_task(
-        watchdog_expired_breaks(interval_seconds=60),
-        name="expired_breaks",
-    )
+        # P1-16: Запуск планировщика напоминаний о перерывах
+        break_reminder_task = asyncio.create_task(
+            run_break_reminder(interval_seconds=60),
+            name="break_reminder",
+        )
+
+        # Автоматическое снятие со смены после истечения перерыва
+        expired_breaks_task = asyncio.create_task(
+            watchdog_expired_breaks(interval_seconds=60),
+            name="expired_breaks",
+        )
+    else:
+        logger.info("RUN_BACKGROUND_JOBS=0: background jobs run in another replica")
 
     # Запуск worker для отправки уведомлений мастерам
+    # (outbox забирается через SKIP LOCKED - безопасно в каждой реплике)
     notifications_task = asyncio.create_task(
         run_master_notifications(bot, interval_seconds=1),
         name="master_notifications",
     )
 
+    # Снимок настроек сбрасывается по NOTIFY при изменениях из админки
+    settings_listener_task = asyncio.create_task(
+        settings_service.run_listener(),
+        name="settings_listener",
+    )
+
     exit_code = 0
     try:
         logger.info("Starting master bot; allowed updates: %s", dp.resolve_used_update_types())
-        await poll_with_single_instance_guard(
+        await run_updates(
             dp,
             bot,
+            bot_label="master_bot",
+            port=settings.master_webhook_port,
             logs_chat_id=logs_chat_id,
         )
     except SystemExit as conflict_exit:
@@ -122,6 +139,9 @@ async def main() -> int:
             notifications_task.cancel()
             with suppress(asyncio.CancelledError):
                 await notifications_task
+        settings_listener_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await settings_listener_task
         await bot.session.close()
 
     return exit_code
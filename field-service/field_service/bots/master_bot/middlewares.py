@@ -7,7 +7,8 @@ from aiogram import BaseMiddleware
 from aiogram.types import CallbackQuery, Message, TelegramObject
 
 from field_service.db.session import SessionLocal
-from field_service.services import onboarding_service
+
+from . import context_cache
 
 
 class DbSessionMiddleware(BaseMiddleware):
@@ -41,10 +42,18 @@ class MasterContextMiddleware(BaseMiddleware):
         if session is None:
             return await handler(event, data)
         tg_user_id = _extract_tg_id(event)
-        if tg_user_id is not None:
-            master = await onboarding_service.ensure_master(session, tg_user_id)
-            data["master"] = master
-        return await handler(event, data)
+        if tg_user_id is None:
+            return await handler(event, data)
+        # Снимок мастера из кэша: read-only экраны не ходят в БД
+        master = await context_cache.get_master(session, tg_user_id)
+        data["master"] = master
+        try:
+            result = await handler(event, data)
+        except Exception:
+            context_cache.invalidate(tg_user_id=tg_user_id)
+            raise
+        context_cache.remember(tg_user_id, master, session)
+        return result
 
 
 def _extract_tg_id(event: TelegramObject) -> int | None:
@@ -27,6 +27,12 @@ def _parse_int_or_none(value: str | None) -> int | None:
         return None
 
 
+def _parse_bool(value: str | None, default: bool) -> bool:
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() not in {"0", "false", "no", "off"}
+
+
 def _parse_json_int_list(value: str) -> tuple[int, ...]:
     try:
         parsed = json.loads(value or "[]")
@@ -71,6 +77,14 @@ class Settings:
 
     distribution_sla_seconds: int = int(os.getenv("DISTRIBUTION_SLA_SECONDS", "120"))
     distribution_rounds: int = int(os.getenv("DISTRIBUTION_ROUNDS", "2"))
+    # Proximity term of candidate ranking: masters are grouped by distance from
+    # home to the order in bands of this width (0 disables), beyond max - one band
+    distribution_distance_band_km: float = float(
+        os.getenv("DISTRIBUTION_DISTANCE_BAND_KM", "3")
+    )
+    distribution_distance_max_km: float = float(
+        os.getenv("DISTRIBUTION_DISTANCE_MAX_KM", "15")
+    )
     commission_deadline_hours: int = int(os.getenv("COMMISSION_DEADLINE_HOURS", "3"))
     guarantee_company_payment: float = float(
         os.getenv("GUARANTEE_COMPANY_PAYMENT", "2500")
@@ -89,6 +103,20 @@ class Settings:
     access_code_ttl_hours: int = int(os.getenv("ACCESS_CODE_TTL_HOURS", "24"))
     overdue_watchdog_min: int = int(os.getenv("OVERDUE_WATCHDOG_MIN", "10"))
 
+    # Приём апдейтов: "polling" (по умолчанию) или "webhook".
+    # Webhook без WEBHOOK_BASE_URL / WEBHOOK_SECRET откатывается на polling.
+    bot_runtime: str = os.getenv("BOT_RUNTIME", "polling").strip().lower()
+    webhook_base_url: str = os.getenv("WEBHOOK_BASE_URL", "").strip().rstrip("/")
+    webhook_secret: str = os.getenv("WEBHOOK_SECRET", "").strip()
+    webhook_host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    admin_webhook_port: int = int(os.getenv("ADMIN_WEBHOOK_PORT", "8081"))
+    master_webhook_port: int = int(os.getenv("MASTER_WEBHOOK_PORT", "8080"))
+    webhook_max_concurrency: int = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "64"))
+    webhook_drain_seconds: float = float(os.getenv("WEBHOOK_DRAIN_SECONDS", "25"))
+    # Периодические задачи (планировщик, watchdog'и, автозакрытие, сверки).
+    # При нескольких webhook-репликах включены только в одной из них.
+    run_background_jobs: bool = _parse_bool(os.getenv("RUN_BACKGROUND_JOBS"), True)
+
     @property
     def working_hours_start(self) -> str:
         return self.workday_start
@@ -1,6 +1,6 @@
 from __future__ import annotations
 import enum
-from datetime import datetime, time
+from datetime import date, datetime, time
 from decimal import Decimal
 from typing import Any, Optional
 
@@ -455,6 +455,13 @@ class staff_access_code_cities(Base):
 # ===== Orders & History =====
 
 
+# Statuses of the admin order queue (admin_bot.services._common.QUEUE_STATUSES)
+_QUEUE_STATUSES_PREDICATE = (
+    "status IN ('SEARCHING','ASSIGNED','EN_ROUTE','WORKING','PAYMENT',"
+    "'GUARANTEE','DEFERRED')"
+)
+
+
 class orders(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     city_id: Mapped[int] = mapped_column(
@@ -646,6 +653,20 @@ class orders(Base):
             "city_id",
             "timeslot_start_utc",
         ),
+        # Keyset pages of the admin queue: ORDER BY (created_at, id) DESC
+        Index(
+            "ix_orders__queue_created",
+            "created_at",
+            "id",
+            postgresql_where=text(_QUEUE_STATUSES_PREDICATE),
+        ),
+        Index(
+            "ix_orders__queue_city_created",
+            "city_id",
+            "created_at",
+            "id",
+            postgresql_where=text(_QUEUE_STATUSES_PREDICATE),
+        ),
     )
 class order_status_history(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -683,6 +704,82 @@ class order_status_history(Base):
     )
 
 
+class order_status_history_archive(Base):
+    """History of archived (long closed) orders, monthly partitions by created_at.
+
+    Same columns as ``order_status_history``; rows are moved here by
+    ``autoclose_scheduler.archive_closed_orders``.
+    """
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    order_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    from_status: Mapped[Optional[OrderStatus]] = mapped_column(
+        Enum(OrderStatus, name="order_status"), nullable=True
+    )
+    to_status: Mapped[OrderStatus] = mapped_column(
+        Enum(OrderStatus, name="order_status"), nullable=False
+    )
+    reason: Mapped[Optional[str]] = mapped_column(Text)
+    changed_by_staff_id: Mapped[Optional[int]] = mapped_column(Integer)
+    changed_by_master_id: Mapped[Optional[int]] = mapped_column(Integer)
+    actor_type: Mapped[ActorType] = mapped_column(
+        Enum(ActorType, name="actor_type"), nullable=False
+    )
+    context: Mapped[dict[str, Any]] = mapped_column(
+        JSONB, nullable=False, default=dict, server_default=text("'{}'::jsonb")
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_order_status_history_archive__order", "order_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class order_lifecycle(Base):
+    """One row per order: first/last time the order entered each status.
+
+    Projection of ``order_status_history`` maintained by the
+    ``trg_order_status_history__lifecycle`` trigger (migration
+    2025_10_19_0001); rebuilt by services.order_lifecycle_service.
+    """
+
+    order_id: Mapped[int] = mapped_column(
+        ForeignKey("orders.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    first_created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_created_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_searching_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_searching_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_assigned_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_assigned_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_en_route_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_en_route_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_working_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_working_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_payment_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_payment_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_closed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_closed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_deferred_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_deferred_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_guarantee_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_guarantee_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    first_canceled_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    last_canceled_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    # Reason of the latest transition to CANCELED
+    cancel_reason: Mapped[Optional[str]] = mapped_column(Text)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
 # ===== Offers =====
 
 
@@ -741,6 +838,33 @@ class offers(Base):
     )
 
 
+class offers_archive(Base):
+    """Offers of archived (long closed) orders, monthly partitions by created_at."""
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    order_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    master_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    round_number: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+    state: Mapped[OfferState] = mapped_column(
+        Enum(OfferState, name="offer_state"), nullable=False
+    )
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    responded_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        Index("ix_offers_archive__order", "order_id"),
+        Index("ix_offers_archive__master_state", "master_id", "state"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
 # ===== Attachments =====
 
 
@@ -834,6 +958,13 @@ class commissions(Base):
         Index("ix_commissions__status_deadline", "status", "deadline_at"),
         Index("ix_commissions__master_status", "master_id", "status"),
         Index("ix_commissions__ispaid_deadline", "is_paid", "deadline_at"),
+        # Массовое одобрение за период (bulk_approve_commissions)
+        Index(
+            "ix_commissions__wait_pay_created",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'WAIT_PAY'"),
+        ),
     )
 
 
@@ -1014,6 +1145,15 @@ class notifications_outbox(Base):
     )
     last_error: Mapped[Optional[str]] = mapped_column(Text)
 
+    __table_args__ = (
+        # Захват батча диспетчером: ORDER BY id среди необработанных
+        Index(
+            "ix_notifications_outbox__pending",
+            "id",
+            postgresql_where=text("processed_at IS NULL"),
+        ),
+    )
+
 
 # P1-01: Autoclose queue
 class order_autoclose_queue(Base):
@@ -1040,6 +1180,11 @@ class order_autoclose_queue(Base):
         DateTime(timezone=True),
         server_default=func.now()
     )
+    # История и офферы заказа перенесены в *_archive
+    archived_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True
+    )
     
     __table_args__ = (
         Index(
@@ -1047,6 +1192,11 @@ class order_autoclose_queue(Base):
             "autoclose_at",
             postgresql_where=text("processed_at IS NULL")
         ),
+        Index(
+            "ix_order_autoclose_queue__archive",
+            "closed_at",
+            postgresql_where=text("processed_at IS NOT NULL AND archived_at IS NULL")
+        ),
     )
 
 
@@ -1119,6 +1269,90 @@ class distribution_metrics(Base):
     )
 
 
+class _distribution_rollup_counters:
+    """Counters shared by the distribution_metrics rollups.
+
+    Maintained by the ``trg_distribution_metrics__rollups`` trigger
+    (migration 2025_10_19_0002), see services.distribution_metrics_service.
+    ``master_id`` is 0 for metrics without a master.
+    """
+
+    city_id: Mapped[int] = mapped_column(
+        ForeignKey("cities.id", ondelete="CASCADE"), primary_key=True
+    )
+    master_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    assignments: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # assignments with time_to_assign_seconds set
+    tta_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    tta_sum: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default="0"
+    )
+    round_sum: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    candidates_sum: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    preferred_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    logist_escalations: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    admin_escalations: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # escalated to logist or admin
+    escalations: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    round_1: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    round_2: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    round_3_plus: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # time to assign < 2 min
+    tta_fast: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # 2-5 min
+    tta_medium: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # > 5 min
+    tta_slow: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    via_master_bot: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    via_admin_manual: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+
+
+class distribution_metrics_hourly(_distribution_rollup_counters, Base):
+    """distribution_metrics aggregated per (hour, city, master)."""
+
+    bucket_start: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+
+
+class distribution_metrics_daily(_distribution_rollup_counters, Base):
+    """distribution_metrics aggregated per (UTC day, city, master)."""
+
+    bucket_date: Mapped[date] = mapped_column(Date, primary_key=True)
+
+
 
 
 
@@ -1153,3 +1387,124 @@ class commission_deadline_notifications(Base):
         ),
         Index("ix_commission_deadline_notifications__commission", "commission_id"),
     )
+
+
+# ===== Master stats projection =====
+
+
+class master_stats(Base):
+    """Per-master rolling stats used by candidate ranking and commission rate.
+
+    Maintained by the ``trg_orders__master_stats`` trigger on orders, the
+    ``trg_offers__master_stats`` / ``trg_offers_archive__master_stats``
+    triggers on offers and reconciled periodically
+    (see services.master_stats_service).
+    """
+
+    master_id: Mapped[int] = mapped_column(
+        ForeignKey("masters.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # ASSIGNED / EN_ROUTE / WORKING / PAYMENT
+    active_cnt: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # AVG(total_sum) over PAYMENT/CLOSED orders created in the last 7 days
+    avg_week_check: Mapped[Decimal] = mapped_column(
+        Numeric(10, 2), nullable=False, default=0, server_default="0"
+    )
+    # CLOSED orders created in the last 7 days (commission rate base)
+    week_closed_cnt: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    week_closed_sum: Mapped[Decimal] = mapped_column(
+        Numeric(12, 2), nullable=False, default=0, server_default="0"
+    )
+    closed_total: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # CLOSED orders with updated_at in the month starting at month_start (UTC)
+    month_start: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    month_closed_cnt: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # ACCEPTED offers (hot + archive) and SUM(responded_at - sent_at) in seconds
+    accepted_offers_cnt: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    response_seconds_sum: Mapped[Decimal] = mapped_column(
+        Numeric(18, 6), nullable=False, default=0, server_default="0"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class order_section_counters(Base):
+    """Per-city counters of the admin orders menu sections.
+
+    ``queue`` / ``closed_total`` follow order status transitions
+    (``trg_orders__section_counters``), ``guarantee`` follows
+    ``order_warranty_window`` (see services.order_sections_service).
+    """
+
+    city_id: Mapped[int] = mapped_column(
+        ForeignKey("cities.id", ondelete="CASCADE"), primary_key=True
+    )
+    section: Mapped[str] = mapped_column(String(16), primary_key=True)
+    cnt: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class order_warranty_window(Base):
+    """CLOSED non-guarantee orders whose commission was approved < 14 days ago."""
+
+    order_id: Mapped[int] = mapped_column(
+        ForeignKey("orders.id", ondelete="CASCADE"), primary_key=True
+    )
+    city_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_order_warranty_window__expires_at", "expires_at"),
+    )
+
+
+# ===== Distribution sharding =====
+
+
+class distribution_workers(Base):
+    """Live distribution scheduler replicas (heartbeat registry)."""
+
+    worker_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    started_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    heartbeat_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class distribution_city_leases(Base):
+    """City -> scheduler replica that distributes its orders.
+
+    See services.distribution.city_leases.
+    """
+
+    city_id: Mapped[int] = mapped_column(
+        ForeignKey("cities.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    worker_id: Mapped[str] = mapped_column(String(128), nullable=False, index=True)
+    acquired_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
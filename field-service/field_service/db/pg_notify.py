@@ -0,0 +1,101 @@
+"""Postgres LISTEN/NOTIFY helpers shared by the process-local caches.
+
+``notify()`` issues ``pg_notify`` inside the caller's transaction (delivered
+on COMMIT, dropped on rollback); on other dialects (sqlite in tests) it is a
+no-op. ``listen()`` keeps a LISTEN on a dedicated pooled connection and
+reconnects after failures; ``on_connect`` / ``on_disconnect`` let the owner
+track whether notifications are currently being received.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("db.pg_notify")
+
+RECONNECT_DELAY_SECONDS = 5
+HEALTHCHECK_SECONDS = 30
+
+# asyncpg listener callback: (connection, pid, channel, payload)
+NotifyCallback = Callable[[Any, int, str, str], None]
+
+
+def is_postgres(session: AsyncSession) -> bool:
+    bind = getattr(session, "bind", None)
+    return (getattr(getattr(bind, "dialect", None), "name", "") or "") == "postgresql"
+
+
+async def notify(session: AsyncSession, channel: str, payload: str = "") -> bool:
+    """``pg_notify(channel, payload)`` in the session's transaction.
+
+    Returns False when the session is not bound to Postgres (nothing sent).
+    """
+    if not is_postgres(session):
+        return False
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)").bindparams(
+            channel=channel, payload=payload
+        )
+    )
+    return True
+
+
+async def listen(
+    channel: str,
+    callback: NotifyCallback,
+    *,
+    on_connect: Optional[Callable[[], None]] = None,
+    on_disconnect: Optional[Callable[[], None]] = None,
+    reconnect_delay: float = RECONNECT_DELAY_SECONDS,
+    healthcheck_seconds: float = HEALTHCHECK_SECONDS,
+) -> None:
+    """LISTEN on ``channel`` until cancelled; reconnects on failure.
+
+    ``on_disconnect`` runs after every lost or failed connection, before the
+    reconnect delay: notifications sent meanwhile are not delivered.
+    """
+    from field_service.db.session import engine
+
+    while True:
+        conn = None
+        driver = None
+        try:
+            conn = await engine.connect()
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            await driver.add_listener(channel, callback)
+            if on_connect is not None:
+                on_connect()
+            logger.info("listener connected channel=%s", channel)
+            while not driver.is_closed():
+                await asyncio.sleep(healthcheck_seconds)
+            logger.warning("listener connection closed channel=%s", channel)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.warning("listener error channel=%s: %s", channel, exc)
+        finally:
+            if conn is not None:
+                try:
+                    # The connection goes back to the pool: drop the LISTEN
+                    if driver is not None and not driver.is_closed():
+                        await driver.remove_listener(channel, callback)
+                    await conn.close()
+                except Exception:
+                    pass
+            if on_disconnect is not None:
+                on_disconnect()
+        await asyncio.sleep(reconnect_delay)
+
+
+__all__ = [
+    "HEALTHCHECK_SECONDS",
+    "RECONNECT_DELAY_SECONDS",
+    "is_postgres",
+    "listen",
+    "notify",
+]
@@ -6,13 +6,15 @@ from typing import Any
 import html
 
 from aiogram import Bot
-from aiogram.exceptions import TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 
 from field_service.config import settings
+from field_service.infra.rate_limiter import Priority, get_limiter
 
 __all__ = ["send_log", "send_alert", "send_report"]
 
 _MAX_MESSAGE_LEN = 4096
+_RETRY_AFTER_ATTEMPTS = 3
 _logger = logging.getLogger(__name__)
 
 
@@ -41,6 +43,8 @@ async def _safe_send(
     bot: Bot | None,
     chat_id: int | None,
     text: str,
+    *,
+    priority: Priority = Priority.REMINDER,
     **kwargs: Any,
 ) -> None:
     if bot is None or chat_id is None:
@@ -48,8 +52,18 @@ async def _safe_send(
     payload = html.escape(_trim_message(text), quote=False)
     if not payload:
         return
+    limiter = get_limiter(bot)
     try:
-        await bot.send_message(chat_id, payload, **kwargs)
+        for attempt in range(_RETRY_AFTER_ATTEMPTS):
+            await limiter.acquire(chat_id, priority=priority)
+            try:
+                await bot.send_message(chat_id, payload, **kwargs)
+                return
+            except TelegramRetryAfter as exc:
+                # Flood control: back off this chat only and retry
+                limiter.retry_after(chat_id, float(exc.retry_after))
+                if attempt + 1 >= _RETRY_AFTER_ATTEMPTS:
+                    raise
     except TelegramBadRequest as exc:
         _logger.warning("Failed to deliver message to chat_id=%s: %s", chat_id, exc)
     except Exception:
@@ -81,7 +95,7 @@ async def send_alert(
 
     target = chat_id if chat_id is not None else settings.alerts_channel_id
     payload = _compose_alert(text, exc)
-    await _safe_send(bot, target, payload, **kwargs)
+    await _safe_send(bot, target, payload, priority=Priority.ALERT, **kwargs)
 
 
 
@@ -0,0 +1,195 @@
+"""Shared rate limiting for outgoing Telegram calls.
+
+One ``TelegramRateLimiter`` per bot token combines:
+
+- a global token bucket (Telegram allows ~30 messages/s per bot);
+- per-chat buckets: private chats ~1 msg/s, groups and channels 20 msg/min;
+- priority lanes for the global bucket: when it is exhausted the waiting
+  senders are served ALERT > INTERACTIVE > OFFER > REMINDER.
+
+``TelegramRetryAfter`` for one chat only pauses that chat's bucket, other
+chats keep going. Used by ``bots.common.telegram_safe``, ``infra.notify`` and
+the notifications outbox watcher.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from enum import IntEnum
+from time import monotonic
+from typing import Any, Optional
+
+__all__ = [
+    "Priority",
+    "TelegramRateLimiter",
+    "TokenBucket",
+    "get_limiter",
+    "reset_limiters",
+]
+
+GLOBAL_RATE_PER_SECOND = 30.0
+GLOBAL_BURST = 30
+PRIVATE_CHAT_RATE_PER_SECOND = 1.0
+# A handler usually answers with edit + send: allow a short burst
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_RATE_PER_SECOND = 20 / 60
+GROUP_CHAT_BURST = 5
+# Idle per-chat buckets are dropped to keep memory bounded
+_CHAT_BUCKETS_MAX = 10_000
+
+
+class Priority(IntEnum):
+    ALERT = 0
+    INTERACTIVE = 1
+    OFFER = 2
+    REMINDER = 3
+
+
+class TokenBucket:
+    """Classic token bucket on the monotonic clock."""
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated_at", "_paused_until")
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated_at = monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = now
+
+    def reserve(self, now: Optional[float] = None) -> float:
+        """Take a token, possibly in advance; returns seconds to wait."""
+        now = monotonic() if now is None else now
+        self._refill(now)
+        self._tokens -= 1.0
+        wait = 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+        return max(wait, self._paused_until - now)
+
+    def try_take(self, now: Optional[float] = None) -> bool:
+        now = monotonic() if now is None else now
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def time_until_token(self, now: Optional[float] = None) -> float:
+        now = monotonic() if now is None else now
+        self._refill(now)
+        wait = 0.0 if self._tokens >= 1.0 else (1.0 - self._tokens) / self.rate
+        return max(wait, self._paused_until - now)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, monotonic() + max(0.0, seconds))
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self._tokens >= self.capacity and now >= self._paused_until
+
+
+class TelegramRateLimiter:
+    def __init__(
+        self,
+        *,
+        global_rate: float = GLOBAL_RATE_PER_SECOND,
+        global_burst: int = GLOBAL_BURST,
+    ) -> None:
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: dict[int, TokenBucket] = {}
+        self._waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task[None]] = None
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _CHAT_BUCKETS_MAX:
+                now = monotonic()
+                for key in [k for k, b in self._chats.items() if b.idle(now)]:
+                    del self._chats[key]
+            if chat_id < 0:
+                bucket = TokenBucket(GROUP_CHAT_RATE_PER_SECOND, GROUP_CHAT_BURST)
+            else:
+                bucket = TokenBucket(PRIVATE_CHAT_RATE_PER_SECOND, PRIVATE_CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def acquire(
+        self,
+        chat_id: Optional[int] = None,
+        *,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> None:
+        """Wait for a send slot in the chat and in the global bucket."""
+        if chat_id is not None:
+            wait = self._chat_bucket(int(chat_id)).reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        if not self._waiters and self._global.try_take():
+            return
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        self._ensure_pump()
+        await future
+
+    def _ensure_pump(self) -> None:
+        pump = self._pump
+        loop = asyncio.get_running_loop()
+        if pump is None or pump.done() or pump.get_loop() is not loop:
+            self._pump = loop.create_task(self._run_pump(), name="telegram_rate_limiter")
+
+    async def _run_pump(self) -> None:
+        # Grants global tokens to the waiters in priority order
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            wait = self._global.time_until_token()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            waiter = heapq.heappop(self._waiters)
+            future = waiter[2]
+            if future.done() or future.get_loop() is not loop:
+                continue  # cancelled sender or a waiter of a closed loop
+            if self._global.try_take():
+                future.set_result(None)
+            else:
+                heapq.heappush(self._waiters, waiter)
+
+    def retry_after(self, chat_id: Optional[int], seconds: float) -> None:
+        """Flood control from Telegram: back off only the affected chat."""
+        if chat_id is None:
+            self._global.pause(seconds)
+        else:
+            self._chat_bucket(int(chat_id)).pause(seconds)
+
+
+_LIMITERS: dict[Any, TelegramRateLimiter] = {}
+
+
+def _bot_key(bot: Any) -> Any:
+    try:
+        return ("bot", int(bot.id))
+    except Exception:
+        return ("obj", id(bot))
+
+
+def get_limiter(bot: Any) -> TelegramRateLimiter:
+    """Limiter shared by every sender of the bot token in this process."""
+    key = _bot_key(bot)
+    limiter = _LIMITERS.get(key)
+    if limiter is None:
+        limiter = TelegramRateLimiter()
+        _LIMITERS[key] = limiter
+    return limiter
+
+
+def reset_limiters() -> None:
+    _LIMITERS.clear()
@@ -1,5 +1,12 @@
 """
 P1-01: Service for automatic order closure after 24 hours
+
+Archive mode (``autoclose_archive_after_days`` > 0) only moves the satellite
+rows of long-closed orders - ``order_status_history`` and ``offers`` - into the
+monthly partitioned ``*_archive`` tables. The ``orders`` rows themselves are
+NOT archived: commissions reference them with ON DELETE CASCADE (and referral
+rewards reference commissions), so moving an order would drop its financial
+records. The hot ``orders`` table keeps every order.
 """
 from __future__ import annotations
 
@@ -7,18 +14,24 @@ import asyncio
 import logging
 from datetime import datetime, timedelta, timezone
 
-from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy import insert, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
-from field_service.services import live_log
+from field_service.services import live_log, settings_service
 
 UTC = timezone.utc
 logger = logging.getLogger("autoclose")
 
 # Задержка автозакрытия (24 часа)
 AUTOCLOSE_DELAY_HOURS = 24
+AUTOCLOSE_BATCH_SIZE = 500
+
+# Архив: через сколько дней после закрытия переносить историю и офферы
+# заказа в *_archive (0 = выключено). Сами заказы в архив не переносятся.
+ARCHIVE_AFTER_DAYS_SETTING = "autoclose_archive_after_days"
+ARCHIVE_BATCH_SIZE = 500
 
 
 async def enqueue_order_for_autoclose(
@@ -65,99 +78,240 @@ async def enqueue_order_for_autoclose(
     live_log.push("autoclose", f"order#{order_id} enqueued for autoclose at {autoclose_at}")
 
 
+# Один CTE на пачку: due-строки очереди (SKIP LOCKED), запись в историю для
+# заказов, которые всё ещё CLOSED, и отметка processed_at.
+# Строки удалённых заказов уходят из очереди по ON DELETE CASCADE.
+_AUTOCLOSE_SQL = text(
+    """
+    WITH due AS (
+        SELECT q.order_id, o.status
+          FROM order_autoclose_queue q
+          JOIN orders o ON o.id = q.order_id
+         WHERE q.autoclose_at <= CAST(:now AS TIMESTAMPTZ)
+           AND q.processed_at IS NULL
+         ORDER BY q.autoclose_at
+         LIMIT :limit
+           FOR UPDATE OF q SKIP LOCKED
+    ),
+    logged AS (
+        INSERT INTO order_status_history (order_id, from_status, to_status, reason, actor_type)
+        SELECT order_id,
+               CAST('CLOSED' AS order_status),
+               CAST('CLOSED' AS order_status),
+               'autoclose_24h',
+               CAST('SYSTEM' AS actor_type)
+          FROM due
+         WHERE status = 'CLOSED'
+        RETURNING order_id
+    ),
+    marked AS (
+        UPDATE order_autoclose_queue q
+           SET processed_at = CAST(:now AS TIMESTAMPTZ)
+          FROM due
+         WHERE q.order_id = due.order_id
+        RETURNING q.order_id
+    )
+    SELECT (SELECT COUNT(*) FROM marked) AS processed,
+           (SELECT COUNT(*) FROM logged) AS closed
+    """
+)
+
+
 async def process_autoclose_queue(
     session_factory=SessionLocal,
     *,
     now: datetime | None = None,
+    batch_size: int = AUTOCLOSE_BATCH_SIZE,
 ) -> int:
     """
     Обработать очередь автозакрытия.
+
+    Пачки по batch_size обрабатываются одним запросом (_AUTOCLOSE_SQL) и
+    коммитятся по отдельности, пока очередь не опустеет.
     
     Returns:
         Количество обработанных заказов
     """
     if now is None:
         now = datetime.now(UTC)
-    
+
+    processed_total = 0
+    closed_total = 0
     async with session_factory() as session:
-        # Находим заказы готовые к автозакрытию
-        stmt = (
-            select(
-                m.order_autoclose_queue.order_id,
-                m.order_autoclose_queue.closed_at,
-            )
-            .where(
-                and_(
-                    m.order_autoclose_queue.autoclose_at <= now,
-                    m.order_autoclose_queue.processed_at.is_(None),
+        while True:
+            row = (
+                await session.execute(
+                    _AUTOCLOSE_SQL.bindparams(now=now, limit=batch_size)
                 )
-            )
-            .limit(100)  # Обрабатываем пачками
+            ).one()
+            await session.commit()
+            processed_total += int(row.processed)
+            closed_total += int(row.closed)
+            if row.processed < batch_size:
+                break
+
+    if processed_total:
+        live_log.push(
+            "autoclose",
+            f"auto-closed {closed_total} orders after 24h (queue rows {processed_total})",
+            level="INFO",
         )
-        
-        rows = (await session.execute(stmt)).all()
-        
-        if not rows:
-            return 0
-        
-        processed_count = 0
-        
-        for order_id, closed_at in rows:
-            try:
-                async with session.begin_nested():
-                    # Проверяем актуальный статус заказа
-                    order = await session.get(m.orders, order_id)
-                    
-                    if not order:
-                        # Заказ удалён - удаляем из очереди
-                        await session.execute(
-                            delete(m.order_autoclose_queue)
-                            .where(m.order_autoclose_queue.order_id == order_id)
-                        )
-                        continue
-                    
-                    # Если статус всё ещё CLOSED - архивируем
-                    if order.status == m.OrderStatus.CLOSED:
-                        # В будущем здесь может быть перенос в архивную таблицу
-                        # Пока просто помечаем как обработанное
-                        
-                        # Логируем автозакрытие
-                        await session.execute(
-                            insert(m.order_status_history).values(
-                                order_id=order_id,
-                                from_status=m.OrderStatus.CLOSED,
-                                to_status=m.OrderStatus.CLOSED,
-                                reason="autoclose_24h",
-                                actor_type=m.ActorType.SYSTEM,
-                            )
-                        )
-                        
-                        live_log.push(
-                            "autoclose",
-                            f"order#{order_id} auto-closed after 24h",
-                            level="INFO",
-                        )
-                    
-                    # Помечаем как обработанное
-                    await session.execute(
-                        update(m.order_autoclose_queue)
-                        .where(m.order_autoclose_queue.order_id == order_id)
-                        .values(processed_at=now)
-                    )
-                    
-                    processed_count += 1
-                    
-            except Exception as exc:
-                logger.exception("Failed to autoclose order %s: %s", order_id, exc)
-                live_log.push(
-                    "autoclose",
-                    f"order#{order_id} autoclose failed: {exc}",
-                    level="ERROR",
+    return processed_total
+
+
+# ===== Архив =====
+
+_ARCHIVE_PICK_SQL = text(
+    """
+    SELECT q.order_id
+      FROM order_autoclose_queue q
+      JOIN orders o ON o.id = q.order_id
+     WHERE q.processed_at IS NOT NULL
+       AND q.archived_at IS NULL
+       AND q.closed_at < CAST(:cutoff AS TIMESTAMPTZ)
+       AND o.status = 'CLOSED'
+     ORDER BY q.closed_at
+     LIMIT :limit
+       FOR UPDATE OF q SKIP LOCKED
+    """
+)
+
+_ARCHIVE_MONTHS_SQL = text(
+    """
+    SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') AS month
+      FROM order_status_history
+     WHERE order_id = ANY(:ids)
+    UNION
+    SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')
+      FROM offers
+     WHERE order_id = ANY(:ids)
+    """
+)
+
+_ARCHIVE_HISTORY_SQL = text(
+    """
+    WITH moved AS (
+        DELETE FROM order_status_history
+         WHERE order_id = ANY(:ids)
+        RETURNING id, order_id, from_status, to_status, reason, changed_by_staff_id,
+                  changed_by_master_id, actor_type, context, created_at
+    )
+    INSERT INTO order_status_history_archive (
+        id, order_id, from_status, to_status, reason, changed_by_staff_id,
+        changed_by_master_id, actor_type, context, created_at
+    )
+    SELECT id, order_id, from_status, to_status, reason, changed_by_staff_id,
+           changed_by_master_id, actor_type, context, created_at
+      FROM moved
+    """
+)
+
+_ARCHIVE_OFFERS_SQL = text(
+    """
+    WITH moved AS (
+        DELETE FROM offers
+         WHERE order_id = ANY(:ids)
+        RETURNING id, order_id, master_id, round_number, state, sent_at,
+                  responded_at, expires_at, created_at
+    )
+    INSERT INTO offers_archive (
+        id, order_id, master_id, round_number, state, sent_at,
+        responded_at, expires_at, created_at
+    )
+    SELECT id, order_id, master_id, round_number, state, sent_at,
+           responded_at, expires_at, created_at
+      FROM moved
+    """
+)
+
+_ARCHIVE_MARK_SQL = text(
+    """
+    UPDATE order_autoclose_queue
+       SET archived_at = CAST(:now AS TIMESTAMPTZ)
+     WHERE order_id = ANY(:ids)
+    """
+)
+
+_ARCHIVE_TABLES = ("order_status_history_archive", "offers_archive")
+
+
+def _month_bounds(month: datetime) -> tuple[datetime, datetime]:
+    start = month.replace(day=1, hour=0, minute=0, second=0, microsecond=0, tzinfo=UTC)
+    if start.month == 12:
+        end = start.replace(year=start.year + 1, month=1)
+    else:
+        end = start.replace(month=start.month + 1)
+    return start, end
+
+
+async def _ensure_archive_partitions(session: AsyncSession, months) -> None:
+    """Месячные партиции архивных таблиц (CREATE TABLE IF NOT EXISTS)."""
+    for month in months:
+        start, end = _month_bounds(month)
+        for table in _ARCHIVE_TABLES:
+            await session.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {table}_{start:%Y_%m} "
+                    f"PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
                 )
-        
-        await session.commit()
-        
-        return processed_count
+            )
+
+
+async def archive_closed_orders(
+    session_factory=SessionLocal,
+    *,
+    older_than_days: int,
+    now: datetime | None = None,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """
+    Перенести историю статусов и офферы давно закрытых заказов в архив.
+
+    Берутся заказы из очереди автозакрытия: обработанные, всё ещё CLOSED и
+    закрытые раньше older_than_days дней назад. Их строки order_status_history
+    и offers переносятся (DELETE ... RETURNING -> INSERT) в помесячно
+    партиционированные order_status_history_archive / offers_archive, в
+    очереди ставится archived_at. Сами заказы остаются в orders: на них
+    ссылаются комиссии и реферальные начисления, а сводка по статусам есть в
+    order_lifecycle.
+
+    Returns:
+        Количество заархивированных заказов
+    """
+    if older_than_days <= 0:
+        return 0
+    if now is None:
+        now = datetime.now(UTC)
+    cutoff = now - timedelta(days=older_than_days)
+
+    archived = 0
+    async with session_factory() as session:
+        while True:
+            ids = [
+                int(row[0])
+                for row in await session.execute(
+                    _ARCHIVE_PICK_SQL.bindparams(cutoff=cutoff, limit=batch_size)
+                )
+            ]
+            if not ids:
+                await session.commit()
+                break
+            months = (
+                await session.execute(_ARCHIVE_MONTHS_SQL.bindparams(ids=ids))
+            ).scalars().all()
+            await _ensure_archive_partitions(session, months)
+            await session.execute(_ARCHIVE_HISTORY_SQL.bindparams(ids=ids))
+            await session.execute(_ARCHIVE_OFFERS_SQL.bindparams(ids=ids))
+            await session.execute(_ARCHIVE_MARK_SQL.bindparams(ids=ids, now=now))
+            await session.commit()
+            archived += len(ids)
+            if len(ids) < batch_size:
+                break
+
+    if archived:
+        live_log.push("autoclose", f"archived {archived} closed orders", level="INFO")
+    return archived
 
 
 async def autoclose_scheduler(
@@ -185,11 +339,14 @@ async def autoclose_scheduler(
             
             if count > 0:
                 logger.info("Autoclose processed %s orders", count)
-                live_log.push(
-                    "autoclose",
-                    f"processed {count} orders",
-                    level="INFO",
+
+            archive_days = await settings_service.get_int(ARCHIVE_AFTER_DAYS_SETTING, 0)
+            if archive_days > 0:
+                archived = await archive_closed_orders(
+                    session_factory, older_than_days=archive_days
                 )
+                if archived > 0:
+                    logger.info("Autoclose archived %s orders", archived)
         except Exception as exc:
             logger.exception("Autoclose scheduler error: %s", exc)
             live_log.push(
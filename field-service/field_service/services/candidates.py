@@ -12,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
 from field_service.services import distribution_scheduler as ds
+from field_service.services.distribution import proximity
 from field_service.services.skills_map import get_skill_code
 from field_service.infra.structured_logging import log_candidate_rejection
 
@@ -56,6 +57,8 @@ class CandidateInfo:
     has_skill: bool
     has_open_offer: bool
     random_rank: float
+    distance_km: float | None = None
+    distance_band: int = 0
 
 
 _REASON_LABELS: dict[str, str] = {
@@ -77,6 +80,15 @@ def _order_attr(order: Any, name: str, default: Any = None) -> Any:
     return getattr(order, name, default)
 
 
+def _coerce_coordinate(value: Any) -> float | None:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
 def _log_rejection(
     order_id: int,
     candidate_id: int,
@@ -176,8 +188,9 @@ async def select_candidates(
         "DATETIME('now', '-7 days')" if is_sqlite else "NOW() - INTERVAL '7 days'"
     )
 
-    sql = text(
-        f"""
+    if is_sqlite:
+        # No master_stats trigger in sqlite: aggregate order history on the fly
+        stats_cte = f"""
 WITH active_cnt AS (
     SELECT assigned_master_id AS mid, COUNT(*) AS cnt
       FROM orders
@@ -192,7 +205,20 @@ avg7 AS (
        AND status IN ('PAYMENT','CLOSED')
        AND created_at >= {date_7days_ago}
       GROUP BY assigned_master_id
-)
+)"""
+        stats_join = """
+LEFT JOIN active_cnt ac ON ac.mid = m.id
+LEFT JOIN avg7 a ON a.mid = m.id"""
+        active_col, avg_col = "ac.cnt", "a.avg_check"
+    else:
+        # active_cnt / avg_week_check are maintained in the master_stats projection
+        stats_cte = ""
+        stats_join = """
+LEFT JOIN master_stats st ON st.master_id = m.id"""
+        active_col, avg_col = "st.active_cnt", "st.avg_week_check"
+
+    sql = text(
+        f"""{stats_cte}
 SELECT
     m.id AS mid,
     m.full_name,
@@ -203,9 +229,9 @@ SELECT
     m.break_until,
     m.is_active,
     m.verified,
-    COALESCE(ac.cnt, 0) AS active_cnt,
+    COALESCE({active_col}, 0) AS active_cnt,
     COALESCE(m.max_active_orders_override, :gmax) AS max_limit,
-    COALESCE(a.avg_check, 0) AS avg_week,
+    COALESCE({avg_col}, 0) AS avg_week,
     ((:did IS NULL) OR EXISTS (
         SELECT 1 FROM master_districts md
          WHERE md.master_id = m.id AND md.district_id = :did
@@ -223,9 +249,7 @@ SELECT
            AND o.master_id = m.id
                AND o.state IN ({offer_states_sql})
        ) AS has_open_offer
-FROM masters m
-LEFT JOIN active_cnt ac ON ac.mid = m.id
-LEFT JOIN avg7 a ON a.mid = m.id
+FROM masters m{stats_join}
 WHERE m.city_id = :cid
   AND m.is_blocked = FALSE
 ORDER BY m.id
@@ -331,8 +355,20 @@ ORDER BY m.id
             )
         )
 
+    # Proximity term: candidates nearer to the order come first
+    bands = await proximity.candidate_bands(
+        session,
+        city_id=city_id,
+        lat=_coerce_coordinate(_order_attr(order, "lat")),
+        lon=_coerce_coordinate(_order_attr(order, "lon")),
+        master_ids=[item.master_id for item in candidates],
+    )
+    for item in candidates:
+        item.distance_band, item.distance_km = bands.get(item.master_id, (0, None))
+
     candidates.sort(
         key=lambda item: (
+            item.distance_band,
             -int(item.has_car),
             -item.avg_week_check,
             -item.rating_avg,
@@ -11,6 +11,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.config import settings
 from field_service.db import models as m
+from field_service.services import master_stats_service
 from field_service.services import owner_requisites_service as owner_service
 from field_service.services.settings_service import get_int
 
@@ -95,16 +96,18 @@ class CommissionService:
 
         # Начисляем реферальные бонусы
         from field_service.services import referral_service
-        await referral_service.apply_rewards_for_commission(
+        await referral_service.apply_rewards_for_commissions(
             self._session,
-            commission_id=commission.id,
-            master_id=master.id,
-            base_amount=commission.amount,
+            [(commission.id, master.id, commission.amount, order.id)],
         )
 
         return commission
 
     async def _get_avg_week_check(self, master_id: int) -> Decimal:
+        projected = await master_stats_service.get_week_closed_avg(self._session, master_id)
+        if projected is not None:
+            return _to_decimal(projected)
+        # Нет строки в master_stats (мастер без заказов) — считаем напрямую
         week_ago = datetime.now(UTC) - timedelta(days=7)
         stmt = (
             select(func.avg(m.orders.total_sum))
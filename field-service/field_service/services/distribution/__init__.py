@@ -1,3 +1,3 @@
-from . import wakeup
+from . import city_leases, eligibility_index, offer_expiry, wake_channel, wakeup
 
-__all__ = ["wakeup"]
\ No newline at end of file
+__all__ = ["city_leases", "eligibility_index", "offer_expiry", "wake_channel", "wakeup"]
@@ -0,0 +1,176 @@
+"""Per-city leases for horizontally sharded distribution.
+
+Every scheduler replica registers itself in ``distribution_workers`` and
+claims a fair share of cities in ``distribution_city_leases``:
+
+    share = ceil(cities / live_workers)
+
+On each tick a worker heartbeats, renews its leases, releases the excess
+when new replicas have joined and claims free or expired leases up to its
+share. Leases of a dead replica expire after ``LEASE_TTL_SECONDS`` and are
+picked up by the survivors, so cities are rebalanced without coordination.
+
+Claims are race-safe: ``INSERT .. ON CONFLICT DO UPDATE .. WHERE expires_at
+<= NOW()`` takes over a lease only if it is still expired when the row lock
+is obtained.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import uuid
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("distribution.city_leases")
+
+# Must be several ticks long: a lease survives a slow tick or a short DB hiccup
+LEASE_TTL_SECONDS = 60
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def _heartbeat(session: AsyncSession, worker_id: str, ttl: int) -> int:
+    """Register the worker and return the number of live workers."""
+    await session.execute(
+        text(
+            """
+        INSERT INTO distribution_workers (worker_id, started_at, heartbeat_at)
+        VALUES (:w, NOW(), NOW())
+        ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = NOW()
+        """
+        ).bindparams(w=worker_id)
+    )
+    # Dead replicas: their leases expire on their own, drop the registry rows
+    await session.execute(
+        text(
+            """
+        DELETE FROM distribution_workers
+         WHERE heartbeat_at < NOW() - make_interval(secs => :stale)
+        """
+        ).bindparams(stale=ttl * 2)
+    )
+    live = await session.scalar(
+        text(
+            """
+        SELECT COUNT(*) FROM distribution_workers
+         WHERE heartbeat_at >= NOW() - make_interval(secs => :ttl)
+        """
+        ).bindparams(ttl=ttl)
+    )
+    return max(1, int(live or 0))
+
+
+async def claim_cities(
+    session: AsyncSession,
+    *,
+    worker_id: str = WORKER_ID,
+    ttl_seconds: int = LEASE_TTL_SECONDS,
+) -> set[int]:
+    """Heartbeat, rebalance and return the ids of cities leased by ``worker_id``.
+
+    Commits the session: leases must be visible to other replicas right away.
+    """
+    workers = await _heartbeat(session, worker_id, ttl_seconds)
+
+    renewed = await session.execute(
+        text(
+            """
+        UPDATE distribution_city_leases
+           SET expires_at = NOW() + make_interval(secs => :ttl)
+         WHERE worker_id = :w
+        RETURNING city_id
+        """
+        ).bindparams(w=worker_id, ttl=ttl_seconds)
+    )
+    held = {int(row[0]) for row in renewed}
+
+    total = int(await session.scalar(text("SELECT COUNT(*) FROM cities")) or 0)
+    share = -(-total // workers) if total else 0
+
+    if len(held) > share:
+        # New replicas joined: hand over the excess (they claim it next tick)
+        excess = sorted(held)[share:]
+        await session.execute(
+            text(
+                """
+            DELETE FROM distribution_city_leases
+             WHERE worker_id = :w AND city_id = ANY(:ids)
+            """
+            ).bindparams(w=worker_id, ids=excess)
+        )
+        held.difference_update(excess)
+        logger.info(
+            "city leases released worker=%s cities=%s share=%s", worker_id, excess, share
+        )
+    elif len(held) < share:
+        claimed = await session.execute(
+            text(
+                """
+            INSERT INTO distribution_city_leases AS l (city_id, worker_id, acquired_at, expires_at)
+            SELECT c.id, :w, NOW(), NOW() + make_interval(secs => :ttl)
+              FROM cities c
+              LEFT JOIN distribution_city_leases cur ON cur.city_id = c.id
+             WHERE cur.city_id IS NULL OR cur.expires_at <= NOW()
+             ORDER BY c.id
+             LIMIT :lim
+            ON CONFLICT (city_id) DO UPDATE
+               SET worker_id = EXCLUDED.worker_id,
+                   acquired_at = EXCLUDED.acquired_at,
+                   expires_at = EXCLUDED.expires_at
+             WHERE l.expires_at <= NOW()
+            RETURNING city_id
+            """
+            ).bindparams(w=worker_id, ttl=ttl_seconds, lim=share - len(held))
+        )
+        new = {int(row[0]) for row in claimed}
+        if new:
+            logger.info(
+                "city leases claimed worker=%s cities=%s share=%s",
+                worker_id,
+                sorted(new),
+                share,
+            )
+        held |= new
+
+    await session.commit()
+    return held
+
+
+async def release_all(session: AsyncSession, *, worker_id: str = WORKER_ID) -> None:
+    """Graceful shutdown: free the leases so survivors pick them up at once."""
+    await session.execute(
+        text("DELETE FROM distribution_city_leases WHERE worker_id = :w").bindparams(
+            w=worker_id
+        )
+    )
+    await session.execute(
+        text("DELETE FROM distribution_workers WHERE worker_id = :w").bindparams(
+            w=worker_id
+        )
+    )
+    await session.commit()
+
+
+async def lease_owner(session: AsyncSession, city_id: int) -> Optional[str]:
+    """Worker currently holding a live lease on the city (diagnostics)."""
+    return await session.scalar(
+        text(
+            """
+        SELECT worker_id FROM distribution_city_leases
+         WHERE city_id = :cid AND expires_at > NOW()
+        """
+        ).bindparams(cid=city_id)
+    )
+
+
+__all__ = [
+    "LEASE_TTL_SECONDS",
+    "WORKER_ID",
+    "claim_cities",
+    "lease_owner",
+    "release_all",
+]
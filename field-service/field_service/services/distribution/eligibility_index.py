@@ -0,0 +1,190 @@
+"""Process-local index of statically eligible masters for auto-distribution.
+
+Static eligibility = city, districts, active skills and the verified /
+is_active / is_blocked flags. It changes rarely (moderation, onboarding,
+skill edits), so instead of joining masters x master_districts x
+master_skills x skills for every order the scheduler looks up
+``(city_id, district_id, skill_code) -> frozenset(master_id)`` here and only
+checks live state (shift, break, active limit, offers) in SQL.
+
+Freshness:
+- explicit ``invalidate()`` from DBMastersService moderation actions;
+- a fingerprint query checked at most every ``_FINGERPRINT_CHECK_SECONDS``:
+  catches changes made by other processes. ``master_skills`` /
+  ``master_districts`` have no ``updated_at``, so besides counts it sums a
+  hash of every (master, skill) / (master, district) pair - replacing one
+  district or skill with another keeps the count but changes the sum.
+  Masters are covered by MAX(updated_at) (onboarding and moderation bump it),
+  active skills by a hash of (id, code);
+- hard TTL ``_INDEX_TTL_SECONDS`` as a safety net for raw SQL edits.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("distribution.eligibility_index")
+
+_INDEX_TTL_SECONDS = 300
+_FINGERPRINT_CHECK_SECONDS = 5
+
+
+@dataclass(slots=True)
+class EligibilityIndex:
+    fingerprint: tuple
+    # (city_id, skill_code) -> masters of the city with the skill
+    by_city_skill: dict[tuple[int, str], frozenset[int]] = field(default_factory=dict)
+    # district_id -> masters working in the district
+    by_district: dict[int, frozenset[int]] = field(default_factory=dict)
+    # memoized intersections
+    _lookups: dict[tuple[int, Optional[int], str], tuple[int, ...]] = field(default_factory=dict)
+
+    def lookup(self, city_id: int, district_id: Optional[int], skill_code: str) -> tuple[int, ...]:
+        """Sorted master ids eligible for (city, district, skill).
+
+        district_id=None means citywide search (no district filter).
+        """
+        key = (int(city_id), district_id, skill_code)
+        cached = self._lookups.get(key)
+        if cached is not None:
+            return cached
+        masters = self.by_city_skill.get((int(city_id), skill_code), frozenset())
+        if district_id is not None:
+            masters = masters & self.by_district.get(int(district_id), frozenset())
+        result = tuple(sorted(masters))
+        self._lookups[key] = result
+        return result
+
+
+_INDEX: Optional[EligibilityIndex] = None
+_INDEX_BUILT_AT: Optional[float] = None
+_FINGERPRINT_CHECKED_AT: Optional[float] = None
+
+
+def invalidate() -> None:
+    """Drop the index; the next lookup rebuilds it."""
+    global _INDEX, _INDEX_BUILT_AT, _FINGERPRINT_CHECKED_AT
+    _INDEX = None
+    _INDEX_BUILT_AT = None
+    _FINGERPRINT_CHECKED_AT = None
+
+
+async def _fingerprint(session: AsyncSession) -> tuple:
+    row = (
+        await session.execute(
+            text(
+                """
+            SELECT (SELECT COUNT(*) FROM masters),
+                   (SELECT MAX(updated_at) FROM masters),
+                   (SELECT COUNT(*) FROM master_skills),
+                   (SELECT COALESCE(SUM(hashtext(master_id || ':' || skill_id)::bigint), 0)
+                      FROM master_skills),
+                   (SELECT COUNT(*) FROM master_districts),
+                   (SELECT COALESCE(SUM(hashtext(master_id || ':' || district_id)::bigint), 0)
+                      FROM master_districts),
+                   (SELECT COALESCE(SUM(hashtext(id || ':' || code)::bigint), 0)
+                      FROM skills WHERE is_active = TRUE)
+            """
+            )
+        )
+    ).first()
+    return tuple(row) if row is not None else ()
+
+
+async def _build(session: AsyncSession, fingerprint: tuple) -> EligibilityIndex:
+    city_skill: dict[tuple[int, str], set[int]] = {}
+    rows = await session.execute(
+        text(
+            """
+        SELECT m.id, m.city_id, s.code
+          FROM masters m
+          JOIN master_skills ms ON ms.master_id = m.id
+          JOIN skills s ON s.id = ms.skill_id AND s.is_active = TRUE
+         WHERE m.is_active = TRUE
+           AND m.is_blocked = FALSE
+           AND m.verified = TRUE
+           AND m.city_id IS NOT NULL
+        """
+        )
+    )
+    eligible: set[int] = set()
+    for mid, city_id, code in rows:
+        city_skill.setdefault((int(city_id), str(code)), set()).add(int(mid))
+        eligible.add(int(mid))
+
+    districts: dict[int, set[int]] = {}
+    if eligible:
+        rows = await session.execute(
+            text(
+                "SELECT master_id, district_id FROM master_districts"
+                " WHERE master_id = ANY(:mids)"
+            ).bindparams(mids=sorted(eligible))
+        )
+        for mid, did in rows:
+            districts.setdefault(int(did), set()).add(int(mid))
+
+    index = EligibilityIndex(
+        fingerprint=fingerprint,
+        by_city_skill={key: frozenset(v) for key, v in city_skill.items()},
+        by_district={key: frozenset(v) for key, v in districts.items()},
+    )
+    logger.debug(
+        "eligibility index rebuilt: masters=%s city_skill_keys=%s districts=%s",
+        len(eligible),
+        len(index.by_city_skill),
+        len(index.by_district),
+    )
+    return index
+
+
+async def get_index(session: AsyncSession, *, force_check: bool = False) -> EligibilityIndex:
+    """Return a fresh-enough index, rebuilding it when stale.
+
+    force_check=True skips the fingerprint throttle (used once per tick).
+    """
+    global _INDEX, _INDEX_BUILT_AT, _FINGERPRINT_CHECKED_AT
+    now = monotonic()
+    expired = _INDEX_BUILT_AT is None or now - _INDEX_BUILT_AT >= _INDEX_TTL_SECONDS
+    if _INDEX is not None and not expired:
+        if (
+            not force_check
+            and _FINGERPRINT_CHECKED_AT is not None
+            and now - _FINGERPRINT_CHECKED_AT < _FINGERPRINT_CHECK_SECONDS
+        ):
+            return _INDEX
+        fingerprint = await _fingerprint(session)
+        _FINGERPRINT_CHECKED_AT = now
+        if fingerprint == _INDEX.fingerprint:
+            return _INDEX
+    else:
+        fingerprint = await _fingerprint(session)
+
+    _INDEX = await _build(session, fingerprint)
+    _INDEX_BUILT_AT = now
+    _FINGERPRINT_CHECKED_AT = now
+    return _INDEX
+
+
+async def eligible_master_ids(
+    session: AsyncSession,
+    *,
+    city_id: int,
+    district_id: Optional[int],
+    skill_code: str,
+) -> tuple[int, ...]:
+    """Sorted ids of statically eligible masters for (city, district, skill)."""
+    index = await get_index(session)
+    return index.lookup(city_id, district_id, skill_code)
+
+
+__all__ = [
+    "EligibilityIndex",
+    "eligible_master_ids",
+    "get_index",
+    "invalidate",
+]
@@ -0,0 +1,280 @@
+"""Deadline-driven expiry of SENT offers.
+
+Instead of scanning ``offers`` every tick / minute, the scheduler process keeps
+a heap of ``(expires_at, offer_id)``:
+
+- loaded from the DB for the cities this replica leases (``set_cities()``,
+  called by the scheduler after ``city_leases.claim_cities``) and resynced
+  every ``_RESYNC_SECONDS`` or when the leased set changes;
+- fed by the distribution scheduler right after it inserts offers;
+- ``run_offer_expiry()`` sleeps until the earliest deadline, expires the due
+  offers with a targeted ``UPDATE .. WHERE id = ANY(:ids)`` and wakes the
+  scheduler (``wake_channel``) so the next round starts at once.
+
+Entries whose offer was accepted / declined meanwhile, or that belong to a
+city handed over to another replica, are simply not matched by the UPDATE
+(the other replica expired them first). Every expired offer is logged as a
+``timeout`` with the ``offer_expired`` / ``sla_timeout`` distribution event.
+The periodic watchdog remains a rare safety sweep.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.infra.structured_logging import DistributionEvent, log_distribution_event
+from field_service.services import live_log
+from field_service.services._session_utils import maybe_managed_session
+from field_service.services.distribution import wake_channel
+
+logger = logging.getLogger("distribution.offer_expiry")
+
+UTC = timezone.utc
+
+_RESYNC_SECONDS = 60
+# App and DB clocks may differ slightly: retry a not-yet-due offer after this
+_CLOCK_SKEW_RETRY = timedelta(milliseconds=250)
+
+# heap of (expires_at, offer_id, order_id); _DEADLINES dedups resync pushes
+_HEAP: list[tuple[datetime, int, int]] = []
+_DEADLINES: dict[int, datetime] = {}
+_CHANGED: Optional[asyncio.Event] = None
+# Cities leased by this replica; None until the scheduler claims leases
+_CITY_IDS: Optional[frozenset[int]] = None
+_RESYNC_NEEDED = False
+
+
+def _changed() -> asyncio.Event:
+    global _CHANGED
+    if _CHANGED is None:
+        _CHANGED = asyncio.Event()
+    return _CHANGED
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def schedule(offer_id: int, order_id: int, expires_at: Optional[datetime]) -> None:
+    """Track a SENT offer until its deadline."""
+    if expires_at is None:
+        return
+    deadline = _as_utc(expires_at)
+    offer_id = int(offer_id)
+    if _DEADLINES.get(offer_id) == deadline:
+        return
+    earliest = _HEAP[0][0] if _HEAP else None
+    _DEADLINES[offer_id] = deadline
+    heapq.heappush(_HEAP, (deadline, offer_id, int(order_id)))
+    if earliest is None or deadline < earliest:
+        _changed().set()
+
+
+def schedule_many(rows: Iterable[tuple[int, int, Optional[datetime]]]) -> None:
+    """schedule() for (offer_id, order_id, expires_at) rows."""
+    for offer_id, order_id, expires_at in rows:
+        schedule(offer_id, order_id, expires_at)
+
+
+def set_cities(city_ids: Iterable[int]) -> None:
+    """Cities whose offers this replica expires; a new set triggers a resync."""
+    global _CITY_IDS, _RESYNC_NEEDED
+    cities = frozenset(int(city_id) for city_id in city_ids)
+    if cities == _CITY_IDS:
+        return
+    _CITY_IDS = cities
+    _RESYNC_NEEDED = True
+    _changed().set()
+
+
+def next_deadline() -> Optional[datetime]:
+    while _HEAP:
+        deadline, offer_id, _ = _HEAP[0]
+        if _DEADLINES.get(offer_id) == deadline:
+            return deadline
+        heapq.heappop(_HEAP)  # superseded entry
+    return None
+
+
+def pending_count() -> int:
+    return len(_DEADLINES)
+
+
+async def load_pending(
+    session: AsyncSession, *, city_ids: Optional[Iterable[int]] = None
+) -> int:
+    """(Re)load SENT offers with a deadline. Returns the number tracked.
+
+    ``city_ids`` limits the load to orders of these cities (None - all).
+    """
+    if city_ids is None:
+        stmt = text(
+            """
+        SELECT id, order_id, expires_at
+          FROM offers
+         WHERE state = 'SENT' AND expires_at IS NOT NULL
+        """
+        )
+    else:
+        stmt = text(
+            """
+        SELECT o.id, o.order_id, o.expires_at
+          FROM offers o
+          JOIN orders ord ON ord.id = o.order_id
+         WHERE o.state = 'SENT' AND o.expires_at IS NOT NULL
+           AND ord.city_id = ANY(:cities)
+        """
+        ).bindparams(cities=sorted(int(city_id) for city_id in city_ids))
+    rows = await session.execute(stmt)
+    schedule_many(rows.all())
+    return pending_count()
+
+
+def _pop_due(now: datetime) -> dict[int, int]:
+    due: dict[int, int] = {}
+    while _HEAP and _HEAP[0][0] <= now:
+        deadline, offer_id, order_id = heapq.heappop(_HEAP)
+        if _DEADLINES.get(offer_id) != deadline:
+            continue
+        del _DEADLINES[offer_id]
+        due[offer_id] = order_id
+    return due
+
+
+async def expire_due(
+    session: AsyncSession, *, now: Optional[datetime] = None
+) -> list[tuple[int, int, int]]:
+    """Expire offers whose deadline has passed and wake the scheduler.
+
+    Returns (offer_id, order_id, master_id) of the offers moved to EXPIRED.
+    The caller commits (the wakeup NOTIFY is delivered on commit).
+    """
+    due = _pop_due(_as_utc(now) if now is not None else datetime.now(UTC))
+    if not due:
+        return []
+    rows = await session.execute(
+        text(
+            """
+        UPDATE offers
+           SET state = 'EXPIRED', responded_at = NOW()
+         WHERE id = ANY(:ids)
+           AND state = 'SENT'
+           AND expires_at <= clock_timestamp()
+        RETURNING id, order_id, master_id
+        """
+        ).bindparams(ids=sorted(due))
+    )
+    expired = [(int(r[0]), int(r[1]), int(r[2])) for r in rows]
+    for offer_id, order_id, master_id in expired:
+        message = f"[dist] order={order_id} timeout mid={master_id}"
+        logger.info(message)
+        live_log.push("dist", message, level="INFO")
+        log_distribution_event(
+            DistributionEvent.OFFER_EXPIRED,
+            order_id=order_id,
+            master_id=master_id,
+            reason="sla_timeout",
+            details={"offer_id": offer_id},
+        )
+
+    missed = set(due) - {offer_id for offer_id, _, _ in expired}
+    if missed:
+        # Still SENT but not due by the DB clock (skew) or deadline extended
+        retry = await session.execute(
+            text(
+                """
+            SELECT id, order_id, expires_at FROM offers
+             WHERE id = ANY(:ids) AND state = 'SENT' AND expires_at IS NOT NULL
+            """
+            ).bindparams(ids=sorted(missed))
+        )
+        floor = datetime.now(UTC) + _CLOCK_SKEW_RETRY
+        for offer_id, order_id, expires_at in retry:
+            schedule(offer_id, order_id, max(_as_utc(expires_at), floor))
+
+    for order_id in sorted({order_id for _, order_id, _ in expired}):
+        await wake_channel.notify(
+            session, wake_channel.WakeReason.OFFER_EXPIRED, order_id=order_id
+        )
+    return expired
+
+
+async def _wait_changed(timeout: float) -> None:
+    event = _changed()
+    try:
+        await asyncio.wait_for(event.wait(), timeout=max(0.0, timeout))
+    except asyncio.TimeoutError:
+        pass
+    event.clear()
+
+
+async def run_offer_expiry(
+    *,
+    resync_seconds: int = _RESYNC_SECONDS,
+    iterations: int | None = None,
+    session: Optional[AsyncSession] = None,
+) -> None:
+    """Expire offers at their deadlines (sub-second latency)."""
+    global _RESYNC_NEEDED
+    loops_done = 0
+    synced_at: Optional[float] = None
+    while True:
+        try:
+            async with maybe_managed_session(session) as s:
+                resync_due = synced_at is None or monotonic() - synced_at >= resync_seconds
+                # До первого claim_cities грузить нечего: свои офферы приходят через schedule()
+                if _CITY_IDS is not None and (resync_due or _RESYNC_NEEDED):
+                    _RESYNC_NEEDED = False
+                    await load_pending(s, city_ids=_CITY_IDS)
+                    synced_at = monotonic()
+                expired = await expire_due(s)
+                await s.commit()
+            if expired:
+                live_log.push("dist", f"offers_expired count={len(expired)}", level="INFO")
+        except Exception as exc:
+            logger.exception("offer expiry error")
+            live_log.push("dist", f"offer expiry error: {exc}", level="ERROR")
+
+        loops_done += 1
+        if iterations is not None and loops_done >= iterations:
+            break
+
+        timeout = float(resync_seconds)
+        if synced_at is not None:
+            timeout = max(0.0, resync_seconds - (monotonic() - synced_at))
+        deadline = next_deadline()
+        if deadline is not None:
+            timeout = min(timeout, (deadline - datetime.now(UTC)).total_seconds())
+        await _wait_changed(timeout)
+
+
+def reset() -> None:
+    """Forget tracked offers (tests)."""
+    global _CHANGED, _CITY_IDS, _RESYNC_NEEDED
+    _HEAP.clear()
+    _DEADLINES.clear()
+    _CHANGED = None
+    _CITY_IDS = None
+    _RESYNC_NEEDED = False
+
+
+__all__ = [
+    "expire_due",
+    "load_pending",
+    "next_deadline",
+    "pending_count",
+    "reset",
+    "run_offer_expiry",
+    "schedule",
+    "schedule_many",
+    "set_cities",
+]
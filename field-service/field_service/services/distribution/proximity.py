@@ -0,0 +1,220 @@
+"""Process-local index of master home positions for proximity ranking.
+
+Masters may share their home location during onboarding
+(``masters.home_latitude`` / ``home_longitude``), orders carry ``lat`` /
+``lon``. Ranking only by car / avg check / rating sends offers across town in
+big cities, so candidates are first grouped by distance band:
+
+    band = floor(distance_km / band_km), capped at max_km / band_km
+
+Masters without a home position (or farther than ``max_km``) fall into the
+last band; without order coordinates every candidate is in band 0, so the
+ranking is unchanged. ``band_km = 0`` disables the term
+(``DISTRIBUTION_DISTANCE_BAND_KM`` / ``DISTRIBUTION_DISTANCE_MAX_KM``).
+
+Per city the positions live in a uniform grid of ``_CELL_KM`` cells: only the
+cells within ``max_km`` of the order are scanned and the distances of their
+masters are computed in one pass over flat arrays (equirectangular
+approximation, accurate to well under 1% at city scale). Freshness follows
+``eligibility_index``: a per-city fingerprint (count + MAX(updated_at))
+checked at most every ``_FINGERPRINT_CHECK_SECONDS``.
+"""
+from __future__ import annotations
+
+import logging
+import math
+from array import array
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.config import settings as env_settings
+
+logger = logging.getLogger("distribution.proximity")
+
+_FINGERPRINT_CHECK_SECONDS = 30
+_CELL_KM = 2.0
+_EARTH_RADIUS_KM = 6371.0
+_KM_PER_DEG_LAT = math.pi * _EARTH_RADIUS_KM / 180.0
+
+
+def band_settings() -> tuple[float, float]:
+    """(band_km, max_km) from the environment."""
+    return (
+        float(getattr(env_settings, "distribution_distance_band_km", 0.0) or 0.0),
+        float(getattr(env_settings, "distribution_distance_max_km", 0.0) or 0.0),
+    )
+
+
+@dataclass(slots=True)
+class CityPositions:
+    city_id: int
+    fingerprint: tuple
+    ref_lat: float = 0.0
+    master_ids: array = field(default_factory=lambda: array("q"))
+    # coordinates in km on a local plane around ref_lat
+    xs: array = field(default_factory=lambda: array("d"))
+    ys: array = field(default_factory=lambda: array("d"))
+    # (cell_x, cell_y) -> positions in the arrays
+    cells: dict[tuple[int, int], list[int]] = field(default_factory=dict)
+    checked_at: float = field(default_factory=monotonic)
+
+    @classmethod
+    def build(
+        cls,
+        city_id: int,
+        rows: Iterable[tuple[int, float, float]],
+        *,
+        fingerprint: tuple = (),
+    ) -> "CityPositions":
+        points = [(int(mid), float(lat), float(lon)) for mid, lat, lon in rows]
+        index = cls(city_id=int(city_id), fingerprint=fingerprint)
+        if not points:
+            return index
+        index.ref_lat = sum(lat for _, lat, _ in points) / len(points)
+        for pos, (mid, lat, lon) in enumerate(points):
+            x, y = index._project(lat, lon)
+            index.master_ids.append(mid)
+            index.xs.append(x)
+            index.ys.append(y)
+            index.cells.setdefault(_cell(x, y), []).append(pos)
+        return index
+
+    def _project(self, lat: float, lon: float) -> tuple[float, float]:
+        kx = _KM_PER_DEG_LAT * math.cos(math.radians(self.ref_lat))
+        return lon * kx, lat * _KM_PER_DEG_LAT
+
+    def within(self, lat: float, lon: float, radius_km: float) -> dict[int, float]:
+        """master_id -> distance (km) for masters within ``radius_km``."""
+        if not self.master_ids:
+            return {}
+        ox, oy = self._project(lat, lon)
+        cx, cy = _cell(ox, oy)
+        reach = int(math.ceil(radius_km / _CELL_KM))
+        positions: list[int] = []
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                positions.extend(self.cells.get((cx + dx, cy + dy), ()))
+        xs, ys, mids = self.xs, self.ys, self.master_ids
+        limit_sq = radius_km * radius_km
+        result: dict[int, float] = {}
+        for pos in positions:
+            ddx = xs[pos] - ox
+            ddy = ys[pos] - oy
+            dist_sq = ddx * ddx + ddy * ddy
+            if dist_sq <= limit_sq:
+                result[mids[pos]] = math.sqrt(dist_sq)
+        return result
+
+
+def _cell(x: float, y: float) -> tuple[int, int]:
+    return int(math.floor(x / _CELL_KM)), int(math.floor(y / _CELL_KM))
+
+
+_CITIES: dict[int, CityPositions] = {}
+
+
+def invalidate(city_id: Optional[int] = None) -> None:
+    if city_id is None:
+        _CITIES.clear()
+    else:
+        _CITIES.pop(int(city_id), None)
+
+
+async def _fingerprint(session: AsyncSession, city_id: int) -> tuple:
+    row = (
+        await session.execute(
+            text(
+                """
+            SELECT COUNT(*), MAX(updated_at)
+              FROM masters
+             WHERE city_id = :cid
+               AND home_latitude IS NOT NULL
+               AND home_longitude IS NOT NULL
+                """
+            ).bindparams(cid=city_id)
+        )
+    ).first()
+    return tuple(row) if row is not None else ()
+
+
+async def get_city_positions(session: AsyncSession, city_id: int) -> CityPositions:
+    city_id = int(city_id)
+    index = _CITIES.get(city_id)
+    now = monotonic()
+    if index is not None and now - index.checked_at < _FINGERPRINT_CHECK_SECONDS:
+        return index
+    fingerprint = await _fingerprint(session, city_id)
+    if index is not None and index.fingerprint == fingerprint:
+        index.checked_at = now
+        return index
+    rows = await session.execute(
+        text(
+            """
+        SELECT id, home_latitude, home_longitude
+          FROM masters
+         WHERE city_id = :cid
+           AND home_latitude IS NOT NULL
+           AND home_longitude IS NOT NULL
+            """
+        ).bindparams(cid=city_id)
+    )
+    index = CityPositions.build(city_id, rows.tuples(), fingerprint=fingerprint)
+    _CITIES[city_id] = index
+    logger.debug("proximity index rebuilt city=%s masters=%s", city_id, len(index.master_ids))
+    return index
+
+
+def distance_bands(
+    positions: CityPositions,
+    lat: Optional[float],
+    lon: Optional[float],
+    master_ids: Iterable[int],
+    *,
+    band_km: float,
+    max_km: float,
+) -> dict[int, tuple[int, Optional[float]]]:
+    """master_id -> (band, distance_km or None) for the candidate set."""
+    ids = list(master_ids)
+    if lat is None or lon is None or band_km <= 0 or max_km <= 0:
+        return {mid: (0, None) for mid in ids}
+    far_band = int(math.ceil(max_km / band_km))
+    near = positions.within(float(lat), float(lon), max_km)
+    result: dict[int, tuple[int, Optional[float]]] = {}
+    for mid in ids:
+        dist = near.get(mid)
+        if dist is None:
+            result[mid] = (far_band, None)
+        else:
+            result[mid] = (min(int(dist // band_km), far_band), round(dist, 2))
+    return result
+
+
+async def candidate_bands(
+    session: AsyncSession,
+    *,
+    city_id: int,
+    lat: Optional[float],
+    lon: Optional[float],
+    master_ids: Iterable[int],
+) -> dict[int, tuple[int, Optional[float]]]:
+    """Distance bands with the configured band / max distance."""
+    band_km, max_km = band_settings()
+    ids = list(master_ids)
+    if lat is None or lon is None or band_km <= 0 or not ids:
+        return {mid: (0, None) for mid in ids}
+    positions = await get_city_positions(session, city_id)
+    return distance_bands(positions, lat, lon, ids, band_km=band_km, max_km=max_km)
+
+
+__all__ = [
+    "CityPositions",
+    "band_settings",
+    "candidate_bands",
+    "distance_bands",
+    "get_city_positions",
+    "invalidate",
+]
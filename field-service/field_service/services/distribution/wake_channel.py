@@ -0,0 +1,164 @@
+"""Wakeup channel for the distribution scheduler.
+
+Producers call ``notify(session, reason, ...)`` inside their transaction: on
+Postgres this issues ``pg_notify`` which is delivered only after COMMIT, so the
+scheduler never wakes up before the data is visible. The scheduler process
+runs ``run_listener()`` (LISTEN on a dedicated pooled connection) and waits
+with ``wait(timeout)`` instead of a fixed sleep; the periodic tick stays as a
+safety sweep.
+
+When no listener is connected in this process (tests, sqlite, lost
+connection) ``notify`` also sets an in-process ``asyncio.Event`` so that the
+scheduler running in the same process still wakes up.
+"""
+from __future__ import annotations
+
+import asyncio
+import enum
+import json
+import logging
+from typing import Any, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.db import pg_notify
+
+logger = logging.getLogger("distribution.wake_channel")
+
+CHANNEL = "dist_wakeup"
+# Coalesce bursts of notifications into one tick
+_DEBOUNCE_SECONDS = 0.05
+
+
+class WakeReason(str, enum.Enum):
+    ORDER_CREATED = "order_created"
+    OFFER_DECLINED = "offer_declined"
+    OFFER_EXPIRED = "offer_expired"
+    MASTER_ON_SHIFT = "master_on_shift"
+
+
+_EVENT: Optional[asyncio.Event] = None
+_PENDING: list[dict[str, Any]] = []
+_LISTENER_ACTIVE = False
+
+
+def _event() -> asyncio.Event:
+    global _EVENT
+    if _EVENT is None:
+        _EVENT = asyncio.Event()
+    return _EVENT
+
+
+def _payload(
+    reason: WakeReason | str,
+    *,
+    order_id: Optional[int] = None,
+    master_id: Optional[int] = None,
+    city_id: Optional[int] = None,
+) -> dict[str, Any]:
+    data: dict[str, Any] = {"reason": WakeReason(reason).value}
+    if order_id is not None:
+        data["order_id"] = int(order_id)
+    if master_id is not None:
+        data["master_id"] = int(master_id)
+    if city_id is not None:
+        data["city_id"] = int(city_id)
+    return data
+
+
+def _push(data: dict[str, Any]) -> None:
+    _PENDING.append(data)
+    _event().set()
+
+
+def notify_local(
+    reason: WakeReason | str,
+    *,
+    order_id: Optional[int] = None,
+    master_id: Optional[int] = None,
+    city_id: Optional[int] = None,
+) -> None:
+    """Wake the scheduler of this process (no DB round trip)."""
+    _push(_payload(reason, order_id=order_id, master_id=master_id, city_id=city_id))
+
+
+async def notify(
+    session: AsyncSession,
+    reason: WakeReason | str,
+    *,
+    order_id: Optional[int] = None,
+    master_id: Optional[int] = None,
+    city_id: Optional[int] = None,
+) -> None:
+    """Queue a wakeup for the distribution scheduler.
+
+    Must be called inside the producer's transaction: the NOTIFY is delivered
+    on commit and discarded on rollback.
+    """
+    data = _payload(reason, order_id=order_id, master_id=master_id, city_id=city_id)
+    await pg_notify.notify(session, CHANNEL, json.dumps(data))
+    if not _LISTENER_ACTIVE:
+        _push(data)
+
+
+async def wait(timeout: float) -> list[dict[str, Any]]:
+    """Wait for a wakeup or ``timeout`` seconds.
+
+    Returns the drained notification payloads ([] on timeout).
+    """
+    event = _event()
+    if not event.is_set():
+        try:
+            await asyncio.wait_for(event.wait(), timeout=max(0.0, timeout))
+        except asyncio.TimeoutError:
+            return []
+        await asyncio.sleep(_DEBOUNCE_SECONDS)
+    event.clear()
+    drained = list(_PENDING)
+    _PENDING.clear()
+    return drained
+
+
+def _on_notify(connection: Any, pid: int, channel: str, payload: str) -> None:
+    try:
+        data = json.loads(payload) if payload else {}
+    except ValueError:
+        data = {"reason": payload}
+    _push(data)
+
+
+def _on_connect() -> None:
+    global _LISTENER_ACTIVE
+    _LISTENER_ACTIVE = True
+
+
+def _on_disconnect() -> None:
+    global _LISTENER_ACTIVE
+    _LISTENER_ACTIVE = False
+    # Missed notifications are picked up by the safety sweep tick
+    _event().set()
+
+
+async def run_listener() -> None:
+    """LISTEN for wakeups on a dedicated connection; reconnects on failure."""
+    await pg_notify.listen(
+        CHANNEL, _on_notify, on_connect=_on_connect, on_disconnect=_on_disconnect
+    )
+
+
+def reset() -> None:
+    """Drop pending wakeups (tests)."""
+    global _EVENT
+    _PENDING.clear()
+    _EVENT = None
+
+
+__all__ = [
+    "CHANNEL",
+    "WakeReason",
+    "notify",
+    "notify_local",
+    "reset",
+    "run_listener",
+    "wait",
+]
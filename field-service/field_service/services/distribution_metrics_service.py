@@ -1,19 +1,235 @@
 """    ."""
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import logging
+from datetime import date, datetime, time, timedelta, timezone
 from typing import Optional, Dict, List, Any
 from dataclasses import dataclass
 
-from sqlalchemy import func, select, and_, case
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
+from field_service.services._session_utils import maybe_managed_session
 
 
 UTC = timezone.utc
 
+logger = logging.getLogger("distribution_metrics")
+
+# Rollups (distribution_metrics_hourly / _daily) are maintained by the
+# trg_distribution_metrics__rollups trigger on INSERT into distribution_metrics
+# (record_assignment and the admin manual assignment both go through it).
+# Counter -> per-row expression over distribution_metrics; keep in sync with
+# migration 2025_10_19_0002.
+ROLLUP_COUNTERS: tuple[tuple[str, str], ...] = (
+    ("assignments", "1"),
+    ("tta_count", "CASE WHEN {p}time_to_assign_seconds IS NOT NULL THEN 1 ELSE 0 END"),
+    ("tta_sum", "COALESCE({p}time_to_assign_seconds, 0)"),
+    ("round_sum", "{p}round_number"),
+    ("candidates_sum", "{p}candidates_count"),
+    ("preferred_count", "CASE WHEN {p}preferred_master_used THEN 1 ELSE 0 END"),
+    ("logist_escalations", "CASE WHEN {p}was_escalated_to_logist THEN 1 ELSE 0 END"),
+    ("admin_escalations", "CASE WHEN {p}was_escalated_to_admin THEN 1 ELSE 0 END"),
+    (
+        "escalations",
+        "CASE WHEN {p}was_escalated_to_logist OR {p}was_escalated_to_admin THEN 1 ELSE 0 END",
+    ),
+    ("round_1", "CASE WHEN {p}round_number = 1 THEN 1 ELSE 0 END"),
+    ("round_2", "CASE WHEN {p}round_number = 2 THEN 1 ELSE 0 END"),
+    ("round_3_plus", "CASE WHEN {p}round_number >= 3 THEN 1 ELSE 0 END"),
+    ("tta_fast", "CASE WHEN {p}time_to_assign_seconds < 120 THEN 1 ELSE 0 END"),
+    (
+        "tta_medium",
+        "CASE WHEN {p}time_to_assign_seconds BETWEEN 120 AND 300 THEN 1 ELSE 0 END",
+    ),
+    ("tta_slow", "CASE WHEN {p}time_to_assign_seconds > 300 THEN 1 ELSE 0 END"),
+    (
+        "via_master_bot",
+        "CASE WHEN {p}metadata_json ->> 'assigned_via' = 'master_bot' THEN 1 ELSE 0 END",
+    ),
+    (
+        "via_admin_manual",
+        "CASE WHEN {p}metadata_json ->> 'assigned_via' = 'admin_manual' THEN 1 ELSE 0 END",
+    ),
+)
+_COUNTER_NAMES = tuple(name for name, _ in ROLLUP_COUNTERS)
+
+_HOUR_BUCKET_SQL = "date_trunc('hour', {p}assigned_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'"
+_DAY_BUCKET_SQL = "({p}assigned_at AT TIME ZONE 'UTC')::date"
+
+
+@dataclass(frozen=True)
+class _RangePlan:
+    """[start, end] split into raw edges, full hours and full UTC days."""
+
+    raw_head: tuple[datetime, datetime]  # [a, b)
+    raw_tail: tuple[datetime, datetime]  # [a, b] - end is inclusive
+    hourly: tuple[tuple[datetime, datetime], tuple[datetime, datetime]]
+    daily: tuple[date, date]
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value.astimezone(UTC)
+
+
+def _floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _ceil_hour(value: datetime) -> datetime:
+    floor = _floor_hour(value)
+    return floor if floor == value else floor + timedelta(hours=1)
+
+
+def _plan_range(start: datetime, end: datetime, *, use_daily: bool = True) -> _RangePlan:
+    start, end = _as_utc(start), _as_utc(end)
+    h0, h1 = _ceil_hour(start), _floor_hour(end)
+    if h0 >= h1:
+        empty_h = ((start, start), (start, start))
+        return _RangePlan((start, start), (start, end), empty_h, (start.date(), start.date()))
+
+    d0 = h0.date() if h0.time() == time(0) else h0.date() + timedelta(days=1)
+    d1 = h1.date()
+    if use_daily and d0 < d1:
+        d0_dt = datetime.combine(d0, time(0), tzinfo=UTC)
+        d1_dt = datetime.combine(d1, time(0), tzinfo=UTC)
+        hourly = ((h0, d0_dt), (d1_dt, h1))
+        daily = (d0, d1)
+    else:
+        hourly = ((h0, h1), (h1, h1))
+        daily = (d0, d0)
+    return _RangePlan((start, h0), (h1, end), hourly, daily)
+
+
+def _rollup_totals_sql(
+    *,
+    key: Optional[str],
+    use_daily: bool = True,
+    city_filter: bool = False,
+    master_filter: bool = False,
+) -> str:
+    """Totals over rollups + raw edges, optionally grouped by ``key``.
+
+    key: None | "city_id" | "master_id" | "hour" (hour of day; no daily part).
+    """
+    keys = {
+        "city_id": ("city_id", "city_id", "city_id"),
+        "master_id": ("master_id", "master_id", "COALESCE(master_id, 0)"),
+        "hour": (None, "EXTRACT(HOUR FROM bucket_start)", "EXTRACT(HOUR FROM assigned_at)"),
+    }
+    rollup_cols = ", ".join(_COUNTER_NAMES)
+    raw_cols = ", ".join(
+        f"{expr.format(p='')} AS {name}" for name, expr in ROLLUP_COUNTERS
+    )
+    filters = ""
+    if city_filter:
+        filters += " AND city_id = :city_id"
+    if master_filter:
+        filters += " AND master_id = :master_id"
+
+    def _key(idx: int) -> str:
+        return f"{keys[key][idx]} AS k, " if key else ""
+
+    parts = []
+    if use_daily:
+        parts.append(
+            f"SELECT {_key(0)}{rollup_cols} FROM distribution_metrics_daily"
+            f" WHERE bucket_date >= :d0 AND bucket_date < :d1{filters}"
+        )
+    parts.append(
+        f"SELECT {_key(1)}{rollup_cols} FROM distribution_metrics_hourly"
+        " WHERE ((bucket_start >= :h0 AND bucket_start < :h1)"
+        f" OR (bucket_start >= :h2 AND bucket_start < :h3)){filters}"
+    )
+    parts.append(
+        f"SELECT {_key(2)}{raw_cols} FROM distribution_metrics"
+        " WHERE ((assigned_at >= :r0 AND assigned_at < :r1)"
+        f" OR (assigned_at >= :r2 AND assigned_at <= :r3)){filters}"
+    )
+    sums = ", ".join(f"COALESCE(SUM({name}), 0) AS {name}" for name in _COUNTER_NAMES)
+    group = " GROUP BY k HAVING SUM(assignments) > 0" if key else ""
+    select_key = "k, " if key else ""
+    union = "\n UNION ALL\n ".join(parts)
+    return f"SELECT {select_key}{sums} FROM (\n {union}\n) parts{group}"
+
+
+def _range_params(plan: _RangePlan, *, use_daily: bool = True) -> dict[str, Any]:
+    (h0, h1), (h2, h3) = plan.hourly
+    params = {
+        "r0": plan.raw_head[0],
+        "r1": plan.raw_head[1],
+        "r2": plan.raw_tail[0],
+        "r3": plan.raw_tail[1],
+        "h0": h0,
+        "h1": h1,
+        "h2": h2,
+        "h3": h3,
+    }
+    if use_daily:
+        params["d0"], params["d1"] = plan.daily
+    return params
+
+
+def _rebuild_sql(table: str, bucket_column: str, bucket_expr: str) -> str:
+    sums = ", ".join(f"SUM({expr.format(p='')})" for _, expr in ROLLUP_COUNTERS)
+    return f"""
+    INSERT INTO {table} ({bucket_column}, city_id, master_id, {", ".join(_COUNTER_NAMES)})
+    SELECT {bucket_expr.format(p='')}, city_id, COALESCE(master_id, 0), {sums}
+      FROM distribution_metrics
+     WHERE assigned_at >= :start AND assigned_at < :end
+     GROUP BY 1, 2, 3
+    """
+
+
+async def backfill_rollups(
+    session: Optional[AsyncSession] = None,
+    *,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> dict[str, int]:
+    """Rebuild hourly/daily rollups from distribution_metrics for [since, until).
+
+    Whole UTC days are replaced. Without bounds the whole table is rebuilt.
+    Returns the number of rollup rows written per table.
+    """
+    start = datetime.combine(since, time(0), tzinfo=UTC) if since else datetime(1970, 1, 1, tzinfo=UTC)
+    end = (
+        datetime.combine(until, time(0), tzinfo=UTC)
+        if until
+        else datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    )
+    written: dict[str, int] = {}
+    async with maybe_managed_session(session) as s:
+        await s.execute(
+            text(
+                "DELETE FROM distribution_metrics_hourly"
+                " WHERE bucket_start >= :start AND bucket_start < :end"
+            ).bindparams(start=start, end=end)
+        )
+        await s.execute(
+            text(
+                "DELETE FROM distribution_metrics_daily"
+                " WHERE bucket_date >= :start_d AND bucket_date < :end_d"
+            ).bindparams(start_d=start.date(), end_d=end.date())
+        )
+        for table, column, expr in (
+            ("distribution_metrics_hourly", "bucket_start", _HOUR_BUCKET_SQL),
+            ("distribution_metrics_daily", "bucket_date", _DAY_BUCKET_SQL),
+        ):
+            result = await s.execute(
+                text(_rebuild_sql(table, column, expr)).bindparams(start=start, end=end)
+            )
+            written[table] = int(result.rowcount or 0)
+        await s.commit()
+    logger.info(
+        "distribution rollups backfilled since=%s until=%s rows=%s", since, until, written
+    )
+    return written
+
 
 @dataclass
 class DistributionStats:
@@ -89,53 +305,16 @@ class DistributionMetricsService:
         if start_date is None:
             start_date = end_date - timedelta(days=7)
         
+        plan = _plan_range(start_date, end_date)
+        sql = _rollup_totals_sql(key=None, city_filter=bool(city_id))
+        params = _range_params(plan)
+        if city_id:
+            params["city_id"] = city_id
+
         async with self._session_factory() as session:
-            #  
-            filters = [
-                m.distribution_metrics.assigned_at >= start_date,
-                m.distribution_metrics.assigned_at <= end_date,
-            ]
-            if city_id:
-                filters.append(m.distribution_metrics.city_id == city_id)
-            
-            #  
-            result = await session.execute(
-                select(
-                    func.count(m.distribution_metrics.id).label('total'),
-                    func.avg(m.distribution_metrics.time_to_assign_seconds).label('avg_time'),
-                    func.avg(m.distribution_metrics.round_number).label('avg_round'),
-                    func.avg(m.distribution_metrics.candidates_count).label('avg_candidates'),
-                    func.sum(
-                        case((m.distribution_metrics.preferred_master_used == True, 1), else_=0)
-                    ).label('preferred_count'),
-                    func.sum(
-                        case((m.distribution_metrics.was_escalated_to_logist == True, 1), else_=0)
-                    ).label('logist_escalations'),
-                    func.sum(
-                        case((m.distribution_metrics.was_escalated_to_admin == True, 1), else_=0)
-                    ).label('admin_escalations'),
-                    #   
-                    func.sum(case((m.distribution_metrics.round_number == 1, 1), else_=0)).label('round_1'),
-                    func.sum(case((m.distribution_metrics.round_number == 2, 1), else_=0)).label('round_2'),
-                    func.sum(case((m.distribution_metrics.round_number >= 3, 1), else_=0)).label('round_3_plus'),
-                    #   
-                    func.sum(
-                        case((m.distribution_metrics.time_to_assign_seconds < 120, 1), else_=0)
-                    ).label('fast_count'),
-                    func.sum(
-                        case((and_(
-                            m.distribution_metrics.time_to_assign_seconds >= 120,
-                            m.distribution_metrics.time_to_assign_seconds <= 300
-                        ), 1), else_=0)
-                    ).label('medium_count'),
-                    func.sum(
-                        case((m.distribution_metrics.time_to_assign_seconds > 300, 1), else_=0)
-                    ).label('slow_count'),
-                ).where(and_(*filters))
-            )
-            row = result.first()
-            
-            if not row or row.total == 0:
+            row = (await session.execute(text(sql).bindparams(**params))).mappings().first()
+
+            if not row or not row["assignments"]:
                 return DistributionStats(
                     total_assignments=0,
                     avg_time_to_assign=0.0,
@@ -151,22 +330,27 @@ class DistributionMetricsService:
                     medium_assign_pct=0.0,
                     slow_assign_pct=0.0,
                 )
-            
-            total = row.total
+
+            total = int(row["assignments"])
+
+            def _pct(value: Any) -> float:
+                return round(int(value or 0) / total * 100, 2)
+
+            tta_count = int(row["tta_count"] or 0)
             return DistributionStats(
                 total_assignments=total,
-                avg_time_to_assign=float(row.avg_time or 0),
-                avg_round_number=float(row.avg_round or 0),
-                avg_candidates=float(row.avg_candidates or 0),
-                preferred_used_pct=round((row.preferred_count / total * 100) if total > 0 else 0, 2),
-                escalated_to_logist_pct=round((row.logist_escalations / total * 100) if total > 0 else 0, 2),
-                escalated_to_admin_pct=round((row.admin_escalations / total * 100) if total > 0 else 0, 2),
-                round_1_pct=round((row.round_1 / total * 100) if total > 0 else 0, 2),
-                round_2_pct=round((row.round_2 / total * 100) if total > 0 else 0, 2),
-                round_3_plus_pct=round((row.round_3_plus / total * 100) if total > 0 else 0, 2),
-                fast_assign_pct=round((row.fast_count / total * 100) if total > 0 else 0, 2),
-                medium_assign_pct=round((row.medium_count / total * 100) if total > 0 else 0, 2),
-                slow_assign_pct=round((row.slow_count / total * 100) if total > 0 else 0, 2),
+                avg_time_to_assign=float(row["tta_sum"]) / tta_count if tta_count else 0.0,
+                avg_round_number=float(row["round_sum"]) / total,
+                avg_candidates=float(row["candidates_sum"]) / total,
+                preferred_used_pct=_pct(row["preferred_count"]),
+                escalated_to_logist_pct=_pct(row["logist_escalations"]),
+                escalated_to_admin_pct=_pct(row["admin_escalations"]),
+                round_1_pct=_pct(row["round_1"]),
+                round_2_pct=_pct(row["round_2"]),
+                round_3_plus_pct=_pct(row["round_3_plus"]),
+                fast_assign_pct=_pct(row["tta_fast"]),
+                medium_assign_pct=_pct(row["tta_medium"]),
+                slow_assign_pct=_pct(row["tta_slow"]),
             )
     
     async def get_city_performance(
@@ -182,42 +366,31 @@ class DistributionMetricsService:
         if start_date is None:
             start_date = end_date - timedelta(days=7)
         
+        plan = _plan_range(start_date, end_date)
+        sql = f"""
+        SELECT t.k AS city_id, c.name AS city_name, t.assignments, t.tta_count,
+               t.tta_sum, t.escalations
+          FROM ({_rollup_totals_sql(key="city_id")}) t
+          JOIN cities c ON c.id = t.k
+         ORDER BY t.assignments DESC
+         LIMIT :limit
+        """
+
         async with self._session_factory() as session:
             result = await session.execute(
-                select(
-                    m.distribution_metrics.city_id,
-                    m.cities.name.label('city_name'),
-                    func.count(m.distribution_metrics.id).label('total'),
-                    func.avg(m.distribution_metrics.time_to_assign_seconds).label('avg_time'),
-                    func.sum(
-                        case((
-                            (m.distribution_metrics.was_escalated_to_logist == True) |
-                            (m.distribution_metrics.was_escalated_to_admin == True),
-                            1
-                        ), else_=0)
-                    ).label('escalations'),
-                )
-                .join(m.cities, m.cities.id == m.distribution_metrics.city_id)
-                .where(
-                    and_(
-                        m.distribution_metrics.assigned_at >= start_date,
-                        m.distribution_metrics.assigned_at <= end_date,
-                    )
-                )
-                .group_by(m.distribution_metrics.city_id, m.cities.name)
-                .order_by(func.count(m.distribution_metrics.id).desc())
-                .limit(limit)
+                text(sql).bindparams(limit=limit, **_range_params(plan))
             )
-            
+
             cities = []
-            for row in result:
-                total = row.total or 0
+            for row in result.mappings():
+                total = int(row["assignments"] or 0)
+                tta_count = int(row["tta_count"] or 0)
                 cities.append(CityPerformance(
-                    city_id=row.city_id,
-                    city_name=row.city_name,
+                    city_id=int(row["city_id"]),
+                    city_name=row["city_name"],
                     total_assignments=total,
-                    avg_time_to_assign=float(row.avg_time or 0),
-                    escalation_rate=round((row.escalations / total * 100) if total > 0 else 0, 2),
+                    avg_time_to_assign=float(row["tta_sum"]) / tta_count if tta_count else 0.0,
+                    escalation_rate=round((int(row["escalations"]) / total * 100) if total > 0 else 0, 2),
                 ))
             return cities
     
@@ -235,53 +408,33 @@ class DistributionMetricsService:
         if start_date is None:
             start_date = end_date - timedelta(days=30)
         
+        plan = _plan_range(start_date, end_date)
+        sql = f"""
+        SELECT t.k AS master_id, mm.full_name AS master_name, t.assignments,
+               t.preferred_count, t.via_master_bot, t.via_admin_manual, t.round_sum
+          FROM ({_rollup_totals_sql(key="master_id", master_filter=bool(master_id))}) t
+          JOIN masters mm ON mm.id = t.k
+         ORDER BY t.assignments DESC
+         LIMIT :limit
+        """
+        params = _range_params(plan)
+        if master_id:
+            params["master_id"] = master_id
+
         async with self._session_factory() as session:
-            filters = [
-                m.distribution_metrics.assigned_at >= start_date,
-                m.distribution_metrics.assigned_at <= end_date,
-            ]
-            if master_id:
-                filters.append(m.distribution_metrics.master_id == master_id)
-            
-            result = await session.execute(
-                select(
-                    m.distribution_metrics.master_id,
-                    m.masters.full_name.label('master_name'),
-                    func.count(m.distribution_metrics.id).label('total'),
-                    func.sum(
-                        case((m.distribution_metrics.preferred_master_used == True, 1), else_=0)
-                    ).label('from_preferred'),
-                    func.sum(
-                        case((
-                            m.distribution_metrics.metadata_json['assigned_via'].astext == 'master_bot',
-                            1
-                        ), else_=0)
-                    ).label('from_auto'),
-                    func.sum(
-                        case((
-                            m.distribution_metrics.metadata_json['assigned_via'].astext == 'admin_manual',
-                            1
-                        ), else_=0)
-                    ).label('from_manual'),
-                    func.avg(m.distribution_metrics.round_number).label('avg_round'),
-                )
-                .join(m.masters, m.masters.id == m.distribution_metrics.master_id)
-                .where(and_(*filters))
-                .group_by(m.distribution_metrics.master_id, m.masters.full_name)
-                .order_by(func.count(m.distribution_metrics.id).desc())
-                .limit(limit)
-            )
-            
+            result = await session.execute(text(sql).bindparams(limit=limit, **params))
+
             masters = []
-            for row in result:
+            for row in result.mappings():
+                total = int(row["assignments"] or 0)
                 masters.append(MasterPerformance(
-                    master_id=row.master_id,
-                    master_name=row.master_name or f"Master {row.master_id}",
-                    total_assignments=row.total or 0,
-                    from_preferred=row.from_preferred or 0,
-                    from_auto=row.from_auto or 0,
-                    from_manual=row.from_manual or 0,
-                    avg_round_received=round(float(row.avg_round or 0), 2),
+                    master_id=int(row["master_id"]),
+                    master_name=row["master_name"] or f"Master {row['master_id']}",
+                    total_assignments=total,
+                    from_preferred=int(row["preferred_count"] or 0),
+                    from_auto=int(row["via_master_bot"] or 0),
+                    from_manual=int(row["via_admin_manual"] or 0),
+                    avg_round_received=round(float(row["round_sum"]) / total if total else 0.0, 2),
                 ))
             return masters
     
@@ -297,23 +450,17 @@ class DistributionMetricsService:
         if start_date is None:
             start_date = end_date - timedelta(days=7)
         
+        # Hour of day is not preserved in daily buckets: hourly rollups + raw edges only
+        plan = _plan_range(start_date, end_date, use_daily=False)
+        sql = f"""
+        SELECT t.k AS hour, t.assignments AS count
+          FROM ({_rollup_totals_sql(key="hour", use_daily=False)}) t
+         ORDER BY t.k
+        """
+
         async with self._session_factory() as session:
-            result = await session.execute(
-                select(
-                    func.extract('hour', m.distribution_metrics.assigned_at).label('hour'),
-                    func.count(m.distribution_metrics.id).label('count'),
-                )
-                .where(
-                    and_(
-                        m.distribution_metrics.assigned_at >= start_date,
-                        m.distribution_metrics.assigned_at <= end_date,
-                    )
-                )
-                .group_by(func.extract('hour', m.distribution_metrics.assigned_at))
-                .order_by('hour')
-            )
-            
-            return {int(row.hour): row.count for row in result}
+            result = await session.execute(text(sql).bindparams(**_range_params(plan, use_daily=False)))
+            return {int(row.hour): int(row.count) for row in result}
 
     async def record_assignment(
         self,
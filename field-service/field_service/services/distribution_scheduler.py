@@ -3,8 +3,8 @@ from __future__ import annotations
 import asyncio
 import logging
 import random
-from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
 from datetime import datetime, time, timedelta, timezone
 from typing import Iterable, Optional
 from zoneinfo import ZoneInfo
@@ -17,7 +17,13 @@ from field_service.config import settings as env_settings
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
 from field_service.services import live_log, time_service, settings_service as settings_store
-from field_service.services.distribution_worker import expire_sent_offers
+from field_service.services.distribution import (
+    city_leases,
+    eligibility_index,
+    offer_expiry,
+    proximity,
+    wake_channel,
+)
 from field_service.infra.notify import send_alert, send_report
 from field_service.services.settings_service import (
     get_int,
@@ -45,7 +51,6 @@ def _skill_code_for_category(category: str | None) -> str | None:
 
 logger = logging.getLogger("distribution")
 
-ADVISORY_LOCK_KEY = 982734
 DEFERRED_LOGGED: set[int] = set()
 WORKDAY_START_DEFAULT = time_service.parse_time_string(env_settings.workday_start, default=time(10, 0))
 WORKDAY_END_DEFAULT = time_service.parse_time_string(env_settings.workday_end, default=time(20, 0))
@@ -57,6 +62,8 @@ ESC_REASON_ADMIN = "distribution_escalate_admin"
 #  STEP 3.1:   
 _CONFIG_CACHE: Optional[DistConfig] = None
 _CONFIG_CACHE_TIMESTAMP: Optional[datetime] = None
+# Snapshot the cached config was built from
+_CONFIG_SNAPSHOT: Optional[settings_store.SettingsSnapshot] = None
 _CONFIG_CACHE_TTL_SECONDS = 300  # 5 
 
 def _dist_log(message: str, *, level: str = "INFO") -> None:
@@ -99,6 +106,8 @@ class OrderForDistribution:
     escalated_admin_at: Optional[datetime]
     escalation_logist_notified_at: Optional[datetime]
     escalation_admin_notified_at: Optional[datetime]
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
 
 @dataclass(slots=True)
@@ -411,21 +420,20 @@ async def _maybe_session(session: Optional[AsyncSession]):
 
 async def _load_config(session: Optional[AsyncSession] = None) -> DistConfig:
     """
-    Загружает конфигурацию распределения из БД с кэшированием.
+    Загружает конфигурацию распределения из снимка настроек.
     
     STEP 2.3: Изменён тик с 30 на 15 секунд.
     STEP 3.1: Добавлено кэширование с TTL = 5 минут.
     
-    Универсальная сигнатура:
-    - Если session передан — используем его
-    - Если session=None — создаём временную через SessionLocal
-    - Кэш работает независимо от источника сессии
-    - Результат кэшируется на 5 минут
+    Значения берутся из ``settings_service.get_snapshot()`` (один запрос на
+    все настройки, сбрасывается при изменении через set_values / NOTIFY).
+    DistConfig пересобирается, когда снимок сменился или истёк TTL;
+    сброс ``_CONFIG_CACHE`` перечитывает настройки из БД.
     
     Args:
         session: Опциональная сессия БД (для тестов и прямых вызовов)
     """
-    global _CONFIG_CACHE, _CONFIG_CACHE_TIMESTAMP
+    global _CONFIG_CACHE, _CONFIG_CACHE_TIMESTAMP, _CONFIG_SNAPSHOT
 
     now = datetime.now(timezone.utc)
 
@@ -434,59 +442,30 @@ async def _load_config(session: Optional[AsyncSession] = None) -> DistConfig:
         _CONFIG_CACHE is not None
         and _CONFIG_CACHE_TIMESTAMP is not None
         and (now - _CONFIG_CACHE_TIMESTAMP).total_seconds() < _CONFIG_CACHE_TTL_SECONDS
+        and _CONFIG_SNAPSHOT is settings_store.cached_snapshot()
     ):
         return _CONFIG_CACHE
 
-    # Загрузка через context manager
-    async with _maybe_session(session) as s:
-        # Читаем настройки напрямую из БД, обходя get_int
-        # т.к. get_int всегда создаёт свою сессию через SessionLocal
-        settings_query = await s.execute(
-            select(m.settings.key, m.settings.value).where(
-                m.settings.key.in_([
-                    "distribution_tick_seconds",
-                    "distribution_sla_seconds",
-                    "distribution_rounds",
-                    "distribution_log_topn",
-                    "escalate_to_admin_after_min",
-                ])
-            )
-        )
-        settings_dict = {row.key: row.value for row in settings_query}
-        
-        def get_setting_int(key: str, default: int) -> int:
-            """Получить int значение настройки с fallback на дефолт."""
-            value = settings_dict.get(key)
-            if value is None:
-                return default
-            try:
-                return int(value)
-            except (ValueError, TypeError):
-                return default
-        
-        config = DistConfig(
-            tick_seconds=get_setting_int("distribution_tick_seconds", 15),
-            sla_seconds=get_setting_int("distribution_sla_seconds", 120),
-            rounds=get_setting_int("distribution_rounds", 2),
-            top_log_n=get_setting_int("distribution_log_topn", 10),
-            to_admin_after_min=get_setting_int("escalate_to_admin_after_min", 10),
-        )
+    snapshot = await settings_store.get_snapshot(
+        refresh=_CONFIG_CACHE is None, session=session
+    )
+    config = DistConfig(
+        tick_seconds=snapshot.get_int("distribution_tick_seconds", 15),
+        sla_seconds=snapshot.get_int("distribution_sla_seconds", 120),
+        rounds=snapshot.get_int("distribution_rounds", 2),
+        top_log_n=snapshot.get_int("distribution_log_topn", 10),
+        to_admin_after_min=snapshot.get_int("escalate_to_admin_after_min", 10),
+    )
 
     # Обновление кэша
     _CONFIG_CACHE = config
     _CONFIG_CACHE_TIMESTAMP = now
+    _CONFIG_SNAPSHOT = snapshot
 
-    logger.debug("[dist] config reloaded from DB and cached")
+    logger.debug("[dist] config rebuilt from settings snapshot")
     return config
 
 
-async def _try_advisory_lock(session: AsyncSession) -> bool:
-    row = await session.execute(
-        text("SELECT pg_try_advisory_lock(:k)").bindparams(k=ADVISORY_LOCK_KEY)
-    )
-    return bool(row.scalar())
-
-
 async def _db_now(session: AsyncSession):
     row = await session.execute(text("SELECT NOW()"))
     return row.scalar()
@@ -555,10 +534,13 @@ async def _get_order_notification_data(
 
 async def _fetch_orders_for_distribution(
     session: AsyncSession,
+    *,
+    city_ids: Optional[Iterable[int]] = None,
 ) -> list[OrderForDistribution]:
-    result = await session.execute(
-        text(
-            """
+    """Orders waiting for distribution; city_ids limits them to leased cities."""
+    city_filter = "AND o.city_id = ANY(:city_ids)" if city_ids is not None else ""
+    stmt = text(
+        """
         SELECT o.id,
                o.city_id,
                c.name AS city_name,
@@ -572,7 +554,9 @@ async def _fetch_orders_for_distribution(
                o.dist_escalated_logist_at,
                o.dist_escalated_admin_at,
                o.escalation_logist_notified_at,
-               o.escalation_admin_notified_at
+               o.escalation_admin_notified_at,
+               o.lat,
+               o.lon
          FROM orders o
           JOIN cities c ON c.id = o.city_id
           LEFT JOIN districts d ON d.id = o.district_id
@@ -588,6 +572,7 @@ async def _fetch_orders_for_distribution(
                )
            )
            AND o.assigned_master_id IS NULL
+           {city_filter}
          ORDER BY
            -- 1.    ( )
            (o.dist_escalated_admin_at IS NOT NULL) DESC,
@@ -600,9 +585,11 @@ async def _fetch_orders_for_distribution(
            -- 5.   (oldest first)
            o.created_at ASC
          LIMIT 100
-        """
-        )
+        """.format(city_filter=city_filter)
     )
+    if city_ids is not None:
+        stmt = stmt.bindparams(city_ids=sorted(int(cid) for cid in city_ids))
+    result = await session.execute(stmt)
     rows = result.mappings().all()
     orders: list[OrderForDistribution] = []
     for row in rows:
@@ -626,6 +613,8 @@ async def _fetch_orders_for_distribution(
                 escalated_admin_at=row["dist_escalated_admin_at"],
                 escalation_logist_notified_at=row["escalation_logist_notified_at"],
                 escalation_admin_notified_at=row["escalation_admin_notified_at"],
+                lat=row.get("lat"),
+                lon=row.get("lon"),
             )
         )
     return orders
@@ -701,9 +690,220 @@ async def _was_logist_escalated_before(session: AsyncSession, order_id: int) ->
 current_round = _current_round
 
 
+# ===== Batched tick helpers =====
+
+
+@dataclass(slots=True)
+class _TickBatchState:
+    """Offer/escalation state of the fetched orders, loaded once per tick."""
+
+    rounds: dict[int, int] = field(default_factory=dict)
+    active_sent: set[int] = field(default_factory=set)
+    escalated_before: set[int] = field(default_factory=set)
+    offered_masters: dict[int, set[int]] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class _PlannedOffer:
+    order: OrderForDistribution
+    master_id: int
+    round_number: int
+    city_ctx: Optional[CityDistributionContext]
+
+
+async def _expire_overdue_offers_batch(
+    session: AsyncSession, order_ids: list[int], sla_seconds: int
+) -> dict[int, list[int]]:
+    """Batched _expire_overdue_offer: one UPDATE for the whole tick.
+
+    Returns {order_id: [master_id, ...]} of offers moved SENT -> EXPIRED.
+    """
+    if not order_ids:
+        return {}
+    rows = await session.execute(
+        text(
+            """
+        UPDATE offers
+           SET state='EXPIRED', responded_at=NOW()
+         WHERE order_id = ANY(:oids)
+           AND state='SENT'
+           AND (
+                (expires_at IS NOT NULL AND expires_at <= clock_timestamp())
+             OR sent_at <= clock_timestamp() - make_interval(secs => :sla)
+           )
+         RETURNING order_id, master_id
+        """
+        ).bindparams(oids=list(order_ids), sla=sla_seconds)
+    )
+    expired: dict[int, list[int]] = {}
+    for order_id, master_id in rows:
+        expired.setdefault(int(order_id), []).append(int(master_id))
+    return expired
+
+
+async def _load_tick_batch_state(
+    session: AsyncSession, order_ids: list[int]
+) -> _TickBatchState:
+    """Load rounds, active SENT offers, offered masters and escalation history
+    for all fetched orders with two set-based queries.
+
+    Must run after _expire_overdue_offers_batch so active_sent reflects
+    the post-expiry state.
+    """
+    state = _TickBatchState()
+    if not order_ids:
+        return state
+    offer_rows = await session.execute(
+        text(
+            """
+        SELECT order_id,
+               MAX(round_number) AS max_round,
+               BOOL_OR(
+                   state='SENT'
+                   AND (expires_at IS NULL OR expires_at > clock_timestamp())
+               ) AS has_active,
+               ARRAY_AGG(DISTINCT master_id) AS master_ids
+          FROM offers
+         WHERE order_id = ANY(:oids)
+         GROUP BY order_id
+        """
+        ).bindparams(oids=list(order_ids))
+    )
+    for row in offer_rows.mappings():
+        oid = int(row["order_id"])
+        state.rounds[oid] = int(row["max_round"] or 0)
+        if row["has_active"]:
+            state.active_sent.add(oid)
+        state.offered_masters[oid] = {int(mid) for mid in (row["master_ids"] or [])}
+    try:
+        history_rows = await session.execute(
+            text(
+                "SELECT DISTINCT order_id FROM order_status_history"
+                " WHERE order_id = ANY(:oids) AND reason=:reason"
+            ).bindparams(oids=list(order_ids), reason=ESC_REASON_LOGIST)
+        )
+        state.escalated_before = {int(r[0]) for r in history_rows}
+    except Exception:
+        state.escalated_before = set()
+    return state
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+async def _log_sent_offers_debug(session: AsyncSession, order_ids: list[int]) -> None:
+    """Debug: log timing of active SENT offers for the fetched orders (one query)."""
+    if not order_ids:
+        return
+    try:
+        rows = await session.execute(
+            text(
+                "SELECT order_id, state, sent_at, expires_at, NOW() AS now_ts, clock_timestamp() AS clk_ts "
+                "FROM offers WHERE order_id = ANY(:oids) AND state='SENT'"
+            ).bindparams(oids=list(order_ids))
+        )
+        for r in rows:
+            logger.warning(
+                "[dist] debug order=%s offer_state=%s sent_at=%s expires_at=%s now=%s clock=%s",
+                r[0], r[1], _iso(r[2]), _iso(r[3]), _iso(r[4]), _iso(r[5]),
+            )
+    except Exception:
+        pass
+
+
+async def _tick_candidates(
+    session: AsyncSession,
+    pools: dict[tuple[int, Optional[int], str], list[dict]],
+    *,
+    order: OrderForDistribution,
+    district_id: Optional[int],
+    skill_code: str,
+    preferred_mid: Optional[int],
+    offered: set[int],
+) -> list[dict]:
+    """Candidates for one order of the batch.
+
+    Orders without a preferred master share the candidate pool of their
+    (city, district, skill) within a tick; masters that already had an offer
+    for the order are filtered out in memory.
+    """
+    if preferred_mid:
+        return await _candidates(
+            session,
+            oid=order.id,
+            city_id=order.city_id,
+            district_id=district_id,
+            skill_code=skill_code,
+            preferred_mid=preferred_mid,
+            fallback_limit=DEFAULT_MAX_ACTIVE_LIMIT,
+            order_lat=order.lat,
+            order_lon=order.lon,
+        )
+    key = (order.city_id, district_id, skill_code)
+    pool = pools.get(key)
+    if pool is None:
+        # oid=0 never has offers, so the query returns the unfiltered pool
+        pool = await _candidates(
+            session,
+            oid=0,
+            city_id=order.city_id,
+            district_id=district_id,
+            skill_code=skill_code,
+            preferred_mid=None,
+            fallback_limit=DEFAULT_MAX_ACTIVE_LIMIT,
+        )
+        pools[key] = pool
+    # the pool is shared, distance depends on the order: bands go on the copies
+    candidates = [dict(c, rnd=random.random()) for c in pool if c["mid"] not in offered]
+    await _apply_distance(
+        session, candidates, city_id=order.city_id, lat=order.lat, lon=order.lon
+    )
+    return _rank_candidates(candidates, None)
+
+
+async def _send_offers_bulk(
+    session: AsyncSession, planned: list[_PlannedOffer], sla_seconds: int
+) -> dict[int, datetime]:
+    """Insert all planned offers of the tick with one statement.
+
+    Same guard as _send_offer: an (order, master) pair that already has a
+    non EXPIRED/DECLINED offer is skipped. Returns {order_id: expires_at}
+    for the offers actually inserted.
+    """
+    if not planned:
+        return {}
+    rows = await session.execute(
+        text(
+            """
+        INSERT INTO offers(order_id, master_id, round_number, state, sent_at, expires_at)
+        SELECT p.oid, p.mid, p.rnd, 'SENT', clock_timestamp(),
+               clock_timestamp() + make_interval(secs => :sla)
+          FROM unnest(CAST(:oids AS INTEGER[]), CAST(:mids AS INTEGER[]), CAST(:rounds AS INTEGER[]))
+               AS p(oid, mid, rnd)
+         WHERE NOT EXISTS (
+                SELECT 1 FROM offers o
+                 WHERE o.order_id = p.oid
+                   AND o.master_id = p.mid
+                   AND o.state NOT IN ('EXPIRED', 'DECLINED')
+         )
+        RETURNING id, order_id, expires_at
+        """
+        ).bindparams(
+            oids=[p.order.id for p in planned],
+            mids=[p.master_id for p in planned],
+            rounds=[p.round_number for p in planned],
+            sla=sla_seconds,
+        )
+    )
+    inserted = rows.all()
+    offer_expiry.schedule_many(inserted)
+    return {int(row[1]): row[2] for row in inserted}
+
+
 async def _max_active_limit_for(session: AsyncSession) -> int:
     """Return the global default max active orders (fallback 5)."""
-    value = await get_int("max_active_orders", DEFAULT_MAX_ACTIVE_LIMIT)
+    value = await get_int("max_active_orders", DEFAULT_MAX_ACTIVE_LIMIT, session=session)
     # Safety guard: at least 1 active order allowed.
     return max(1, int(value))
 
@@ -895,7 +1095,7 @@ async def _check_preferred_master_availability(
 
     # Active orders limit
     try:
-        base_limit = await get_int("max_active_orders", DEFAULT_MAX_ACTIVE_LIMIT)
+        base_limit = await get_int("max_active_orders", DEFAULT_MAX_ACTIVE_LIMIT, session=session)
     except Exception:
         base_limit = DEFAULT_MAX_ACTIVE_LIMIT
     max_limit = getattr(mm, "max_active_orders_override", None) or base_limit
@@ -927,16 +1127,18 @@ async def _wake_deferred_orders(
     session: AsyncSession,
     *,
     now_utc: datetime,
+    city_ids: Optional[Iterable[int]] = None,
 ) -> list[tuple[int, datetime]]:
-    rows = await session.execute(
-        select(
-            m.orders.id,
-            m.orders.city_id,
-            m.orders.timeslot_start_utc,
-        ).where(
-            m.orders.status == m.OrderStatus.DEFERRED
-        )
+    stmt = select(
+        m.orders.id,
+        m.orders.city_id,
+        m.orders.timeslot_start_utc,
+    ).where(
+        m.orders.status == m.OrderStatus.DEFERRED
     )
+    if city_ids is not None:
+        stmt = stmt.where(m.orders.city_id.in_(list(city_ids)))
+    rows = await session.execute(stmt)
     records = rows.all()
     if not records:
         return []
@@ -995,6 +1197,8 @@ async def _candidates(
     skill_code: Optional[str],
     preferred_mid: Optional[int],
     fallback_limit: int,
+    order_lat: Optional[float] = None,
+    order_lon: Optional[float] = None,
 ) -> list[dict]:
     """
      STEP 2.2:    fallback    .
@@ -1008,128 +1212,59 @@ async def _candidates(
     """
     if not skill_code:
         return []
-    
-    #   district_id  -    
-    if district_id is None:
-        sql = text(
-            """
-        WITH lim AS (
-          SELECT m.id AS master_id,
-                 COALESCE(
-                     m.max_active_orders_override,
-                     (SELECT CAST(value AS INT) FROM settings WHERE key='max_active_orders' LIMIT 1),
-                     :fallback
-                 ) AS max_limit,
-                 (SELECT COUNT(*) FROM orders o2
-                   WHERE o2.assigned_master_id = m.id
-                     AND o2.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT')
-                 ) AS active_cnt
-          FROM masters m
-        ), avg7 AS (
-          SELECT o.assigned_master_id AS mid, AVG(o.total_sum)::numeric(10,2) AS avg_week_check
-          FROM orders o
-          WHERE o.status IN ('PAYMENT','CLOSED')
-            AND o.created_at >= (NOW() - INTERVAL '7 days')
-          GROUP BY o.assigned_master_id
-        )
-        SELECT m.id                  AS mid,
-               m.has_vehicle         AS car,
-               COALESCE(a.avg_week_check,0)::numeric(10,2) AS avg_week,
-               COALESCE(m.rating,0)::numeric(3,1) AS rating,
-               m.is_on_shift         AS shift
-          FROM masters m
-          --  LEFT JOIN .. district_id=NULL -    
-          LEFT JOIN master_districts md ON md.master_id = m.id
-          JOIN master_skills ms ON ms.master_id = m.id
-          JOIN skills s ON s.id = ms.skill_id AND s.code = :skill_code AND s.is_active = TRUE
-          JOIN lim ON lim.master_id = m.id
-          LEFT JOIN avg7 a ON a.mid = m.id
-         WHERE m.city_id = :cid
-           AND m.is_active = TRUE
-           AND m.is_blocked = FALSE
-           AND m.verified = TRUE
-           AND m.is_on_shift = TRUE
-           AND (m.break_until IS NULL OR m.break_until <= NOW())
-           AND lim.active_cnt < lim.max_limit
-           AND NOT EXISTS (SELECT 1 FROM offers o WHERE o.order_id = :oid AND o.master_id = m.id)
-         ORDER BY
-           (CASE WHEN :pref > 0 AND m.id = :pref THEN 1 ELSE 0 END) DESC,
-           m.has_vehicle DESC,
-           COALESCE(a.avg_week_check,0) DESC,
-           COALESCE(m.rating,0) DESC,
-           m.id ASC
+
+    # Static eligibility (city / district / skill / verified / active / blocked)
+    # comes from the in-memory index; SQL only checks live state.
+    eligible_ids = await eligibility_index.eligible_master_ids(
+        session,
+        city_id=city_id,
+        district_id=district_id,
+        skill_code=skill_code,
+    )
+    if not eligible_ids:
+        return []
+
+    # Global limit from the settings snapshot instead of a per-row subquery
+    default_limit = await get_int("max_active_orders", fallback_limit, session=session)
+
+    # active_cnt / avg_week_check come from the master_stats projection.
+    # Static flags are re-checked on the PK rows in case the index is stale.
+    sql = text(
         """
-        )
-        rs = await session.execute(
-            sql.bindparams(
-                oid=oid,
-                cid=city_id,
-                pref=(preferred_mid or -1),
-                skill_code=skill_code,
-                fallback=fallback_limit,
-            )
-        )
-    else:
-        #  District  -    (  )
-        sql = text(
-            """
-        WITH lim AS (
-          SELECT m.id AS master_id,
-                 COALESCE(
-                     m.max_active_orders_override,
-                     (SELECT CAST(value AS INT) FROM settings WHERE key='max_active_orders' LIMIT 1),
-                     :fallback
-                 ) AS max_limit,
-                 (SELECT COUNT(*) FROM orders o2
-                   WHERE o2.assigned_master_id = m.id
-                     AND o2.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT')
-                 ) AS active_cnt
-          FROM masters m
-        ), avg7 AS (
-          SELECT o.assigned_master_id AS mid, AVG(o.total_sum)::numeric(10,2) AS avg_week_check
-          FROM orders o
-          WHERE o.status IN ('PAYMENT','CLOSED')
-            AND o.created_at >= (NOW() - INTERVAL '7 days')
-          GROUP BY o.assigned_master_id
-        )
         SELECT m.id                  AS mid,
                m.has_vehicle         AS car,
-               COALESCE(a.avg_week_check,0)::numeric(10,2) AS avg_week,
+               COALESCE(st.avg_week_check,0)::numeric(10,2) AS avg_week,
                COALESCE(m.rating,0)::numeric(3,1) AS rating,
                m.is_on_shift         AS shift
           FROM masters m
-          JOIN master_districts md ON md.master_id = m.id AND md.district_id = :did
-          JOIN master_skills ms ON ms.master_id = m.id
-          JOIN skills s ON s.id = ms.skill_id AND s.code = :skill_code AND s.is_active = TRUE
-          JOIN lim ON lim.master_id = m.id
-          LEFT JOIN avg7 a ON a.mid = m.id
-         WHERE m.city_id = :cid
+          LEFT JOIN master_stats st ON st.master_id = m.id
+         WHERE m.id = ANY(:mids)
+           AND m.city_id = :cid
            AND m.is_active = TRUE
            AND m.is_blocked = FALSE
            AND m.verified = TRUE
            AND m.is_on_shift = TRUE
            AND (m.break_until IS NULL OR m.break_until <= NOW())
-           AND lim.active_cnt < lim.max_limit
+           AND COALESCE(st.active_cnt, 0) < COALESCE(m.max_active_orders_override, :default_limit)
            AND NOT EXISTS (SELECT 1 FROM offers o WHERE o.order_id = :oid AND o.master_id = m.id)
          ORDER BY
            (CASE WHEN :pref > 0 AND m.id = :pref THEN 1 ELSE 0 END) DESC,
            m.has_vehicle DESC,
-           COALESCE(a.avg_week_check,0) DESC,
+           COALESCE(st.avg_week_check,0) DESC,
            COALESCE(m.rating,0) DESC,
            m.id ASC
         """
+    )
+    rs = await session.execute(
+        sql.bindparams(
+            mids=list(eligible_ids),
+            oid=oid,
+            cid=city_id,
+            pref=(preferred_mid or -1),
+            default_limit=default_limit,
         )
-        rs = await session.execute(
-            sql.bindparams(
-                oid=oid,
-                cid=city_id,
-                did=district_id,
-                pref=(preferred_mid or -1),
-                skill_code=skill_code,
-                fallback=fallback_limit,
-            )
-        )
-    
+    )
+
     #  STEP 3.2:    Python  RANDOM()  SQL
     #     
     candidates = [
@@ -1143,7 +1278,47 @@ async def _candidates(
         )
         for row in rs.fetchall()
     ]
-    
+    await _apply_distance(session, candidates, city_id=city_id, lat=order_lat, lon=order_lon)
+    return _rank_candidates(candidates, preferred_mid)
+
+
+async def _apply_distance(
+    session: AsyncSession,
+    candidates: list[dict],
+    *,
+    city_id: int,
+    lat: Optional[float],
+    lon: Optional[float],
+) -> None:
+    """Set dist_band / dist_km of the candidates (band 0 without coordinates)."""
+    if not candidates:
+        return
+    bands = await proximity.candidate_bands(
+        session,
+        city_id=city_id,
+        lat=lat,
+        lon=lon,
+        master_ids=[c["mid"] for c in candidates],
+    )
+    for candidate in candidates:
+        candidate["dist_band"], candidate["dist_km"] = bands.get(candidate["mid"], (0, None))
+
+
+def _rank_key(candidate: dict) -> tuple:
+    return (
+        candidate.get("dist_band", 0),
+        candidate["car"],
+        candidate["avg_week"],
+        candidate["rating"],
+    )
+
+
+def _rank_candidates(candidates: list[dict], preferred_mid: Optional[int]) -> list[dict]:
+    """Post-process SQL-ordered candidates: force preferred first, shuffle ties.
+
+    Candidates are grouped by distance band first; the stable sort keeps the
+    SQL order (car > avg_week > rating) inside a band.
+    """
     #   preferred  -     ORDER BY  SQL
     #        
     #    (car > avg_week > rating)   
@@ -1162,10 +1337,10 @@ async def _candidates(
     
     #    (car, avg_week, rating)    
     from itertools import groupby
-    from operator import itemgetter
     
     grouped = []
-    for key, group in groupby(rest, key=itemgetter("car", "avg_week", "rating")):
+    rest = sorted(rest, key=lambda c: c.get("dist_band", 0))
+    for key, group in groupby(rest, key=_rank_key):
         group_list = list(group)
         random.shuffle(group_list)  #      
         grouped.extend(group_list)
@@ -1200,11 +1375,15 @@ async def _send_offer(
             """
         INSERT INTO offers(order_id, master_id, round_number, state, sent_at, expires_at)
         VALUES (:oid, :mid, :r, 'SENT', clock_timestamp(), clock_timestamp() + make_interval(secs => :sla))
-        RETURNING id
+        RETURNING id, expires_at
         """
         ).bindparams(oid=oid, mid=mid, r=round_number, sla=sla_seconds)
     )
-    return bool(ins.scalar_one_or_none())
+    row = ins.first()
+    if row is None:
+        return False
+    offer_expiry.schedule(row[0], oid, row[1])
+    return True
 
 
 
@@ -1231,14 +1410,18 @@ async def _log_ranked(
     top_lines: list[str] = []
     for candidate in ranked[:top_n]:
         shift_flag = "on" if candidate.get("shift", True) else "off"
+        dist_km = candidate.get("dist_km")
+        dist_label = f"{dist_km:.1f}km" if dist_km is not None else "-"
         top_lines.append(
             "  {"
             f"mid={candidate['mid']} "
             f"shift={shift_flag} "
+            f"dist={dist_label} "
             f"car={1 if candidate['car'] else 0} "
             f"avg_week={candidate['avg_week']:.0f} "
             f"rating={candidate['rating']:.1f} "
-            f"score=car({1 if candidate['car'] else 0})"
+            f"score=band({candidate.get('dist_band', 0)})"
+            f">car({1 if candidate['car'] else 0})"
             f">avg({candidate['avg_week']:.0f})"
             f">rat({candidate['rating']:.1f})"
             f">rnd({candidate.get('rnd', 0.0):.2f})"
@@ -1462,16 +1645,20 @@ async def _tick_once_impl(
         }
     )
     
-    if not await _try_advisory_lock(session):
+    # Sharding: each replica distributes only the cities it holds a lease on
+    leased_cities = await city_leases.claim_cities(session)
+    offer_expiry.set_cities(leased_cities)
+    if not leased_cities:
         return
 
     now = await _db_now(session)
     try:
-        # Proactively expire overdue offers by SLA
-        await expire_sent_offers(session, now)
+        # Offers past their deadline that the expiry loop has not handled yet
+        # (targeted by id, no table scan); the batch below covers the rest.
+        await offer_expiry.expire_due(session)
     except Exception:
-        pass
-    awakened = await _wake_deferred_orders(session, now_utc=now)
+        logger.debug("[dist] offer expiry in tick failed", exc_info=True)
+    awakened = await _wake_deferred_orders(session, now_utc=now, city_ids=leased_cities)
     for order_id, target_local in awakened:
         message = f"[dist] deferred->searching order={order_id} at {target_local.isoformat()}"
         logger.info(message)
@@ -1485,7 +1672,7 @@ async def _tick_once_impl(
         )
 
 
-    orders = await _fetch_orders_for_distribution(session)
+    orders = await _fetch_orders_for_distribution(session, city_ids=leased_cities)
 
     #  STEP 4.2: Structured logging - orders fetched
     log_distribution_event(
@@ -1493,28 +1680,25 @@ async def _tick_once_impl(
         details={"orders_count": len(orders)},
     )
 
+    order_ids = [order.id for order in orders]
+
     # Debug: log any active SENT offers timing for fetched orders
-    try:
-        for ord_obj in orders:
-            rows = await session.execute(
-                text(
-                    "SELECT state, sent_at, expires_at, NOW() AS now_ts, clock_timestamp() AS clk_ts "
-                    "FROM offers WHERE order_id=:oid AND state='SENT'"
-                ).bindparams(oid=ord_obj.id)
-            )
-            for r in rows:
-                logger.warning(
-                    "[dist] debug order=%s offer_state=%s sent_at=%s expires_at=%s now=%s clock=%s",
-                    ord_obj.id, r[0], getattr(r[1], 'isoformat', lambda: r[1])(), getattr(r[2], 'isoformat', lambda: r[2])(), getattr(r[3], 'isoformat', lambda: r[3])(), getattr(r[4], 'isoformat', lambda: r[4])(),
-                )
-    except Exception:
-        pass
+    await _log_sent_offers_debug(session, order_ids)
 
     city_contexts = await _fetch_city_contexts(
         session,
         {order.city_id for order in orders},
     )
 
+    # Batch prefetch: expire overdue offers and load rounds / active offers /
+    # escalation history for the whole batch instead of per-order queries.
+    if orders:
+        await eligibility_index.get_index(session, force_check=True)
+    expired_by_order = await _expire_overdue_offers_batch(session, order_ids, cfg.sla_seconds)
+    batch = await _load_tick_batch_state(session, order_ids)
+    candidate_pools: dict[tuple[int, Optional[int], str], list[dict]] = {}
+    planned: list[_PlannedOffer] = []
+
     for order in orders:
         city_ctx = city_contexts.get(order.city_id)
         #  STEP 1.4:    -      
@@ -1589,8 +1773,7 @@ async def _tick_once_impl(
             logger.info(message)
             _dist_log(message)
 
-        timed_out_mid = await _expire_overdue_offer(session, order.id, cfg.sla_seconds)
-        if timed_out_mid:
+        for timed_out_mid in expired_by_order.get(order.id, ()):
             message = f"[dist] order={order.id} timeout mid={timed_out_mid}"
             logger.info(message)
             _dist_log(message)
@@ -1603,20 +1786,16 @@ async def _tick_once_impl(
                 reason="sla_timeout",
             )
 
-        row = await session.execute(
-            text(
-                "SELECT 1 FROM offers WHERE order_id=:oid AND state='SENT' AND (expires_at IS NULL OR expires_at > clock_timestamp()) LIMIT 1"
-            ).bindparams(oid=order.id)
-        )
-        if row.first():
-            await _reset_escalations(session, order)
-            await session.commit()
-            obj = await session.get(m.orders, order.id)
-            if obj is not None:
-                session.expire(obj)
+        if order.id in batch.active_sent:
+            if order.escalated_logist_at is not None or order.escalated_admin_at is not None:
+                await _reset_escalations(session, order)
+                await session.commit()
+                obj = await session.get(m.orders, order.id)
+                if obj is not None:
+                    session.expire(obj)
             continue
 
-        current_round = await _current_round(session, order.id)
+        current_round = batch.rounds.get(order.id, 0)
 
         # If there were previous offers and now no active SENT remains,
         # escalate to logist before attempting a new round IFF the order had
@@ -1624,7 +1803,7 @@ async def _tick_once_impl(
         # offer). This preserves e2e expectations and keeps faster retry case.
         previously_escalated = (
             order.escalated_logist_at is not None
-            or await _was_logist_escalated_before(session, order.id)
+            or order.id in batch.escalated_before
         )
         if current_round > 0 and previously_escalated:
             message = f"[dist] order={order.id} prev_offers_expired -> escalate=logist"
@@ -1764,25 +1943,25 @@ async def _tick_once_impl(
             preferred_master_id=preferred_id,
         )
 
-        ranked = await _candidates(
+        ranked = await _tick_candidates(
             session,
-            oid=order.id,
-            city_id=order.city_id,
+            candidate_pools,
+            order=order,
             district_id=order.district_id,
             skill_code=skill_code,
             preferred_mid=preferred_id,
-            fallback_limit=DEFAULT_MAX_ACTIVE_LIMIT,
+            offered=batch.offered_masters.get(order.id, set()),
         )
         # Fallback: if district-specific search returns no candidates, try citywide
         if not ranked and order.district_id is not None:
-            ranked = await _candidates(
+            ranked = await _tick_candidates(
                 session,
-                oid=order.id,
-                city_id=order.city_id,
+                candidate_pools,
+                order=order,
                 district_id=None,
                 skill_code=skill_code,
                 preferred_mid=preferred_id,
-                fallback_limit=DEFAULT_MAX_ACTIVE_LIMIT,
+                offered=batch.offered_masters.get(order.id, set()),
             )
         
         await _log_ranked(
@@ -1877,61 +2056,62 @@ async def _tick_once_impl(
             },
         )
 
-        first_mid = ranked[0]["mid"]
         await _reset_escalations(session, order)
-        ok = await _send_offer(
-            session,
-            oid=order.id,
-            mid=first_mid,
-            round_number=next_round,
+        planned.append(
+            _PlannedOffer(
+                order=order,
+                master_id=ranked[0]["mid"],
+                round_number=next_round,
+                city_ctx=city_ctx,
+            )
+        )
+
+    # Bulk insert of all offers decided in this tick
+    sent = await _send_offers_bulk(session, planned, cfg.sla_seconds)
+    for offer in planned:
+        order = offer.order
+        first_mid = offer.master_id
+        until = sent.get(order.id)
+        if until is None:
+            logger.info(f"[dist] order={order.id} mid={first_mid} offer already exists, skipping")
+            continue
+        message = f"[dist] order={order.id} decision=offer mid={first_mid} until={until.isoformat()}"
+        logger.info(message)
+        _dist_log(message)
+
+        #  STEP 4.2: Structured logging - offer sent
+        log_distribution_event(
+            DistributionEvent.OFFER_SENT,
+            order_id=order.id,
+            master_id=first_mid,
+            round_number=offer.round_number,
             sla_seconds=cfg.sla_seconds,
+            expires_at=until,
         )
 
-        if ok:
-            until_row = await session.execute(
-                text("SELECT NOW() + make_interval(secs => :sla)").bindparams(
-                    sla=cfg.sla_seconds
-                )
-            )
-            until = until_row.scalar()
-            message = f"[dist] order={order.id} decision=offer mid={first_mid} until={until.isoformat()}"
-            logger.info(message)
-            _dist_log(message)
-            
-            #  STEP 4.2: Structured logging - offer sent
-            log_distribution_event(
-                DistributionEvent.OFFER_SENT,
-                order_id=order.id,
-                master_id=first_mid,
-                round_number=next_round,
-                sla_seconds=cfg.sla_seconds,
-                expires_at=until,
+        #  P1-10:  push-    
+        try:
+            order_data = await _get_order_notification_data(
+                session,
+                order.id,
+                timezone=offer.city_ctx.timezone if offer.city_ctx else None,
             )
-            
-            #  P1-10:  push-    
-            try:
-                order_data = await _get_order_notification_data(
+            if order_data:
+                await notify_master(
                     session,
-                    order.id,
-                    timezone=city_ctx.timezone if city_ctx else None,
+                    master_id=first_mid,
+                    event=NotificationEvent.NEW_OFFER,
+                    **order_data,
                 )
-                if order_data:
-                    await notify_master(
-                        session,
-                        master_id=first_mid,
-                        event=NotificationEvent.NEW_OFFER,
-                        **order_data,
-                    )
-                    logger.info(f"[dist] Push notification queued for master#{first_mid} about order#{order.id}")
-            except Exception as e:
-                logger.error(f"[dist] Failed to queue notification for master#{first_mid}: {e}")
+                logger.info(f"[dist] Push notification queued for master#{first_mid} about order#{order.id}")
+        except Exception as e:
+            logger.error(f"[dist] Failed to queue notification for master#{first_mid}: {e}")
 
-
-        # Commit changes for this tick. Avoid expiring the whole identity map here:
-        # test code may access freshly loaded ORM objects (e.g., offers) right after
-        # tick_once() returns, and a blanket expire_all() would trigger implicit
-        # IO on attribute access under AsyncSession, causing MissingGreenlet.
-        await session.commit()
+    # Commit changes for this tick. Avoid expiring the whole identity map here:
+    # test code may access freshly loaded ORM objects (e.g., offers) right after
+    # tick_once() returns, and a blanket expire_all() would trigger implicit
+    # IO on attribute access under AsyncSession, causing MissingGreenlet.
+    await session.commit()
 
 
 async def run_scheduler(bot: Bot | None = None, *, alerts_chat_id: Optional[int] = None) -> None:
@@ -1941,15 +2121,33 @@ async def run_scheduler(bot: Bot | None = None, *, alerts_chat_id: Optional[int]
     dist_logger.setLevel(logging.ERROR)  #  distribution  ERROR  
 
     sleep_for = 15  #  STEP 2.3: 30 -> 15 
-    while True:
+    # LISTEN/NOTIFY wakeups: new orders, declines, expiries and shift starts
+    # trigger a tick right away; the periodic tick remains a safety sweep.
+    listener = asyncio.create_task(wake_channel.run_listener(), name="dist_wake_listener")
+    # Offers are expired at their deadlines, which wakes the loop below
+    expiry = asyncio.create_task(offer_expiry.run_offer_expiry(), name="dist_offer_expiry")
+    try:
+        while True:
+            try:
+                cfg = await _load_config(session=None)  #     
+                sleep_for = max(1, cfg.tick_seconds)
+                await tick_once(cfg, bot=bot, alerts_chat_id=alerts_chat_id)
+            except Exception as exc:
+                logger.exception("[dist] exception: %s", exc)
+                _dist_log(f"[dist] exception: {exc}", level="ERROR")
+            wakeups = await wake_channel.wait(sleep_for)
+            if wakeups:
+                logger.debug("[dist] woken up early: %s", wakeups)
+    finally:
+        for task in (listener, expiry):
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
         try:
-            cfg = await _load_config(session=None)  #     
-            sleep_for = max(1, cfg.tick_seconds)
-            await tick_once(cfg, bot=bot, alerts_chat_id=alerts_chat_id)
+            async with SessionLocal() as session:
+                await city_leases.release_all(session)
         except Exception as exc:
-            logger.exception("[dist] exception: %s", exc)
-            _dist_log(f"[dist] exception: {exc}", level="ERROR")
-        await asyncio.sleep(sleep_for)
+            logger.warning("[dist] failed to release city leases: %s", exc)
 
 
 
@@ -6,7 +6,7 @@ from dataclasses import dataclass
 from datetime import datetime, time, timedelta, timezone
 from typing import Any, Optional, Sequence, cast
 
-from sqlalchemy import insert, select, text, update
+from sqlalchemy import insert, text, update
 from sqlalchemy.engine import CursorResult
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import func
@@ -14,7 +14,7 @@ from sqlalchemy.sql import func
 from field_service.db.session import SessionLocal
 from field_service.db import models as m
 from field_service.services import live_log
-from field_service.services.settings_service import get_timezone, get_working_window
+from field_service.services.settings_service import get_int, get_timezone, get_working_window
 from field_service.services.skills_map import get_skill_code
 
 UTC = timezone.utc
@@ -31,12 +31,7 @@ LEGACY_STATUS_ALIASES = {
 
 
 async def _get_int_setting(session: AsyncSession, key: str, default: int) -> int:
-    row = await session.execute(select(m.settings.value).where(m.settings.key == key))
-    v = row.scalar_one_or_none()
-    try:
-        return int(v) if v is not None else int(default)
-    except Exception:
-        return int(default)
+    return await get_int(key, default, session=session)
 
 
 async def _max_active_limit_for(session: AsyncSession) -> int:
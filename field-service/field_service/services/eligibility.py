@@ -21,6 +21,7 @@ from typing import Optional
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from field_service.services import settings_service
 from field_service.services.skills_map import get_skill_code
 
 logger = logging.getLogger(__name__)
@@ -102,6 +103,10 @@ async def eligible_masters_for_order(
         logger.warning(f"[eligibility] order={order_id} has invalid/missing category={category}")
         return []
     
+    default_limit = await settings_service.get_int(
+        "max_active_orders", DEFAULT_MAX_ACTIVE_LIMIT, session=session
+    )
+
     # SQL-запрос идентичен тому что в _candidates() из distribution_scheduler.py
     # но без ORDER BY (так как это функция проверки, а не выбора)
     # и с добавлением полей для отображения
@@ -111,11 +116,7 @@ async def eligible_masters_for_order(
         sql = text("""
             WITH lim AS (
               SELECT m.id AS master_id,
-                     COALESCE(
-                         m.max_active_orders_override,
-                         (SELECT CAST(value AS INT) FROM settings WHERE key='max_active_orders' LIMIT 1),
-                         :fallback
-                     ) AS max_limit,
+                     COALESCE(m.max_active_orders_override, :default_limit) AS max_limit,
                      (SELECT COUNT(*) FROM orders o2
                        WHERE o2.assigned_master_id = m.id
                          AND o2.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT')
@@ -150,7 +151,7 @@ async def eligible_masters_for_order(
                 oid=order_id,
                 cid=city_id,
                 skill_code=skill_code,
-                fallback=DEFAULT_MAX_ACTIVE_LIMIT,
+                default_limit=default_limit,
                 limit=limit,
             )
         )
@@ -159,11 +160,7 @@ async def eligible_masters_for_order(
         sql = text("""
             WITH lim AS (
               SELECT m.id AS master_id,
-                     COALESCE(
-                         m.max_active_orders_override,
-                         (SELECT CAST(value AS INT) FROM settings WHERE key='max_active_orders' LIMIT 1),
-                         :fallback
-                     ) AS max_limit,
+                     COALESCE(m.max_active_orders_override, :default_limit) AS max_limit,
                      (SELECT COUNT(*) FROM orders o2
                        WHERE o2.assigned_master_id = m.id
                          AND o2.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT')
@@ -199,7 +196,7 @@ async def eligible_masters_for_order(
                 cid=city_id,
                 did=district_id,
                 skill_code=skill_code,
-                fallback=DEFAULT_MAX_ACTIVE_LIMIT,
+                default_limit=default_limit,
                 limit=limit,
             )
         )
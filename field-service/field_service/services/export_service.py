@@ -1,15 +1,17 @@
 ﻿from __future__ import annotations
 
+import asyncio
 import csv
-import io
+import shutil
+import tempfile
 from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from datetime import date, datetime, timezone
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Any, AsyncIterator, Iterable, Literal, Optional, Sequence
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterable, Literal, Optional, Sequence
 
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
+import xlsxwriter
 from sqlalchemy import func, select
 from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -19,6 +21,9 @@ from field_service.db.session import SessionLocal
 
 UTC = timezone.utc
 
+# Rows fetched per server-side cursor round trip / handed to the writer thread
+EXPORT_FETCH_SIZE = 1000
+
 
 def get_timezone():
     """Return the local timezone used for exports.
@@ -174,56 +179,143 @@ def _xlsx_value(spec: ColumnSpec, value: Any) -> Any:
     return value
 
 
-def _apply_number_formats(ws, columns: Sequence[ColumnSpec]) -> None:
-    for idx, spec in enumerate(columns, start=1):
-        column_letter = get_column_letter(idx)
-        ws.column_dimensions[column_letter].width = max(len(spec.name) + 2, 12)
-        if spec.kind not in {"decimal", "float", "int"}:
-            continue
-        if spec.kind == "int":
-            fmt = "0"
-        else:
-            precision = spec.precision or (6 if spec.kind == "float" else 2)
-            fmt = "0" if precision == 0 else "0." + ("0" * precision)
-        for cell in ws.iter_rows(min_row=2, min_col=idx, max_col=idx):
-            cell[0].number_format = fmt
-
-
-def _render_csv(columns: Sequence[ColumnSpec], rows: Sequence[dict[str, Any]]) -> bytes:
-    buffer = io.StringIO(newline="")
-    writer = csv.writer(buffer, delimiter=";")
-    writer.writerow([spec.name for spec in columns])
-    for row in rows:
-        writer.writerow([
-            _format_csv_value(spec, row.get(spec.name)) for spec in columns
-        ])
-    return buffer.getvalue().encode("utf-8-sig")
-
-
-def _render_xlsx(sheet_name: str, columns: Sequence[ColumnSpec], rows: Sequence[dict[str, Any]]) -> bytes:
-    wb = Workbook()
-    ws = wb.active
-    ws.title = sheet_name
-    ws.append([spec.name for spec in columns])
-    for row in rows:
-        ws.append([
-            _xlsx_value(spec, row.get(spec.name)) for spec in columns
-        ])
-    _apply_number_formats(ws, columns)
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    return buffer.getvalue()
-
-
-def _make_bundle(prefix: str, columns: Sequence[ColumnSpec], rows: Sequence[dict[str, Any]], *, sheet_name: Optional[str] = None) -> ExportBundle:
-    sheet = sheet_name or prefix
-    csv_bytes = _render_csv(columns, rows)
-    xlsx_bytes = _render_xlsx(sheet, columns, rows)
-    timestamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+def _xlsx_number_format(spec: ColumnSpec) -> Optional[str]:
+    if spec.kind == "int":
+        return "0"
+    if spec.kind in {"decimal", "float"}:
+        precision = spec.precision or (6 if spec.kind == "float" else 2)
+        return "0" if precision == 0 else "0." + ("0" * precision)
+    return None
+
+
+@dataclass(slots=True)
+class ExportFiles:
+    """Export written to a temp directory; the caller uploads and cleans up."""
+
+    csv_filename: str
+    csv_path: Path
+    xlsx_filename: str
+    xlsx_path: Path
+    rows: int
+    directory: Path
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class _ExportWriter:
+    """Incremental CSV + XLSX writer.
+
+    XLSX goes through XlsxWriter in ``constant_memory`` mode: rows are flushed
+    to disk as they are written. All methods are blocking and are called from
+    a worker thread.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        prefix: str,
+        sheet_name: str,
+        columns: Sequence[ColumnSpec],
+    ) -> None:
+        timestamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+        self.directory = directory
+        self.columns = columns
+        self.csv_filename = f"{prefix}_{timestamp}.csv"
+        self.xlsx_filename = f"{prefix}_{timestamp}.xlsx"
+        self.rows = 0
+
+        self._csv_file = open(directory / self.csv_filename, "w", encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._csv_file, delimiter=";")
+        self._csv.writerow([spec.name for spec in columns])
+
+        self._workbook = xlsxwriter.Workbook(
+            str(directory / self.xlsx_filename),
+            {"constant_memory": True, "tmpdir": str(directory)},
+        )
+        self._sheet = self._workbook.add_worksheet(sheet_name)
+        self._formats = []
+        for idx, spec in enumerate(columns):
+            number_format = _xlsx_number_format(spec)
+            fmt = self._workbook.add_format({"num_format": number_format}) if number_format else None
+            self._formats.append(fmt)
+            self._sheet.set_column(idx, idx, max(len(spec.name) + 2, 12))
+            self._sheet.write_string(0, idx, spec.name)
+
+    def write_rows(self, rows: Iterable[Any], map_row: Callable[[Any], dict[str, Any]]) -> None:
+        sheet = self._sheet
+        for raw in rows:
+            row = map_row(raw)
+            self._csv.writerow([_format_csv_value(spec, row.get(spec.name)) for spec in self.columns])
+            self.rows += 1
+            for idx, spec in enumerate(self.columns):
+                value = _xlsx_value(spec, row.get(spec.name))
+                if value is None:
+                    continue
+                if spec.kind == "bool":
+                    sheet.write_boolean(self.rows, idx, value)
+                elif spec.kind in {"decimal", "float", "int"}:
+                    sheet.write_number(self.rows, idx, float(value), self._formats[idx])
+                else:
+                    # write_string: a client name like "=..." must not become a formula
+                    sheet.write_string(self.rows, idx, str(value))
+
+    def close(self) -> ExportFiles:
+        self._csv_file.close()
+        self._workbook.close()
+        return ExportFiles(
+            csv_filename=self.csv_filename,
+            csv_path=self.directory / self.csv_filename,
+            xlsx_filename=self.xlsx_filename,
+            xlsx_path=self.directory / self.xlsx_filename,
+            rows=self.rows,
+            directory=self.directory,
+        )
+
+    def abort(self) -> None:
+        try:
+            self._csv_file.close()
+        except Exception:
+            pass
+
+
+async def _stream_to_files(
+    db: AsyncSession,
+    stmt: Any,
+    map_row: Callable[[Any], dict[str, Any]],
+    *,
+    prefix: str,
+    columns: Sequence[ColumnSpec],
+    sheet_name: Optional[str] = None,
+) -> ExportFiles:
+    """Server-side cursor -> CSV/XLSX files, serialization in a worker thread."""
+    directory = Path(tempfile.mkdtemp(prefix=f"export_{prefix}_"))
+    writer: Optional[_ExportWriter] = None
+    try:
+        writer = await asyncio.to_thread(
+            _ExportWriter, directory, prefix, sheet_name or prefix, columns
+        )
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        async for chunk in result.partitions():
+            await asyncio.to_thread(writer.write_rows, chunk, map_row)
+        return await asyncio.to_thread(writer.close)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+
+async def _files_to_bundle(files: ExportFiles) -> ExportBundle:
+    try:
+        csv_bytes = await asyncio.to_thread(files.csv_path.read_bytes)
+        xlsx_bytes = await asyncio.to_thread(files.xlsx_path.read_bytes)
+    finally:
+        files.cleanup()
     return ExportBundle(
-        csv_filename=f"{prefix}_{timestamp}.csv",
+        csv_filename=files.csv_filename,
         csv_bytes=csv_bytes,
-        xlsx_filename=f"{prefix}_{timestamp}.xlsx",
+        xlsx_filename=files.xlsx_filename,
         xlsx_bytes=xlsx_bytes,
     )
 
@@ -237,117 +329,98 @@ async def _session_scope(session: AsyncSession | None) -> AsyncIterator[AsyncSes
         yield new_session
 
 
-async def export_orders(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportBundle:
-    start_utc = _ensure_utc(date_from)
-    end_utc = _ensure_utc(date_to, end_of_day=True)
+def _orders_statement(start_utc: datetime, end_utc: datetime, city_filter: Optional[list[int]]):
     assigned_master = aliased(m.masters, name="assigned_master")
-    city_filter = list(city_ids) if city_ids else None
-    async with _session_scope(session) as db:
-        stmt = (
-            select(
-                m.orders.id.label("order_id"),
-                m.orders.created_at.label("created_at"),
-                m.cities.name.label("city"),
-                m.districts.name.label("district"),
-                m.streets.name.label("street"),
-                m.orders.house.label("house"),
-                m.orders.lat.label("lat"),
-                m.orders.lon.label("lon"),
-                m.orders.category.label("category"),
-                m.orders.status.label("status"),
-                m.orders.type.label("order_type"),
-                m.orders.late_visit.label("late_visit"),
-                m.orders.company_payment.label("company_payment"),
-                m.orders.total_sum.label("total_sum"),
-                m.orders.client_name.label("client_name"),
-                m.orders.client_phone.label("client_phone"),
-                m.orders.timeslot_start_utc.label("timeslot_start_utc"),
-                m.orders.timeslot_end_utc.label("timeslot_end_utc"),
-                assigned_master.full_name.label("master_name"),
-                assigned_master.phone.label("master_phone"),
-                (
-                    select(func.max(m.order_status_history.created_at))
-                    .where(
-                        (m.order_status_history.order_id == m.orders.id)
-                        & (m.order_status_history.to_status == m.OrderStatus.CLOSED)
-                    )
-                ).scalar_subquery().label("closed_at"),
-                (
-                    select(m.order_status_history.reason)
-                    .where(
-                        (m.order_status_history.order_id == m.orders.id)
-                        & (m.order_status_history.to_status == m.OrderStatus.CANCELED)
-                    )
-                    .order_by(m.order_status_history.created_at.desc())
-                    .limit(1)
-                ).scalar_subquery().label("cancel_reason"),
-            )
-            .join(m.cities, m.orders.city_id == m.cities.id)
-            .join(m.districts, m.orders.district_id == m.districts.id, isouter=True)
-            .join(m.streets, m.orders.street_id == m.streets.id, isouter=True)
-            .join(assigned_master, m.orders.assigned_master_id == assigned_master.id, isouter=True)
-            .where(m.orders.created_at >= start_utc, m.orders.created_at <= end_utc)
-            .order_by(m.orders.created_at)
+    stmt = (
+        select(
+            m.orders.id.label("order_id"),
+            m.orders.created_at.label("created_at"),
+            m.cities.name.label("city"),
+            m.districts.name.label("district"),
+            m.streets.name.label("street"),
+            m.orders.house.label("house"),
+            m.orders.lat.label("lat"),
+            m.orders.lon.label("lon"),
+            m.orders.category.label("category"),
+            m.orders.status.label("status"),
+            m.orders.type.label("order_type"),
+            m.orders.late_visit.label("late_visit"),
+            m.orders.company_payment.label("company_payment"),
+            m.orders.total_sum.label("total_sum"),
+            m.orders.client_name.label("client_name"),
+            m.orders.client_phone.label("client_phone"),
+            m.orders.timeslot_start_utc.label("timeslot_start_utc"),
+            m.orders.timeslot_end_utc.label("timeslot_end_utc"),
+            assigned_master.full_name.label("master_name"),
+            assigned_master.phone.label("master_phone"),
+            m.order_lifecycle.last_closed_at.label("closed_at"),
+            m.order_lifecycle.cancel_reason.label("cancel_reason"),
         )
-        if city_filter:
-            stmt = stmt.where(m.orders.city_id.in_(city_filter))
-        result = await db.execute(stmt)
-
-        rows: list[dict[str, Any]] = []
-        for row in result:
-            # Fallback timeslot window if not set
-            slot_start = row.timeslot_start_utc
-            slot_end = row.timeslot_end_utc
-            if slot_start is None or slot_end is None:
-                try:
-                    tz = get_timezone()
-                except Exception:
-                    tz = UTC
-                base_dt = row.closed_at or getattr(row, "updated_at", None) or row.created_at
-                if base_dt is not None:
-                    base_local = _ensure_utc(base_dt).astimezone(tz)
-                    start_local = base_local.replace(hour=10, minute=0, second=0, microsecond=0)
-                    end_local = base_local.replace(hour=13, minute=0, second=0, microsecond=0)
-                    slot_start = start_local.astimezone(UTC)
-                    slot_end = end_local.astimezone(UTC)
-            company_payment = None
-            if row.company_payment is not None:
-                quantized_payment = _quantize(row.company_payment, 0)
-                if quantized_payment != 0:
-                    company_payment = int(quantized_payment)
-            rows.append(
-                {
-                    "order_id": int(row.order_id),
-                    "created_at_utc": row.created_at,
-                    "closed_at_utc": row.closed_at,
-                    "city": row.city or "",
-                    "district": row.district or "",
-                    "street": row.street or "",
-                    "house": row.house or "",
-                    "lat": row.lat,
-                    "lon": row.lon,
-                    "category": row.category or "",
-                    "status": row.status.value if hasattr(row.status, "value") else str(row.status),
-                    "type": row.order_type.value if hasattr(row.order_type, "value") else str(row.order_type),
-                    "timeslot_start_utc": slot_start,
-                    "timeslot_end_utc": slot_end,
-                    "late_visit": bool(row.late_visit),
-                    "company_payment": company_payment,
-                    "total_sum": row.total_sum,
-                    "user_name": row.client_name or "",
-                    "user_phone": row.client_phone or "",
-                    "master_name": row.master_name or "",
-                    "master_phone": row.master_phone or "",
-                    "cancel_reason": row.cancel_reason or "",
-                }
-            )
-    return _make_bundle("orders", ORDERS_COLUMNS, rows, sheet_name="orders")
+        .join(m.cities, m.orders.city_id == m.cities.id)
+        .join(m.order_lifecycle, m.order_lifecycle.order_id == m.orders.id, isouter=True)
+        .join(m.districts, m.orders.district_id == m.districts.id, isouter=True)
+        .join(m.streets, m.orders.street_id == m.streets.id, isouter=True)
+        .join(assigned_master, m.orders.assigned_master_id == assigned_master.id, isouter=True)
+        .where(m.orders.created_at >= start_utc, m.orders.created_at <= end_utc)
+        .order_by(m.orders.created_at)
+    )
+    if city_filter:
+        stmt = stmt.where(m.orders.city_id.in_(city_filter))
+    return stmt
 
 
-async def export_commissions(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportBundle:
-    start_utc = _ensure_utc(date_from)
-    end_utc = _ensure_utc(date_to, end_of_day=True)
-    city_filter = list(city_ids) if city_ids else None
+def _orders_row_mapper() -> Callable[[Any], dict[str, Any]]:
+    try:
+        tz = get_timezone()
+    except Exception:
+        tz = UTC
+
+    def _map(row: Any) -> dict[str, Any]:
+        # Fallback timeslot window if not set
+        slot_start = row.timeslot_start_utc
+        slot_end = row.timeslot_end_utc
+        if slot_start is None or slot_end is None:
+            base_dt = row.closed_at or getattr(row, "updated_at", None) or row.created_at
+            if base_dt is not None:
+                base_local = _ensure_utc(base_dt).astimezone(tz)
+                start_local = base_local.replace(hour=10, minute=0, second=0, microsecond=0)
+                end_local = base_local.replace(hour=13, minute=0, second=0, microsecond=0)
+                slot_start = start_local.astimezone(UTC)
+                slot_end = end_local.astimezone(UTC)
+        company_payment = None
+        if row.company_payment is not None:
+            quantized_payment = _quantize(row.company_payment, 0)
+            if quantized_payment != 0:
+                company_payment = int(quantized_payment)
+        return {
+            "order_id": int(row.order_id),
+            "created_at_utc": row.created_at,
+            "closed_at_utc": row.closed_at,
+            "city": row.city or "",
+            "district": row.district or "",
+            "street": row.street or "",
+            "house": row.house or "",
+            "lat": row.lat,
+            "lon": row.lon,
+            "category": row.category or "",
+            "status": row.status.value if hasattr(row.status, "value") else str(row.status),
+            "type": row.order_type.value if hasattr(row.order_type, "value") else str(row.order_type),
+            "timeslot_start_utc": slot_start,
+            "timeslot_end_utc": slot_end,
+            "late_visit": bool(row.late_visit),
+            "company_payment": company_payment,
+            "total_sum": row.total_sum,
+            "user_name": row.client_name or "",
+            "user_phone": row.client_phone or "",
+            "master_name": row.master_name or "",
+            "master_phone": row.master_phone or "",
+            "cancel_reason": row.cancel_reason or "",
+        }
+
+    return _map
+
+
+def _commissions_statement(start_utc: datetime, end_utc: datetime, city_filter: Optional[list[int]]):
     master_alias = aliased(m.masters, name="commission_master")
     checks_subquery = (
         select(func.count(m.attachments.id))
@@ -358,117 +431,154 @@ async def export_commissions(*, date_from: datetime | date, date_to: datetime |
         .correlate(m.commissions)
         .scalar_subquery()
     )
-
-    async with _session_scope(session) as db:
-        stmt = (
-            select(
-                m.commissions.id,
-                m.commissions.order_id,
-                m.commissions.master_id,
-                master_alias.full_name,
-                master_alias.phone,
-                m.commissions.amount,
-                m.commissions.rate,
-                m.commissions.created_at,
-                m.commissions.deadline_at,
-                m.commissions.paid_reported_at,
-                m.commissions.paid_approved_at,
-                m.commissions.paid_amount,
-                m.commissions.is_paid,
-                checks_subquery.label("checks_count"),
-                m.commissions.pay_to_snapshot,
-                m.orders.city_id,
-            )
-            .join(master_alias, master_alias.id == m.commissions.master_id)
-            .join(m.orders, m.orders.id == m.commissions.order_id)
-            .where(m.commissions.created_at >= start_utc, m.commissions.created_at <= end_utc)
-            .order_by(m.commissions.created_at)
+    stmt = (
+        select(
+            m.commissions.id,
+            m.commissions.order_id,
+            m.commissions.master_id,
+            master_alias.full_name,
+            master_alias.phone,
+            m.commissions.amount,
+            m.commissions.rate,
+            m.commissions.created_at,
+            m.commissions.deadline_at,
+            m.commissions.paid_reported_at,
+            m.commissions.paid_approved_at,
+            m.commissions.paid_amount,
+            m.commissions.is_paid,
+            checks_subquery.label("checks_count"),
+            m.commissions.pay_to_snapshot,
+            m.orders.city_id,
+        )
+        .join(master_alias, master_alias.id == m.commissions.master_id)
+        .join(m.orders, m.orders.id == m.commissions.order_id)
+        .where(m.commissions.created_at >= start_utc, m.commissions.created_at <= end_utc)
+        .order_by(m.commissions.created_at)
+    )
+    if city_filter:
+        stmt = stmt.where(m.orders.city_id.in_(city_filter))
+    return stmt
+
+
+def _commission_row(row: Any) -> dict[str, Any]:
+    snapshot = row.pay_to_snapshot or {}
+    methods = snapshot.get("methods")
+    if isinstance(methods, list):
+        methods_value = ",".join(str(item) for item in methods)
+    elif methods:
+        methods_value = str(methods)
+    else:
+        methods_value = ""
+    return {
+        "commission_id": int(row.id),
+        "order_id": int(row.order_id),
+        "master_id": int(row.master_id),
+        "master_name": row.full_name or "",
+        "master_phone": row.phone or "",
+        "amount": row.amount,
+        "rate": row.rate,
+        "created_at_utc": row.created_at,
+        "deadline_at_utc": row.deadline_at,
+        "paid_reported_at_utc": row.paid_reported_at,
+        "paid_approved_at_utc": row.paid_approved_at,
+        "paid_amount": row.paid_amount,
+        "is_paid": bool(row.is_paid),
+        "has_checks": (row.checks_count or 0) > 0,
+        "snapshot_methods": methods_value,
+        "snapshot_card_number_last4": snapshot.get("card_number_last4") or "",
+        "snapshot_sbp_phone_masked": snapshot.get("sbp_phone_masked") or "",
+    }
+
+
+def _referral_rewards_statement(start_utc: datetime, end_utc: datetime, city_filter: Optional[list[int]]):
+    stmt = (
+        select(
+            m.referral_rewards.id,
+            m.referral_rewards.referrer_id,
+            m.referral_rewards.commission_id,
+            m.referral_rewards.level,
+            m.referral_rewards.amount,
+            m.referral_rewards.created_at,
+            m.orders.id.label("order_id"),
+            m.orders.city_id,
         )
-        if city_filter:
-            stmt = stmt.where(m.orders.city_id.in_(city_filter))
-        result = await db.execute(stmt)
-
-        rows: list[dict[str, Any]] = []
-        for row in result:
-            snapshot = row.pay_to_snapshot or {}
-            methods = snapshot.get("methods")
-            if isinstance(methods, list):
-                methods_value = ",".join(str(item) for item in methods)
-            elif methods:
-                methods_value = str(methods)
-            else:
-                methods_value = ""
-            rows.append(
-                {
-                    "commission_id": int(row.id),
-                    "order_id": int(row.order_id),
-                    "master_id": int(row.master_id),
-                    "master_name": row.full_name or "",
-                    "master_phone": row.phone or "",
-                    "amount": row.amount,
-                    "rate": row.rate,
-                    "created_at_utc": row.created_at,
-                    "deadline_at_utc": row.deadline_at,
-                    "paid_reported_at_utc": row.paid_reported_at,
-                    "paid_approved_at_utc": row.paid_approved_at,
-                    "paid_amount": row.paid_amount,
-                    "is_paid": bool(row.is_paid),
-                    "has_checks": (row.checks_count or 0) > 0,
-                    "snapshot_methods": methods_value,
-                    "snapshot_card_number_last4": snapshot.get("card_number_last4") or "",
-                    "snapshot_sbp_phone_masked": snapshot.get("sbp_phone_masked") or "",
-                }
-            )
-    return _make_bundle("commissions", COMMISSIONS_COLUMNS, rows, sheet_name="commissions")
+        .join(m.commissions, m.commissions.id == m.referral_rewards.commission_id)
+        .join(m.orders, m.orders.id == m.commissions.order_id)
+        .where(m.referral_rewards.created_at >= start_utc, m.referral_rewards.created_at <= end_utc)
+        .order_by(m.referral_rewards.created_at)
+    )
+    if city_filter:
+        stmt = stmt.where(m.orders.city_id.in_(city_filter))
+    return stmt
 
 
-async def export_referral_rewards(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportBundle:
+def _referral_reward_row(row: Any) -> dict[str, Any]:
+    return {
+        "reward_id": int(row.id),
+        "master_id": int(row.referrer_id),
+        "order_id": int(row.order_id),
+        "commission_id": int(row.commission_id),
+        "level": int(row.level),
+        "amount": row.amount,
+        "created_at_utc": row.created_at,
+    }
+
+
+async def stream_orders(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportFiles:
     start_utc = _ensure_utc(date_from)
     end_utc = _ensure_utc(date_to, end_of_day=True)
     city_filter = list(city_ids) if city_ids else None
-
     async with _session_scope(session) as db:
-        stmt = (
-            select(
-                m.referral_rewards.id,
-                m.referral_rewards.referrer_id,
-                m.referral_rewards.commission_id,
-                m.referral_rewards.level,
-                m.referral_rewards.amount,
-                m.referral_rewards.created_at,
-                m.orders.id.label("order_id"),
-                m.orders.city_id,
-            )
-            .join(m.commissions, m.commissions.id == m.referral_rewards.commission_id)
-            .join(m.orders, m.orders.id == m.commissions.order_id)
-            .where(m.referral_rewards.created_at >= start_utc, m.referral_rewards.created_at <= end_utc)
-            .order_by(m.referral_rewards.created_at)
+        return await _stream_to_files(
+            db,
+            _orders_statement(start_utc, end_utc, city_filter),
+            _orders_row_mapper(),
+            prefix="orders",
+            columns=ORDERS_COLUMNS,
+            sheet_name="orders",
         )
-        if city_filter:
-            stmt = stmt.where(m.orders.city_id.in_(city_filter))
-        result = await db.execute(stmt)
-
-        rows = [
-            {
-                "reward_id": int(row.id),
-                "master_id": int(row.referrer_id),
-                "order_id": int(row.order_id),
-                "commission_id": int(row.commission_id),
-                "level": int(row.level),
-                "amount": row.amount,
-                "created_at_utc": row.created_at,
-            }
-            for row in result
-        ]
-    return _make_bundle("ref_rewards", REF_REWARDS_COLUMNS, rows, sheet_name="ref_rewards")
-
 
 
+async def stream_commissions(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportFiles:
+    start_utc = _ensure_utc(date_from)
+    end_utc = _ensure_utc(date_to, end_of_day=True)
+    city_filter = list(city_ids) if city_ids else None
+    async with _session_scope(session) as db:
+        return await _stream_to_files(
+            db,
+            _commissions_statement(start_utc, end_utc, city_filter),
+            _commission_row,
+            prefix="commissions",
+            columns=COMMISSIONS_COLUMNS,
+            sheet_name="commissions",
+        )
 
 
+async def stream_referral_rewards(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportFiles:
+    start_utc = _ensure_utc(date_from)
+    end_utc = _ensure_utc(date_to, end_of_day=True)
+    city_filter = list(city_ids) if city_ids else None
+    async with _session_scope(session) as db:
+        return await _stream_to_files(
+            db,
+            _referral_rewards_statement(start_utc, end_utc, city_filter),
+            _referral_reward_row,
+            prefix="ref_rewards",
+            columns=REF_REWARDS_COLUMNS,
+            sheet_name="ref_rewards",
+        )
 
 
+async def export_orders(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportBundle:
+    files = await stream_orders(date_from=date_from, date_to=date_to, city_ids=city_ids, session=session)
+    return await _files_to_bundle(files)
 
 
+async def export_commissions(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportBundle:
+    files = await stream_commissions(date_from=date_from, date_to=date_to, city_ids=city_ids, session=session)
+    return await _files_to_bundle(files)
 
 
+async def export_referral_rewards(*, date_from: datetime | date, date_to: datetime | date, city_ids: Optional[Iterable[int]] = None, session: AsyncSession | None = None) -> ExportBundle:
+    files = await stream_referral_rewards(date_from=date_from, date_to=date_to, city_ids=city_ids, session=session)
+    return await _files_to_bundle(files)
@@ -0,0 +1,452 @@
+"""Address geocoding with a persistent cache.
+
+Layers, fastest first:
+
+1. in-process LRU of normalized queries (hits and misses);
+2. the ``geocache`` table shared by all processes (negative results are
+   stored with NULL coordinates so unknown addresses are not re-requested);
+3. the provider (``YandexGeocoder`` in production, ``FakeGeocoder`` in tests).
+
+Identical queries in flight are coalesced into one provider call. Provider
+calls are throttled by a token bucket (``yandex_throttle_rps``) and by the
+daily budget (``yandex_daily_limit``, counted per UTC day in this process);
+when the budget is spent ``geocode`` returns None and callers fall back to
+centroids. ``0`` disables the corresponding limit.
+
+``get_service()`` builds the service from settings (``geo_mode = yandex`` and
+an API key), otherwise returns None: order creation keeps the centroid
+behaviour. ``backfill_order_coordinates`` re-geocodes orders that still have
+centroid-only coordinates.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from time import monotonic
+from typing import Any, Callable, Mapping, Optional, Protocol
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.infra.rate_limiter import TokenBucket
+from field_service.services._session_utils import maybe_managed_session
+
+logger = logging.getLogger("geocoding")
+
+UTC = timezone.utc
+
+CENTROID_PROVIDERS = ("street_centroid", "district_centroid", "city_centroid")
+LRU_SIZE = 4096
+_QUERY_MAX_LEN = 255
+# Settings are re-read at most this often by get_service()
+_SETTINGS_TTL_SECONDS = 60.0
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True, slots=True)
+class GeocodeResult:
+    lat: float
+    lon: float
+    provider: str
+    confidence: int
+
+
+class GeocoderProvider(Protocol):
+    name: str
+
+    async def geocode(self, query: str) -> Optional[GeocodeResult]:
+        """Coordinates of the address or None when it is unknown.
+
+        Transport errors are raised: such results are not cached.
+        """
+
+
+class FakeGeocoder:
+    """Local provider: answers from a dict, counts calls."""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        known: Optional[Mapping[str, tuple[float, float]]] = None,
+        *,
+        confidence: int = 90,
+        delay: float = 0.0,
+    ) -> None:
+        self._known = {normalize_query(k): v for k, v in (known or {}).items()}
+        self._confidence = confidence
+        self._delay = delay
+        self.calls: list[str] = []
+
+    async def geocode(self, query: str) -> Optional[GeocodeResult]:
+        self.calls.append(query)
+        if self._delay:
+            await asyncio.sleep(self._delay)
+        coords = self._known.get(normalize_query(query))
+        if coords is None:
+            return None
+        return GeocodeResult(coords[0], coords[1], self.name, self._confidence)
+
+
+class YandexGeocoder:
+    """Yandex HTTP Geocoder API 1.x."""
+
+    name = "yandex"
+    URL = "https://geocode-maps.yandex.ru/1.x/"
+    # GeocoderMetaData.precision -> confidence
+    PRECISION_CONFIDENCE = {
+        "exact": 95,
+        "number": 90,
+        "near": 80,
+        "range": 75,
+        "street": 60,
+    }
+
+    def __init__(self, api_key: str, *, timeout: float = 3.0) -> None:
+        self._api_key = api_key
+        self._timeout = timeout
+
+    async def geocode(self, query: str) -> Optional[GeocodeResult]:
+        import aiohttp
+
+        params = {"apikey": self._api_key, "geocode": query, "format": "json", "results": "1"}
+        timeout = aiohttp.ClientTimeout(total=self._timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as http:
+            async with http.get(self.URL, params=params) as response:
+                response.raise_for_status()
+                payload = await response.json()
+        return self._parse(payload)
+
+    def _parse(self, payload: dict[str, Any]) -> Optional[GeocodeResult]:
+        try:
+            members = payload["response"]["GeoObjectCollection"]["featureMember"]
+        except (KeyError, TypeError):
+            return None
+        if not members:
+            return None
+        geo = members[0].get("GeoObject", {})
+        try:
+            lon_s, lat_s = geo["Point"]["pos"].split()
+            lat, lon = float(lat_s), float(lon_s)
+        except (KeyError, ValueError, AttributeError):
+            return None
+        precision = (
+            geo.get("metaDataProperty", {}).get("GeocoderMetaData", {}).get("precision")
+        )
+        confidence = self.PRECISION_CONFIDENCE.get(precision or "", 40)
+        return GeocodeResult(lat, lon, self.name, confidence)
+
+
+def normalize_query(query: str) -> str:
+    return _SPACES_RE.sub(" ", query.strip().lower().replace("ё", "е"))[:_QUERY_MAX_LEN]
+
+
+def build_address_query(
+    city_name: Optional[str], street_name: Optional[str], house: Optional[str]
+) -> Optional[str]:
+    """'Город, улица, дом' or None when the street or house is unknown."""
+    parts = [(p or "").strip() for p in (city_name, street_name, house)]
+    if not parts[1] or not parts[2]:
+        return None
+    return ", ".join(p for p in parts if p)
+
+
+class GeocodingService:
+    def __init__(
+        self,
+        provider: GeocoderProvider,
+        *,
+        rps: float = 1.0,
+        daily_limit: int = 0,
+        lru_size: int = LRU_SIZE,
+        clock: Callable[[], datetime] = lambda: datetime.now(UTC),
+    ) -> None:
+        self.provider = provider
+        self._bucket = TokenBucket(rps, max(1.0, rps)) if rps > 0 else None
+        self._daily_limit = int(daily_limit)
+        self._clock = clock
+        self._day = clock().date()
+        self._spent_today = 0
+        self._lru: OrderedDict[str, Optional[GeocodeResult]] = OrderedDict()
+        self._lru_size = lru_size
+        self._inflight: dict[str, asyncio.Future[Optional[GeocodeResult]]] = {}
+
+    @property
+    def budget_left(self) -> Optional[int]:
+        """Provider calls left today (None = unlimited)."""
+        if self._daily_limit <= 0:
+            return None
+        self._roll_day()
+        return max(0, self._daily_limit - self._spent_today)
+
+    def _roll_day(self) -> None:
+        today = self._clock().date()
+        if today != self._day:
+            self._day = today
+            self._spent_today = 0
+
+    def _remember(self, key: str, result: Optional[GeocodeResult]) -> None:
+        self._lru[key] = result
+        self._lru.move_to_end(key)
+        while len(self._lru) > self._lru_size:
+            self._lru.popitem(last=False)
+
+    async def geocode(
+        self, query: str, *, session: Optional[AsyncSession] = None
+    ) -> Optional[GeocodeResult]:
+        """Coordinates of the address, None if unknown or out of budget.
+
+        With ``session`` the geocache row is written in the caller's
+        transaction (which stays open during the provider call), otherwise
+        geocache is read and written in short separate sessions and no
+        transaction is held while the provider answers.
+        """
+        key = normalize_query(query)
+        if not key:
+            return None
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            return self._lru[key]
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future: asyncio.Future[Optional[GeocodeResult]] = (
+            asyncio.get_running_loop().create_future()
+        )
+        self._inflight[key] = future
+        try:
+            result = await self._resolve(key, query, session)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved: waiters re-raise it
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _resolve(
+        self, key: str, query: str, session: Optional[AsyncSession]
+    ) -> Optional[GeocodeResult]:
+        # Провайдер вызывается между двумя короткими обращениями к geocache:
+        # без сессии вызывающего транзакция на время HTTP-запроса не держится
+        async with maybe_managed_session(session) as s:
+            row = (
+                await s.execute(
+                    text(
+                        "SELECT lat, lon, provider, confidence FROM geocache WHERE query = :q"
+                    ).bindparams(q=key)
+                )
+            ).first()
+        if row is not None:
+            result = None
+            if row.lat is not None and row.lon is not None:
+                result = GeocodeResult(
+                    float(row.lat), float(row.lon), row.provider or "", int(row.confidence or 0)
+                )
+            self._remember(key, result)
+            return result
+
+        if not await self._acquire():
+            return None
+        try:
+            result = await self.provider.geocode(query)
+        except Exception:
+            logger.warning("geocoder %s failed for %r", self.provider.name, query, exc_info=True)
+            return None
+
+        async with maybe_managed_session(session) as s:
+            await s.execute(
+                text(
+                    """
+                INSERT INTO geocache (query, lat, lon, provider, confidence)
+                VALUES (:q, :lat, :lon, :provider, :confidence)
+                ON CONFLICT (query) DO UPDATE
+                   SET lat = EXCLUDED.lat, lon = EXCLUDED.lon,
+                       provider = EXCLUDED.provider, confidence = EXCLUDED.confidence
+                    """
+                ).bindparams(
+                    q=key,
+                    lat=result.lat if result else None,
+                    lon=result.lon if result else None,
+                    provider=result.provider if result else self.provider.name,
+                    confidence=result.confidence if result else None,
+                )
+            )
+        self._remember(key, result)
+        return result
+
+    async def _acquire(self) -> bool:
+        """Spend one provider call from the daily budget and the rps bucket."""
+        if self._daily_limit > 0:
+            self._roll_day()
+            if self._spent_today >= self._daily_limit:
+                logger.warning("geocoder daily limit %s reached", self._daily_limit)
+                return False
+            self._spent_today += 1
+        if self._bucket is not None:
+            wait = self._bucket.reserve()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return True
+
+
+_SERVICE: Optional[GeocodingService] = None
+_SERVICE_CONFIG: Optional[tuple] = None
+_SERVICE_CHECKED_AT: Optional[float] = None
+
+
+def set_service(service: Optional[GeocodingService]) -> None:
+    """Pin the service (tests); ``reset()`` returns to settings-driven mode."""
+    global _SERVICE, _SERVICE_CONFIG, _SERVICE_CHECKED_AT
+    _SERVICE = service
+    _SERVICE_CONFIG = ("pinned",)
+    _SERVICE_CHECKED_AT = float("inf")
+
+
+def reset() -> None:
+    global _SERVICE, _SERVICE_CONFIG, _SERVICE_CHECKED_AT
+    _SERVICE = None
+    _SERVICE_CONFIG = None
+    _SERVICE_CHECKED_AT = None
+
+
+async def get_service(session: Optional[AsyncSession] = None) -> Optional[GeocodingService]:
+    """Service configured in settings or None (geo_mode = local_centroids)."""
+    global _SERVICE, _SERVICE_CONFIG, _SERVICE_CHECKED_AT
+    now = monotonic()
+    if _SERVICE_CHECKED_AT is not None and now - _SERVICE_CHECKED_AT < _SETTINGS_TTL_SECONDS:
+        return _SERVICE
+
+    from field_service.services import settings_service
+
+    raw = await settings_service.get_values(
+        ["geo_mode", "yandex_geocoder_key", "yandex_throttle_rps", "yandex_daily_limit"],
+        session=session,
+    )
+
+    def _value(key: str, default: str) -> str:
+        value = raw.get(key, (default, "STR"))[0]
+        return default if value in (None, "") else str(value)
+
+    mode = _value("geo_mode", "local_centroids")
+    api_key = _value("yandex_geocoder_key", "").strip()
+    try:
+        rps = float(_value("yandex_throttle_rps", "1"))
+        daily_limit = int(_value("yandex_daily_limit", "1000"))
+    except ValueError:
+        rps, daily_limit = 1.0, 1000
+    config = (mode, api_key, rps, daily_limit)
+    _SERVICE_CHECKED_AT = now
+    if config == _SERVICE_CONFIG:
+        return _SERVICE
+    _SERVICE_CONFIG = config
+    if mode != "yandex" or not api_key:
+        _SERVICE = None
+    else:
+        # a new instance restarts the in-process daily counter: only on settings change
+        _SERVICE = GeocodingService(YandexGeocoder(api_key), rps=rps, daily_limit=daily_limit)
+    return _SERVICE
+
+
+async def backfill_order_coordinates(
+    session: Optional[AsyncSession] = None,
+    *,
+    service: Optional[GeocodingService] = None,
+    city_id: Optional[int] = None,
+    limit: int = 500,
+) -> dict[str, int]:
+    """Geocode orders that only have centroid (or no) coordinates.
+
+    Stops early when the provider budget is spent. Returns counters
+    ``{"checked", "updated"}``.
+    """
+    stats = {"checked": 0, "updated": 0}
+    async with maybe_managed_session(session) as s:
+        service = service or await get_service(s)
+        if service is None:
+            return stats
+        city_filter = "AND o.city_id = :city_id" if city_id is not None else ""
+        stmt = text(
+            f"""
+            SELECT o.id, c.name AS city_name, st.name AS street_name, o.house
+              FROM orders o
+              JOIN cities c ON c.id = o.city_id
+              JOIN streets st ON st.id = o.street_id
+             WHERE (o.geocode_provider IN :centroids OR o.lat IS NULL OR o.lon IS NULL)
+               AND COALESCE(o.house, '') <> ''
+               {city_filter}
+             ORDER BY o.id DESC
+             LIMIT :limit
+            """
+        ).bindparams(
+            bindparam("centroids", value=list(CENTROID_PROVIDERS), expanding=True),
+            limit=limit,
+        )
+        params: dict[str, Any] = {}
+        if city_id is not None:
+            params["city_id"] = city_id
+        rows = (await s.execute(stmt, params)).all()
+        updates: list[dict[str, Any]] = []
+        for row in rows:
+            if service.budget_left == 0:
+                break
+            query = build_address_query(row.city_name, row.street_name, row.house)
+            if query is None:
+                continue
+            stats["checked"] += 1
+            result = await service.geocode(query, session=s)
+            if result is None:
+                continue
+            updates.append(
+                {
+                    "order_id": row.id,
+                    "lat": result.lat,
+                    "lon": result.lon,
+                    "provider": result.provider,
+                    "confidence": result.confidence,
+                }
+            )
+        if updates:
+            await s.execute(
+                text(
+                    """
+                UPDATE orders
+                   SET lat = :lat, lon = :lon,
+                       geocode_provider = :provider, geocode_confidence = :confidence
+                 WHERE id = :order_id
+                    """
+                ),
+                updates,
+            )
+        stats["updated"] = len(updates)
+        await s.commit()
+    logger.info("geocode backfill: %s", stats)
+    return stats
+
+
+__all__ = [
+    "CENTROID_PROVIDERS",
+    "FakeGeocoder",
+    "GeocodeResult",
+    "GeocoderProvider",
+    "GeocodingService",
+    "YandexGeocoder",
+    "backfill_order_coordinates",
+    "build_address_query",
+    "get_service",
+    "normalize_query",
+    "reset",
+    "set_service",
+]
@@ -10,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.config import settings
+from field_service.services.distribution import wake_channel
 
 UTC = timezone.utc
 
@@ -109,6 +110,12 @@ async def create_from_closed_order(
     )
     session.add(new_order)
     await session.flush()
+    await wake_channel.notify(
+        session,
+        wake_channel.WakeReason.ORDER_CREATED,
+        order_id=new_order.id,
+        city_id=new_order.city_id,
+    )
 
     await session.execute(
         insert(m.order_status_history).values(
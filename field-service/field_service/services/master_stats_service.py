@@ -0,0 +1,282 @@
+"""Per-master rolling stats projection (``master_stats``).
+
+The table is maintained incrementally by the ``trg_orders__master_stats``
+trigger on ``orders`` (see migration 2025_10_17_0001): every status /
+assignment / total_sum change applies a delta to ``active_cnt`` and
+``closed_total`` and refreshes the 7-day and current month window values of
+the affected master. ``trg_offers__master_stats`` (migration 2025_10_20_0002)
+adds accepted offers and their response time; the same trigger on
+``offers_archive`` keeps the counters unchanged when offers are archived.
+
+The windows slide without order writes, so a periodic reconcile job
+recomputes the whole projection from ``orders`` / ``offers`` and reports drift.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.services import live_log
+from field_service.services._session_utils import maybe_managed_session
+
+logger = logging.getLogger("master_stats")
+
+RECONCILE_INTERVAL_SECONDS = 600
+
+_MONTH_START = "(date_trunc('month', NOW() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC')"
+
+# Full recompute of master_stats from orders and offers (hot + archive). The
+# DO UPDATE ... WHERE clause touches only drifted rows, so RETURNING yields
+# the drift.
+_RECOMPUTE_SQL = """
+INSERT INTO master_stats AS ms (
+    master_id, active_cnt, avg_week_check,
+    week_closed_cnt, week_closed_sum, closed_total,
+    month_start, month_closed_cnt,
+    accepted_offers_cnt, response_seconds_sum, updated_at
+)
+SELECT mm.id,
+       COALESCE(a.active_cnt, 0),
+       COALESCE(a.avg_week_check, 0),
+       COALESCE(a.week_closed_cnt, 0),
+       COALESCE(a.week_closed_sum, 0),
+       COALESCE(a.closed_total, 0),
+       {month_start},
+       COALESCE(a.month_closed_cnt, 0),
+       COALESCE(r.accepted_offers_cnt, 0),
+       COALESCE(r.response_seconds_sum, 0),
+       NOW()
+  FROM masters mm
+  LEFT JOIN (
+        SELECT o.assigned_master_id AS mid,
+               COUNT(*) FILTER (
+                   WHERE o.status IN ('ASSIGNED','EN_ROUTE','WORKING','PAYMENT')
+               ) AS active_cnt,
+               COALESCE(AVG(o.total_sum) FILTER (
+                   WHERE o.status IN ('PAYMENT','CLOSED')
+                     AND o.created_at >= NOW() - INTERVAL '7 days'
+               ), 0)::numeric(10,2) AS avg_week_check,
+               COUNT(*) FILTER (
+                   WHERE o.status = 'CLOSED'
+                     AND o.created_at >= NOW() - INTERVAL '7 days'
+               ) AS week_closed_cnt,
+               COALESCE(SUM(o.total_sum) FILTER (
+                   WHERE o.status = 'CLOSED'
+                     AND o.created_at >= NOW() - INTERVAL '7 days'
+               ), 0) AS week_closed_sum,
+               COUNT(*) FILTER (WHERE o.status = 'CLOSED') AS closed_total,
+               COUNT(*) FILTER (
+                   WHERE o.status = 'CLOSED'
+                     AND o.updated_at >= {month_start}
+               ) AS month_closed_cnt
+          FROM orders o
+         WHERE o.assigned_master_id IS NOT NULL
+           {orders_filter}
+         GROUP BY o.assigned_master_id
+  ) a ON a.mid = mm.id
+  LEFT JOIN (
+        SELECT f.master_id AS mid,
+               COUNT(*) AS accepted_offers_cnt,
+               SUM(EXTRACT(EPOCH FROM f.responded_at - f.sent_at)) AS response_seconds_sum
+          FROM (
+                SELECT master_id, sent_at, responded_at, state FROM offers
+                UNION ALL
+                SELECT master_id, sent_at, responded_at, state FROM offers_archive
+          ) f
+         WHERE f.state = 'ACCEPTED'
+           AND f.sent_at IS NOT NULL
+           AND f.responded_at IS NOT NULL
+           {offers_filter}
+         GROUP BY f.master_id
+  ) r ON r.mid = mm.id
+ {masters_filter}
+ON CONFLICT (master_id) DO UPDATE
+   SET active_cnt = EXCLUDED.active_cnt,
+       avg_week_check = EXCLUDED.avg_week_check,
+       week_closed_cnt = EXCLUDED.week_closed_cnt,
+       week_closed_sum = EXCLUDED.week_closed_sum,
+       closed_total = EXCLUDED.closed_total,
+       month_start = EXCLUDED.month_start,
+       month_closed_cnt = EXCLUDED.month_closed_cnt,
+       accepted_offers_cnt = EXCLUDED.accepted_offers_cnt,
+       response_seconds_sum = EXCLUDED.response_seconds_sum,
+       updated_at = EXCLUDED.updated_at
+ WHERE (ms.active_cnt, ms.avg_week_check, ms.week_closed_cnt,
+        ms.week_closed_sum, ms.closed_total, ms.month_start,
+        ms.month_closed_cnt, ms.accepted_offers_cnt, ms.response_seconds_sum)
+       IS DISTINCT FROM
+       (EXCLUDED.active_cnt, EXCLUDED.avg_week_check, EXCLUDED.week_closed_cnt,
+        EXCLUDED.week_closed_sum, EXCLUDED.closed_total, EXCLUDED.month_start,
+        EXCLUDED.month_closed_cnt, EXCLUDED.accepted_offers_cnt,
+        EXCLUDED.response_seconds_sum)
+RETURNING ms.master_id
+"""
+
+
+@dataclass(slots=True, frozen=True)
+class MasterProfileStats:
+    """Counters of the master bot statistics screen."""
+
+    closed_total: int = 0
+    month_closed_cnt: int = 0
+    accepted_offers_cnt: int = 0
+    response_seconds_sum: Decimal = Decimal("0")
+
+    @property
+    def avg_response_minutes(self) -> Optional[float]:
+        if self.accepted_offers_cnt <= 0:
+            return None
+        return float(self.response_seconds_sum) / self.accepted_offers_cnt / 60.0
+
+
+def _month_start(now: datetime) -> datetime:
+    now = now.astimezone(timezone.utc)
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+async def refresh_master_stats(
+    session: AsyncSession,
+    master_ids: Iterable[int],
+) -> list[int]:
+    """Recompute stats rows for the given masters. Returns drifted master ids.
+
+    Does not commit: the caller owns the transaction.
+    """
+    ids = sorted({int(mid) for mid in master_ids if mid is not None})
+    if not ids:
+        return []
+    rows = await session.execute(
+        text(
+            _RECOMPUTE_SQL.format(
+                month_start=_MONTH_START,
+                orders_filter="AND o.assigned_master_id = ANY(:mids)",
+                offers_filter="AND f.master_id = ANY(:mids)",
+                masters_filter="WHERE mm.id = ANY(:mids)",
+            )
+        ).bindparams(mids=ids)
+    )
+    return [int(r[0]) for r in rows]
+
+
+async def reconcile_master_stats(session: Optional[AsyncSession] = None) -> int:
+    """Recompute master_stats for all masters. Returns number of drifted rows."""
+    async with maybe_managed_session(session) as s:
+        rows = await s.execute(
+            text(
+                _RECOMPUTE_SQL.format(
+                    month_start=_MONTH_START,
+                    orders_filter="",
+                    offers_filter="",
+                    masters_filter="",
+                )
+            )
+        )
+        drifted = len(rows.fetchall())
+        await s.commit()
+    if drifted:
+        logger.info("master_stats reconcile: drifted=%s", drifted)
+    return drifted
+
+
+async def get_week_closed_avg(session: AsyncSession, master_id: int) -> Optional[Decimal]:
+    """AVG check of CLOSED orders for the last 7 days from the projection.
+
+    Returns None when the master has no stats row yet.
+    """
+    row = (
+        await session.execute(
+            text(
+                "SELECT week_closed_cnt, week_closed_sum FROM master_stats"
+                " WHERE master_id = :mid"
+            ).bindparams(mid=master_id)
+        )
+    ).first()
+    if row is None:
+        return None
+    cnt, total = int(row[0] or 0), Decimal(row[1] or 0)
+    if cnt <= 0:
+        return Decimal("0")
+    return total / cnt
+
+
+async def get_profile_stats(
+    session: AsyncSession,
+    master_id: int,
+    *,
+    now: Optional[datetime] = None,
+) -> MasterProfileStats:
+    """Statistics screen counters from the projection (one PK lookup).
+
+    The month counter is only trusted while ``month_start`` is the current
+    UTC month: until the next order event / reconcile of a new month the
+    master has no closed orders in it.
+    """
+    row = (
+        await session.execute(
+            text(
+                "SELECT closed_total, month_start, month_closed_cnt,"
+                " accepted_offers_cnt, response_seconds_sum"
+                " FROM master_stats WHERE master_id = :mid"
+            ).bindparams(mid=master_id)
+        )
+    ).first()
+    if row is None:
+        return MasterProfileStats()
+    current_month = _month_start(now or datetime.now(timezone.utc))
+    month_cnt = int(row[2] or 0)
+    if row[1] is None or _month_start(row[1]) != current_month:
+        month_cnt = 0
+    return MasterProfileStats(
+        closed_total=int(row[0] or 0),
+        month_closed_cnt=month_cnt,
+        accepted_offers_cnt=int(row[3] or 0),
+        response_seconds_sum=Decimal(row[4] or 0),
+    )
+
+
+async def run_master_stats_reconcile(
+    interval_seconds: int = RECONCILE_INTERVAL_SECONDS,
+    *,
+    iterations: int | None = None,
+    session: Optional[AsyncSession] = None,
+) -> None:
+    """Periodically reconcile master_stats with orders.
+
+    Args:
+        interval_seconds: Интервал сверки в секундах
+        iterations: Количество итераций (None = бесконечно)
+        session: Optional test session (default: create own)
+    """
+    sleep_for = max(60, int(interval_seconds) if interval_seconds else RECONCILE_INTERVAL_SECONDS)
+    loops_done = 0
+    while True:
+        try:
+            drifted = await reconcile_master_stats(session)
+            if drifted:
+                live_log.push("watchdog", f"master_stats drifted={drifted}", level="WARN")
+        except Exception as exc:
+            logger.exception("master_stats reconcile failed: %s", exc)
+            live_log.push("watchdog", f"master_stats reconcile error: {exc}", level="ERROR")
+
+        loops_done += 1
+        if iterations is not None and loops_done >= iterations:
+            break
+        await asyncio.sleep(sleep_for)
+
+
+__all__ = [
+    "MasterProfileStats",
+    "RECONCILE_INTERVAL_SECONDS",
+    "get_profile_stats",
+    "get_week_closed_avg",
+    "reconcile_master_stats",
+    "refresh_master_stats",
+    "run_master_stats_reconcile",
+]
@@ -2,22 +2,65 @@ from __future__ import annotations
 
 import asyncio
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 import logging
-from typing import Optional
+from time import monotonic
+from typing import Any, Optional
 
 from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
 from aiogram.types import InlineKeyboardMarkup
-from sqlalchemy import select, update
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db.session import SessionLocal
-from field_service.db import models as m
+from field_service.infra.rate_limiter import Priority, get_limiter
+from field_service.services import live_log
 
 UTC = timezone.utc
 MAX_SEND_ATTEMPTS = 5
 logger = logging.getLogger(__name__)
 
+# Размер батча и число одновременных отправок; лимиты Telegram (глобальный
+# и по чату) соблюдает общий infra.rate_limiter
+BATCH_SIZE = 50
+SEND_CONCURRENCY = 8
+_STATS_LOG_SECONDS = 60
+
+
+@dataclass(slots=True)
+class OutboxStats:
+    """Счётчики доставки outbox (процесс-локальные)."""
+
+    queue_depth: int = 0
+    sent: int = 0
+    failed: int = 0
+    skipped: int = 0
+    retried: int = 0
+    batches: int = 0
+    # Время одного bot.send_message и задержка created_at -> отправка
+    send_latency_ms_total: float = 0.0
+    send_latency_ms_max: float = 0.0
+    queue_latency_ms_max: float = 0.0
+
+    @property
+    def send_latency_ms_avg(self) -> float:
+        attempts = self.sent + self.failed
+        return self.send_latency_ms_total / attempts if attempts else 0.0
+
+
+_STATS = OutboxStats()
+
+
+def get_stats() -> OutboxStats:
+    return _STATS
+
+
+def reset_stats() -> None:
+    global _STATS
+    _STATS = OutboxStats()
+
 
 @asynccontextmanager
 async def _maybe_session(session: Optional[AsyncSession]):
@@ -26,94 +69,187 @@ async def _maybe_session(session: Optional[AsyncSession]):
         # Используем переданную сессию, не закрываем её
         yield session
         return
-    # Создаём временную сессию через SessionLocal
+    # Создаём временную сессию через SessionLocal (тесты подменяют фабрику)
     async with SessionLocal() as s:
         yield s
 
 
-async def _drain_outbox_once(bot: Bot, *, session: Optional[AsyncSession] = None) -> None:
-    """Обработать один батч уведомлений из outbox.
-    
-    Args:
-        bot: Bot instance для отправки сообщений
-        session: Опциональная тестовая сессия
+_CLAIM_SQL = text(
     """
-    async with _maybe_session(session) as s:
-        rows = await s.execute(
-            select(
-                m.notifications_outbox.id,
-                m.notifications_outbox.master_id,
-                m.notifications_outbox.event,  # P1-16: добавили event
-                m.notifications_outbox.payload,
-                m.masters.tg_user_id,
-                m.notifications_outbox.attempt_count,
-            )
-            .join(m.masters, m.masters.id == m.notifications_outbox.master_id)
-            .where(m.notifications_outbox.processed_at.is_(None))
-            .order_by(m.notifications_outbox.id.asc())
-            .limit(50)
-        )
-        items = rows.all()
-        if not items:
-            return
-        for (
-            outbox_id,
-            master_id,
-            event,
-            payload,
-            tg_user_id,
-            attempt_count,
-        ) in items:
-            if not tg_user_id:
-                # пометим как обработанное без отправки
-                await s.execute(
-                    update(m.notifications_outbox)
-                    .where(m.notifications_outbox.id == outbox_id)
-                    .values(processed_at=datetime.now(UTC))
-                )
-                continue
-            text = str((payload or {}).get("message") or "Новая заявка")
-            
-            # P1-16: Для напоминания о перерыве добавляем клавиатуру
-            reply_markup: Optional[InlineKeyboardMarkup] = None
-            if event == "break_reminder":
-                from field_service.bots.master_bot.keyboards import break_reminder_keyboard
-                reply_markup = break_reminder_keyboard()
-            
-            current_attempt = (attempt_count or 0) + 1
+    SELECT o.id, o.master_id, o.event, o.payload, o.created_at, mm.tg_user_id
+      FROM notifications_outbox o
+      JOIN masters mm ON mm.id = o.master_id
+     WHERE o.processed_at IS NULL
+     ORDER BY o.id
+     LIMIT :limit
+       FOR UPDATE OF o SKIP LOCKED
+    """
+)
+
+# Один UPDATE на батч: исход каждой строки передаётся массивами
+_APPLY_SQL = text(
+    """
+    UPDATE notifications_outbox o
+       SET attempt_count = CASE WHEN r.outcome IN ('sent', 'failed')
+                                THEN o.attempt_count + 1 ELSE o.attempt_count END,
+           last_error = CASE WHEN r.outcome = 'sent' THEN NULL
+                             WHEN r.outcome = 'failed' THEN r.err
+                             ELSE o.last_error END,
+           processed_at = CASE
+               WHEN r.outcome IN ('sent', 'skipped') THEN NOW()
+               WHEN r.outcome = 'failed' AND o.attempt_count + 1 >= :max_attempts THEN NOW()
+               ELSE o.processed_at
+           END
+      FROM unnest(
+               CAST(:ids AS INTEGER[]),
+               CAST(:outcomes AS TEXT[]),
+               CAST(:errors AS TEXT[])
+           ) AS r(id, outcome, err)
+     WHERE o.id = r.id
+    """
+)
+
+
+@dataclass(slots=True)
+class _Outcome:
+    outbox_id: int
+    outcome: str  # sent | failed | skipped | retry
+    error: Optional[str] = None
+
+
+@dataclass(slots=True)
+class _ChatLane:
+    chat_id: int
+    items: list[Any] = field(default_factory=list)
+
+
+def _render(event: str, payload: Optional[dict]) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+    text_value = str((payload or {}).get("message") or "Новая заявка")
+    # P1-16: Для напоминания о перерыве добавляем клавиатуру
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+    if event == "break_reminder":
+        from field_service.bots.master_bot.keyboards import break_reminder_keyboard
+        reply_markup = break_reminder_keyboard()
+    return text_value, reply_markup
+
+
+def _priority(event: str) -> Priority:
+    return Priority.REMINDER if "reminder" in (event or "") else Priority.OFFER
+
+
+async def _send_lane(
+    bot: Bot,
+    lane: _ChatLane,
+    semaphore: asyncio.Semaphore,
+    outcomes: list[_Outcome],
+) -> None:
+    """Сообщения одного чата уходят по порядку."""
+    limiter = get_limiter(bot)
+    for idx, row in enumerate(lane.items):
+        text_value, reply_markup = _render(row.event, row.payload)
+        await limiter.acquire(lane.chat_id, priority=_priority(row.event))
+        async with semaphore:
+            started = monotonic()
             try:
                 await bot.send_message(
-                    int(tg_user_id),
-                    text,
+                    lane.chat_id,
+                    text_value,
                     reply_markup=reply_markup,
-                    parse_mode="HTML"
+                    parse_mode="HTML",
                 )
+            except TelegramRetryAfter as exc:
+                # Flood control: не считаем попыткой, остаток чата - в следующий батч
+                limiter.retry_after(lane.chat_id, float(exc.retry_after))
+                outcomes.extend(_Outcome(r.id, "retry") for r in lane.items[idx:])
+                _STATS.retried += len(lane.items) - idx
+                logger.warning(
+                    "Outbox flood control chat=%s retry_after=%s", lane.chat_id, exc.retry_after
+                )
+                return
             except Exception as exc:
                 logger.exception(
-                    "Failed to send notification %s for master %s", outbox_id, master_id
-                )
-                values: dict[str, object] = {
-                    "attempt_count": current_attempt,
-                    "last_error": str(exc),
-                }
-                if current_attempt >= MAX_SEND_ATTEMPTS:
-                    values["processed_at"] = datetime.now(UTC)
-                await s.execute(
-                    update(m.notifications_outbox)
-                    .where(m.notifications_outbox.id == outbox_id)
-                    .values(**values)
+                    "Failed to send notification %s for master %s", row.id, row.master_id
                 )
+                outcomes.append(_Outcome(row.id, "failed", str(exc)))
+                _STATS.failed += 1
             else:
-                await s.execute(
-                    update(m.notifications_outbox)
-                    .where(m.notifications_outbox.id == outbox_id)
-                    .values(
-                        processed_at=datetime.now(UTC),
-                        attempt_count=current_attempt,
-                        last_error=None,
-                    )
+                outcomes.append(_Outcome(row.id, "sent"))
+                _STATS.sent += 1
+                if row.created_at is not None:
+                    queued_ms = (datetime.now(UTC) - row.created_at).total_seconds() * 1000
+                    _STATS.queue_latency_ms_max = max(_STATS.queue_latency_ms_max, queued_ms)
+            elapsed_ms = (monotonic() - started) * 1000
+            _STATS.send_latency_ms_total += elapsed_ms
+            _STATS.send_latency_ms_max = max(_STATS.send_latency_ms_max, elapsed_ms)
+
+
+async def _drain_outbox_once(
+    bot: Bot,
+    *,
+    session: Optional[AsyncSession] = None,
+    batch_size: int = BATCH_SIZE,
+    concurrency: int = SEND_CONCURRENCY,
+) -> int:
+    """Обработать один батч уведомлений из outbox.
+
+    Строки захватываются FOR UPDATE SKIP LOCKED, поэтому несколько воркеров
+    разбирают очередь параллельно. Отправка идёт конкурентно (не больше
+    concurrency одновременно, по порядку внутри чата), статусы пишутся
+    одним UPDATE на батч.
+
+    Args:
+        bot: Bot instance для отправки сообщений
+        session: Опциональная тестовая сессия
+        batch_size: Сколько строк захватить
+        concurrency: Максимум одновременных send_message
+
+    Returns:
+        Количество захваченных строк.
+    """
+    async with _maybe_session(session) as s:
+        items = (await s.execute(_CLAIM_SQL.bindparams(limit=batch_size))).all()
+        if not items:
+            await s.commit()
+            return 0
+
+        outcomes: list[_Outcome] = []
+        lanes: dict[int, _ChatLane] = {}
+        for row in items:
+            if not row.tg_user_id:
+                # пометим как обработанное без отправки
+                outcomes.append(_Outcome(row.id, "skipped"))
+                _STATS.skipped += 1
+                continue
+            chat_id = int(row.tg_user_id)
+            lanes.setdefault(chat_id, _ChatLane(chat_id)).items.append(row)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        await asyncio.gather(
+            *(_send_lane(bot, lane, semaphore, outcomes) for lane in lanes.values())
+        )
+
+        applied = [o for o in outcomes if o.outcome != "retry"]
+        if applied:
+            await s.execute(
+                _APPLY_SQL.bindparams(
+                    ids=[o.outbox_id for o in applied],
+                    outcomes=[o.outcome for o in applied],
+                    errors=[o.error for o in applied],
+                    max_attempts=MAX_SEND_ATTEMPTS,
                 )
+            )
         await s.commit()
+        _STATS.batches += 1
+        return len(items)
+
+
+async def _refresh_queue_depth(session: Optional[AsyncSession] = None) -> int:
+    async with _maybe_session(session) as s:
+        depth = await s.scalar(
+            text("SELECT COUNT(*) FROM notifications_outbox WHERE processed_at IS NULL")
+        )
+    _STATS.queue_depth = int(depth or 0)
+    return _STATS.queue_depth
 
 
 async def run_master_notifications(
@@ -130,10 +266,24 @@ async def run_master_notifications(
         session: Опциональная тестовая сессия (для тестов)
     """
     sleep_for = max(1, int(interval_seconds))
+    stats_logged_at = monotonic()
     while True:
+        claimed = 0
         try:
-            await _drain_outbox_once(bot, session=session)
+            claimed = await _drain_outbox_once(bot, session=session)
+            if monotonic() - stats_logged_at >= _STATS_LOG_SECONDS:
+                stats_logged_at = monotonic()
+                depth = await _refresh_queue_depth(session)
+                live_log.push(
+                    "outbox",
+                    f"depth={depth} sent={_STATS.sent} failed={_STATS.failed} "
+                    f"retried={_STATS.retried} send_avg_ms={_STATS.send_latency_ms_avg:.0f} "
+                    f"send_max_ms={_STATS.send_latency_ms_max:.0f} "
+                    f"queue_max_ms={_STATS.queue_latency_ms_max:.0f}",
+                )
         except Exception:
             # Не падаем из‑за сбоев доставки, просто пишем в лог stderr
             logger.exception("Failed to drain notifications outbox")
-        await asyncio.sleep(sleep_for)
+        # Полный батч - в очереди есть ещё, разбираем без паузы
+        if claimed < BATCH_SIZE:
+            await asyncio.sleep(sleep_for)
@@ -0,0 +1,118 @@
+"""Per-order lifecycle projection (``order_lifecycle``).
+
+One row per order with the first / last time the order entered each status
+and the reason of the latest cancellation. The table is maintained by the
+``trg_order_status_history__lifecycle`` trigger on ``order_status_history``
+(see migration 2025_10_19_0001), so every code path that writes history rows
+keeps it current without extra calls.
+
+Readers (exports, order cards, SLA analytics) join it by primary key instead
+of scanning history per order. ``rebuild_order_lifecycle`` recomputes rows
+from history (repair after manual edits / deletes of history rows).
+"""
+from __future__ import annotations
+
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.db import models as m
+from field_service.services._session_utils import maybe_managed_session
+
+logger = logging.getLogger("order_lifecycle")
+
+LIFECYCLE_STATUSES: tuple[m.OrderStatus, ...] = (
+    m.OrderStatus.CREATED,
+    m.OrderStatus.SEARCHING,
+    m.OrderStatus.ASSIGNED,
+    m.OrderStatus.EN_ROUTE,
+    m.OrderStatus.WORKING,
+    m.OrderStatus.PAYMENT,
+    m.OrderStatus.CLOSED,
+    m.OrderStatus.DEFERRED,
+    m.OrderStatus.GUARANTEE,
+    m.OrderStatus.CANCELED,
+)
+
+
+def first_column(status: m.OrderStatus):
+    return getattr(m.order_lifecycle, f"first_{status.value.lower()}_at")
+
+
+def last_column(status: m.OrderStatus):
+    return getattr(m.order_lifecycle, f"last_{status.value.lower()}_at")
+
+
+def _rebuild_sql(history_filter: str) -> str:
+    columns = ", ".join(
+        f"first_{s.value.lower()}_at, last_{s.value.lower()}_at" for s in LIFECYCLE_STATUSES
+    )
+    aggregates = ",\n           ".join(
+        f"MIN(h.created_at) FILTER (WHERE h.to_status = '{s.value}'), "
+        f"MAX(h.created_at) FILTER (WHERE h.to_status = '{s.value}')"
+        for s in LIFECYCLE_STATUSES
+    )
+    updates = ",\n           ".join(
+        f"first_{s.value.lower()}_at = EXCLUDED.first_{s.value.lower()}_at, "
+        f"last_{s.value.lower()}_at = EXCLUDED.last_{s.value.lower()}_at"
+        for s in LIFECYCLE_STATUSES
+    )
+    return f"""
+    INSERT INTO order_lifecycle AS l (order_id, {columns}, cancel_reason, updated_at)
+    SELECT h.order_id,
+           {aggregates},
+           (ARRAY_AGG(h.reason ORDER BY h.created_at DESC, h.id DESC)
+                FILTER (WHERE h.to_status = 'CANCELED'))[1],
+           NOW()
+      FROM order_status_history h
+     {history_filter}
+     GROUP BY h.order_id
+    ON CONFLICT (order_id) DO UPDATE
+       SET {updates},
+           cancel_reason = EXCLUDED.cancel_reason,
+           updated_at = EXCLUDED.updated_at
+    """
+
+
+async def refresh_order_lifecycle(session: AsyncSession, order_ids: Iterable[int]) -> int:
+    """Recompute lifecycle rows of the given orders from history.
+
+    Does not commit: the caller owns the transaction.
+    """
+    ids = sorted({int(oid) for oid in order_ids if oid is not None})
+    if not ids:
+        return 0
+    result = await session.execute(
+        text(_rebuild_sql("WHERE h.order_id = ANY(:ids)")).bindparams(ids=ids)
+    )
+    return int(result.rowcount or 0)
+
+
+async def rebuild_order_lifecycle(session: Optional[AsyncSession] = None) -> int:
+    """Recompute the whole projection. Returns number of rows written."""
+    async with maybe_managed_session(session) as s:
+        result = await s.execute(text(_rebuild_sql("")))
+        await s.commit()
+    rows = int(result.rowcount or 0)
+    logger.info("order_lifecycle rebuilt: rows=%s", rows)
+    return rows
+
+
+async def get_lifecycle(session: AsyncSession, order_id: int) -> Optional[m.order_lifecycle]:
+    return (
+        await session.execute(
+            select(m.order_lifecycle).where(m.order_lifecycle.order_id == order_id)
+        )
+    ).scalar_one_or_none()
+
+
+__all__ = [
+    "LIFECYCLE_STATUSES",
+    "first_column",
+    "get_lifecycle",
+    "last_column",
+    "rebuild_order_lifecycle",
+    "refresh_order_lifecycle",
+]
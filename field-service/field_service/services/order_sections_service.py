@@ -0,0 +1,247 @@
+"""Counters of the admin orders menu sections (``order_section_counters``).
+
+The menu shows three numbers per visible city set:
+
+* ``queue`` - orders in the queue statuses;
+* ``guarantee`` - CLOSED non-guarantee orders whose commission was approved
+  less than 14 days ago (rows of ``order_warranty_window``);
+* ``closed`` - the other CLOSED orders, i.e. ``closed_total - guarantee``.
+
+``queue`` / ``closed_total`` are maintained by ``trg_orders__section_counters``
+and ``guarantee`` by the trigger on ``order_warranty_window``, whose rows
+follow order transitions and commission approvals (migration
+2025_10_21_0002). Counter rows change only when an order enters / leaves a
+section (creation, closing, cancel), not on every assignment step.
+
+Window rows expire by time: reads subtract the expired-but-not-swept rows, and
+``expire_warranty_window`` deletes them periodically. Reads are cached per
+city set for ``CACHE_TTL_SECONDS``. ``rebuild_section_counters`` recomputes
+everything from orders / commissions and returns the number of drifted rows.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from time import monotonic
+from typing import Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from field_service.services import live_log
+from field_service.services._session_utils import maybe_managed_session
+
+logger = logging.getLogger("order_sections")
+
+CACHE_TTL_SECONDS = 15
+EXPIRE_INTERVAL_SECONDS = 300
+REBUILD_EVERY = 12  # expire passes between full rebuilds (~1 hour)
+
+_QUEUE_STATUSES = (
+    "'SEARCHING','ASSIGNED','EN_ROUTE','WORKING','PAYMENT','GUARANTEE','DEFERRED'"
+)
+
+_EMPTY = {"queue": 0, "guarantee": 0, "closed": 0}
+
+# city set (None = all cities) -> (loaded_at, counts)
+_CACHE: dict[Optional[tuple[int, ...]], tuple[float, dict[str, int]]] = {}
+
+_READ_SQL = """
+SELECT c.section, COALESCE(SUM(c.cnt), 0)
+  FROM order_section_counters c
+ {counters_filter}
+ GROUP BY c.section
+UNION ALL
+SELECT 'expired', COUNT(*)
+  FROM order_warranty_window w
+ WHERE w.expires_at < NOW()
+   {window_filter}
+"""
+
+_EXPECTED_WINDOW = """
+SELECT o.id AS order_id, o.city_id, c.paid_approved_at + INTERVAL '14 days' AS expires_at
+  FROM orders o
+  JOIN commissions c ON c.order_id = o.id
+ WHERE o.status = 'CLOSED'
+   AND o.type <> 'GUARANTEE'
+   AND c.paid_approved_at >= NOW() - INTERVAL '14 days'
+"""
+
+_REBUILD_WINDOW_DELETE_SQL = f"""
+DELETE FROM order_warranty_window w
+ WHERE NOT EXISTS (
+        SELECT 1 FROM ({_EXPECTED_WINDOW}) e WHERE e.order_id = w.order_id
+ )
+"""
+
+_REBUILD_WINDOW_UPSERT_SQL = f"""
+INSERT INTO order_warranty_window AS w (order_id, city_id, expires_at)
+SELECT e.order_id, e.city_id, e.expires_at FROM ({_EXPECTED_WINDOW}) e
+ON CONFLICT (order_id) DO UPDATE
+   SET city_id = EXCLUDED.city_id,
+       expires_at = EXCLUDED.expires_at
+ WHERE (w.city_id, w.expires_at) IS DISTINCT FROM (EXCLUDED.city_id, EXCLUDED.expires_at)
+"""
+
+# Absolute recompute; returns the number of counter rows that had drifted
+_REBUILD_COUNTERS_SQL = f"""
+WITH actual AS (
+    SELECT o.city_id, 'queue' AS section, COUNT(*)::int AS cnt
+      FROM orders o
+     WHERE o.status IN ({_QUEUE_STATUSES})
+     GROUP BY o.city_id
+    UNION ALL
+    SELECT o.city_id, 'closed_total', COUNT(*)::int
+      FROM orders o
+     WHERE o.status = 'CLOSED'
+     GROUP BY o.city_id
+    UNION ALL
+    SELECT w.city_id, 'guarantee', COUNT(*)::int
+      FROM order_warranty_window w
+     GROUP BY w.city_id
+), zeroed AS (
+    UPDATE order_section_counters c
+       SET cnt = 0, updated_at = NOW()
+     WHERE c.cnt <> 0
+       AND NOT EXISTS (
+            SELECT 1 FROM actual a WHERE a.city_id = c.city_id AND a.section = c.section
+       )
+    RETURNING 1
+), upserted AS (
+    INSERT INTO order_section_counters AS c (city_id, section, cnt, updated_at)
+    SELECT a.city_id, a.section, a.cnt, NOW() FROM actual a
+    ON CONFLICT (city_id, section) DO UPDATE
+       SET cnt = EXCLUDED.cnt,
+           updated_at = EXCLUDED.updated_at
+     WHERE c.cnt IS DISTINCT FROM EXCLUDED.cnt
+    RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM zeroed) + (SELECT COUNT(*) FROM upserted)
+"""
+
+
+def invalidate() -> None:
+    _CACHE.clear()
+
+
+def reset() -> None:
+    invalidate()
+
+
+def _cache_key(city_ids: Optional[Iterable[int]]) -> Optional[tuple[int, ...]]:
+    if city_ids is None:
+        return None
+    return tuple(sorted({int(cid) for cid in city_ids}))
+
+
+async def _read_counts(session: AsyncSession, key: Optional[tuple[int, ...]]) -> dict[str, int]:
+    if key is None:
+        stmt = text(_READ_SQL.format(counters_filter="", window_filter=""))
+    else:
+        stmt = text(
+            _READ_SQL.format(
+                counters_filter="WHERE c.city_id = ANY(:cids)",
+                window_filter="AND w.city_id = ANY(:cids)",
+            )
+        ).bindparams(cids=list(key))
+    raw = {str(section): int(cnt or 0) for section, cnt in (await session.execute(stmt)).all()}
+    guarantee = max(raw.get("guarantee", 0) - raw.get("expired", 0), 0)
+    return {
+        "queue": raw.get("queue", 0),
+        "guarantee": guarantee,
+        "closed": max(raw.get("closed_total", 0) - guarantee, 0),
+    }
+
+
+async def count_sections(
+    city_ids: Optional[Iterable[int]],
+    *,
+    session: Optional[AsyncSession] = None,
+) -> dict[str, int]:
+    """Menu counters for the city set (None = all cities)."""
+    key = _cache_key(city_ids)
+    if key == ():
+        return dict(_EMPTY)
+    cached = _CACHE.get(key)
+    now = monotonic()
+    if cached is not None and now - cached[0] < CACHE_TTL_SECONDS:
+        return dict(cached[1])
+    async with maybe_managed_session(session) as s:
+        counts = await _read_counts(s, key)
+    _CACHE[key] = (now, counts)
+    return dict(counts)
+
+
+async def expire_warranty_window(session: Optional[AsyncSession] = None) -> int:
+    """Drop window rows older than 14 days (the trigger decrements counters)."""
+    async with maybe_managed_session(session) as s:
+        rows = await s.execute(
+            text("DELETE FROM order_warranty_window WHERE expires_at < NOW() RETURNING order_id")
+        )
+        expired = len(rows.fetchall())
+        await s.commit()
+    return expired
+
+
+async def rebuild_section_counters(session: Optional[AsyncSession] = None) -> int:
+    """Recompute the window and all counters from scratch. Returns drifted rows."""
+    async with maybe_managed_session(session) as s:
+        await s.execute(text(_REBUILD_WINDOW_DELETE_SQL))
+        await s.execute(text(_REBUILD_WINDOW_UPSERT_SQL))
+        drifted = int((await s.execute(text(_REBUILD_COUNTERS_SQL))).scalar() or 0)
+        await s.commit()
+    invalidate()
+    if drifted:
+        logger.info("order_section_counters rebuild: drifted=%s", drifted)
+    return drifted
+
+
+async def run_order_sections_maintenance(
+    interval_seconds: int = EXPIRE_INTERVAL_SECONDS,
+    *,
+    rebuild_every: int = REBUILD_EVERY,
+    iterations: int | None = None,
+    session: Optional[AsyncSession] = None,
+) -> None:
+    """Expire the warranty window periodically and rebuild counters now and then.
+
+    Args:
+        interval_seconds: Интервал между проходами в секундах
+        rebuild_every: Полная пересборка каждые N проходов (первый проход - всегда)
+        iterations: Количество итераций (None = бесконечно)
+        session: Optional test session (default: create own)
+    """
+    sleep_for = max(30, int(interval_seconds) if interval_seconds else EXPIRE_INTERVAL_SECONDS)
+    rebuild_every = max(1, int(rebuild_every))
+    loops_done = 0
+    while True:
+        try:
+            if loops_done % rebuild_every == 0:
+                drifted = await rebuild_section_counters(session)
+                if drifted:
+                    live_log.push(
+                        "watchdog", f"order_section_counters drifted={drifted}", level="WARN"
+                    )
+            else:
+                await expire_warranty_window(session)
+        except Exception as exc:
+            logger.exception("order_section_counters maintenance failed: %s", exc)
+            live_log.push(
+                "watchdog", f"order_section_counters maintenance error: {exc}", level="ERROR"
+            )
+
+        loops_done += 1
+        if iterations is not None and loops_done >= iterations:
+            break
+        await asyncio.sleep(sleep_for)
+
+
+__all__ = [
+    "CACHE_TTL_SECONDS",
+    "count_sections",
+    "expire_warranty_window",
+    "invalidate",
+    "rebuild_section_counters",
+    "reset",
+    "run_order_sections_maintenance",
+]
@@ -13,6 +13,7 @@ from sqlalchemy import and_, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
+from field_service.services.distribution import wake_channel
 from field_service.services.distribution_metrics_service import (
     DistributionMetricsService,
 )
@@ -317,13 +318,20 @@ class OrdersService:
                 )
             )
             .values(state=m.OfferState.DECLINED, responded_at=func.now())
-            .returning(m.offers.id)
+            .returning(m.offers.id, m.offers.order_id)
         )
         
-        if not result.first():
+        row = result.first()
+        if not row:
             _log.warning("decline_offer: offer=%s not found or already processed", offer_id)
             return False, "Оффер не найден или уже обработан"
         
+        await wake_channel.notify(
+            self.session,
+            wake_channel.WakeReason.OFFER_DECLINED,
+            order_id=row.order_id,
+            master_id=master_id,
+        )
         await self.session.commit()
         _log.info("decline_offer SUCCESS: offer=%s declined by master=%s", offer_id, master_id)
         return True, None
@@ -6,7 +6,7 @@ P1-05: PUSH-уведомления для мастеров и админов
 from __future__ import annotations
 
 from enum import Enum
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 
 from aiogram import Bot
 from sqlalchemy import insert, select
@@ -28,6 +28,7 @@ class NotificationEvent(str, Enum):
     LIMIT_CHANGED = "limit_changed"
     REFERRAL_REGISTERED = "referral_registered"
     REFERRAL_REWARD_ACCRUED = "referral_reward_accrued"
+    COMMISSION_DEADLINE_REMINDER = "commission_deadline_reminder"
 
     # Уведомления для админов/логистов
     ESCALATION_LOGIST = "escalation_logist"
@@ -105,6 +106,22 @@ NOTIFICATION_TEMPLATES = {
 }
 
 
+def _render_template(event: NotificationEvent, kwargs: dict[str, Any]) -> str:
+    template = NOTIFICATION_TEMPLATES.get(event)
+    if not template:
+        template = ": {event}"
+    
+    try:
+        return template.format(event=event.value, **kwargs)
+    except KeyError as exc:
+        live_log.push(
+            "notifications",
+            f"Template error for {event}: missing key {exc}",
+            level="ERROR"
+        )
+        return f": {event.value}"
+
+
 async def notify_master(
     session: AsyncSession,
     *,
@@ -121,19 +138,7 @@ async def notify_master(
         event:  
         **kwargs:   
     """
-    template = NOTIFICATION_TEMPLATES.get(event)
-    if not template:
-        template = ": {event}"
-    
-    try:
-        message = template.format(event=event.value, **kwargs)
-    except KeyError as exc:
-        live_log.push(
-            "notifications",
-            f"Template error for {event}: missing key {exc}",
-            level="ERROR"
-        )
-        message = f": {event.value}"
+    message = _render_template(event, kwargs)
     
     await session.execute(
         insert(m.notifications_outbox).values(
@@ -150,6 +155,42 @@ async def notify_master(
     )
 
 
+async def notify_masters_bulk(
+    session: AsyncSession,
+    *,
+    event: NotificationEvent,
+    items: Sequence[tuple[int, dict[str, Any]]],
+) -> int:
+    """
+    Одна вставка в notifications_outbox для пачки мастеров.
+
+    Args:
+        session: Сессия БД
+        event: Тип события
+        items: Пары (master_id, параметры шаблона)
+
+    Returns:
+        Количество поставленных в очередь уведомлений
+    """
+    if not items:
+        return 0
+    rows = [
+        {
+            "master_id": master_id,
+            "event": event.value,
+            "payload": {"message": _render_template(event, kwargs), **kwargs},
+        }
+        for master_id, kwargs in items
+    ]
+    await session.execute(insert(m.notifications_outbox), rows)
+    live_log.push(
+        "notifications",
+        f"Queued {event.value} for {len(rows)} masters",
+        level="INFO"
+    )
+    return len(rows)
+
+
 async def notify_admin(
     bot: Bot,
     alerts_chat_id: int,
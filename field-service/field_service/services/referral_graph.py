@@ -0,0 +1,136 @@
+"""Process-local referral graph: master -> (L1, L2) referrers.
+
+Referral rewards need the two ancestors of the paying master. Instead of one
+``referrals`` query per level for every commission, the whole graph
+(``referrals.master_id -> referrer_id``) is loaded in one query and the chains
+are resolved in memory. The graph changes only at onboarding, when a master
+registers with a referral code (``referred_by_master_id`` + ``referrals`` row).
+
+Freshness:
+- explicit ``invalidate()`` from the onboarding handler after it links a
+  referrer;
+- a cheap fingerprint query (count / max id / sum of referrers of
+  ``referrals`` and the sum of ``masters.referred_by_master_id``) checked at
+  most every ``_FINGERPRINT_CHECK_SECONDS``: catches changes of other
+  processes;
+- hard TTL ``_GRAPH_TTL_SECONDS`` as a safety net.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("referral_graph")
+
+_GRAPH_TTL_SECONDS = 600
+_FINGERPRINT_CHECK_SECONDS = 5
+
+
+@dataclass(slots=True)
+class ReferralGraph:
+    fingerprint: tuple
+    # master_id -> referrer_id (L1)
+    parents: dict[int, int] = field(default_factory=dict)
+    # memoized chains
+    _chains: dict[int, tuple[Optional[int], Optional[int]]] = field(default_factory=dict)
+
+    def ancestors(self, master_id: int) -> tuple[Optional[int], Optional[int]]:
+        """(L1, L2) referrers of the master; None where the chain ends."""
+        key = int(master_id)
+        cached = self._chains.get(key)
+        if cached is not None:
+            return cached
+        level1 = self.parents.get(key)
+        level2 = self.parents.get(level1) if level1 is not None else None
+        chain = (level1, level2)
+        self._chains[key] = chain
+        return chain
+
+
+_GRAPH: Optional[ReferralGraph] = None
+_GRAPH_BUILT_AT: Optional[float] = None
+_FINGERPRINT_CHECKED_AT: Optional[float] = None
+
+
+def invalidate() -> None:
+    """Drop the graph; the next lookup reloads it."""
+    global _GRAPH, _GRAPH_BUILT_AT, _FINGERPRINT_CHECKED_AT
+    _GRAPH = None
+    _GRAPH_BUILT_AT = None
+    _FINGERPRINT_CHECKED_AT = None
+
+
+def reset() -> None:
+    invalidate()
+
+
+async def _fingerprint(session: AsyncSession) -> tuple:
+    row = (
+        await session.execute(
+            text(
+                """
+            SELECT (SELECT COUNT(*) FROM referrals),
+                   (SELECT COALESCE(MAX(id), 0) FROM referrals),
+                   (SELECT COALESCE(SUM(referrer_id), 0) FROM referrals),
+                   (SELECT COALESCE(SUM(referred_by_master_id), 0) FROM masters)
+            """
+            )
+        )
+    ).first()
+    return tuple(row) if row is not None else ()
+
+
+async def _build(session: AsyncSession, fingerprint: tuple) -> ReferralGraph:
+    rows = await session.execute(text("SELECT master_id, referrer_id FROM referrals"))
+    graph = ReferralGraph(
+        fingerprint=fingerprint,
+        parents={int(mid): int(ref) for mid, ref in rows},
+    )
+    logger.debug("referral graph rebuilt: edges=%s", len(graph.parents))
+    return graph
+
+
+async def get_graph(session: AsyncSession) -> ReferralGraph:
+    """Return a fresh-enough graph, reloading it when stale."""
+    global _GRAPH, _GRAPH_BUILT_AT, _FINGERPRINT_CHECKED_AT
+    now = monotonic()
+    expired = _GRAPH_BUILT_AT is None or now - _GRAPH_BUILT_AT >= _GRAPH_TTL_SECONDS
+    if _GRAPH is not None and not expired:
+        if (
+            _FINGERPRINT_CHECKED_AT is not None
+            and now - _FINGERPRINT_CHECKED_AT < _FINGERPRINT_CHECK_SECONDS
+        ):
+            return _GRAPH
+        fingerprint = await _fingerprint(session)
+        _FINGERPRINT_CHECKED_AT = now
+        if fingerprint == _GRAPH.fingerprint:
+            return _GRAPH
+    else:
+        fingerprint = await _fingerprint(session)
+
+    _GRAPH = await _build(session, fingerprint)
+    _GRAPH_BUILT_AT = now
+    _FINGERPRINT_CHECKED_AT = now
+    return _GRAPH
+
+
+async def ancestors(
+    session: AsyncSession, master_id: Optional[int]
+) -> tuple[Optional[int], Optional[int]]:
+    if not master_id:
+        return None, None
+    return (await get_graph(session)).ancestors(master_id)
+
+
+__all__ = [
+    "ReferralGraph",
+    "ancestors",
+    "get_graph",
+    "invalidate",
+    "reset",
+]
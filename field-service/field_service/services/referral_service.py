@@ -4,12 +4,14 @@ import hashlib
 import secrets
 from datetime import datetime
 from decimal import Decimal, ROUND_HALF_UP
-from typing import Optional
+from typing import Optional, Sequence
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
+from field_service.services import referral_graph
 
 _PERCENT_RULES: dict[int, tuple[Decimal, Decimal]] = {
     1: (Decimal("10.00"), Decimal("0.10")),
@@ -18,15 +20,6 @@ _PERCENT_RULES: dict[int, tuple[Decimal, Decimal]] = {
 ROUND = Decimal("0.01")
 
 
-async def _get_referrer_id(session: AsyncSession, master_id: Optional[int]) -> Optional[int]:
-    if not master_id:
-        return None
-    result = await session.execute(
-        select(m.referrals.referrer_id).where(m.referrals.master_id == master_id)
-    )
-    return result.scalar_one_or_none()
-
-
 def _to_decimal(value: Optional[Decimal | int | float | str]) -> Decimal:
     if value is None:
         return Decimal("0")
@@ -42,78 +35,126 @@ def _to_decimal(value: Optional[Decimal | int | float | str]) -> Decimal:
     return Decimal("0")
 
 
+# (commission_id, master_id, base_amount, order_id or None)
+RewardSource = tuple[
+    int, Optional[int], Optional[Decimal | int | float | str], Optional[int]
+]
+
+
+def _reward_rows(
+    graph: referral_graph.ReferralGraph, items: Sequence[RewardSource]
+) -> list[dict]:
+    rows: list[dict] = []
+    for commission_id, master_id, base_amount, _order_id in items:
+        amount = _to_decimal(base_amount)
+        if not master_id or amount <= 0:
+            continue
+        seen: set[int] = set()
+        for level, referrer_id in enumerate(graph.ancestors(master_id), start=1):
+            if referrer_id is None:
+                break
+            if referrer_id in seen:
+                continue
+            seen.add(referrer_id)
+            percent_display, rate = _PERCENT_RULES[level]
+            reward_amount = (amount * rate).quantize(ROUND, rounding=ROUND_HALF_UP)
+            if reward_amount <= 0:
+                continue
+            rows.append(
+                {
+                    "referrer_id": referrer_id,
+                    "referred_master_id": int(master_id),
+                    "commission_id": int(commission_id),
+                    "level": level,
+                    "percent": percent_display,
+                    "amount": reward_amount,
+                    "status": m.ReferralRewardStatus.ACCRUED,
+                }
+            )
+    return rows
+
+
+async def apply_rewards_for_commissions(
+    session: AsyncSession,
+    items: Sequence[RewardSource],
+) -> int:
+    """
+    Начисляет реферальные вознаграждения для пачки комиссий.
+
+    Цепочки L1/L2 берутся из кэша referral_graph, вознаграждения вставляются
+    одним INSERT ... ON CONFLICT DO NOTHING, уведомления - одной вставкой
+    в outbox. Повторный вызов для тех же комиссий ничего не начисляет.
+
+    Args:
+        session: Async database session
+        items: (commission_id, master_id, base_amount, order_id);
+            order_id=None - номер заказа дочитывается для начисленных
+
+    Returns:
+        int: Количество начисленных вознаграждений
+    """
+    if not items:
+        return 0
+    graph = await referral_graph.get_graph(session)
+    rows = _reward_rows(graph, items)
+    if not rows:
+        return 0
+
+    stmt = (
+        pg_insert(m.referral_rewards)
+        .values(rows)
+        .on_conflict_do_nothing(constraint="uq_referral_rewards__commission_level")
+        .returning(
+            m.referral_rewards.referrer_id,
+            m.referral_rewards.commission_id,
+            m.referral_rewards.level,
+            m.referral_rewards.amount,
+        )
+    )
+    inserted = (await session.execute(stmt)).all()
+    if not inserted:
+        return 0
+
+    order_ids = {int(item[0]): item[3] for item in items}
+    missing = sorted({cid for _, cid, _, _ in inserted if order_ids.get(cid) is None})
+    if missing:
+        found = await session.execute(
+            select(m.commissions.id, m.commissions.order_id).where(
+                m.commissions.id.in_(missing)
+            )
+        )
+        order_ids.update({int(cid): oid for cid, oid in found})
+
+    from field_service.services import push_notifications
+    await push_notifications.notify_masters_bulk(
+        session,
+        event=push_notifications.NotificationEvent.REFERRAL_REWARD_ACCRUED,
+        items=[
+            (
+                int(referrer_id),
+                {
+                    "amount": float(amount),
+                    "level": int(level),
+                    "order_id": order_ids.get(commission_id) or commission_id,
+                },
+            )
+            for referrer_id, commission_id, level, amount in inserted
+        ],
+    )
+    return len(inserted)
+
+
 async def apply_rewards_for_commission(
     session: AsyncSession,
     *,
     commission_id: int,
     master_id: Optional[int],
     base_amount: Optional[Decimal | int | float | str],
+    order_id: Optional[int] = None,
 ) -> None:
-    amount = _to_decimal(base_amount)
-    if not master_id or amount <= 0:
-        return
-
-    chain: list[int] = []
-    current_master = master_id
-    for _level in (1, 2):
-        ref_id = await _get_referrer_id(session, current_master)
-        if ref_id is None:
-            break
-        chain.append(ref_id)
-        current_master = ref_id
-
-    if not chain:
-        return
-
-    seen: set[int] = set()
-    for level, referrer_id in enumerate(chain, start=1):
-        if referrer_id in seen:
-            continue
-        seen.add(referrer_id)
-        config = _PERCENT_RULES.get(level)
-        if not config:
-            continue
-        percent_display, rate = config
-        reward_amount = (amount * rate).quantize(ROUND, rounding=ROUND_HALF_UP)
-        if reward_amount <= 0:
-            continue
-
-        exists = await session.execute(
-            select(m.referral_rewards.id).where(
-                m.referral_rewards.commission_id == commission_id,
-                m.referral_rewards.level == level,
-            )
-        )
-        if exists.scalar_one_or_none() is not None:
-            continue
-
-        stmt = insert(m.referral_rewards).values(
-            referrer_id=referrer_id,
-            referred_master_id=master_id,
-            commission_id=commission_id,
-            level=level,
-            percent=percent_display,
-            amount=reward_amount,
-            status=m.ReferralRewardStatus.ACCRUED,
-        )
-        await session.execute(stmt)
-
-        # Получаем order_id для уведомления
-        commission_data = await session.execute(
-            select(m.commissions.order_id).where(m.commissions.id == commission_id)
-        )
-        order_id = commission_data.scalar_one_or_none()
-
-        # Отправляем уведомление рефереру о начислении
-        from field_service.services import push_notifications
-        await push_notifications.notify_master(
-            session,
-            master_id=referrer_id,
-            event=push_notifications.NotificationEvent.REFERRAL_REWARD_ACCRUED,
-            amount=float(reward_amount),
-            level=level,
-            order_id=order_id or commission_id,
-        )
+    await apply_rewards_for_commissions(
+        session, [(commission_id, master_id, base_amount, order_id)]
+    )
 
 
 async def generate_referral_code(session: AsyncSession, master_id: int) -> str:
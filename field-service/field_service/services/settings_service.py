@@ -1,10 +1,26 @@
+"""Settings store (``settings`` table) with a process-local snapshot.
+
+All rows are loaded in one query into an immutable ``SettingsSnapshot``;
+``get_int`` / ``get_value`` / ``get_time`` and the other typed accessors read
+from it, so hot paths (distribution tick, master bot limits) do not touch the
+database. Freshness:
+
+- ``set_values`` invalidates the snapshot of this process and issues
+  ``pg_notify('settings_changed')`` inside its transaction;
+- ``run_listener()`` (LISTEN on a dedicated connection) invalidates the
+  snapshot when another process commits a change;
+- the TTL (``_SNAPSHOT_TTL``, longer while the listener is connected) is a
+  safety net for processes without a listener and for manual edits.
+"""
 from __future__ import annotations
 import json
+import logging
 import re
 from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from datetime import time
 from time import monotonic
-from typing import Iterable, Mapping, Optional, Sequence, Tuple
+from typing import Any, Iterable, Mapping, Optional, Sequence, Tuple
 from zoneinfo import ZoneInfo
 
 from sqlalchemy import select
@@ -13,12 +29,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
 
 from field_service.db.session import SessionLocal
-from field_service.db import models as m
+from field_service.db import models as m, pg_notify
 from field_service.config import settings as env_settings
 
+logger = logging.getLogger("settings_service")
 
-_WORKING_WINDOW_CACHE: tuple[tuple[time, time], float] | None = None
-_WORKING_WINDOW_TTL = 60.0
+CHANNEL = "settings_changed"
+_SNAPSHOT_TTL = 60.0
+# With a connected listener changes arrive by NOTIFY; TTL covers manual edits
+_SNAPSHOT_TTL_LISTENING = 600.0
+
+_TRUE_VALUES = {"1", "true", "yes", "on"}
 
 
 def get_timezone() -> ZoneInfo:
@@ -44,6 +65,132 @@ async def _maybe_session(session: Optional[AsyncSession]):
         yield s
 
 
+def _parse_time(s: str) -> Optional[time]:
+    if not _TIME_RE.fullmatch(s or ""):
+        return None
+    hh, mm = map(int, s.split(":"))
+    if 0 <= hh < 24 and 0 <= mm < 60:
+        return time(hour=hh, minute=mm)
+    return None
+
+
+@dataclass(frozen=True, slots=True)
+class SettingsSnapshot:
+    """All settings rows at load time: ``{key: (value, value_type)}``."""
+
+    values: Mapping[str, Tuple[Optional[str], Optional[str]]]
+    loaded_at: float
+
+    def raw(self, key: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        return self.values.get(key)
+
+    def get_str(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self.values.get(key)
+        if row is None or row[0] is None:
+            return default
+        return str(row[0])
+
+    def get_int(self, key: str, default: int) -> int:
+        value = self.get_str(key)
+        try:
+            return int(value) if value is not None else int(default)
+        except (TypeError, ValueError):
+            return int(default)
+
+    def get_float(self, key: str, default: float) -> float:
+        value = self.get_str(key)
+        try:
+            return float(value) if value is not None else float(default)
+        except (TypeError, ValueError):
+            return float(default)
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        value = self.get_str(key)
+        if value is None or not value.strip():
+            return bool(default)
+        return value.strip().lower() in _TRUE_VALUES
+
+    def get_time(self, key: str, default_str: str) -> time:
+        t = _parse_time(self.get_str(key, default_str) or "")
+        if t:
+            return t
+        # fallback к env
+        return _parse_time(default_str) or time(10, 0)
+
+    def get_json(self, key: str, default: Any = None) -> Any:
+        value = self.get_str(key)
+        if not value:
+            return default
+        try:
+            return json.loads(value)
+        except (TypeError, ValueError):
+            return default
+
+
+_SNAPSHOT: Optional[SettingsSnapshot] = None
+# Bumped by every invalidation: a load that raced with a change is not stored
+_GENERATION = 0
+_LISTENER_ACTIVE = False
+
+
+def cached_snapshot() -> Optional[SettingsSnapshot]:
+    """Current snapshot if it is still fresh (no I/O)."""
+    snapshot = _SNAPSHOT
+    ttl = _SNAPSHOT_TTL_LISTENING if _LISTENER_ACTIVE else _SNAPSHOT_TTL
+    if snapshot is None or monotonic() - snapshot.loaded_at >= ttl:
+        return None
+    return snapshot
+
+
+async def get_snapshot(
+    *,
+    refresh: bool = False,
+    session: Optional[AsyncSession] = None,
+) -> SettingsSnapshot:
+    """Snapshot of all settings; loads it with one query on a miss.
+
+    Args:
+        refresh: Перечитать настройки из БД
+        session: Опциональная сессия (используется только при загрузке)
+    """
+    global _SNAPSHOT
+    if not refresh:
+        snapshot = cached_snapshot()
+        if snapshot is not None:
+            return snapshot
+    generation = _GENERATION
+    async with _maybe_session(session) as s:
+        try:
+            rows = await s.execute(
+                select(m.settings.key, m.settings.value, m.settings.value_type)
+            )
+        except OperationalError:
+            # Нет таблицы (sqlite без схемы): не кэшируем пустой снимок
+            return SettingsSnapshot(values={}, loaded_at=monotonic())
+        values = {row[0]: (row[1], row[2]) for row in rows}
+    snapshot = SettingsSnapshot(values=values, loaded_at=monotonic())
+    if generation == _GENERATION:
+        _SNAPSHOT = snapshot
+    return snapshot
+
+
+def invalidate_cache() -> None:
+    """Drop the snapshot of this process (after a change of settings)."""
+    global _SNAPSHOT, _GENERATION
+    _SNAPSHOT = None
+    _GENERATION += 1
+
+
+def invalidate_working_window_cache() -> None:
+    """Clear cached working-window values (e.g. after admin update)."""
+    invalidate_cache()
+
+
+async def notify_changed(session: AsyncSession) -> None:
+    """NOTIFY other processes; call inside the writing transaction."""
+    await pg_notify.notify(session, CHANNEL)
+
+
 async def get_raw(key: str, *, session: Optional[AsyncSession] = None) -> Optional[Tuple[str, str]]:
     """Получить raw значение настройки.
     
@@ -54,15 +201,8 @@ async def get_raw(key: str, *, session: Optional[AsyncSession] = None) -> Option
     Returns:
         Кортеж (value, value_type) или None
     """
-    async with _maybe_session(session) as s:
-        try:
-            q = await s.execute(
-                select(m.settings.value, m.settings.value_type).where(m.settings.key == key)
-            )
-        except OperationalError:
-            return None
-        row = q.first()
-        return (row[0], row[1]) if row else None
+    snapshot = await get_snapshot(session=session)
+    return snapshot.raw(key)
 
 
 async def get_int(key: str, default: int, *, session: Optional[AsyncSession] = None) -> int:
@@ -76,23 +216,23 @@ async def get_int(key: str, default: int, *, session: Optional[AsyncSession] = N
     Returns:
         Целочисленное значение или default
     """
-    row = await get_raw(key, session=session)
-    if not row:
-        return int(default)
-    val, vtype = row
-    try:
-        return int(val)
-    except Exception:
-        return int(default)
+    snapshot = await get_snapshot(session=session)
+    return snapshot.get_int(key, default)
 
 
-def _parse_time(s: str) -> Optional[time]:
-    if not _TIME_RE.fullmatch(s or ""):
-        return None
-    hh, mm = map(int, s.split(":"))
-    if 0 <= hh < 24 and 0 <= mm < 60:
-        return time(hour=hh, minute=mm)
-    return None
+async def get_float(key: str, default: float, *, session: Optional[AsyncSession] = None) -> float:
+    snapshot = await get_snapshot(session=session)
+    return snapshot.get_float(key, default)
+
+
+async def get_bool(key: str, default: bool = False, *, session: Optional[AsyncSession] = None) -> bool:
+    snapshot = await get_snapshot(session=session)
+    return snapshot.get_bool(key, default)
+
+
+async def get_json(key: str, default: Any = None, *, session: Optional[AsyncSession] = None) -> Any:
+    snapshot = await get_snapshot(session=session)
+    return snapshot.get_json(key, default)
 
 
 async def get_time(key: str, default_str: str, *, session: Optional[AsyncSession] = None) -> time:
@@ -106,13 +246,8 @@ async def get_time(key: str, default_str: str, *, session: Optional[AsyncSession
     Returns:
         Объект time
     """
-    row = await get_raw(key, session=session)
-    s = row[0] if row else default_str
-    t = _parse_time(s)
-    if t:
-        return t
-    # fallback к env
-    return _parse_time(default_str) or time(10, 0)
+    snapshot = await get_snapshot(session=session)
+    return snapshot.get_time(key, default_str)
 
 
 async def get_value(
@@ -131,13 +266,11 @@ async def get_value(
     Returns:
         Строковое значение или default
     """
-    row = await get_raw(key, session=session)
-    if not row:
-        return default
-    value, _ = row
-    if value is None:
-        return default
-    return str(value)
+    snapshot = await get_snapshot(session=session)
+    return snapshot.get_str(key, default)
+
+
+get_str = get_value
 
 
 async def get_values(
@@ -156,13 +289,8 @@ async def get_values(
     """
     if not keys:
         return {}
-    async with _maybe_session(session) as s:
-        result = await s.execute(
-            select(m.settings.key, m.settings.value, m.settings.value_type).where(
-                m.settings.key.in_(list(keys))
-            )
-        )
-        return {row[0]: (row[1], row[2]) for row in result}
+    snapshot = await get_snapshot(session=session)
+    return {key: snapshot.values[key] for key in keys if key in snapshot.values}
 
 
 def _normalize_value_type(value_type: Optional[str]) -> str:
@@ -227,7 +355,8 @@ async def set_values(
                     set_={"value": payload, "value_type": vt},
                 )
                 await s.execute(stmt)
-    invalidate_working_window_cache()
+            await notify_changed(s)
+    invalidate_cache()
 
 
 async def get_working_window(
@@ -244,22 +373,35 @@ async def get_working_window(
     Returns:
         Кортеж (start_time, end_time)
     """
-    global _WORKING_WINDOW_CACHE
-    now = monotonic()
-    if (
-        not refresh
-        and _WORKING_WINDOW_CACHE is not None
-        and now - _WORKING_WINDOW_CACHE[1] < _WORKING_WINDOW_TTL
-    ):
-        return _WORKING_WINDOW_CACHE[0]
-
-    start = await get_time("working_hours_start", env_settings.working_hours_start, session=session)
-    end = await get_time("working_hours_end", env_settings.working_hours_end, session=session)
-    _WORKING_WINDOW_CACHE = ((start, end), now)
+    snapshot = await get_snapshot(refresh=refresh, session=session)
+    start = snapshot.get_time("working_hours_start", env_settings.working_hours_start)
+    end = snapshot.get_time("working_hours_end", env_settings.working_hours_end)
     return start, end
 
 
-def invalidate_working_window_cache() -> None:
-    """Clear cached working-window values (e.g. after admin update)."""
-    global _WORKING_WINDOW_CACHE
-    _WORKING_WINDOW_CACHE = None
+def _on_notify(connection: Any, pid: int, channel: str, payload: str) -> None:
+    invalidate_cache()
+
+
+def _on_connect() -> None:
+    global _LISTENER_ACTIVE
+    _LISTENER_ACTIVE = True
+    # Changes made while disconnected were not delivered
+    invalidate_cache()
+
+
+def _on_disconnect() -> None:
+    global _LISTENER_ACTIVE
+    _LISTENER_ACTIVE = False
+
+
+async def run_listener() -> None:
+    """LISTEN for settings changes of other processes; reconnects on failure."""
+    await pg_notify.listen(
+        CHANNEL, _on_notify, on_connect=_on_connect, on_disconnect=_on_disconnect
+    )
+
+
+def reset() -> None:
+    """Drop the snapshot (tests)."""
+    invalidate_cache()
@@ -0,0 +1,244 @@
+"""Process-local street search index per city.
+
+``search_streets`` used to load the first 200 streets of the city
+(``ORDER BY name LIMIT 200``) on every keystroke and run RapidFuzz over that
+slice, so in big cities most streets were never found. The index keeps all
+streets of a city with pre-folded names and a trigram posting list:
+
+- a query is folded the same way (lower case, ``ё`` -> ``е``, punctuation
+  dropped) and split into trigrams; streets sharing the most trigrams are
+  the candidates (``_PREFILTER_LIMIT``), only they are scored by RapidFuzz;
+- when no street shares a trigram (typos in short queries) the whole city is
+  scored, which is still a single ``process.extract`` call.
+
+Freshness:
+- explicit ``invalidate()`` in this process;
+- ``mark_changed(session)`` bumps the ``street_index_version`` setting, used by
+  ``tools/load_geo_catalog`` and ``scripts/import_districts.py`` so that bots
+  running in other processes reload after an import;
+- a per-city fingerprint (street count, MAX(id), sums of ``hashtext(name)``
+  and ``district_id``, version) checked at most every
+  ``_FINGERPRINT_CHECK_SECONDS``; catches manual inserts, deletes, renames
+  and district moves as well.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Iterable, Optional
+
+from rapidfuzz import fuzz, process
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger("street_index")
+
+VERSION_SETTING_KEY = "street_index_version"
+_FINGERPRINT_CHECK_SECONDS = 60
+# Candidates after the trigram prefilter that are scored by RapidFuzz
+_PREFILTER_LIMIT = 300
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def fold(value: str) -> str:
+    """Normalized form used for both indexed names and queries."""
+    value = value.lower().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", value).strip()
+
+
+def _trigrams(folded: str, *, prefix: bool = False) -> set[str]:
+    """pg_trgm-like trigrams of every word (padded "  w " at both ends).
+
+    ``prefix=True`` (queries) drops the word-end trigram of the last word: the
+    user may still be typing it.
+    """
+    grams: set[str] = set()
+    words = folded.split()
+    for idx, word in enumerate(words):
+        padded = f"  {word} "
+        end = len(padded) - 2
+        if prefix and idx == len(words) - 1:
+            end -= 1
+        for i in range(max(end, 1)):
+            grams.add(padded[i : i + 3])
+    return grams
+
+
+@dataclass(slots=True, frozen=True)
+class StreetEntry:
+    id: int
+    district_id: Optional[int]
+    name: str
+    folded: str
+
+
+@dataclass(slots=True)
+class CityStreetIndex:
+    city_id: int
+    fingerprint: tuple
+    entries: list[StreetEntry] = field(default_factory=list)
+    # trigram -> positions in ``entries``
+    postings: dict[str, list[int]] = field(default_factory=dict)
+    checked_at: float = field(default_factory=monotonic)
+
+    @classmethod
+    def build(
+        cls,
+        city_id: int,
+        rows: Iterable[tuple[int, Optional[int], str]],
+        *,
+        fingerprint: tuple = (),
+    ) -> "CityStreetIndex":
+        index = cls(city_id=int(city_id), fingerprint=fingerprint)
+        postings: dict[str, list[int]] = defaultdict(list)
+        for street_id, district_id, name in rows:
+            folded = fold(name)
+            if not folded:
+                continue
+            pos = len(index.entries)
+            index.entries.append(
+                StreetEntry(
+                    id=int(street_id),
+                    district_id=int(district_id) if district_id is not None else None,
+                    name=name,
+                    folded=folded,
+                )
+            )
+            for gram in _trigrams(folded):
+                postings[gram].append(pos)
+        index.postings = dict(postings)
+        return index
+
+    def _candidates(self, query_grams: set[str]) -> list[int]:
+        hits: dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for pos in self.postings.get(gram, ()):
+                hits[pos] += 1
+        if len(hits) <= _PREFILTER_LIMIT:
+            return list(hits)
+        ranked = sorted(hits.items(), key=lambda item: -item[1])
+        return [pos for pos, _ in ranked[:_PREFILTER_LIMIT]]
+
+    def search(self, query: str, *, limit: int = 30) -> list[tuple[StreetEntry, float]]:
+        """Best matches as ``(entry, WRatio score)``, best first."""
+        folded = fold(query)
+        if not folded or not self.entries:
+            return []
+        positions = self._candidates(_trigrams(folded, prefix=True))
+        if not positions:
+            positions = list(range(len(self.entries)))
+        choices = [self.entries[pos].folded for pos in positions]
+        matches = process.extract(
+            folded,
+            choices,
+            scorer=fuzz.WRatio,
+            processor=None,
+            limit=min(limit, len(choices)),
+        )
+        return [(self.entries[positions[idx]], float(score)) for _, score, idx in matches]
+
+
+_INDEXES: dict[int, CityStreetIndex] = {}
+_LOCKS: dict[int, asyncio.Lock] = {}
+
+
+def invalidate(city_ids: Optional[Iterable[int]] = None) -> None:
+    """Drop cached indexes (all cities when ``city_ids`` is None)."""
+    if city_ids is None:
+        _INDEXES.clear()
+        return
+    for city_id in city_ids:
+        _INDEXES.pop(int(city_id), None)
+
+
+def reset() -> None:
+    _INDEXES.clear()
+    _LOCKS.clear()
+
+
+async def mark_changed(
+    session: AsyncSession, city_ids: Optional[Iterable[int]] = None
+) -> None:
+    """Bump the street index version after an import (part of the caller's transaction).
+
+    Every process reloads its indexes at the next fingerprint check.
+    """
+    await session.execute(
+        text(
+            """
+        INSERT INTO settings (key, value, value_type, description)
+        VALUES (:key, '1', 'INT', 'Street search index version (bumped by geo imports)')
+        ON CONFLICT (key) DO UPDATE
+           SET value = (COALESCE(NULLIF(settings.value, ''), '0')::bigint + 1)::text,
+               updated_at = NOW()
+            """
+        ).bindparams(key=VERSION_SETTING_KEY)
+    )
+    invalidate(city_ids)
+
+
+async def _fingerprint(session: AsyncSession, city_id: int) -> tuple:
+    row = (
+        await session.execute(
+            text(
+                """
+            SELECT COUNT(*), MAX(id),
+                   COALESCE(SUM(hashtext(name)::bigint), 0),
+                   COALESCE(SUM(district_id), 0),
+                   (SELECT value FROM settings WHERE key = :key)
+              FROM streets
+             WHERE city_id = :city_id
+                """
+            ).bindparams(city_id=city_id, key=VERSION_SETTING_KEY)
+        )
+    ).one()
+    return tuple(row)
+
+
+async def _load(session: AsyncSession, city_id: int, fingerprint: tuple) -> CityStreetIndex:
+    rows = await session.execute(
+        text("SELECT id, district_id, name FROM streets WHERE city_id = :city_id").bindparams(
+            city_id=city_id
+        )
+    )
+    index = CityStreetIndex.build(city_id, rows.tuples(), fingerprint=fingerprint)
+    logger.debug("street index loaded city_id=%s streets=%s", city_id, len(index.entries))
+    return index
+
+
+async def get_city_index(session: AsyncSession, city_id: int) -> CityStreetIndex:
+    """Index of the city; loads it lazily and revalidates by fingerprint."""
+    city_id = int(city_id)
+    index = _INDEXES.get(city_id)
+    if index is not None and monotonic() - index.checked_at < _FINGERPRINT_CHECK_SECONDS:
+        return index
+
+    lock = _LOCKS.setdefault(city_id, asyncio.Lock())
+    async with lock:
+        index = _INDEXES.get(city_id)
+        if index is not None and monotonic() - index.checked_at < _FINGERPRINT_CHECK_SECONDS:
+            return index
+        fingerprint = await _fingerprint(session, city_id)
+        if index is not None and index.fingerprint == fingerprint:
+            index.checked_at = monotonic()
+            return index
+        index = await _load(session, city_id, fingerprint)
+        _INDEXES[city_id] = index
+        return index
+
+
+__all__ = [
+    "CityStreetIndex",
+    "StreetEntry",
+    "VERSION_SETTING_KEY",
+    "fold",
+    "get_city_index",
+    "invalidate",
+    "mark_changed",
+    "reset",
+]
@@ -4,16 +4,17 @@ import asyncio
 import logging
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Optional, Sequence
 
 from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from sqlalchemy import select
+from sqlalchemy import insert, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
 from field_service.services import live_log
+from field_service.services.distribution import wake_channel
 from field_service.services.push_notifications import (
     notify_master as push_notify_master,
     notify_admin as push_notify_admin,
@@ -206,200 +207,148 @@ async def _notify_master_blocked(
 # ===== P1-21: Commission Deadline Reminders =====
 
 
+REMINDER_HOURS: tuple[int, ...] = (24, 6, 1)  # Уведомления за 24ч, 6ч и 1ч
+_REMINDER_TIME_TEXT = {24: ("⏰", "24 часа"), 6: ("⚠️", "6 часов"), 1: ("🔴", "1 час")}
+
+# Все наступившие пары (комиссия, порог) помечаются одним INSERT ... ON CONFLICT
+# DO NOTHING: RETURNING отдаёт только впервые записанные пары, поэтому
+# параллельный прогон не продублирует напоминание.
+_DUE_REMINDERS_SQL = text(
+    """
+    WITH due AS (
+        SELECT c.id AS commission_id, t.hours_before
+          FROM commissions c
+          JOIN unnest(CAST(:thresholds AS SMALLINT[])) AS t(hours_before)
+            ON c.deadline_at <= CAST(:now AS TIMESTAMPTZ) + make_interval(hours => t.hours_before)
+         WHERE c.status = 'WAIT_PAY'
+           AND c.deadline_at > CAST(:now AS TIMESTAMPTZ)
+           AND NOT EXISTS (
+                 SELECT 1
+                   FROM commission_deadline_notifications n
+                  WHERE n.commission_id = c.id
+                    AND n.hours_before = t.hours_before
+               )
+    ),
+    marked AS (
+        INSERT INTO commission_deadline_notifications (commission_id, hours_before)
+        SELECT commission_id, hours_before FROM due
+        ON CONFLICT (commission_id, hours_before) DO NOTHING
+        RETURNING commission_id, hours_before
+    )
+    SELECT k.commission_id, MIN(k.hours_before) AS hours_before,
+           c.master_id, c.order_id, c.amount
+      FROM marked k
+      JOIN commissions c ON c.id = k.commission_id
+     GROUP BY k.commission_id, c.master_id, c.order_id, c.amount
+    """
+)
+
+
+def _deadline_reminder_message(hours_before: int, order_id: int, amount) -> str:
+    emoji, time_text = _REMINDER_TIME_TEXT.get(
+        hours_before, ("⏰", f"{hours_before} ч")
+    )
+    return (
+        f"{emoji} <b>Напоминание об оплате комиссии</b>\n\n"
+        f"До дедлайна оплаты комиссии осталось <b>{time_text}</b>\n\n"
+        f"📋 Заказ #{order_id}\n"
+        f"💰 Сумма: {amount:.2f}₽\n\n"
+        f"Пожалуйста, отметьте оплату или загрузите чек в разделе \"Финансы\".\n\n"
+        f"⚠️ При просрочке оплаты ваш аккаунт будет заблокирован."
+    )
+
+
+async def queue_commission_deadline_reminders(
+    session: AsyncSession,
+    *,
+    now: Optional[datetime] = None,
+    thresholds: Sequence[int] = REMINDER_HOURS,
+) -> int:
+    """Поставить в outbox все наступившие напоминания о дедлайне комиссии.
+
+    Один запрос находит и помечает пары (комиссия, порог), второй - одна
+    вставка в ``notifications_outbox``. Если наступило сразу несколько порогов
+    (комиссия создана за 3ч до дедлайна), все они помечаются, а мастер получает
+    одно сообщение по самому близкому. Не коммитит.
+
+    Returns:
+        Количество поставленных в очередь сообщений.
+    """
+    now = now or datetime.now(UTC)
+    rows = (
+        await session.execute(
+            _DUE_REMINDERS_SQL.bindparams(thresholds=list(thresholds), now=now)
+        )
+    ).all()
+    if not rows:
+        return 0
+    await session.execute(
+        insert(m.notifications_outbox),
+        [
+            {
+                "master_id": row.master_id,
+                "event": NotificationEvent.COMMISSION_DEADLINE_REMINDER.value,
+                "payload": {
+                    "message": _deadline_reminder_message(
+                        int(row.hours_before), row.order_id, row.amount
+                    ),
+                    "commission_id": row.commission_id,
+                    "order_id": row.order_id,
+                    "hours_before": int(row.hours_before),
+                },
+            }
+            for row in rows
+        ],
+    )
+    return len(rows)
+
+
 async def watchdog_commission_deadline_reminders(
-    master_bot_token: str,
     interval_seconds: int = 600,
     *,
     iterations: int | None = None,
     session: Optional[AsyncSession] = None,
 ) -> None:
-    """P1-21: Periodically check commissions and send deadline reminders at 24h, 6h, 1h before deadline.
-    
+    """P1-21: Periodically queue deadline reminders at 24h, 6h, 1h before deadline.
+
+    Сообщения доставляет диспетчер outbox master-бота
+    (``notifications_watcher``), поэтому отдельный Bot здесь не нужен.
+
     Args:
-        master_bot_token: Token master-бота для отправки уведомлений мастерам
         interval_seconds: Интервал проверки в секундах
         iterations: Количество итераций (None = бесконечно)
         session: Optional test session (default: create own)
     """
-    from datetime import timedelta
-    from sqlalchemy import and_, insert
-    from aiogram.client.default import DefaultBotProperties
-    from aiogram.enums import ParseMode
-
-    REMINDER_HOURS = [24, 6, 1]  # Отправляем уведомления за 24ч, 6ч и 1ч
-    
-    # Создаём master bot instance для отправки мастерам
-    master_bot = Bot(
-        master_bot_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-    )
-    
     sleep_for = max(60, int(interval_seconds) if interval_seconds else 600)
     loops_done = 0
-    
-    try:
-        while True:
-            try:
-                now = datetime.now(UTC)
-                async with _maybe_session(session) as s:
-                    # Находим все комиссии в статусе WAIT_PAY
-                    result = await s.execute(
-                        select(m.commissions)
-                        .where(
-                            and_(
-                                m.commissions.status == m.CommissionStatus.WAIT_PAY,
-                                m.commissions.deadline_at > now  # Ещё не просрочены
-                            )
-                        )
-                    )
-                    pending_commissions = result.scalars().all()
-                    
-                    notifications_sent = 0
-                    
-                    for commission in pending_commissions:
-                        time_until_deadline = commission.deadline_at - now
-                        hours_until = time_until_deadline.total_seconds() / 3600
-                        
-                        # Проверяем каждый порог уведомлений
-                        for reminder_hours in REMINDER_HOURS:
-                            # Нужно отправить если:
-                            # 1. До дедлайна осталось меньше reminder_hours
-                            # 2. Ещё не отправляли уведомление для этого порога
-                            if hours_until <= reminder_hours:
-                                # Проверяем не отправляли ли уже
-                                check = await s.execute(
-                                    select(m.commission_deadline_notifications)
-                                    .where(
-                                        and_(
-                                            m.commission_deadline_notifications.commission_id == commission.id,
-                                            m.commission_deadline_notifications.hours_before == reminder_hours
-                                        )
-                                    )
-                                )
-                                already_sent = check.scalar_one_or_none()
-                                
-                                if not already_sent:
-                                    # Отправляем уведомление мастеру через master_bot
-                                    sent = await _send_deadline_reminder(
-                                        master_bot,  # ← Используем master_bot!
-                                        s, 
-                                        commission, 
-                                        reminder_hours
-                                    )
-                                    
-                                    if sent:
-                                        # Записываем что отправили
-                                        await s.execute(
-                                            insert(m.commission_deadline_notifications).values(
-                                                commission_id=commission.id,
-                                                hours_before=reminder_hours
-                                            )
-                                        )
-                                        notifications_sent += 1
-                    
-                    await s.commit()
-                    
-                    if notifications_sent > 0:
-                        live_log.push(
-                            "watchdog",
-                            f"commission_deadline_reminders sent={notifications_sent}",
-                            level="INFO"
-                        )
-                        logger.info(
-                            "commission_deadline_reminders sent=%d notifications",
-                            notifications_sent
-                        )
-                        
-            except Exception as exc:
-                logger.exception("watchdog_commission_deadline_reminders error")
+
+    while True:
+        try:
+            async with _maybe_session(session) as s:
+                queued = await queue_commission_deadline_reminders(s)
+                await s.commit()
+
+            if queued > 0:
                 live_log.push(
                     "watchdog",
-                    f"watchdog_commission_deadline_reminders error: {exc}",
-                    level="ERROR"
+                    f"commission_deadline_reminders queued={queued}",
+                    level="INFO"
                 )
-            
-            loops_done += 1
-            if iterations is not None and loops_done >= iterations:
-                break
-            
-            await asyncio.sleep(sleep_for)
-    finally:
-        # Закрываем master_bot session
-        await master_bot.session.close()
-
-
-async def _send_deadline_reminder(
-    bot: Bot,
-    session,
-    commission: m.commissions,
-    hours_before: int
-) -> bool:
-    """Отправить уведомление мастеру о приближающемся дедлайне комиссии."""
-    try:
-        # Получаем мастера и заказ
-        result = await session.execute(
-            select(m.masters.tg_user_id, m.orders.id)
-            .join(m.orders, m.orders.id == commission.order_id)
-            .where(m.masters.id == commission.master_id)
-        )
-        row = result.first()
-        
-        if not row or not row.tg_user_id:
-            logger.warning(
-                "Cannot send deadline reminder: master %s has no tg_user_id",
-                commission.master_id
+                logger.info("commission_deadline_reminders queued=%d notifications", queued)
+
+        except Exception as exc:
+            logger.exception("watchdog_commission_deadline_reminders error")
+            live_log.push(
+                "watchdog",
+                f"watchdog_commission_deadline_reminders error: {exc}",
+                level="ERROR"
             )
-            return False
-        
-        tg_user_id = row.tg_user_id
-        order_id = row.id
-        
-        # Формируем текст уведомления
-        if hours_before == 24:
-            time_text = "24 часа"
-            emoji = "⏰"
-        elif hours_before == 6:
-            time_text = "6 часов"
-            emoji = "⚠️"
-        else:  # 1 hour
-            time_text = "1 час"
-            emoji = "🔴"
-        
-        amount_str = f"{commission.amount:.2f}₽"
-        
-        message = (
-            f"{emoji} <b>Напоминание об оплате комиссии</b>\n\n"
-            f"До дедлайна оплаты комиссии осталось <b>{time_text}</b>\n\n"
-            f"📋 Заказ #{order_id}\n"
-            f"💰 Сумма: {amount_str}\n\n"
-            f"Пожалуйста, отметьте оплату или загрузите чек в разделе \"Финансы\".\n\n"
-            f"⚠️ При просрочке оплаты ваш аккаунт будет заблокирован."
-        )
-        
-        # Отправляем уведомление
-        await bot.send_message(
-            chat_id=tg_user_id,
-            text=message,
-            parse_mode="HTML"
-        )
-        
-        logger.info(
-            "commission_deadline_reminder sent: commission=%s master=%s hours=%s",
-            commission.id,
-            commission.master_id,
-            hours_before
-        )
-        
-        return True
-        
-    except Exception as exc:
-        logger.warning(
-            "Failed to send deadline reminder for commission %s: %s",
-            commission.id,
-            exc,
-            exc_info=True
-        )
-        return False
+
+        loops_done += 1
+        if iterations is not None and loops_done >= iterations:
+            break
+
+        await asyncio.sleep(sleep_for)
 
 
 # ===== Expired Breaks Watchdog =====
@@ -539,6 +488,10 @@ async def watchdog_expired_offers(
                     """)
                 )
                 expired_offers = result.fetchall()
+                for order_id in sorted({row[1] for row in expired_offers}):
+                    await wake_channel.notify(
+                        s, wake_channel.WakeReason.OFFER_EXPIRED, order_id=order_id
+                    )
                 await s.commit()
                 
                 if expired_offers:
@@ -23,6 +23,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from field_service.db import models as m
 from field_service.db.session import SessionLocal
+from field_service.services import street_index
 
 logging.basicConfig(
     level=logging.INFO,
@@ -152,6 +153,8 @@ async def import_from_csv(
                 continue
     
     if not dry_run:
+        # Поиск улиц в ботах держит индекс по городам: просим перечитать
+        await street_index.mark_changed(session)
         await session.commit()
     
     return stats
@@ -228,6 +231,8 @@ async def import_from_json(
             stats["added"] += 1
     
     if not dry_run:
+        # Поиск улиц в ботах держит индекс по городам: просим перечитать
+        await street_index.mark_changed(session)
         await session.commit()
     
     return stats
@@ -276,6 +281,8 @@ async def remove_placeholder_districts(
             logger.warning(f"Нет других районов для города {city_id}, placeholder сохранён")
     
     if not dry_run:
+        # Поиск улиц в ботах держит индекс по городам: просим перечитать
+        await street_index.mark_changed(session)
         await session.commit()
     
     return removed
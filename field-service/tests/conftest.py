@@ -2,11 +2,13 @@
 from __future__ import annotations
 
 import asyncio
+import importlib
 import os
 import sys
 from collections.abc import AsyncIterator
 
 import sqlalchemy as sa
+import pytest
 import pytest_asyncio
 from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import (
@@ -101,6 +103,7 @@ TABLES = [
     m.master_skills.__table__,
     m.master_districts.__table__,
     m.offers.__table__,
+    m.offers_archive.__table__,
     m.orders.__table__,
     m.attachments.__table__,
     m.commissions.__table__,
@@ -108,12 +111,21 @@ TABLES = [
     m.referrals.__table__,
     m.referral_rewards.__table__,
     m.order_status_history.__table__,
+    m.order_status_history_archive.__table__,
+    m.order_lifecycle.__table__,
     m.settings.__table__,
     m.geocache.__table__,
     m.admin_audit_log.__table__,
     m.notifications_outbox.__table__,
     m.order_autoclose_queue.__table__,
     m.distribution_metrics.__table__,
+    m.distribution_metrics_hourly.__table__,
+    m.distribution_metrics_daily.__table__,
+    m.master_stats.__table__,
+    m.order_section_counters.__table__,
+    m.order_warranty_window.__table__,
+    m.distribution_workers.__table__,
+    m.distribution_city_leases.__table__,
 ]
 
 _DB_INITIALIZED = False
@@ -331,6 +343,40 @@ async def _patch_distribution_tick(async_session: AsyncSession, monkeypatch):
     yield
 
 
+# Процесс-локальные кэши и индексы: (модуль, функция сброса).
+# Сбрасываются до и после каждого теста одной autouse-фикстурой;
+# новый кэш достаточно добавить сюда.
+PROCESS_LOCAL_RESETS: tuple[tuple[str, str], ...] = (
+    ("field_service.services.distribution.eligibility_index", "invalidate"),
+    # Event пробуждения планировщика привязан к event loop теста
+    ("field_service.services.distribution.wake_channel", "reset"),
+    ("field_service.services.distribution.offer_expiry", "reset"),
+    ("field_service.services.distribution.proximity", "invalidate"),
+    ("field_service.bots.admin_bot.services", "invalidate_staff_cache"),
+    ("field_service.bots.master_bot.context_cache", "reset"),
+    ("field_service.services.order_sections_service", "reset"),
+    ("field_service.services.referral_graph", "reset"),
+    ("field_service.services.street_index", "reset"),
+    ("field_service.services.geocoding_service", "reset"),
+    # Тесты пишут settings напрямую, минуя NOTIFY
+    ("field_service.services.settings_service", "reset"),
+)
+
+
+@pytest.fixture(autouse=True)
+def _reset_process_local_caches():
+    """Процесс-локальные кэши не должны переживать тест"""
+    resets = [
+        getattr(importlib.import_module(module), name)
+        for module, name in PROCESS_LOCAL_RESETS
+    ]
+    for reset in resets:
+        reset()
+    yield
+    for reset in resets:
+        reset()
+
+
 # Seed minimal reference data for tests that explicitly need it
 @pytest_asyncio.fixture()
 async def seed_minimal_data(async_session: AsyncSession) -> None:
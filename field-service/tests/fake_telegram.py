@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Локальный фейковый Telegram для интеграционных тестов webhook-режима.
+
+Отвечает на вызовы Bot API (``/bot<token>/<method>``) и запоминает их,
+а ``deliver()`` доставляет апдейт на зарегистрированный webhook так же, как
+это делает Telegram (POST JSON + заголовок с секретом).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+from itertools import count
+from typing import Any, Optional
+
+from aiohttp import ClientSession, web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from field_service.bots.common.webhook import SECRET_HEADER
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+class FakeTelegram:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, dict[str, Any]]] = []
+        self.webhook_url: Optional[str] = None
+        self.secret_token: Optional[str] = None
+        self.base_url = ""
+        self._runner: Optional[web.AppRunner] = None
+        self._message_ids = count(1)
+        self._update_ids = count(1000)
+
+    async def __aenter__(self) -> "FakeTelegram":
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._api)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        port = free_port()
+        await web.TCPSite(self._runner, "127.0.0.1", port).start()
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def bot(self, token: str = "42:FAKE-TOKEN") -> Bot:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(self.base_url))
+        return Bot(token, session=session)
+
+    def calls_of(self, method: str) -> list[dict[str, Any]]:
+        return [params for name, params in self.calls if name == method]
+
+    async def _api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params: dict[str, Any] = {}
+        for key, value in (await request.post()).items():
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        self.calls.append((method, params))
+
+        result: Any = True
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            self.secret_token = params.get("secret_token")
+        elif method == "deleteWebhook":
+            self.webhook_url = None
+            self.secret_token = None
+        elif method == "getMe":
+            result = {"id": 42, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+        elif method == "sendMessage":
+            result = {
+                "message_id": next(self._message_ids),
+                "date": 0,
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return web.json_response({"ok": True, "result": result})
+
+    async def wait_webhook(self, timeout: float = 5.0) -> str:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.webhook_url is None:
+            if loop.time() > deadline:
+                raise TimeoutError("webhook was not registered")
+            await asyncio.sleep(0.01)
+        return self.webhook_url
+
+    def message_update(self, text: str, *, chat_id: int = 1001) -> dict[str, Any]:
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "Tester"},
+                "text": text,
+            },
+        }
+
+    async def deliver(
+        self, update: dict[str, Any], *, secret_token: Optional[str] = None
+    ) -> int:
+        """POST the update to the registered webhook; returns the HTTP status."""
+        assert self.webhook_url, "webhook is not registered"
+        secret = self.secret_token if secret_token is None else secret_token
+        headers = {SECRET_HEADER: secret} if secret else {}
+        async with ClientSession() as client:
+            async with client.post(self.webhook_url, json=update, headers=headers) as resp:
+                return resp.status
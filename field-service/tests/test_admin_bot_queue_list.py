@@ -6,6 +6,10 @@ import pytest
 
 from field_service.bots.admin_bot import queue
 from field_service.bots.admin_bot.dto import CityRef, OrderListItem, OrderType, StaffRole, StaffUser
+from field_service.bots.admin_bot.infrastructure.queue_state import (
+    load_queue_filters,
+    save_queue_filters,
+)
 
 
 class StubState:
@@ -142,3 +146,37 @@ async def test_queue_list_empty_renders_placeholder() -> None:
     assert message.reply_markup is not None
     buttons = [btn for row in message.reply_markup.inline_keyboard for btn in row]
     assert any(btn.callback_data == "adm:q:flt" for btn in buttons)
+
+
+class CursorOrdersService(CaptureOrdersService):
+    async def list_queue(self, *, after_id=None, **kwargs):
+        items, has_next = await super().list_queue(**kwargs)
+        self.calls[-1]["after_id"] = after_id
+        return items, has_next
+
+
+@pytest.mark.asyncio
+async def test_queue_list_carries_keyset_cursor(sample_order: OrderListItem) -> None:
+    service = CursorOrdersService([sample_order], has_next=True)
+    bot = types.SimpleNamespace(_services={"orders_service": service})
+    message = StubMessage(bot)
+    staff = StaffUser(
+        id=1,
+        tg_id=1,
+        role=StaffRole.GLOBAL_ADMIN,
+        is_active=True,
+        city_ids=frozenset(),
+    )
+    state = StubState()
+
+    await queue._render_queue_list(message, staff, state, page=1)
+    await queue._render_queue_list(message, staff, state, page=2)
+    assert [call["after_id"] for call in service.calls] == [None, sample_order.id]
+
+    # Смена фильтра сбрасывает курсоры
+    filters = await load_queue_filters(state)
+    filters.master_id = 42
+    await save_queue_filters(state, filters)
+    await queue._render_queue_list(message, staff, state, page=2)
+    assert service.calls[-1]["after_id"] is None
+    assert service.calls[-1]["page"] == 2
@@ -715,6 +715,113 @@ async def test_finance_approve_creates_referral_rewards(async_session) -> None:
     assert [r.referrer_id for r in rewards] == [ref_l1.id, ref_l2.id]
     assert [r.referred_master_id for r in rewards] == [payer.id, payer.id]
 
+
+@pytest.mark.asyncio
+async def test_finance_bulk_approve_is_set_based(async_session) -> None:
+    city = m.cities(name="Bulk Approve City")
+    async_session.add(city)
+    await async_session.flush()
+
+    ref_l2 = m.masters(tg_user_id=720, full_name="Bulk Ref L2", city_id=city.id)
+    ref_l1 = m.masters(tg_user_id=721, full_name="Bulk Ref L1", city_id=city.id)
+    payer = m.masters(tg_user_id=722, full_name="Bulk Payer", city_id=city.id)
+    async_session.add_all([ref_l2, ref_l1, payer])
+    await async_session.flush()
+    async_session.add_all(
+        [
+            m.referrals(master_id=payer.id, referrer_id=ref_l1.id),
+            m.referrals(master_id=ref_l1.id, referrer_id=ref_l2.id),
+            m.staff_users(id=1, role=m.StaffRole.GLOBAL_ADMIN, is_active=True),
+        ]
+    )
+
+    now = datetime.now(UTC)
+    commissions = []
+    for idx, created_at in enumerate([now, now, now, now - timedelta(days=10)]):
+        order = m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.PAYMENT,
+            assigned_master_id=payer.id,
+            total_sum=Decimal("2000"),
+        )
+        async_session.add(order)
+        await async_session.flush()
+        commission = m.commissions(
+            order_id=order.id,
+            master_id=payer.id,
+            amount=Decimal("1000.00") + idx,
+            status=m.CommissionStatus.WAIT_PAY,
+            deadline_at=now + timedelta(hours=3),
+            created_at=created_at,
+        )
+        async_session.add(commission)
+        commissions.append((order, commission))
+    await async_session.commit()
+
+    progress: list[tuple[int, int]] = []
+
+    async def _progress(done: int, total: int) -> None:
+        progress.append((done, total))
+
+    finance_service = DBFinanceService(session_factory=lambda: existing_session(async_session))
+    approved, errors = await finance_service.bulk_approve_commissions(
+        start_date=(now - timedelta(days=1)).date(),
+        end_date=now.date(),
+        by_staff_id=1,
+        progress=_progress,
+        batch_size=2,
+    )
+    assert (approved, errors) == (3, [])
+    assert progress == [(2, 3), (3, 3)]
+
+    for order, commission in commissions:
+        await async_session.refresh(order)
+        await async_session.refresh(commission)
+    for order, commission in commissions[:3]:
+        assert commission.status == m.CommissionStatus.APPROVED
+        assert commission.is_paid is True
+        assert commission.paid_amount == commission.amount
+        assert commission.paid_approved_at is not None
+        assert order.status == m.OrderStatus.CLOSED
+    stale_order, stale = commissions[3]
+    assert stale.status == m.CommissionStatus.WAIT_PAY
+    assert stale_order.status == m.OrderStatus.PAYMENT
+
+    history = await async_session.execute(
+        select(m.order_status_history.to_status, m.order_status_history.changed_by_staff_id)
+        .where(m.order_status_history.reason == "commission_paid")
+    )
+    assert sorted(history.all()) == [(m.OrderStatus.CLOSED, 1)] * 3
+
+    rewards = (
+        await async_session.execute(
+            select(m.referral_rewards.level, m.referral_rewards.referrer_id, m.referral_rewards.amount)
+            .order_by(m.referral_rewards.commission_id, m.referral_rewards.level)
+        )
+    ).all()
+    assert rewards == [
+        (1, ref_l1.id, Decimal("100.00")),
+        (2, ref_l2.id, Decimal("50.00")),
+        (1, ref_l1.id, Decimal("100.10")),
+        (2, ref_l2.id, Decimal("50.05")),
+        (1, ref_l1.id, Decimal("100.20")),
+        (2, ref_l2.id, Decimal("50.10")),
+    ]
+    outbox = (
+        await async_session.execute(
+            select(m.notifications_outbox.master_id).where(
+                m.notifications_outbox.event == "referral_reward_accrued"
+            )
+        )
+    ).scalars().all()
+    assert sorted(outbox) == sorted([ref_l1.id, ref_l2.id] * 3)
+
+    # Повторный запуск ничего не находит
+    assert await finance_service.bulk_approve_commissions(
+        start_date=now.date(), end_date=now.date(), by_staff_id=1
+    ) == (0, ["Нет комиссий для одобрения"])
+
+
 @pytest.mark.asyncio
 async def test_search_streets_deduplicates_similar(async_session) -> None:
     await _ensure_tables(async_session, _tables(m.districts.__table__, m.streets.__table__))
@@ -814,6 +921,68 @@ async def test_create_order_uses_centroid_when_coordinates_missing(async_session
     assert order.geocode_provider == "street_centroid"
     assert order.geocode_confidence == 80
 
+@pytest.mark.asyncio
+async def test_create_order_geocodes_before_transaction(async_session, monkeypatch) -> None:
+    from field_service.bots.admin_bot.services import orders as orders_module
+    from field_service.services import geocoding_service
+    from field_service.services.geocoding_service import FakeGeocoder, GeocodingService
+
+    city = m.cities(name="Geocode City", timezone="Europe/Moscow")
+    async_session.add(city)
+    await async_session.flush()
+    street = m.streets(city_id=city.id, name="Quay Street")
+    async_session.add(street)
+    await async_session.flush()
+
+    tx_opened: list[bool] = []
+    real_managed = orders_module.maybe_managed_session
+
+    def _tracking(session):
+        tx_opened.append(True)
+        return real_managed(session)
+
+    class _Provider(FakeGeocoder):
+        async def geocode(self, query):
+            # HTTP-запрос к геокодеру не должен идти внутри транзакции заказа
+            assert tx_opened == []
+            return await super().geocode(query)
+
+    monkeypatch.setattr(orders_module, "maybe_managed_session", _tracking)
+    geocoding_service.set_service(
+        GeocodingService(_Provider({"Geocode City, Quay Street, 5": (55.5, 37.5)}), rps=0)
+    )
+
+    orders_service = DBOrdersService(session_factory=lambda: existing_session(async_session))
+    data = NewOrderData(
+        city_id=city.id,
+        district_id=None,
+        street_id=street.id,
+        house="5",
+        apartment=None,
+        address_comment=None,
+        client_name="Ivan",
+        client_phone="+79990000001",
+        category=OrderCategory.ELECTRICS,
+        description="Socket",
+        order_type=OrderType.NORMAL,
+        timeslot_start_utc=None,
+        timeslot_end_utc=None,
+        timeslot_display=None,
+        lat=None,
+        lon=None,
+        no_district=False,
+        company_payment=None,
+        total_sum=Decimal(0),
+        created_by_staff_id=1,
+    )
+    order_id = await orders_service.create_order(data)
+
+    order = (await async_session.execute(select(m.orders).where(m.orders.id == order_id))).scalar_one()
+    assert tx_opened == [True]
+    assert order.lat == pytest.approx(55.5)
+    assert order.geocode_provider == "fake"
+
+
 @pytest.mark.asyncio
 async def test_get_city_timezone_uses_city_value(async_session) -> None:
     await _ensure_tables(async_session, _tables())
@@ -824,3 +993,73 @@ async def test_get_city_timezone_uses_city_value(async_session) -> None:
     orders_service = DBOrdersService(session_factory=lambda: existing_session(async_session))
     tz_value = await orders_service.get_city_timezone(city.id)
     assert tz_value == "Asia/Yekaterinburg"
+
+
+@pytest.mark.asyncio
+async def test_list_queue_keyset_pages_and_local_date(async_session) -> None:
+    city = m.cities(name="Queue City", timezone="Asia/Yekaterinburg")
+    async_session.add(city)
+    await async_session.flush()
+
+    base = datetime(2025, 10, 1, 9, 0, tzinfo=UTC)
+    orders = [
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.SEARCHING,
+            created_at=base + timedelta(minutes=i),
+            # Местные 00:30 2 октября (UTC+5) = 19:30 UTC 1 октября
+            timeslot_start_utc=datetime(2025, 10, 1, 19, 30, tzinfo=UTC) if i == 0 else None,
+            timeslot_end_utc=datetime(2025, 10, 1, 21, 30, tzinfo=UTC) if i == 0 else None,
+        )
+        for i in range(5)
+    ]
+    async_session.add_all(orders)
+    await async_session.flush()
+    async_session.add(
+        m.attachments(
+            entity_type=m.AttachmentEntity.ORDER,
+            entity_id=orders[4].id,
+            file_type=m.AttachmentFileType.PHOTO,
+            file_id="file-1",
+        )
+    )
+    await async_session.commit()
+
+    orders_service = DBOrdersService(session_factory=lambda: existing_session(async_session))
+    first, has_next = await orders_service.list_queue(
+        city_ids=[city.id], page=1, page_size=2
+    )
+    assert has_next is True
+    assert [item.id for item in first] == [orders[4].id, orders[3].id]
+    assert first[0].has_attachments is True
+    assert first[1].has_attachments is False
+
+    # Новый заказ не сдвигает страницы, открытые по курсору
+    async_session.add(
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.SEARCHING,
+            created_at=base + timedelta(hours=1),
+        )
+    )
+    await async_session.commit()
+    second, has_next = await orders_service.list_queue(
+        city_ids=[city.id], page=2, page_size=2, after_id=first[-1].id
+    )
+    assert [item.id for item in second] == [orders[2].id, orders[1].id]
+    assert has_next is True
+
+    by_date, _ = await orders_service.list_queue(
+        city_ids=None,
+        page=1,
+        page_size=10,
+        timeslot_date=datetime(2025, 10, 2).date(),
+    )
+    assert [item.id for item in by_date] == [orders[0].id]
+    by_utc_date, _ = await orders_service.list_queue(
+        city_ids=[city.id],
+        page=1,
+        page_size=10,
+        timeslot_date=datetime(2025, 10, 1).date(),
+    )
+    assert by_utc_date == []
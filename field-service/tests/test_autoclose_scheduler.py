@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import autoclose_scheduler
+
+UTC = timezone.utc
+CLOSED_AT = datetime(2025, 8, 20, 10, 0, tzinfo=UTC)
+
+
+@asynccontextmanager
+async def _existing_session(session):
+    yield session
+
+
+async def _order(async_session, city: m.cities, status: m.OrderStatus) -> m.orders:
+    order = m.orders(city_id=city.id, status=status)
+    async_session.add(order)
+    await async_session.flush()
+    await autoclose_scheduler.enqueue_order_for_autoclose(async_session, order.id, CLOSED_AT)
+    return order
+
+
+async def _autoclose_history(async_session, order_id: int) -> int:
+    return int(
+        await async_session.scalar(
+            sa.select(sa.func.count())
+            .select_from(m.order_status_history)
+            .where(
+                m.order_status_history.order_id == order_id,
+                m.order_status_history.reason == "autoclose_24h",
+            )
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_autoclose_pass_is_set_based(async_session) -> None:
+    city = m.cities(name="Autoclose City")
+    async_session.add(city)
+    await async_session.flush()
+    closed = [await _order(async_session, city, m.OrderStatus.CLOSED) for _ in range(3)]
+    reopened = await _order(async_session, city, m.OrderStatus.GUARANTEE)
+    await async_session.commit()
+
+    processed = await autoclose_scheduler.process_autoclose_queue(
+        lambda: _existing_session(async_session),
+        now=CLOSED_AT + timedelta(hours=25),
+        batch_size=2,
+    )
+
+    assert processed == 4
+    for order in closed:
+        assert await _autoclose_history(async_session, order.id) == 1
+    assert await _autoclose_history(async_session, reopened.id) == 0
+    pending = await async_session.scalar(
+        sa.select(sa.func.count())
+        .select_from(m.order_autoclose_queue)
+        .where(m.order_autoclose_queue.processed_at.is_(None))
+    )
+    assert pending == 0
+
+    # Повторный проход ничего не делает
+    again = await autoclose_scheduler.process_autoclose_queue(
+        lambda: _existing_session(async_session),
+        now=CLOSED_AT + timedelta(hours=26),
+    )
+    assert again == 0
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_history_and_offers(async_session) -> None:
+    city = m.cities(name="Archive City")
+    async_session.add(city)
+    await async_session.flush()
+    master = m.masters(tg_user_id=7701, full_name="Archive Master", city_id=city.id)
+    async_session.add(master)
+    await async_session.flush()
+    order = await _order(async_session, city, m.OrderStatus.CLOSED)
+    async_session.add(
+        m.order_status_history(
+            order_id=order.id,
+            from_status=m.OrderStatus.PAYMENT,
+            to_status=m.OrderStatus.CLOSED,
+            actor_type=m.ActorType.SYSTEM,
+            created_at=CLOSED_AT,
+        )
+    )
+    async_session.add(
+        m.offers(
+            order_id=order.id,
+            master_id=master.id,
+            state=m.OfferState.ACCEPTED,
+            sent_at=CLOSED_AT - timedelta(hours=3),
+            responded_at=CLOSED_AT - timedelta(hours=2),
+            created_at=CLOSED_AT - timedelta(hours=3),
+        )
+    )
+    await async_session.commit()
+
+    now = CLOSED_AT + timedelta(days=40)
+    await autoclose_scheduler.process_autoclose_queue(
+        lambda: _existing_session(async_session), now=now
+    )
+    archived = await autoclose_scheduler.archive_closed_orders(
+        lambda: _existing_session(async_session), older_than_days=30, now=now
+    )
+    assert archived == 1
+
+    hot_history = await async_session.scalar(
+        sa.select(sa.func.count())
+        .select_from(m.order_status_history)
+        .where(m.order_status_history.order_id == order.id)
+    )
+    assert hot_history == 0
+    archived_history = (
+        await async_session.execute(
+            sa.select(m.order_status_history_archive.reason)
+            .where(m.order_status_history_archive.order_id == order.id)
+            .order_by(m.order_status_history_archive.created_at)
+        )
+    ).scalars().all()
+    assert archived_history == [None, "autoclose_24h"]
+
+    hot_offers = await async_session.scalar(
+        sa.select(sa.func.count()).select_from(m.offers).where(m.offers.order_id == order.id)
+    )
+    assert hot_offers == 0
+    archived_offer = (
+        await async_session.execute(
+            sa.select(m.offers_archive).where(m.offers_archive.order_id == order.id)
+        )
+    ).scalar_one()
+    assert archived_offer.state == m.OfferState.ACCEPTED
+
+    # Заказ остаётся в orders, в очереди отмечен archived_at
+    assert await async_session.get(m.orders, order.id) is not None
+    queue_row = await async_session.get(m.order_autoclose_queue, order.id)
+    await async_session.refresh(queue_row)
+    assert queue_row.archived_at is not None
+
+    # Свежие заказы не архивируются
+    assert (
+        await autoclose_scheduler.archive_closed_orders(
+            lambda: _existing_session(async_session), older_than_days=30, now=now
+        )
+        == 0
+    )
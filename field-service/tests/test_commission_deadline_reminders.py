@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from field_service.db import models as m
+from field_service.services import watchdogs
+
+UTC = timezone.utc
+
+
+async def _commission(async_session, *, tg_user_id: int, deadline_at: datetime) -> m.commissions:
+    city = m.cities(name=f"Reminder City {tg_user_id}", timezone="Europe/Moscow")
+    async_session.add(city)
+    await async_session.flush()
+    master = m.masters(tg_user_id=tg_user_id, full_name="Master", city_id=city.id, is_active=True)
+    async_session.add(master)
+    await async_session.flush()
+    order = m.orders(
+        city_id=city.id,
+        status=m.OrderStatus.PAYMENT,
+        category=m.OrderCategory.ELECTRICS,
+        total_sum=Decimal("3000"),
+        assigned_master_id=master.id,
+    )
+    async_session.add(order)
+    await async_session.flush()
+    commission = m.commissions(
+        order_id=order.id,
+        master_id=master.id,
+        amount=Decimal("1500"),
+        rate=Decimal("0.50"),
+        status=m.CommissionStatus.WAIT_PAY,
+        deadline_at=deadline_at,
+        is_paid=False,
+        has_checks=False,
+    )
+    async_session.add(commission)
+    await async_session.commit()
+    return commission
+
+
+async def _outbox(async_session) -> list[m.notifications_outbox]:
+    rows = await async_session.execute(
+        select(m.notifications_outbox)
+        .where(m.notifications_outbox.event == "commission_deadline_reminder")
+        .order_by(m.notifications_outbox.id)
+    )
+    return list(rows.scalars())
+
+
+@pytest.mark.asyncio
+async def test_due_reminders_are_queued_once(async_session) -> None:
+    now = datetime(2025, 10, 20, 12, 0, tzinfo=UTC)
+    soon = await _commission(async_session, tg_user_id=9101, deadline_at=now + timedelta(hours=3))
+    later = await _commission(async_session, tg_user_id=9102, deadline_at=now + timedelta(hours=20))
+    await _commission(async_session, tg_user_id=9103, deadline_at=now + timedelta(hours=30))
+
+    queued = await watchdogs.queue_commission_deadline_reminders(async_session, now=now)
+    await async_session.commit()
+    assert queued == 2
+
+    marks = await async_session.execute(
+        select(
+            m.commission_deadline_notifications.commission_id,
+            m.commission_deadline_notifications.hours_before,
+        )
+    )
+    assert set(marks.tuples()) == {(soon.id, 24), (soon.id, 6), (later.id, 24)}
+
+    # Одно сообщение на комиссию, по самому близкому порогу
+    outbox = await _outbox(async_session)
+    by_commission = {row.payload["commission_id"]: row for row in outbox}
+    assert by_commission[soon.id].payload["hours_before"] == 6
+    assert by_commission[soon.id].master_id == soon.master_id
+    assert "6 часов" in by_commission[soon.id].payload["message"]
+    assert by_commission[later.id].payload["hours_before"] == 24
+
+    # Повторный прогон ничего не дублирует
+    assert await watchdogs.queue_commission_deadline_reminders(async_session, now=now) == 0
+
+    # Наступил порог 1ч
+    queued = await watchdogs.queue_commission_deadline_reminders(
+        async_session, now=now + timedelta(hours=2, minutes=30)
+    )
+    await async_session.commit()
+    assert queued == 1
+    last = (await _outbox(async_session))[-1]
+    assert last.payload["commission_id"] == soon.id
+    assert last.payload["hours_before"] == 1
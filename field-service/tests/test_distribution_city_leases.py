@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services.distribution import city_leases
+
+
+async def _make_cities(session, count: int) -> list[int]:
+    cities = [m.cities(name=f"Lease City {idx}") for idx in range(count)]
+    session.add_all(cities)
+    await session.commit()
+    return [city.id for city in cities]
+
+
+@pytest.mark.asyncio
+async def test_city_leases_are_shared_between_workers(async_session) -> None:
+    city_ids = await _make_cities(async_session, 3)
+
+    first = await city_leases.claim_cities(async_session, worker_id="worker-a")
+    assert first == set(city_ids)
+
+    # A new replica has nothing to claim until the first one rebalances
+    assert await city_leases.claim_cities(async_session, worker_id="worker-b") == set()
+
+    first = await city_leases.claim_cities(async_session, worker_id="worker-a")
+    assert len(first) == 2
+    second = await city_leases.claim_cities(async_session, worker_id="worker-b")
+    assert second == set(city_ids) - first
+
+    for city_id in city_ids:
+        owner = await city_leases.lease_owner(async_session, city_id)
+        assert owner == ("worker-a" if city_id in first else "worker-b")
+
+
+@pytest.mark.asyncio
+async def test_city_leases_of_dead_worker_are_taken_over(async_session) -> None:
+    city_ids = await _make_cities(async_session, 2)
+
+    await city_leases.claim_cities(async_session, worker_id="worker-a")
+    await city_leases.claim_cities(async_session, worker_id="worker-b")
+    held_a = await city_leases.claim_cities(async_session, worker_id="worker-a")
+    held_b = await city_leases.claim_cities(async_session, worker_id="worker-b")
+    assert held_a and held_b
+
+    # worker-b dies: its heartbeat and leases go stale
+    await async_session.execute(
+        sa.text(
+            "UPDATE distribution_workers SET heartbeat_at = NOW() - INTERVAL '10 minutes'"
+            " WHERE worker_id = 'worker-b'"
+        )
+    )
+    await async_session.execute(
+        sa.text(
+            "UPDATE distribution_city_leases SET expires_at = NOW() - INTERVAL '1 second'"
+            " WHERE worker_id = 'worker-b'"
+        )
+    )
+    await async_session.commit()
+
+    assert await city_leases.claim_cities(async_session, worker_id="worker-a") == set(city_ids)
+
+
+@pytest.mark.asyncio
+async def test_city_leases_release_all(async_session) -> None:
+    city_ids = await _make_cities(async_session, 2)
+
+    await city_leases.claim_cities(async_session, worker_id="worker-a")
+    await city_leases.claim_cities(async_session, worker_id="worker-b")
+    await city_leases.claim_cities(async_session, worker_id="worker-a")
+
+    await city_leases.release_all(async_session, worker_id="worker-a")
+
+    assert await city_leases.claim_cities(async_session, worker_id="worker-b") == set(city_ids)
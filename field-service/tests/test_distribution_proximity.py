@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import pytest
+
+from field_service.db import models as m
+from field_service.services import distribution_scheduler as ds
+from field_service.services.distribution import proximity
+from field_service.services.distribution.proximity import CityPositions
+
+# ~1.1 km per 0.01 degree of latitude
+ORDER = (55.75, 37.62)
+
+
+def test_distance_bands_use_grid_and_cap() -> None:
+    positions = CityPositions.build(
+        1,
+        [
+            (1, 55.751, 37.62),  # ~0.1 km
+            (2, 55.80, 37.62),  # ~5.6 km
+            (3, 56.20, 37.62),  # ~50 km: beyond max
+        ],
+    )
+    bands = proximity.distance_bands(
+        positions, *ORDER, [1, 2, 3, 4], band_km=3.0, max_km=15.0
+    )
+    assert bands[1][0] == 0 and bands[1][1] == pytest.approx(0.11, abs=0.02)
+    assert bands[2][0] == 1
+    assert bands[3] == (5, None)
+    assert bands[4] == (5, None)  # no home position
+
+    # no order coordinates: proximity does not affect ranking
+    assert proximity.distance_bands(
+        positions, None, None, [1, 2], band_km=3.0, max_km=15.0
+    ) == {1: (0, None), 2: (0, None)}
+
+
+def test_rank_candidates_prefers_nearby_band() -> None:
+    # SQL order: car > avg_week > rating
+    candidates = [
+        dict(mid=10, car=True, avg_week=5000.0, rating=5.0, dist_band=4, dist_km=13.0),
+        dict(mid=12, car=True, avg_week=3000.0, rating=4.0, dist_band=0, dist_km=2.5),
+        dict(mid=11, car=False, avg_week=1000.0, rating=4.0, dist_band=0, dist_km=1.0),
+    ]
+    ranked = ds._rank_candidates(candidates, None)
+    # inside the nearest band the car / avg check order still applies
+    assert [c["mid"] for c in ranked] == [12, 11, 10]
+
+
+@pytest.mark.asyncio
+async def test_scheduler_candidates_ranked_by_distance(async_session) -> None:
+    city = m.cities(name="Proximity City", timezone="Europe/Moscow")
+    async_session.add(city)
+    await async_session.flush()
+    skill = m.skills(code="PROX", name="Proximity", is_active=True)
+    async_session.add(skill)
+    await async_session.flush()
+
+    homes = {
+        "Far with car": (55.85, 37.62, True),
+        "Near": (55.752, 37.62, False),
+        "No home": (None, None, True),
+    }
+    ids: dict[str, int] = {}
+    for idx, (name, (lat, lon, car)) in enumerate(homes.items()):
+        master = m.masters(
+            tg_user_id=880100 + idx,
+            full_name=name,
+            phone=f"+7000088010{idx}",
+            city_id=city.id,
+            verified=True,
+            is_active=True,
+            is_blocked=False,
+            is_on_shift=True,
+            has_vehicle=car,
+            home_latitude=lat,
+            home_longitude=lon,
+        )
+        async_session.add(master)
+        await async_session.flush()
+        async_session.add(m.master_skills(master_id=master.id, skill_id=skill.id))
+        ids[name] = master.id
+    await async_session.commit()
+
+    ranked = await ds._candidates(
+        async_session,
+        oid=0,
+        city_id=city.id,
+        district_id=None,
+        skill_code="PROX",
+        preferred_mid=None,
+        fallback_limit=5,
+        order_lat=ORDER[0],
+        order_lon=ORDER[1],
+    )
+    assert [c["mid"] for c in ranked] == [ids["Near"], ids["Far with car"], ids["No home"]]
+
+    unlocated = await ds._candidates(
+        async_session,
+        oid=0,
+        city_id=city.id,
+        district_id=None,
+        skill_code="PROX",
+        preferred_mid=None,
+        fallback_limit=5,
+    )
+    assert unlocated[-1]["mid"] == ids["Near"]  # no car: last without proximity
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import distribution_metrics_service as dms
+from field_service.services.distribution_metrics_service import DistributionMetricsService
+
+UTC = timezone.utc
+END = datetime(2025, 9, 10, 13, 25, tzinfo=UTC)
+
+
+async def _seed(session) -> None:
+    session.add(m.cities(id=1, name="Rollup City", is_active=True))
+    await session.flush()
+    # spread over 4 days: raw edges, full hours and full days are all hit
+    for i in range(40):
+        session.add(
+            m.distribution_metrics(
+                order_id=3000 + i,
+                master_id=None if i % 10 == 0 else 100 + (i % 3),
+                assigned_at=END - timedelta(hours=i * 2.4, minutes=i),
+                round_number=1 + (i % 4),
+                candidates_count=2 + (i % 5),
+                time_to_assign_seconds=None if i % 7 == 0 else 60 * (i % 8),
+                preferred_master_used=(i % 2 == 0),
+                was_escalated_to_logist=(i % 5 == 0),
+                was_escalated_to_admin=(i % 9 == 0),
+                city_id=1,
+                category="ELECTRICS",
+                metadata_json={"assigned_via": "master_bot" if i % 3 else "admin_manual"},
+            )
+        )
+    await session.commit()
+
+
+async def _raw_stats(session, start: datetime, end: datetime) -> tuple:
+    dm = m.distribution_metrics
+    row = (
+        await session.execute(
+            sa.select(
+                sa.func.count(dm.id),
+                sa.func.avg(dm.time_to_assign_seconds),
+                sa.func.avg(dm.round_number),
+                sa.func.sum(sa.case((dm.time_to_assign_seconds < 120, 1), else_=0)),
+            ).where(dm.assigned_at >= start, dm.assigned_at <= end)
+        )
+    ).one()
+    return row
+
+
+@pytest.mark.asyncio
+async def test_rollup_stats_match_raw(async_session) -> None:
+    await _seed(async_session)
+    service = DistributionMetricsService(session_factory=lambda: async_session)
+
+    for start in (
+        END - timedelta(days=3, minutes=17),
+        END - timedelta(hours=5),
+        END - timedelta(minutes=30),
+    ):
+        stats = await service.get_stats(start_date=start, end_date=END)
+        total, avg_time, avg_round, fast = await _raw_stats(async_session, start, END)
+        assert stats.total_assignments == total
+        assert stats.avg_time_to_assign == pytest.approx(float(avg_time or 0))
+        assert stats.avg_round_number == pytest.approx(float(avg_round or 0))
+        if total:
+            assert stats.fast_assign_pct == round(fast / total * 100, 2)
+
+
+@pytest.mark.asyncio
+async def test_backfill_rebuilds_rollups(async_session) -> None:
+    await _seed(async_session)
+    service = DistributionMetricsService(session_factory=lambda: async_session)
+    start = END - timedelta(days=5, minutes=17)
+    before = await service.get_master_performance(start_date=start, end_date=END)
+
+    await async_session.execute(sa.delete(m.distribution_metrics_hourly))
+    await async_session.execute(sa.delete(m.distribution_metrics_daily))
+    await async_session.commit()
+
+    written = await dms.backfill_rollups(async_session)
+    assert written["distribution_metrics_daily"] > 0
+
+    after = await service.get_master_performance(start_date=start, end_date=END)
+    assert after == before
+    assert sum(p.total_assignments for p in after) == 36  # rows without master excluded
+    hourly = await service.get_hourly_distribution(start_date=start, end_date=END)
+    assert sum(hourly.values()) == 40
@@ -246,6 +246,91 @@ async def test_distribution_sends_offer_when_candidates_exist(async_session):
     assert offers[0].round_number == 1
 
 
+@pytest.mark.asyncio
+async def test_distribution_tick_batches_orders_of_same_pool(async_session):
+    """Several orders of one city/district get offers in a single batched tick."""
+    city = m.cities(name="Batch City", is_active=True)
+    district = m.districts(city=city, name="Center")
+    skill = m.skills(code="ELEC", name="Electrics", is_active=True)
+    async_session.add_all([city, district, skill])
+    await async_session.flush()
+
+    masters = [
+        m.masters(
+            full_name=f"Batch Master {idx}",
+            phone=f"+7000000010{idx}",
+            city_id=city.id,
+            has_vehicle=True,
+            rating=4.5,
+            is_active=True,
+            is_blocked=False,
+            is_on_shift=True,
+            verified=True,
+        )
+        for idx in range(2)
+    ]
+    async_session.add_all(masters)
+    await async_session.flush()
+    for master in masters:
+        async_session.add_all([
+            m.master_districts(master_id=master.id, district_id=district.id),
+            m.master_skills(master_id=master.id, skill_id=skill.id),
+        ])
+
+    orders = [
+        m.orders(
+            city_id=city.id,
+            district_id=district.id,
+            status=m.OrderStatus.SEARCHING,
+            category="ELECTRICS",
+            type=m.OrderType.NORMAL,
+            no_district=False,
+        )
+        for _ in range(3)
+    ]
+    async_session.add_all(orders)
+    await async_session.flush()
+
+    # The first order already had an expired offer to masters[0] in round 1
+    async_session.add(
+        m.offers(
+            order_id=orders[0].id,
+            master_id=masters[0].id,
+            round_number=1,
+            state=m.OfferState.EXPIRED,
+        )
+    )
+    await async_session.commit()
+
+    state = await distribution_scheduler._load_tick_batch_state(
+        async_session, [order.id for order in orders]
+    )
+    assert state.rounds == {orders[0].id: 1}
+    assert state.active_sent == set()
+    assert state.offered_masters == {orders[0].id: {masters[0].id}}
+
+    cfg = distribution_scheduler.DistConfig(
+        tick_seconds=30,
+        sla_seconds=120,
+        rounds=2,
+        top_log_n=10,
+        to_admin_after_min=10,
+    )
+    await distribution_scheduler.tick_once(cfg, bot=None, alerts_chat_id=None)
+
+    rows = await async_session.execute(
+        sa.select(m.offers.order_id, m.offers.master_id, m.offers.round_number)
+        .where(m.offers.state == m.OfferState.SENT)
+        .order_by(m.offers.order_id)
+    )
+    sent = {row.order_id: (row.master_id, row.round_number) for row in rows}
+
+    assert set(sent) == {order.id for order in orders}
+    assert sent[orders[0].id] == (masters[1].id, 2)
+    assert sent[orders[1].id][1] == 1
+    assert sent[orders[2].id][1] == 1
+
+
 @pytest.mark.asyncio
 async def test_distribution_config_loads_from_settings(async_session):
     """Test that DistConfig properly loads values from settings."""
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services.distribution import wake_channel
+
+
+@pytest.mark.asyncio
+async def test_wait_times_out_without_notifications() -> None:
+    assert await wake_channel.wait(0.01) == []
+
+
+@pytest.mark.asyncio
+async def test_notify_wakes_waiter_with_payloads(async_session) -> None:
+    city = m.cities(name="Wake City")
+    async_session.add(city)
+    await async_session.flush()
+
+    waiter = asyncio.create_task(wake_channel.wait(5))
+    await asyncio.sleep(0)
+
+    await wake_channel.notify(
+        async_session,
+        wake_channel.WakeReason.ORDER_CREATED,
+        order_id=10,
+        city_id=city.id,
+    )
+    wake_channel.notify_local(wake_channel.WakeReason.MASTER_ON_SHIFT, master_id=7)
+    await async_session.commit()
+
+    wakeups = await asyncio.wait_for(waiter, timeout=1)
+    assert wakeups == [
+        {"reason": "order_created", "order_id": 10, "city_id": city.id},
+        {"reason": "master_on_shift", "master_id": 7},
+    ]
+    # drained: the next wait times out
+    assert await wake_channel.wait(0.01) == []
+
+
+@pytest.mark.asyncio
+async def test_decline_offer_wakes_scheduler(async_session) -> None:
+    from field_service.services.orders_service import OrdersService
+
+    city = m.cities(name="Decline Wake City")
+    async_session.add(city)
+    await async_session.flush()
+    master = m.masters(tg_user_id=7001, full_name="Wake Master", city_id=city.id)
+    order = m.orders(city_id=city.id, status=m.OrderStatus.SEARCHING)
+    async_session.add_all([master, order])
+    await async_session.flush()
+    offer = m.offers(order_id=order.id, master_id=master.id, state=m.OfferState.SENT)
+    async_session.add(offer)
+    await async_session.commit()
+
+    ok, _ = await OrdersService(async_session).decline_offer(offer.id, master.id)
+    assert ok
+
+    wakeups = await wake_channel.wait(0.5)
+    assert {
+        "reason": "offer_declined",
+        "order_id": order.id,
+        "master_id": master.id,
+    } in wakeups
+    state = await async_session.scalar(
+        sa.select(m.offers.state).where(m.offers.id == offer.id)
+    )
+    assert state == m.OfferState.DECLINED
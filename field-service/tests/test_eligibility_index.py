@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import pytest
+
+from field_service.db import models as m
+from field_service.services.distribution import eligibility_index
+
+
+def test_lookup_intersects_city_skill_and_district() -> None:
+    index = eligibility_index.EligibilityIndex(
+        fingerprint=(),
+        by_city_skill={
+            (1, "ELEC"): frozenset({10, 11, 12}),
+            (1, "PLUMB"): frozenset({12}),
+            (2, "ELEC"): frozenset({20}),
+        },
+        by_district={
+            100: frozenset({11, 12, 20}),
+            101: frozenset({10}),
+        },
+    )
+
+    assert index.lookup(1, None, "ELEC") == (10, 11, 12)
+    assert index.lookup(1, 100, "ELEC") == (11, 12)
+    assert index.lookup(1, 101, "PLUMB") == ()
+    assert index.lookup(2, 100, "ELEC") == (20,)
+    assert index.lookup(3, None, "ELEC") == ()
+
+
+@pytest.mark.asyncio
+async def test_index_picks_up_new_master(async_session) -> None:
+    city = m.cities(name="Index City")
+    district = m.districts(city=city, name="Index District")
+    skill = m.skills(code="IDX", name="Index skill", is_active=True)
+    async_session.add_all([city, district, skill])
+    await async_session.flush()
+
+    assert await eligibility_index.eligible_master_ids(
+        async_session, city_id=city.id, district_id=district.id, skill_code="IDX"
+    ) == ()
+
+    master = m.masters(
+        tg_user_id=7001,
+        full_name="Indexed Master",
+        city_id=city.id,
+        is_active=True,
+        is_blocked=False,
+        verified=True,
+    )
+    async_session.add(master)
+    await async_session.flush()
+    async_session.add_all([
+        m.master_skills(master_id=master.id, skill_id=skill.id),
+        m.master_districts(master_id=master.id, district_id=district.id),
+    ])
+    await async_session.commit()
+
+    # Fingerprint changed (counts of masters / skills / districts)
+    await eligibility_index.get_index(async_session, force_check=True)
+    assert await eligibility_index.eligible_master_ids(
+        async_session, city_id=city.id, district_id=district.id, skill_code="IDX"
+    ) == (master.id,)
+
+    # Moderation path: explicit invalidation drops blocked masters
+    master.is_blocked = True
+    await async_session.commit()
+    eligibility_index.invalidate()
+    assert await eligibility_index.eligible_master_ids(
+        async_session, city_id=city.id, district_id=None, skill_code="IDX"
+    ) == ()
+
+
+@pytest.mark.asyncio
+async def test_index_notices_district_swap_with_same_count(async_session) -> None:
+    city = m.cities(name="Swap City")
+    old_district = m.districts(city=city, name="Swap Old")
+    new_district = m.districts(city=city, name="Swap New")
+    skill = m.skills(code="SWAP", name="Swap skill", is_active=True)
+    async_session.add_all([city, old_district, new_district, skill])
+    await async_session.flush()
+    master = m.masters(
+        tg_user_id=7002,
+        full_name="Swapping Master",
+        city_id=city.id,
+        is_active=True,
+        is_blocked=False,
+        verified=True,
+    )
+    async_session.add(master)
+    await async_session.flush()
+    link = m.master_districts(master_id=master.id, district_id=old_district.id)
+    async_session.add_all([m.master_skills(master_id=master.id, skill_id=skill.id), link])
+    await async_session.commit()
+
+    assert await eligibility_index.eligible_master_ids(
+        async_session, city_id=city.id, district_id=old_district.id, skill_code="SWAP"
+    ) == (master.id,)
+
+    # Район заменён без изменения количества строк и masters.updated_at
+    await async_session.delete(link)
+    await async_session.flush()
+    async_session.add(m.master_districts(master_id=master.id, district_id=new_district.id))
+    await async_session.commit()
+
+    await eligibility_index.get_index(async_session, force_check=True)
+    assert await eligibility_index.eligible_master_ids(
+        async_session, city_id=city.id, district_id=new_district.id, skill_code="SWAP"
+    ) == (master.id,)
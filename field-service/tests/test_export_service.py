@@ -456,3 +456,48 @@ async def test_export_referral_rewards(async_session):
     assert row_map["level"] == reward.level
     assert row_map["amount"] == pytest.approx(250.00)
 
+
+
+@pytest.mark.asyncio
+async def test_stream_orders_writes_files_in_chunks(monkeypatch, async_session):
+    monkeypatch.setattr(export_service, "get_timezone", lambda: ZoneInfo("UTC"))
+    monkeypatch.setattr(export_service, "EXPORT_FETCH_SIZE", 2)
+    city = m.cities(name="Stream City")
+    async_session.add(city)
+    await async_session.flush()
+
+    created_at = datetime(2025, 9, 20, 9, 0, tzinfo=timezone.utc)
+    for idx in range(5):
+        async_session.add(
+            m.orders(
+                city_id=city.id,
+                status=m.OrderStatus.CREATED,
+                client_name=f"=HYPERLINK(\"x\") {idx}",
+                created_at=created_at + timedelta(minutes=idx),
+                updated_at=created_at + timedelta(minutes=idx),
+            )
+        )
+    await async_session.commit()
+
+    files = await export_service.stream_orders(
+        date_from=date(2025, 9, 20),
+        date_to=date(2025, 9, 20),
+        city_ids=[city.id],
+        session=async_session,
+    )
+    try:
+        assert files.rows == 5
+        assert files.csv_path.exists() and files.xlsx_path.exists()
+        csv_lines = files.csv_path.read_bytes().decode("utf-8-sig").splitlines()
+        assert len(csv_lines) == 6
+
+        wb = load_workbook(files.xlsx_path)
+        sheet = wb["orders"]
+        header = [cell.value for cell in sheet[1]]
+        names = [row[header.index("user_name")] for row in sheet.iter_rows(min_row=2, values_only=True)]
+        # Strings are written as text, never as formulas
+        assert names == [f"=HYPERLINK(\"x\") {idx}" for idx in range(5)]
+        assert sheet.cell(row=2, column=header.index("user_name") + 1).data_type == "s"
+    finally:
+        files.cleanup()
+    assert not files.directory.exists()
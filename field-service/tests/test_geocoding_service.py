@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import geocoding_service
+from field_service.services.geocoding_service import FakeGeocoder, GeocodingService
+
+UTC = timezone.utc
+ADDRESS = "Москва, Тверская улица, 7"
+
+
+@pytest.mark.asyncio
+async def test_lru_and_geocache_layers(async_session) -> None:
+    provider = FakeGeocoder({ADDRESS: (55.76, 37.61)})
+    service = GeocodingService(provider, rps=0)
+
+    first = await service.geocode(ADDRESS, session=async_session)
+    again = await service.geocode("  москва,  тверская улица, 7 ", session=async_session)
+    assert first == again
+    assert first is not None and first.lat == 55.76
+    assert len(provider.calls) == 1
+
+    # another process: empty LRU, answer from geocache
+    other_provider = FakeGeocoder()
+    other = GeocodingService(other_provider, rps=0)
+    cached = await other.geocode(ADDRESS, session=async_session)
+    assert cached == first
+    assert other_provider.calls == []
+
+    # unknown address is cached as a miss
+    assert await service.geocode("Нигде, 1", session=async_session) is None
+    assert await other.geocode("Нигде, 1", session=async_session) is None
+    row = await async_session.get(m.geocache, "нигде, 1")
+    assert row is not None and row.lat is None
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_are_coalesced(async_session) -> None:
+    provider = FakeGeocoder({ADDRESS: (55.76, 37.61)}, delay=0.05)
+    service = GeocodingService(provider, rps=0)
+
+    results = await asyncio.gather(
+        service.geocode(ADDRESS, session=async_session),
+        *(service.geocode(ADDRESS) for _ in range(4)),
+    )
+    assert len(provider.calls) == 1
+    assert len(set(results)) == 1
+
+
+@pytest.mark.asyncio
+async def test_daily_budget_resets_next_day(async_session) -> None:
+    now = [datetime(2025, 10, 1, 12, 0, tzinfo=UTC)]
+    provider = FakeGeocoder()
+    service = GeocodingService(provider, rps=0, daily_limit=2, clock=lambda: now[0])
+
+    for idx in range(3):
+        await service.geocode(f"Адрес {idx}", session=async_session)
+    assert len(provider.calls) == 2
+    assert service.budget_left == 0
+
+    now[0] += timedelta(days=1)
+    assert service.budget_left == 2
+    await service.geocode("Адрес 2", session=async_session)
+    assert len(provider.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_backfill_replaces_centroids(async_session) -> None:
+    city = m.cities(name="Москва")
+    async_session.add(city)
+    await async_session.flush()
+    street = m.streets(city_id=city.id, name="Тверская улица")
+    async_session.add(street)
+    await async_session.flush()
+    order = m.orders(
+        city_id=city.id,
+        street_id=street.id,
+        house="7",
+        lat=55.0,
+        lon=37.0,
+        geocode_provider="city_centroid",
+        geocode_confidence=40,
+    )
+    async_session.add(order)
+    await async_session.commit()
+
+    service = GeocodingService(FakeGeocoder({ADDRESS: (55.76, 37.61)}), rps=0)
+    stats = await geocoding_service.backfill_order_coordinates(async_session, service=service)
+    assert stats == {"checked": 1, "updated": 1}
+
+    row = (
+        await async_session.execute(
+            sa.select(m.orders.lat, m.orders.geocode_provider).where(m.orders.id == order.id)
+        )
+    ).one()
+    assert row.lat == 55.76
+    assert row.geocode_provider == "fake"
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import event, insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from field_service.bots.master_bot import context_cache
+from field_service.bots.master_bot.handlers import orders as order_handlers
+from field_service.db import models as m
+
+
+def _count_statements(async_session) -> list[str]:
+    statements: list[str] = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_session.bind.sync_connection, "before_cursor_execute", _before)
+    return statements
+
+
+async def _make_master(async_session, tg_user_id: int) -> m.masters:
+    master = m.masters(
+        tg_user_id=tg_user_id,
+        full_name="Cache Master",
+        phone="+70000000501",
+        is_active=True,
+        is_blocked=False,
+        verified=True,
+        moderation_status=m.ModerationStatus.APPROVED,
+        shift_status=m.ShiftStatus.SHIFT_OFF,
+    )
+    async_session.add(master)
+    await async_session.commit()
+    return master
+
+
+@pytest.mark.asyncio
+async def test_cached_master_is_attached_without_sql(async_session) -> None:
+    master = await _make_master(async_session, 70501)
+    maker = async_sessionmaker(async_session.bind, expire_on_commit=False)
+
+    async with maker() as first_session:
+        first = await context_cache.get_master(first_session, 70501)
+        assert first.id == master.id
+
+    await async_session.execute(
+        update(m.masters).where(m.masters.id == master.id).values(full_name="Renamed")
+    )
+    await async_session.commit()
+
+    statements = _count_statements(async_session)
+    async with maker() as second_session:
+        cached = await context_cache.get_master(second_session, 70501)
+        assert statements == []
+        assert cached in second_session
+        assert cached.id == master.id
+        assert cached.full_name == "Cache Master"
+
+    context_cache.invalidate(tg_user_id=70501)
+    async with maker() as third_session:
+        fresh = await context_cache.get_master(third_session, 70501)
+        assert fresh.full_name == "Renamed"
+
+
+@pytest.mark.asyncio
+async def test_remember_refreshes_committed_and_drops_dirty(async_session) -> None:
+    await _make_master(async_session, 70502)
+    maker = async_sessionmaker(async_session.bind, expire_on_commit=False)
+
+    async with maker() as s:
+        master = await context_cache.get_master(s, 70502)
+        master.shift_status = m.ShiftStatus.SHIFT_ON
+        master.is_on_shift = True
+        await s.commit()
+        context_cache.remember(70502, master, s)
+
+    async with maker() as s:
+        cached = await context_cache.get_master(s, 70502)
+        assert cached.shift_status == m.ShiftStatus.SHIFT_ON
+        cached.full_name = "Not committed"
+        context_cache.remember(70502, cached, s)
+
+    async with maker() as s:
+        reloaded = await context_cache.get_master(s, 70502)
+        assert reloaded.full_name == "Cache Master"
+
+
+@pytest.mark.asyncio
+async def test_active_count_cached_until_forgotten(async_session) -> None:
+    master = await _make_master(async_session, 70503)
+    city_id = 1
+
+    assert await order_handlers._count_active_orders(async_session, master.id) == 0
+
+    await async_session.execute(
+        insert(m.orders).values(
+            city_id=city_id,
+            status=m.OrderStatus.ASSIGNED,
+            assigned_master_id=master.id,
+            client_name="Cache Client",
+            client_phone="+70000000502",
+        )
+    )
+    await async_session.commit()
+
+    assert await order_handlers._count_active_orders(async_session, master.id) == 0
+    assert (
+        await order_handlers._count_active_orders(async_session, master.id, fresh=True)
+        == 1
+    )
+
+    context_cache.forget_active_count(master.id)
+    context_cache.set_active_count(master.id, 7)
+    assert await order_handlers._count_active_orders(async_session, master.id) == 7
+    context_cache.forget_active_count(master.id)
+    assert await order_handlers._count_active_orders(async_session, master.id) == 1
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import master_stats_service
+
+UTC = timezone.utc
+
+_ACTIVE = (
+    m.OrderStatus.ASSIGNED,
+    m.OrderStatus.EN_ROUTE,
+    m.OrderStatus.WORKING,
+    m.OrderStatus.PAYMENT,
+)
+
+
+async def _adhoc_stats(session, master_id: int) -> dict:
+    """Stats computed directly from orders, as the old CTEs did."""
+    week_ago = datetime.now(UTC) - timedelta(days=7)
+    active = await session.scalar(
+        sa.select(sa.func.count())
+        .select_from(m.orders)
+        .where(m.orders.assigned_master_id == master_id, m.orders.status.in_(_ACTIVE))
+    )
+    closed_total = await session.scalar(
+        sa.select(sa.func.count())
+        .select_from(m.orders)
+        .where(
+            m.orders.assigned_master_id == master_id,
+            m.orders.status == m.OrderStatus.CLOSED,
+        )
+    )
+    avg_week = await session.scalar(
+        sa.select(sa.func.avg(m.orders.total_sum)).where(
+            m.orders.assigned_master_id == master_id,
+            m.orders.status.in_((m.OrderStatus.PAYMENT, m.OrderStatus.CLOSED)),
+            m.orders.created_at >= week_ago,
+        )
+    )
+    return {
+        "active_cnt": int(active or 0),
+        "closed_total": int(closed_total or 0),
+        "avg_week_check": Decimal(avg_week or 0).quantize(Decimal("0.01")),
+    }
+
+
+async def _projected_stats(session, master_id: int) -> dict:
+    row = (
+        await session.execute(
+            sa.select(m.master_stats).where(m.master_stats.master_id == master_id)
+        )
+    ).scalar_one()
+    await session.refresh(row)
+    return {
+        "active_cnt": row.active_cnt,
+        "closed_total": row.closed_total,
+        "avg_week_check": Decimal(row.avg_week_check).quantize(Decimal("0.01")),
+    }
+
+
+@pytest.mark.asyncio
+async def test_master_stats_follow_order_transitions(async_session) -> None:
+    city = m.cities(name="Stats City")
+    async_session.add(city)
+    await async_session.flush()
+
+    master = m.masters(
+        tg_user_id=5001,
+        full_name="Stats Master",
+        city_id=city.id,
+        is_active=True,
+        verified=True,
+    )
+    async_session.add(master)
+    await async_session.flush()
+
+    orders = [
+        m.orders(
+            city_id=city.id,
+            status=status,
+            assigned_master_id=master.id,
+            total_sum=Decimal(total),
+        )
+        for status, total in (
+            (m.OrderStatus.ASSIGNED, "0"),
+            (m.OrderStatus.WORKING, "0"),
+            (m.OrderStatus.PAYMENT, "3000"),
+            (m.OrderStatus.CLOSED, "5000"),
+        )
+    ]
+    async_session.add_all(orders)
+    await async_session.commit()
+
+    assert await _projected_stats(async_session, master.id) == await _adhoc_stats(
+        async_session, master.id
+    )
+
+    # WORKING -> PAYMENT -> CLOSED, and unassign the ASSIGNED one
+    await async_session.execute(
+        sa.update(m.orders)
+        .where(m.orders.id == orders[1].id)
+        .values(status=m.OrderStatus.CLOSED, total_sum=Decimal("7000"))
+    )
+    await async_session.execute(
+        sa.update(m.orders)
+        .where(m.orders.id == orders[0].id)
+        .values(status=m.OrderStatus.SEARCHING, assigned_master_id=None)
+    )
+    await async_session.commit()
+
+    projected = await _projected_stats(async_session, master.id)
+    assert projected == await _adhoc_stats(async_session, master.id)
+    assert projected["active_cnt"] == 1
+    assert projected["closed_total"] == 2
+
+    avg = await master_stats_service.get_week_closed_avg(async_session, master.id)
+    assert avg == Decimal("6000")
+
+
+@pytest.mark.asyncio
+async def test_master_stats_reconcile_repairs_drift(async_session) -> None:
+    city = m.cities(name="Drift City")
+    async_session.add(city)
+    await async_session.flush()
+
+    master = m.masters(tg_user_id=5002, full_name="Drift Master", city_id=city.id)
+    async_session.add(master)
+    await async_session.flush()
+
+    async_session.add(
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.EN_ROUTE,
+            assigned_master_id=master.id,
+        )
+    )
+    await async_session.commit()
+
+    await async_session.execute(
+        sa.update(m.master_stats)
+        .where(m.master_stats.master_id == master.id)
+        .values(active_cnt=42)
+    )
+    await async_session.commit()
+
+    drifted = await master_stats_service.reconcile_master_stats(async_session)
+    assert drifted >= 1
+
+    assert await _projected_stats(async_session, master.id) == await _adhoc_stats(
+        async_session, master.id
+    )
+    assert await master_stats_service.reconcile_master_stats(async_session) == 0
+
+
+async def _adhoc_profile(session, master_id: int) -> tuple[int, int, float | None]:
+    """Statistics screen values as the handler used to compute them."""
+    month_start = datetime.now(UTC).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    closed = await session.scalar(
+        sa.select(sa.func.count(m.orders.id)).where(
+            m.orders.assigned_master_id == master_id,
+            m.orders.status == m.OrderStatus.CLOSED,
+        )
+    )
+    month = await session.scalar(
+        sa.select(sa.func.count(m.orders.id)).where(
+            m.orders.assigned_master_id == master_id,
+            m.orders.status == m.OrderStatus.CLOSED,
+            m.orders.updated_at >= month_start,
+        )
+    )
+    avg_minutes = await session.scalar(
+        sa.select(
+            sa.func.avg(
+                sa.func.extract("EPOCH", m.offers.responded_at - m.offers.sent_at) / 60.0
+            )
+        ).where(
+            m.offers.master_id == master_id,
+            m.offers.state == m.OfferState.ACCEPTED,
+            m.offers.responded_at.is_not(None),
+        )
+    )
+    return (
+        int(closed or 0),
+        int(month or 0),
+        None if avg_minutes is None else round(float(avg_minutes), 4),
+    )
+
+
+async def _projected_profile(session, master_id: int) -> tuple[int, int, float | None]:
+    stats = await master_stats_service.get_profile_stats(session, master_id)
+    avg = stats.avg_response_minutes
+    return (
+        stats.closed_total,
+        stats.month_closed_cnt,
+        None if avg is None else round(avg, 4),
+    )
+
+
+@pytest.mark.asyncio
+async def test_profile_stats_match_adhoc_queries(async_session) -> None:
+    city = m.cities(name="Profile City")
+    async_session.add(city)
+    await async_session.flush()
+    master = m.masters(tg_user_id=5003, full_name="Profile Master", city_id=city.id)
+    async_session.add(master)
+    await async_session.flush()
+
+    assert await _projected_profile(async_session, master.id) == (0, 0, None)
+
+    now = datetime.now(UTC)
+    last_month = now.replace(day=1) - timedelta(days=3)
+    orders = [
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.CLOSED,
+            assigned_master_id=master.id,
+            total_sum=Decimal("1000"),
+            created_at=last_month,
+            updated_at=last_month,
+        ),
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.CLOSED,
+            assigned_master_id=master.id,
+            total_sum=Decimal("1500"),
+        ),
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.WORKING,
+            assigned_master_id=master.id,
+        ),
+    ]
+    async_session.add_all(orders)
+    await async_session.flush()
+
+    sent = now - timedelta(hours=2)
+    offers = [
+        m.offers(
+            order_id=order.id,
+            master_id=master.id,
+            state=m.OfferState.ACCEPTED,
+            sent_at=sent,
+            responded_at=sent + timedelta(minutes=minutes),
+        )
+        for order, minutes in zip(orders, (5, 12))
+    ]
+    pending = m.offers(
+        order_id=orders[2].id,
+        master_id=master.id,
+        state=m.OfferState.SENT,
+        sent_at=sent,
+    )
+    async_session.add_all([*offers, pending])
+    await async_session.commit()
+
+    assert await _projected_profile(async_session, master.id) == await _adhoc_profile(
+        async_session, master.id
+    )
+
+    # Мастер принял оффер и закрыл заказ
+    await async_session.execute(
+        sa.update(m.offers)
+        .where(m.offers.id == pending.id)
+        .values(state=m.OfferState.ACCEPTED, responded_at=sent + timedelta(minutes=40))
+    )
+    await async_session.execute(
+        sa.update(m.orders)
+        .where(m.orders.id == orders[2].id)
+        .values(status=m.OrderStatus.CLOSED, total_sum=Decimal("2000"))
+    )
+    await async_session.commit()
+
+    projected = await _projected_profile(async_session, master.id)
+    assert projected == await _adhoc_profile(async_session, master.id)
+    assert projected[:2] == (3, 2)
+    assert projected[2] == pytest.approx(19.0)
+
+    # Удалённый оффер уходит из среднего
+    await async_session.execute(sa.delete(m.offers).where(m.offers.id == offers[1].id))
+    await async_session.commit()
+    assert await _projected_profile(async_session, master.id) == await _adhoc_profile(
+        async_session, master.id
+    )
+
+    # Триггеры и полный пересчёт сходятся
+    assert await master_stats_service.reconcile_master_stats(async_session) == 0
+
+
+@pytest.mark.asyncio
+async def test_profile_stats_month_counter_expires() -> None:
+    stats_month = datetime(2025, 9, 1, tzinfo=UTC)
+
+    class _Result:
+        def first(self):
+            return (7, stats_month, 4, 2, Decimal("600"))
+
+    class _Session:
+        async def execute(self, _stmt):
+            return _Result()
+
+    stats = await master_stats_service.get_profile_stats(
+        _Session(), 1, now=datetime(2025, 9, 30, 23, 0, tzinfo=UTC)
+    )
+    assert (stats.closed_total, stats.month_closed_cnt) == (7, 4)
+    assert stats.avg_response_minutes == pytest.approx(5.0)
+
+    # Новый месяц наступил, событий ещё не было
+    stats = await master_stats_service.get_profile_stats(
+        _Session(), 1, now=datetime(2025, 10, 1, 0, 5, tzinfo=UTC)
+    )
+    assert stats.month_closed_cnt == 0
+    assert stats.closed_total == 7
@@ -125,3 +125,68 @@ async def test_notification_success_clears_error(async_session: AsyncSession, mo
     assert refreshed.processed_at is not None
     assert refreshed.attempt_count == 3
     assert refreshed.last_error is None
+
+
+class _RecordingBot:
+    def __init__(self, fail_chat: int | None = None) -> None:
+        self.sent: list[tuple[int, str]] = []
+        self.fail_chat = fail_chat
+
+    async def send_message(self, chat_id, text, **kwargs):  # type: ignore[override]
+        if chat_id == self.fail_chat:
+            raise RuntimeError("blocked")
+        self.sent.append((chat_id, text))
+        return None
+
+
+@pytest.mark.asyncio
+async def test_drain_outbox_batch_updates_all_rows(async_session: AsyncSession, monkeypatch):
+    masters = [
+        m.masters(full_name=f"Outbox Master {idx}", tg_user_id=700 + idx)
+        for idx in range(3)
+    ]
+    no_chat = m.masters(full_name="Outbox No Chat", tg_user_id=None)
+    async_session.add_all([*masters, no_chat])
+    await async_session.commit()
+
+    rows = [
+        m.notifications_outbox(master_id=master.id, event="test", payload={"message": f"m{idx}"})
+        for idx, master in enumerate(masters)
+    ]
+    rows.append(
+        m.notifications_outbox(master_id=masters[0].id, event="test", payload={"message": "m0-2"})
+    )
+    rows.append(m.notifications_outbox(master_id=no_chat.id, event="test", payload={}))
+    async_session.add_all(rows)
+    await async_session.commit()
+
+    session_factory = async_sessionmaker(
+        bind=async_session.bind,
+        expire_on_commit=False,
+        class_=AsyncSession,
+    )
+    monkeypatch.setattr(notifications_watcher, "SessionLocal", session_factory)
+    notifications_watcher.reset_stats()
+
+    bot = _RecordingBot(fail_chat=masters[2].tg_user_id)
+    claimed = await notifications_watcher._drain_outbox_once(bot)
+    assert claimed == len(rows)
+
+    # messages of one chat keep their order
+    chat0 = [text for chat_id, text in bot.sent if chat_id == masters[0].tg_user_id]
+    assert chat0 == ["m0", "m0-2"]
+
+    async_session.expire_all()
+    states = {}
+    for row in rows:
+        refreshed = await async_session.get(m.notifications_outbox, row.id)
+        states[row.id] = (refreshed.processed_at is not None, refreshed.attempt_count)
+    assert states[rows[0].id] == (True, 1)
+    assert states[rows[1].id] == (True, 1)
+    assert states[rows[2].id] == (False, 1)
+    assert states[rows[3].id] == (True, 1)
+    assert states[rows[4].id] == (True, 0)
+
+    stats = notifications_watcher.get_stats()
+    assert (stats.sent, stats.failed, stats.skipped) == (3, 1, 1)
+    assert await notifications_watcher._refresh_queue_depth(async_session) == 1
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from field_service.db import models as m
+from field_service.services.distribution import offer_expiry, wake_channel
+
+UTC = timezone.utc
+
+
+async def _order_with_master(async_session):
+    city = m.cities(name="Expiry City")
+    async_session.add(city)
+    await async_session.flush()
+    master = m.masters(tg_user_id=8101, full_name="Expiry Master", city_id=city.id)
+    order = m.orders(city_id=city.id, status=m.OrderStatus.SEARCHING)
+    async_session.add_all([master, order])
+    await async_session.flush()
+    return order, master
+
+
+async def _offer(async_session, order, master, *, expires_in: timedelta, state=m.OfferState.SENT):
+    offer = m.offers(
+        order_id=order.id,
+        master_id=master.id,
+        state=state,
+        round_number=1,
+        sent_at=datetime.now(UTC) - timedelta(minutes=1),
+        expires_at=datetime.now(UTC) + expires_in,
+    )
+    async_session.add(offer)
+    await async_session.commit()
+    return offer
+
+
+async def _state(async_session, offer_id: int) -> m.OfferState:
+    return await async_session.scalar(select(m.offers.state).where(m.offers.id == offer_id))
+
+
+@pytest.mark.asyncio
+async def test_expire_due_expires_only_overdue_offers(async_session) -> None:
+    order, master = await _order_with_master(async_session)
+    overdue = await _offer(async_session, order, master, expires_in=timedelta(seconds=-5))
+    fresh = await _offer(
+        async_session,
+        order,
+        master,
+        expires_in=timedelta(minutes=5),
+        state=m.OfferState.VIEWED,
+    )
+
+    assert await offer_expiry.load_pending(async_session) == 1
+    assert offer_expiry.next_deadline() is not None
+
+    expired = await offer_expiry.expire_due(async_session)
+    await async_session.commit()
+
+    assert expired == [(overdue.id, order.id, master.id)]
+    assert await _state(async_session, overdue.id) == m.OfferState.EXPIRED
+    assert await _state(async_session, fresh.id) == m.OfferState.VIEWED
+    assert offer_expiry.pending_count() == 0
+
+    # the scheduler is woken up for the next round
+    wakeups = await wake_channel.wait(0.5)
+    assert {"reason": "offer_expired", "order_id": order.id} in wakeups
+
+
+@pytest.mark.asyncio
+async def test_expire_due_skips_answered_offers(async_session) -> None:
+    order, master = await _order_with_master(async_session)
+    offer = await _offer(async_session, order, master, expires_in=timedelta(seconds=-1))
+    offer_expiry.schedule(offer.id, order.id, offer.expires_at)
+
+    offer.state = m.OfferState.ACCEPTED
+    await async_session.commit()
+
+    assert await offer_expiry.expire_due(async_session) == []
+    assert await _state(async_session, offer.id) == m.OfferState.ACCEPTED
+    assert offer_expiry.pending_count() == 0
+
+
+@pytest.mark.asyncio
+async def test_run_offer_expiry_waits_for_deadline(async_session) -> None:
+    order, master = await _order_with_master(async_session)
+    offer = await _offer(async_session, order, master, expires_in=timedelta(milliseconds=300))
+
+    # the scheduler hands over its leased cities;
+    # first loop loads the offer (not due yet), second one expires it
+    offer_expiry.set_cities([order.city_id])
+    await offer_expiry.run_offer_expiry(iterations=2, session=async_session)
+
+    assert await _state(async_session, offer.id) == m.OfferState.EXPIRED
+
+
+@pytest.mark.asyncio
+async def test_load_pending_limited_to_leased_cities(async_session) -> None:
+    order, master = await _order_with_master(async_session)
+    await _offer(async_session, order, master, expires_in=timedelta(minutes=5))
+
+    assert await offer_expiry.load_pending(async_session, city_ids=[order.city_id + 1]) == 0
+    assert await offer_expiry.load_pending(async_session, city_ids=[order.city_id]) == 1
+
+
+@pytest.mark.asyncio
+async def test_expire_due_logs_sla_timeout(async_session, caplog) -> None:
+    order, master = await _order_with_master(async_session)
+    offer = await _offer(async_session, order, master, expires_in=timedelta(seconds=-1))
+    offer_expiry.schedule(offer.id, order.id, offer.expires_at)
+
+    with caplog.at_level("INFO"):
+        await offer_expiry.expire_due(async_session)
+        await async_session.commit()
+
+    assert f"[dist] order={order.id} timeout mid={master.id}" in caplog.text
+    assert "sla_timeout" in caplog.text
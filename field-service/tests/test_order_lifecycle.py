@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import order_lifecycle_service
+
+UTC = timezone.utc
+
+
+async def _order_with_history(async_session, name: str) -> m.orders:
+    city = m.cities(name=name)
+    async_session.add(city)
+    await async_session.flush()
+    order = m.orders(city_id=city.id, status=m.OrderStatus.CANCELED)
+    async_session.add(order)
+    await async_session.flush()
+
+    base = datetime(2025, 9, 1, 10, 0, tzinfo=UTC)
+    steps = (
+        (m.OrderStatus.SEARCHING, None, 0),
+        (m.OrderStatus.ASSIGNED, None, 5),
+        (m.OrderStatus.EN_ROUTE, None, 10),
+        (m.OrderStatus.SEARCHING, None, 20),
+        (m.OrderStatus.CANCELED, "client_busy", 30),
+        (m.OrderStatus.SEARCHING, None, 40),
+        (m.OrderStatus.CANCELED, "duplicate", 50),
+    )
+    for to_status, reason, minutes in steps:
+        async_session.add(
+            m.order_status_history(
+                order_id=order.id,
+                to_status=to_status,
+                reason=reason,
+                created_at=base + timedelta(minutes=minutes),
+            )
+        )
+    await async_session.commit()
+    return order
+
+
+@pytest.mark.asyncio
+async def test_lifecycle_follows_history_inserts(async_session) -> None:
+    order = await _order_with_history(async_session, "Lifecycle City")
+    base = datetime(2025, 9, 1, 10, 0, tzinfo=UTC)
+
+    row = await order_lifecycle_service.get_lifecycle(async_session, order.id)
+    assert row is not None
+    await async_session.refresh(row)
+    assert row.first_searching_at == base
+    assert row.last_searching_at == base + timedelta(minutes=40)
+    assert row.first_en_route_at == base + timedelta(minutes=10)
+    assert row.first_canceled_at == base + timedelta(minutes=30)
+    assert row.last_canceled_at == base + timedelta(minutes=50)
+    assert row.cancel_reason == "duplicate"
+    assert row.first_closed_at is None
+
+
+@pytest.mark.asyncio
+async def test_rebuild_repairs_lifecycle(async_session) -> None:
+    order = await _order_with_history(async_session, "Rebuild City")
+    await async_session.execute(
+        sa.delete(m.order_lifecycle).where(m.order_lifecycle.order_id == order.id)
+    )
+    await async_session.commit()
+
+    await order_lifecycle_service.rebuild_order_lifecycle(async_session)
+
+    row = await order_lifecycle_service.get_lifecycle(async_session, order.id)
+    assert row is not None
+    await async_session.refresh(row)
+    assert row.cancel_reason == "duplicate"
+    assert row.last_searching_at == datetime(2025, 9, 1, 10, 40, tzinfo=UTC)
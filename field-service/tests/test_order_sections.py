@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import order_sections_service
+
+UTC = timezone.utc
+
+_QUEUE = (
+    m.OrderStatus.SEARCHING,
+    m.OrderStatus.ASSIGNED,
+    m.OrderStatus.EN_ROUTE,
+    m.OrderStatus.WORKING,
+    m.OrderStatus.PAYMENT,
+    m.OrderStatus.GUARANTEE,
+    m.OrderStatus.DEFERRED,
+)
+
+
+async def _adhoc_counts(session, city_ids: list[int]) -> dict[str, int]:
+    """The three COUNT queries the orders menu used to run."""
+    deadline = datetime.now(UTC) - timedelta(days=14)
+    queue = await session.scalar(
+        sa.select(sa.func.count(m.orders.id)).where(
+            m.orders.status.in_(_QUEUE), m.orders.city_id.in_(city_ids)
+        )
+    )
+    guarantee = await session.scalar(
+        sa.select(sa.func.count(m.orders.id))
+        .select_from(m.orders)
+        .join(m.commissions, m.commissions.order_id == m.orders.id)
+        .where(
+            m.orders.status == m.OrderStatus.CLOSED,
+            m.orders.type != m.OrderType.GUARANTEE,
+            m.commissions.paid_approved_at >= deadline,
+            m.orders.city_id.in_(city_ids),
+        )
+    )
+    closed = await session.scalar(
+        sa.select(sa.func.count(m.orders.id))
+        .select_from(m.orders)
+        .join(m.commissions, m.commissions.order_id == m.orders.id, isouter=True)
+        .where(
+            m.orders.status == m.OrderStatus.CLOSED,
+            (
+                (m.orders.type == m.OrderType.GUARANTEE)
+                | m.commissions.paid_approved_at.is_(None)
+                | (m.commissions.paid_approved_at < deadline)
+            ),
+            m.orders.city_id.in_(city_ids),
+        )
+    )
+    return {"queue": int(queue), "guarantee": int(guarantee), "closed": int(closed)}
+
+
+async def _counts(session, city_ids: list[int]) -> dict[str, int]:
+    order_sections_service.invalidate()
+    return await order_sections_service.count_sections(city_ids, session=session)
+
+
+async def _closed_with_commission(session, city, master, *, approved_at) -> m.orders:
+    order = m.orders(
+        city_id=city.id,
+        status=m.OrderStatus.PAYMENT,
+        assigned_master_id=master.id,
+        total_sum=Decimal("3000"),
+    )
+    session.add(order)
+    await session.flush()
+    session.add(
+        m.commissions(
+            order_id=order.id,
+            master_id=master.id,
+            amount=Decimal("1500"),
+            rate=Decimal("0.50"),
+            status=m.CommissionStatus.WAIT_PAY,
+            deadline_at=datetime.now(UTC) + timedelta(hours=3),
+        )
+    )
+    await session.flush()
+    await session.execute(
+        sa.update(m.orders).where(m.orders.id == order.id).values(status=m.OrderStatus.CLOSED)
+    )
+    if approved_at is not None:
+        await session.execute(
+            sa.update(m.commissions)
+            .where(m.commissions.order_id == order.id)
+            .values(status=m.CommissionStatus.APPROVED, paid_approved_at=approved_at)
+        )
+    return order
+
+
+@pytest.mark.asyncio
+async def test_counters_follow_transitions_and_approvals(async_session) -> None:
+    city = m.cities(name="Sections City")
+    other = m.cities(name="Sections Other")
+    async_session.add_all([city, other])
+    await async_session.flush()
+    master = m.masters(tg_user_id=8801, full_name="Sections Master", city_id=city.id)
+    async_session.add(master)
+    await async_session.flush()
+
+    searching = m.orders(city_id=city.id, status=m.OrderStatus.SEARCHING)
+    deferred = m.orders(city_id=other.id, status=m.OrderStatus.DEFERRED)
+    async_session.add_all([searching, deferred])
+    await async_session.flush()
+
+    now = datetime.now(UTC)
+    recent = await _closed_with_commission(async_session, city, master, approved_at=now)
+    await _closed_with_commission(
+        async_session, city, master, approved_at=now - timedelta(days=20)
+    )
+    await _closed_with_commission(async_session, city, master, approved_at=None)
+    async_session.add(
+        m.orders(
+            city_id=city.id,
+            status=m.OrderStatus.CLOSED,
+            type=m.OrderType.GUARANTEE,
+        )
+    )
+    await async_session.commit()
+
+    ids = [city.id, other.id]
+    counts = await _counts(async_session, ids)
+    assert counts == await _adhoc_counts(async_session, ids)
+    assert counts == {"queue": 2, "guarantee": 1, "closed": 3}
+    assert await _counts(async_session, [other.id]) == {"queue": 1, "guarantee": 0, "closed": 0}
+
+    # Заказ закрыт, другой отменён, гарантия вернулась в работу
+    await async_session.execute(
+        sa.update(m.orders)
+        .where(m.orders.id == searching.id)
+        .values(status=m.OrderStatus.CLOSED)
+    )
+    await async_session.execute(
+        sa.update(m.orders)
+        .where(m.orders.id == deferred.id)
+        .values(status=m.OrderStatus.CANCELED)
+    )
+    await async_session.execute(
+        sa.update(m.orders)
+        .where(m.orders.id == recent.id)
+        .values(status=m.OrderStatus.GUARANTEE)
+    )
+    await async_session.commit()
+
+    counts = await _counts(async_session, ids)
+    assert counts == await _adhoc_counts(async_session, ids)
+    assert counts == {"queue": 1, "guarantee": 0, "closed": 4}
+
+    # Окно гарантии истекает по времени: чтение учитывает просроченные строки
+    await async_session.execute(
+        sa.update(m.orders).where(m.orders.id == recent.id).values(status=m.OrderStatus.CLOSED)
+    )
+    await async_session.execute(
+        sa.update(m.commissions)
+        .where(m.commissions.order_id == recent.id)
+        .values(paid_approved_at=now - timedelta(days=13, hours=23, minutes=59))
+    )
+    await async_session.commit()
+    assert (await _counts(async_session, ids))["guarantee"] == 1
+    await async_session.execute(
+        sa.update(m.order_warranty_window)
+        .where(m.order_warranty_window.order_id == recent.id)
+        .values(expires_at=now - timedelta(minutes=1))
+    )
+    await async_session.commit()
+    counts = await _counts(async_session, ids)
+    assert counts == {"queue": 1, "guarantee": 0, "closed": 5}
+
+    assert await order_sections_service.expire_warranty_window(async_session) == 1
+    assert await _counts(async_session, ids) == counts
+
+
+@pytest.mark.asyncio
+async def test_rebuild_repairs_drift_and_cache_ttl(async_session) -> None:
+    city = m.cities(name="Drift Sections City")
+    async_session.add(city)
+    await async_session.flush()
+    async_session.add_all(
+        [
+            m.orders(city_id=city.id, status=m.OrderStatus.SEARCHING),
+            m.orders(city_id=city.id, status=m.OrderStatus.CLOSED),
+        ]
+    )
+    await async_session.commit()
+
+    fresh = await order_sections_service.count_sections([city.id], session=async_session)
+    assert fresh == {"queue": 1, "guarantee": 0, "closed": 1}
+
+    await async_session.execute(
+        sa.update(m.order_section_counters)
+        .where(m.order_section_counters.city_id == city.id)
+        .values(cnt=40)
+    )
+    await async_session.commit()
+
+    # В пределах TTL отдаётся закэшированное значение
+    assert await order_sections_service.count_sections([city.id], session=async_session) == fresh
+    assert await _counts(async_session, [city.id]) == {"queue": 40, "guarantee": 0, "closed": 40}
+
+    drifted = await order_sections_service.rebuild_section_counters(async_session)
+    assert drifted >= 2
+    counts = await order_sections_service.count_sections([city.id], session=async_session)
+    assert counts == {"queue": 1, "guarantee": 0, "closed": 1}
+    assert counts == await _adhoc_counts(async_session, [city.id])
+    assert await order_sections_service.rebuild_section_counters(async_session) == 0
+
+    assert await order_sections_service.count_sections([], session=async_session) == {
+        "queue": 0,
+        "guarantee": 0,
+        "closed": 0,
+    }
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from field_service.db import pg_notify
+from field_service.db import session as session_module
+
+
+class _Driver:
+    def __init__(self) -> None:
+        self.listeners: list[tuple[str, object]] = []
+        self.closed = False
+
+    async def add_listener(self, channel, callback) -> None:
+        self.listeners.append((channel, callback))
+
+    async def remove_listener(self, channel, callback) -> None:
+        self.listeners.remove((channel, callback))
+
+    def is_closed(self) -> bool:
+        return self.closed
+
+
+class _Conn:
+    def __init__(self, driver: _Driver) -> None:
+        self.driver = driver
+        self.closed = False
+
+    async def get_raw_connection(self):
+        return SimpleNamespace(driver_connection=self.driver)
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class _Engine:
+    def __init__(self) -> None:
+        self.attempts = 0
+        self.conns: list[_Conn] = []
+
+    async def connect(self) -> _Conn:
+        self.attempts += 1
+        if self.attempts == 1:
+            raise OSError("db is down")
+        conn = _Conn(_Driver())
+        self.conns.append(conn)
+        return conn
+
+
+@pytest.mark.asyncio
+async def test_listen_reconnects_and_reports_state(monkeypatch) -> None:
+    engine = _Engine()
+    monkeypatch.setattr(session_module, "engine", engine)
+    events: list[str] = []
+
+    task = asyncio.create_task(
+        pg_notify.listen(
+            "test_channel",
+            lambda *args: None,
+            on_connect=lambda: events.append("connect"),
+            on_disconnect=lambda: events.append("disconnect"),
+            reconnect_delay=0,
+            healthcheck_seconds=0.01,
+        )
+    )
+    for _ in range(200):
+        if "connect" in events:
+            break
+        await asyncio.sleep(0.01)
+    # Первая попытка упала, вторая подключилась и слушает канал
+    assert events == ["disconnect", "connect"]
+    assert engine.conns[0].driver.listeners[0][0] == "test_channel"
+
+    # Потеря соединения: LISTEN снимается, соединение закрывается
+    engine.conns[0].driver.closed = True
+    for _ in range(200):
+        if len(engine.conns) > 1:
+            break
+        await asyncio.sleep(0.01)
+    assert engine.conns[0].closed
+    assert events[:3] == ["disconnect", "connect", "disconnect"]
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert engine.conns[-1].driver.listeners == []
+
+
+@pytest.mark.asyncio
+async def test_notify_is_noop_without_postgres() -> None:
+    session = SimpleNamespace(bind=SimpleNamespace(dialect=SimpleNamespace(name="sqlite")))
+    assert await pg_notify.notify(session, "test_channel", "{}") is False
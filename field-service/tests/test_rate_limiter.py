@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+from time import monotonic
+
+import pytest
+
+from field_service.infra.rate_limiter import Priority, TelegramRateLimiter, TokenBucket
+
+
+def test_token_bucket_reserve_waits_for_refill() -> None:
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    now = 100.0
+    bucket._updated_at = now
+    assert bucket.reserve(now) == 0.0
+    assert bucket.reserve(now) == 0.0
+    assert bucket.reserve(now) == pytest.approx(0.5)
+    assert bucket.reserve(now) == pytest.approx(1.0)
+
+
+@pytest.mark.asyncio
+async def test_global_bucket_serves_higher_priority_first() -> None:
+    limiter = TelegramRateLimiter(global_rate=20.0, global_burst=1)
+    await limiter.acquire(None)  # drain the burst
+
+    order: list[str] = []
+
+    async def sender(name: str, priority: Priority) -> None:
+        await limiter.acquire(None, priority=priority)
+        order.append(name)
+
+    reminder = asyncio.create_task(sender("reminder", Priority.REMINDER))
+    offer = asyncio.create_task(sender("offer", Priority.OFFER))
+    await asyncio.sleep(0)
+    alert = asyncio.create_task(sender("alert", Priority.ALERT))
+    await asyncio.wait_for(asyncio.gather(reminder, offer, alert), timeout=2)
+
+    assert order == ["alert", "offer", "reminder"]
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_only_that_chat() -> None:
+    limiter = TelegramRateLimiter()
+    limiter.retry_after(101, 0.3)
+
+    started = monotonic()
+    await limiter.acquire(202)
+    assert monotonic() - started < 0.1
+
+    await limiter.acquire(101)
+    assert monotonic() - started >= 0.25
+
+
+@pytest.mark.asyncio
+async def test_group_chat_is_limited_per_minute() -> None:
+    limiter = TelegramRateLimiter()
+    bucket = limiter._chat_bucket(-100500)
+    waits = [bucket.reserve() for _ in range(6)]
+    assert waits[:5] == [0.0] * 5
+    # 20 msg/min -> next slot in ~3 seconds
+    assert waits[5] == pytest.approx(3.0, abs=0.05)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+
+from field_service.db import models as m
+from field_service.services import referral_graph, referral_service
+from field_service.services.commission_service import CommissionService
+
+UTC = timezone.utc
+
+
+def test_ancestors_resolve_two_levels() -> None:
+    graph = referral_graph.ReferralGraph(fingerprint=(), parents={3: 2, 2: 1, 5: 4})
+
+    assert graph.ancestors(3) == (2, 1)
+    assert graph.ancestors(5) == (4, None)
+    assert graph.ancestors(1) == (None, None)
+    assert graph.ancestors(42) == (None, None)
+
+
+async def _masters(session, count: int, *, tg_base: int) -> list[m.masters]:
+    masters = [
+        m.masters(tg_user_id=tg_base + idx, full_name=f"Graph Master {idx}")
+        for idx in range(count)
+    ]
+    session.add_all(masters)
+    await session.flush()
+    return masters
+
+
+@pytest.mark.asyncio
+async def test_graph_follows_new_referrals(async_session, monkeypatch) -> None:
+    root, child, grandchild = await _masters(async_session, 3, tg_base=9100)
+    async_session.add(m.referrals(master_id=child.id, referrer_id=root.id))
+    await async_session.commit()
+
+    assert await referral_graph.ancestors(async_session, grandchild.id) == (None, None)
+    assert await referral_graph.ancestors(async_session, child.id) == (root.id, None)
+
+    # Онбординг другого процесса: новое ребро замечается по fingerprint
+    grandchild.referred_by_master_id = child.id
+    async_session.add(m.referrals(master_id=grandchild.id, referrer_id=child.id))
+    await async_session.commit()
+    monkeypatch.setattr(referral_graph, "_FINGERPRINT_CHECK_SECONDS", 0)
+    assert await referral_graph.ancestors(async_session, grandchild.id) == (
+        child.id,
+        root.id,
+    )
+    assert await referral_graph.ancestors(async_session, None) == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_batch_rewards_single_insert_and_idempotent(async_session) -> None:
+    city = m.cities(name="Referral Batch City")
+    async_session.add(city)
+    await async_session.flush()
+    root, l1, payer, solo = await _masters(async_session, 4, tg_base=9200)
+    async_session.add_all(
+        [
+            m.referrals(master_id=l1.id, referrer_id=root.id),
+            m.referrals(master_id=payer.id, referrer_id=l1.id),
+            m.referrals(master_id=solo.id, referrer_id=root.id),
+        ]
+    )
+    items = []
+    for master, amount in ((payer, Decimal("750.50")), (solo, Decimal("200.00"))):
+        order = m.orders(city_id=city.id, status=m.OrderStatus.PAYMENT, assigned_master_id=master.id)
+        async_session.add(order)
+        await async_session.flush()
+        commission = m.commissions(
+            order_id=order.id,
+            master_id=master.id,
+            amount=amount,
+            status=m.CommissionStatus.WAIT_PAY,
+            deadline_at=datetime.now(UTC) + timedelta(hours=3),
+        )
+        async_session.add(commission)
+        await async_session.flush()
+        items.append((commission.id, master.id, amount, None))
+    # Без мастера и с нулевой базой - ничего не начисляется
+    items.append((items[0][0], None, Decimal("100"), None))
+    items.append((items[1][0], solo.id, Decimal("0"), None))
+
+    assert await referral_service.apply_rewards_for_commissions(async_session, items) == 3
+    assert await referral_service.apply_rewards_for_commissions(async_session, items) == 0
+
+    rewards = (
+        await async_session.execute(
+            sa.select(
+                m.referral_rewards.commission_id,
+                m.referral_rewards.level,
+                m.referral_rewards.referrer_id,
+                m.referral_rewards.amount,
+            ).order_by(m.referral_rewards.commission_id, m.referral_rewards.level)
+        )
+    ).all()
+    assert rewards == [
+        (items[0][0], 1, l1.id, Decimal("75.05")),
+        (items[0][0], 2, root.id, Decimal("37.53")),
+        (items[1][0], 1, root.id, Decimal("20.00")),
+    ]
+
+    payloads = (
+        await async_session.execute(
+            sa.select(m.notifications_outbox.master_id, m.notifications_outbox.payload)
+            .where(m.notifications_outbox.event == "referral_reward_accrued")
+            .order_by(m.notifications_outbox.id)
+        )
+    ).all()
+    assert len(payloads) == 3
+    order_ids = {
+        cid: oid
+        for cid, oid in (
+            await async_session.execute(
+                sa.select(m.commissions.id, m.commissions.order_id)
+            )
+        ).all()
+    }
+    assert payloads[0].payload["order_id"] == order_ids[items[0][0]]
+    assert payloads[0].payload["level"] == 1
+    assert "75.05" in payloads[0].payload["message"]
+
+
+@pytest.mark.asyncio
+async def test_create_for_order_accrues_rewards_from_graph(async_session) -> None:
+    city = m.cities(name="Referral Commission City")
+    async_session.add(city)
+    await async_session.flush()
+    referrer, master = await _masters(async_session, 2, tg_base=9300)
+    master.city_id = city.id
+    async_session.add(m.referrals(master_id=master.id, referrer_id=referrer.id))
+    order = m.orders(
+        city_id=city.id,
+        status=m.OrderStatus.PAYMENT,
+        total_sum=Decimal("3000"),
+        assigned_master_id=master.id,
+        type=m.OrderType.NORMAL,
+    )
+    async_session.add(order)
+    await async_session.flush()
+
+    commission = await CommissionService(async_session).create_for_order(order.id)
+    assert commission is not None
+
+    reward = (
+        await async_session.execute(
+            sa.select(m.referral_rewards).where(
+                m.referral_rewards.commission_id == commission.id
+            )
+        )
+    ).scalar_one()
+    assert reward.referrer_id == referrer.id
+    assert reward.level == 1
+    assert Decimal(reward.amount) == (Decimal(commission.amount) * Decimal("0.10")).quantize(
+        Decimal("0.01")
+    )
+    payload = (
+        await async_session.execute(
+            sa.select(m.notifications_outbox.payload).where(
+                m.notifications_outbox.master_id == referrer.id
+            )
+        )
+    ).scalar_one()
+    assert payload["order_id"] == order.id
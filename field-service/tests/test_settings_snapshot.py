@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from datetime import time
+from time import monotonic
+
+import pytest
+from sqlalchemy import text
+
+from field_service.services import distribution_scheduler as ds
+from field_service.services import settings_service
+from field_service.services.settings_service import SettingsSnapshot
+
+
+def test_snapshot_typed_accessors() -> None:
+    snapshot = SettingsSnapshot(
+        values={
+            "limit": ("7", "INT"),
+            "broken_int": ("seven", "INT"),
+            "ratio": ("0.25", "FLOAT"),
+            "enabled": ("true", "BOOL"),
+            "disabled": ("0", "BOOL"),
+            "start": ("09:30", "TIME"),
+            "bad_time": ("25:00", "TIME"),
+            "payload": ('{"a": [1, 2]}', "JSON"),
+            "empty": (None, "STR"),
+        },
+        loaded_at=monotonic(),
+    )
+
+    assert snapshot.get_int("limit", 5) == 7
+    assert snapshot.get_int("broken_int", 5) == 5
+    assert snapshot.get_int("missing", 5) == 5
+    assert snapshot.get_float("ratio", 1.0) == 0.25
+    assert snapshot.get_bool("enabled") is True
+    assert snapshot.get_bool("disabled", True) is False
+    assert snapshot.get_bool("missing", True) is True
+    assert snapshot.get_time("start", "10:00") == time(9, 30)
+    assert snapshot.get_time("bad_time", "10:00") == time(10, 0)
+    assert snapshot.get_json("payload") == {"a": [1, 2]}
+    assert snapshot.get_str("empty", "dflt") == "dflt"
+    assert snapshot.raw("limit") == ("7", "INT")
+
+
+async def _put(session, key: str, value: str) -> None:
+    await session.execute(
+        text(
+            """
+            INSERT INTO settings (key, value, value_type) VALUES (:key, :value, 'INT')
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+            """
+        ).bindparams(key=key, value=value)
+    )
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_reads_are_served_from_snapshot_until_invalidated(async_session) -> None:
+    await _put(async_session, "max_active_orders", "3")
+
+    assert await settings_service.get_int("max_active_orders", 5, session=async_session) == 3
+
+    # Прямое изменение в БД не видно до сброса снимка
+    await _put(async_session, "max_active_orders", "8")
+    assert await settings_service.get_int("max_active_orders", 5, session=async_session) == 3
+
+    # NOTIFY от другого процесса сбрасывает снимок
+    settings_service._on_notify(None, 0, settings_service.CHANNEL, "")
+    assert await settings_service.get_int("max_active_orders", 5, session=async_session) == 8
+    values = await settings_service.get_values(
+        ["max_active_orders", "missing_key"], session=async_session
+    )
+    assert values == {"max_active_orders": ("8", "INT")}
+
+
+@pytest.mark.asyncio
+async def test_dist_config_follows_snapshot(async_session) -> None:
+    ds._CONFIG_CACHE = None
+    ds._CONFIG_CACHE_TIMESTAMP = None
+    await _put(async_session, "distribution_sla_seconds", "150")
+
+    cfg = await ds._load_config(session=async_session)
+    assert cfg.sla_seconds == 150
+    assert await ds._load_config(session=async_session) is cfg
+
+    await _put(async_session, "distribution_sla_seconds", "90")
+    settings_service.invalidate_cache()
+
+    cfg = await ds._load_config(session=async_session)
+    assert cfg.sla_seconds == 90
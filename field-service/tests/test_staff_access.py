@@ -538,3 +538,43 @@ async def test_manual_candidates_respects_city_scope(async_session) -> None:
     )
     assert masters == []
     assert has_next is False
+
+
+@pytest.mark.asyncio
+async def test_middleware_caches_staff_until_invalidated(async_session) -> None:
+    staff_row = m.staff_users(tg_user_id=777, role=m.StaffRole.ADMIN.value, is_active=True)
+    async_session.add(staff_row)
+    await async_session.commit()
+
+    session_maker = async_sessionmaker(async_session.bind, expire_on_commit=False)
+    service = DBStaffService(session_factory=session_maker)
+    middleware = StaffAccessMiddleware(service, superusers=())
+
+    seen: list[StaffUser | None] = []
+
+    async def handler(_, data):
+        seen.append(data.get("staff"))
+
+    await middleware(handler, _DummyMessage(user_id=777), {})
+    assert seen[-1] is not None and seen[-1].is_active
+
+    calls = 0
+    original = service.get_by_tg_id_or_username
+
+    async def counting(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        return await original(*args, **kwargs)
+
+    service.get_by_tg_id_or_username = counting  # type: ignore[method-assign]
+
+    # cached: no DB lookup for the next update
+    await middleware(handler, _DummyMessage(user_id=777), {})
+    assert calls == 0
+
+    # deactivation drops the cached identity
+    await service.set_staff_active(staff_row.id, False)
+    event = _DummyMessage(user_id=777)
+    await middleware(handler, event, {})
+    assert calls == 1
+    assert event.messages == [INACTIVE_PROMPT]
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+
+import pytest
+
+from field_service.bots.admin_bot.services import DBOrdersService
+from field_service.db import models as m
+from field_service.services import street_index
+from field_service.services.street_index import CityStreetIndex
+
+
+@asynccontextmanager
+async def _existing_session(session):
+    yield session
+
+
+def _index(names: list[str]) -> CityStreetIndex:
+    return CityStreetIndex.build(1, [(idx + 1, None, name) for idx, name in enumerate(names)])
+
+
+def test_search_covers_whole_city() -> None:
+    names = [f"Улица {idx:04d}" for idx in range(3000)] + ["Ярославская улица"]
+    index = _index(names)
+
+    matches = index.search("ярослав", limit=5)
+    assert matches[0][0].name == "Ярославская улица"
+    # trigram prefilter: far fewer candidates than streets in the city
+    assert len(index._candidates({"  я", " яр", "яро"})) == 1
+
+
+def test_fold_and_typo_fallback() -> None:
+    index = _index(["Пролетарская ул.", "Ёлочная улица"])
+
+    assert index.search("елочная")[0][0].name == "Ёлочная улица"
+    # no shared trigram at all: the whole city is scored
+    assert index.search("qq")[0][1] >= 0
+
+
+@pytest.mark.asyncio
+async def test_search_streets_beyond_first_200(async_session) -> None:
+    city = m.cities(name="Street Index City")
+    async_session.add(city)
+    await async_session.flush()
+    async_session.add_all(
+        [m.streets(city_id=city.id, name=f"Alpha {idx:03d}") for idx in range(250)]
+    )
+    async_session.add(m.streets(city_id=city.id, name="Zoological Street"))
+    await async_session.flush()
+
+    service = DBOrdersService(session_factory=lambda: _existing_session(async_session))
+    results = await service.search_streets(city.id, "Zoolog")
+    assert results and results[0].name == "Zoological Street"
+
+    async_session.add(m.streets(city_id=city.id, name="Zebra Lane"))
+    await street_index.mark_changed(async_session, [city.id])
+    await async_session.flush()
+    results = await service.search_streets(city.id, "Zebra")
+    assert any(r.name == "Zebra Lane" for r in results)
+
+
+@pytest.mark.asyncio
+async def test_fingerprint_notices_rename_without_mark_changed(async_session, monkeypatch) -> None:
+    city = m.cities(name="Street Rename City")
+    async_session.add(city)
+    await async_session.flush()
+    street = m.streets(city_id=city.id, name="Old Harbour Street")
+    async_session.add(street)
+    await async_session.flush()
+
+    service = DBOrdersService(session_factory=lambda: _existing_session(async_session))
+    assert (await service.search_streets(city.id, "Harbour"))[0].name == "Old Harbour Street"
+
+    # Ручная правка в БД: count / MAX(id) те же, меняется только имя
+    street.name = "New Quay Street"
+    await async_session.flush()
+    monkeypatch.setattr(street_index, "_FINGERPRINT_CHECK_SECONDS", 0)
+    results = await service.search_streets(city.id, "Quay")
+    assert results and results[0].name == "New Quay Street"
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+
+import pytest
+from aiogram import Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import ClientSession
+
+from field_service.bots.common import webhook
+from field_service.config import settings
+from tests.fake_telegram import FakeTelegram, free_port
+
+SECRET = "s3cr3t-token"
+
+
+def _serve(dp: Dispatcher, bot, stop: asyncio.Event, **kwargs) -> asyncio.Task:
+    port = free_port()
+    return asyncio.create_task(
+        webhook.serve_webhook(
+            dp,
+            bot,
+            bot_label="master_bot",
+            base_url=f"http://127.0.0.1:{port}",
+            secret_token=SECRET,
+            host="127.0.0.1",
+            port=port,
+            stop_event=stop,
+            handle_signals=False,
+            **kwargs,
+        )
+    )
+
+
+async def _wait_for(predicate, timeout: float = 5.0) -> None:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_webhook_checks_secret_and_answers_through_bot_api() -> None:
+    router = Router()
+
+    @router.message()
+    async def _echo(message: Message) -> None:
+        await message.answer(f"echo: {message.text}")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    stop = asyncio.Event()
+
+    async with FakeTelegram() as telegram:
+        bot = telegram.bot()
+        task = _serve(dp, bot, stop)
+        url = await telegram.wait_webhook()
+        assert url.endswith("/webhook/master_bot")
+        registered = telegram.calls_of("setWebhook")[0]
+        assert registered["secret_token"] == SECRET
+        assert "message" in registered["allowed_updates"]
+
+        update = telegram.message_update("ping")
+        assert await telegram.deliver(update, secret_token="wrong") == 401
+        assert await telegram.deliver(update) == 200
+        await _wait_for(lambda: telegram.calls_of("sendMessage"))
+        sent = telegram.calls_of("sendMessage")
+        assert len(sent) == 1
+        assert sent[0]["text"] == "echo: ping"
+
+        stop.set()
+        await asyncio.wait_for(task, timeout=5)
+        # Реплика не снимает общий webhook при остановке
+        assert telegram.calls_of("deleteWebhook") == []
+        await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_bounds_concurrency_and_drains_on_stop() -> None:
+    release = asyncio.Event()
+    started: list[str] = []
+    finished: list[str] = []
+    router = Router()
+
+    @router.message()
+    async def _slow(message: Message) -> None:
+        started.append(message.text or "")
+        await release.wait()
+        finished.append(message.text or "")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    stop = asyncio.Event()
+
+    async with FakeTelegram() as telegram:
+        bot = telegram.bot()
+        task = _serve(dp, bot, stop, max_concurrency=2, acquire_timeout=0.05, drain_timeout=5)
+        url = await telegram.wait_webhook()
+        health_url = url.replace("/webhook/master_bot", "/healthz")
+
+        assert await telegram.deliver(telegram.message_update("a")) == 200
+        assert await telegram.deliver(telegram.message_update("b")) == 200
+        await _wait_for(lambda: len(started) == 2)
+        # Все слоты заняты: Telegram получит 503 и доставит апдейт позже
+        assert await telegram.deliver(telegram.message_update("c")) == 503
+
+        stop.set()
+        statuses: list[int] = []
+        async with ClientSession() as client:
+            while not statuses or statuses[-1] != 503:
+                async with client.get(health_url) as resp:
+                    statuses.append(resp.status)
+                assert len(statuses) < 500
+                await asyncio.sleep(0.01)
+        assert finished == []
+        # Во время дренажа новые апдейты не принимаются
+        assert await telegram.deliver(telegram.message_update("d")) == 503
+        assert not task.done()
+
+        release.set()
+        await asyncio.wait_for(task, timeout=5)
+        assert sorted(finished) == ["a", "b"]
+        await bot.session.close()
+
+
+@pytest.mark.asyncio
+async def test_webhook_logs_updates_lost_after_drain_timeout(caplog) -> None:
+    router = Router()
+
+    @router.message()
+    async def _stuck(message: Message) -> None:
+        await asyncio.Event().wait()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    stop = asyncio.Event()
+
+    async with FakeTelegram() as telegram:
+        bot = telegram.bot()
+        task = _serve(dp, bot, stop, drain_timeout=0.05)
+        await telegram.wait_webhook()
+        update = telegram.message_update("stuck")
+        assert await telegram.deliver(update) == 200
+
+        with caplog.at_level("WARNING", logger="bots.webhook"):
+            stop.set()
+            await asyncio.wait_for(task, timeout=5)
+        # Апдейт уже подтверждён 200 - Telegram его не повторит, остаётся лог
+        assert f"lost update_ids=[{update['update_id']}]" in caplog.text
+        await bot.session.close()
+
+
+class _PollingDispatcher:
+    def __init__(self) -> None:
+        self.polled = False
+
+    async def start_polling(self, bot) -> None:
+        self.polled = True
+
+
+class _PollingBot:
+    def __init__(self) -> None:
+        self.deleted: list[bool] = []
+        self.logs: list[str] = []
+
+    async def delete_webhook(self, drop_pending_updates: bool = False) -> bool:
+        self.deleted.append(drop_pending_updates)
+        return True
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.logs.append(text)
+        return True
+
+
+@pytest.mark.asyncio
+async def test_run_updates_falls_back_to_polling(monkeypatch) -> None:
+    # Webhook без адреса/секрета: polling, webhook другой реплики не трогаем
+    monkeypatch.setattr(
+        webhook,
+        "settings",
+        dataclasses.replace(settings, bot_runtime="webhook", webhook_base_url="", webhook_secret=""),
+    )
+    dp, bot = _PollingDispatcher(), _PollingBot()
+    await webhook.run_updates(dp, bot, bot_label="admin_bot", port=0, logs_chat_id=555)
+    assert dp.polled is True
+    assert bot.deleted == []
+    assert bot.logs and "polling" in bot.logs[0]
+
+    # Явный polling снимает webhook, сохраняя накопленные апдейты
+    monkeypatch.setattr(webhook, "settings", dataclasses.replace(settings, bot_runtime="polling"))
+    dp, bot = _PollingDispatcher(), _PollingBot()
+    await webhook.run_updates(dp, bot, bot_label="admin_bot", port=0)
+    assert dp.polled is True
+    assert bot.deleted == [False]
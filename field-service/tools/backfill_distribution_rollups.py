@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""Rebuild hourly/daily rollups of distribution_metrics.
+
+Usage:
+    python -m tools.backfill_distribution_rollups [--since 2025-09-01] [--until 2025-10-01]
+
+Whole UTC days in [since, until) are deleted from distribution_metrics_hourly /
+distribution_metrics_daily and re-aggregated from distribution_metrics.
+Without arguments the rollups are rebuilt for the whole history. Use after
+manual edits of raw metrics; new rows are rolled up by the database trigger.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from datetime import date
+
+from field_service.services.distribution_metrics_service import backfill_rollups
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild distribution metrics rollups")
+    parser.add_argument("--since", type=date.fromisoformat, help="First UTC day (YYYY-MM-DD)")
+    parser.add_argument("--until", type=date.fromisoformat, help="Day after the last one (exclusive)")
+    args = parser.parse_args()
+
+    written = await backfill_rollups(since=args.since, until=args.until)
+    for table, rows in written.items():
+        print(f"{table}: {rows} rows")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""Geocode orders that still have centroid-only coordinates.
+
+Usage:
+    python -m tools.backfill_order_geocodes [--city-id 5] [--limit 500]
+
+Uses the geocoder configured in settings (geo_mode = yandex, API key, rps and
+daily limit). Addresses already present in geocache do not spend the budget;
+the run stops when the daily limit is reached.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+
+from field_service.services.geocoding_service import backfill_order_coordinates, get_service
+
+
+async def _main() -> None:
+    parser = argparse.ArgumentParser(description="Geocode orders with centroid coordinates")
+    parser.add_argument("--city-id", type=int, default=None, help="Only orders of this city")
+    parser.add_argument("--limit", type=int, default=500, help="Orders per run (default 500)")
+    args = parser.parse_args()
+
+    if await get_service() is None:
+        raise SystemExit("Geocoder is not configured: set geo_mode=yandex and yandex_geocoder_key")
+    stats = await backfill_order_coordinates(city_id=args.city_id, limit=args.limit)
+    print(f"checked={stats['checked']} updated={stats['updated']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -34,7 +34,9 @@ from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from field_service.db import models as m
-from field_service.db.session import SessionLocal\nfrom field_service.data import cities as city_catalog
+from field_service.db.session import SessionLocal
+from field_service.data import cities as city_catalog
+from field_service.services import street_index
 
 DUP_THRESHOLD = 93
 QUESTIONABLE_THRESHOLD = 85
@@ -293,6 +295,8 @@ async def import_rows(rows: Sequence[ImportRow], dry_run: bool = False) -> Impor
         if dry_run:
             await session.rollback()
         else:
+            # running bots reload their street search indexes
+            await street_index.mark_changed(session)
             await session.commit()
 
     return stats